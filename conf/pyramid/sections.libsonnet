@@ -147,7 +147,8 @@ PasteDeploy `set` keyword then enclose it in quotes, as in the example below:
     },
   },
   VisIndexer(
-    remote_indexing=false
+    remote_indexing=false,
+    visindexer_processes=1,
   ): {
     'composite:visindexer': section_data,
     local section_data = {
@@ -158,6 +159,7 @@ PasteDeploy `set` keyword then enclose it in quotes, as in the example below:
       'set timeout': 60,
       'set embed_cache.capacity': 5000,
       'set visindexer': true,
+      'set visindexer.processes': visindexer_processes,
       'set remote_indexing': remote_indexing,
     },
   },
@@ -87,7 +87,17 @@ setup(
         es-index-listener = snovault.elasticsearch.es_index_listener:main
 
         add-date-created = encoded.commands.add_date_created:main
+        benchmark-access-key = encoded.commands.benchmark_access_key:main
+        benchmark-audit = encoded.commands.benchmark_audit:main
+        benchmark-csv = encoded.commands.benchmark_csv:main
+        benchmark-embed-loader = encoded.commands.benchmark_embed_loader:main
+        benchmark-metadata = encoded.commands.benchmark_metadata:main
+        benchmark-ontology-closure = encoded.commands.benchmark_ontology_closure:main
+        benchmark-region-search = encoded.commands.benchmark_region_search:main
+        benchmark-status = encoded.commands.benchmark_status:main
+        benchmark-vis-indexer = encoded.commands.benchmark_vis_indexer:main
         check-rendering = encoded.commands.check_rendering:main
+        compact-ontology = encoded.commands.compact_ontology:main
         deploy = encoded.commands.deploy:main
         extract_test_data = encoded.commands.extract_test_data:main
         es-index-data = encoded.commands.es_index_data:main
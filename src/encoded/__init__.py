@@ -29,6 +29,7 @@ from snovault.elasticsearch import (
 )
 from snovault.json_renderer import json_renderer
 from elasticsearch import Elasticsearch
+from encoded.ontology_store import load_ontology
 STATIC_MAX_AGE = 0
 
 
@@ -226,8 +227,10 @@ def main(global_config, **local_config):
     config.include('.server_defaults')
     config.include('.types')
     config.include('.root')
+    config.include('.bulk_load')
     # Must include before anything that uses, or imports from something that uses, cache.
     config.include('.searches.caches')
+    config.include('.searches.snapshots')
     config.include('.batch_download')
     config.include('.reports.batch_download')
     config.include('.reports.metadata')
@@ -256,9 +259,10 @@ def main(global_config, **local_config):
         config.include('.region_search')
     config.include(static_resources)
     config.include(changelogs)
-    ontology_path = Path(__file__).resolve().parents[2] / "ontology.json"
-    config.registry['ontology'] = (
-        json_from_path(str(ontology_path)) if ontology_path.exists() else {}
+    ontology_dir = Path(__file__).resolve().parents[2]
+    config.registry['ontology'] = load_ontology(
+        str(ontology_dir / "ontology.json"),
+        str(ontology_dir / "ontology.bin"),
     )
 
     if asbool(settings.get('testing', False)):
@@ -1,2 +1,11 @@
+from .incremental import AUDIT_RESULT_CACHE
+from .incremental import make_audit_result_cache
+from .stats import instrument_audit_checkers
+
+
 def includeme(config):
+    config.add_route('_audit_stats', '/_audit_stats')
     config.scan()
+    config.registry[AUDIT_RESULT_CACHE] = make_audit_result_cache(config.registry.settings)
+    # After every audit_checker has been added to the auditor.
+    config.action(None, instrument_audit_checkers, args=(config.registry,), order=1)
@@ -7,6 +7,8 @@ from .formatter import (
     path_to_text,
 )
 
+from .file_index import FileIndex
+from .incremental import run_audit_checks
 from .standards_data import pipelines_with_read_depth, minimal_read_depth_requirements
 
 
@@ -310,93 +312,34 @@ Dispatcher and helper function for assay-specific audits
 '''
 
 
+ANALYSIS_FILE_BUCKETS = [
+    'alignments',
+    'unfiltered_alignments',
+
+    'normalized_signal_files',
+
+    'idr_thresholded_peaks',
+    'overlap_and_idr_peaks',
+    'peaks_files',
+    'preferred_default_idr_peaks',
+    'pseudo_replicated_peaks_files',
+
+    'cpg_quantifications',
+    'gene_quantifications_files',
+    'microRNA_quantifications_files',
+    'transcript_quantifications_files',
+
+    'chromatin_interaction_files',
+]
+
+
 def create_files_mapping(files, excluded_files):
-    to_return = {
-        'alignments': {},
-        'unfiltered_alignments': {},
-
-        'normalized_signal_files': {},
-
-        'idr_thresholded_peaks': {},
-        'overlap_and_idr_peaks': {},
-        'peaks_files': {},
-        'preferred_default_idr_peaks': {},
-        'pseudo_replicated_peaks_files': {},
-
-        'cpg_quantifications': {},
-        'gene_quantifications_files': {},
-        'microRNA_quantifications_files': {},
-        'transcript_quantifications_files': {},
-
-        'chromatin_interaction_files': {},
-    }
-    for file_object in files:
-        if file_object['status'] not in excluded_files and \
-                'analysis_step_version' in file_object and \
-                'file_format' in file_object and \
-                'output_type' in file_object:
-            file_format = file_object.get('file_format')
-            file_output = file_object.get('output_type')
-
-            # Alignments
-            if file_format == 'bam' and file_output in [
-                'alignments',
-                'redacted alignments'
-            ]:
-                to_return['alignments'][file_object['@id']] = file_object
-            if file_format == 'bam' and file_output in [
-                'unfiltered alignments',
-                'redacted unfiltered alignments'
-            ]:
-                to_return['unfiltered_alignments'][file_object['@id']] = file_object
-
-            # Signal
-            if file_output == 'read-depth normalized signal':
-                to_return['normalized_signal_files'][file_object['@id']] = file_object
-
-            # Peaks
-            if file_output == 'IDR thresholded peaks':
-                to_return['idr_thresholded_peaks'][file_object['@id']] = file_object
-
-            if file_format == 'bed' and file_output in [
-                'replicated peaks',
-                'pseudoreplicated peaks',
-                'conservative IDR thresholded peaks',
-                'IDR thresholded peaks'
-            ]:
-                to_return['overlap_and_idr_peaks'][file_object['@id']] = file_object
-            if file_format == 'bed' and file_output in [
-                'peaks',
-                'peaks and background as input for IDR'
-            ]:
-                to_return['peaks_files'][file_object['@id']] = file_object
-            if file_output == 'optimal IDR thresholded peaks':
-                to_return['preferred_default_idr_peaks'][file_object['@id']] = file_object
-            if (
-                file_object.get('preferred_default')
-                and file_output == 'IDR thresholded peaks'
-            ):
-                to_return['preferred_default_idr_peaks'][
-                    file_object['@id']
-                ] = file_object
-            if (file_format == 'bed' and file_output == 'pseudoreplicated peaks'):
-                to_return['pseudo_replicated_peaks_files'][file_object['@id']] = file_object
-
-            # Quantifications
-            if file_output == 'methylation state at CpG':
-                to_return['cpg_quantifications'][file_object['@id']] = file_object
-            if file_output == 'gene quantifications':
-                to_return['gene_quantifications_files'][file_object['@id']] = file_object
-            if file_output == 'microRNA quantifications':
-                to_return['microRNA_quantifications_files'][file_object['@id']] = file_object
-            if file_output == 'transcript quantifications':
-                to_return['transcript_quantifications_files'][file_object['@id']] = file_object
-
-            # Other processed files
-            if file_output in ['contact matrix', 'loops']:
-                to_return['chromatin_interaction_files'][file_object['@id']] = file_object
-
-    return to_return
+    return FileIndex(
+        files,
+        excluded_files,
+        ANALYSIS_FILE_BUCKETS,
+        required_fields=('analysis_step_version', 'file_format', 'output_type'),
+    )
 
 
 def audit_experiment_standards_dispatcher(value, system, files_structure):
@@ -674,7 +617,7 @@ def check_analysis_dnase_seq_standards(
     ):
         return
 
-    samtools_flagstat_metrics = get_metrics(alignment_files, 'SamtoolsFlagstatsQualityMetric')
+    samtools_flagstat_metrics = files_structure.metrics('alignments', 'SamtoolsFlagstatsQualityMetric')
     if samtools_flagstat_metrics is not None and \
             len(samtools_flagstat_metrics) > 0:
 
@@ -730,7 +673,7 @@ def check_analysis_dnase_seq_standards(
         if 'assembly' in signal_file:
             signal_assemblies[signal_file['accession']] = signal_file['assembly']
 
-    hotspot_quality_metrics = get_metrics(alignment_files, 'HotspotQualityMetric')
+    hotspot_quality_metrics = files_structure.metrics('alignments', 'HotspotQualityMetric')
     if hotspot_quality_metrics is not None and \
        len(hotspot_quality_metrics) > 0:
         for metric in hotspot_quality_metrics:
@@ -768,7 +711,7 @@ def check_analysis_dnase_seq_standards(
     if (len(replicated) == 1 and replicated[0] == 'unreplicated') or len(replicated) == 0:
         return
 
-    signal_quality_metrics = get_metrics(signal_files, 'CorrelationQualityMetric')
+    signal_quality_metrics = files_structure.metrics('normalized_signal_files', 'CorrelationQualityMetric')
     if signal_quality_metrics is not None and \
        len(signal_quality_metrics) > 0:
         threshold = 0.9
@@ -830,10 +773,9 @@ def check_analysis_chip_seq_standards(
 
     alignment_files = files_structure.get('alignments').values()
     unfiltered_alignment_files = files_structure.get('unfiltered_alignments').values()
-    idr_peaks_files = files_structure.get('preferred_default_idr_peaks').values()
 
     # Check normalized strand cross-correlation and relative strand cross-correlation
-    align_enrich_metrics = get_metrics(alignment_files, 'ChipAlignmentEnrichmentQualityMetric')
+    align_enrich_metrics = files_structure.metrics('alignments', 'ChipAlignmentEnrichmentQualityMetric')
     if align_enrich_metrics is not None and len(align_enrich_metrics) > 0:
         for metric in align_enrich_metrics:
             yield from negative_coefficients(
@@ -872,7 +814,7 @@ def check_analysis_chip_seq_standards(
         return
 
     ListofMetrics = []
-    ListofMetrics.extend([get_metrics(idr_peaks_files, 'IDRQualityMetric'), get_metrics(idr_peaks_files, 'ChipReplicationQualityMetric')])
+    ListofMetrics.extend([files_structure.metrics('preferred_default_idr_peaks', 'IDRQualityMetric'), files_structure.metrics('preferred_default_idr_peaks', 'ChipReplicationQualityMetric')])
     if ListofMetrics:
         for idr_metrics in ListofMetrics:
             yield from check_idr(idr_metrics, 2, 2, assay_term_name, value['title'])
@@ -900,7 +842,6 @@ def check_analysis_modERN_chip_seq_standards(
         return
 
     alignment_files = files_structure.get('alignments').values()
-    idr_peaks_files = files_structure.get('preferred_default_idr_peaks').values()
 
     for f in alignment_files:
 
@@ -923,8 +864,8 @@ def check_analysis_modERN_chip_seq_standards(
 
     ListofMetrics = []
     ListofMetrics.extend([
-        get_metrics(idr_peaks_files, 'IDRQualityMetric'),
-        get_metrics(idr_peaks_files, 'ChipReplicationQualityMetric')
+        files_structure.metrics('preferred_default_idr_peaks', 'IDRQualityMetric'),
+        files_structure.metrics('preferred_default_idr_peaks', 'ChipReplicationQualityMetric')
     ])
     if ListofMetrics:
         for idr_metrics in ListofMetrics:
@@ -1335,7 +1276,6 @@ def check_analysis_bulk_rna_standards(
 
     alignment_files = files_structure.get('alignments').values()
     alignment_files = get_non_tophat_alignment_files(alignment_files)
-    gene_quantifications = files_structure.get('gene_quantifications_files').values()
 
     star_quality_metrics = get_metrics(alignment_files, 'StarQualityMetric')
     if star_quality_metrics is not None and \
@@ -1389,7 +1329,7 @@ def check_analysis_bulk_rna_standards(
 
     replicated = value['datasets'][0]['replication_type'] if 'replication_type' in value['datasets'][0] else None
     if assay_term_name != 'single-cell RNA sequencing assay':
-        mad_metrics = get_metrics(gene_quantifications, 'MadQualityMetric')
+        mad_metrics = files_structure.metrics('gene_quantifications_files', 'MadQualityMetric')
         if replicated == 'unreplicated' and len(value['datasets'][0]['replicates']) > 1:
             yield from check_spearman_technical_replicates(
                 mad_metrics, pipeline_title, 0.9, assay_term_name, value['title'])
@@ -1419,7 +1359,6 @@ def check_analysis_small_rna_standards(
 
     alignment_files = files_structure.get('alignments').values()
     alignment_files = get_non_tophat_alignment_files(alignment_files)
-    gene_quantifications = files_structure.get('gene_quantifications_files').values()
 
     star_quality_metrics = get_metrics(alignment_files, 'StarQualityMetric')
     if star_quality_metrics is not None and \
@@ -1447,7 +1386,7 @@ def check_analysis_small_rna_standards(
     if replicated == 'unreplicated' or replicated is None:
         return
 
-    mad_metrics = get_metrics(gene_quantifications, 'MadQualityMetric')
+    mad_metrics = files_structure.metrics('gene_quantifications_files', 'MadQualityMetric')
 
     yield from check_spearman(mad_metrics, replicated, 0.9, 0.8, pipeline_title, assay_term_name, value['title'])
     return
@@ -1472,7 +1411,6 @@ def check_analysis_cage_rampage_standards(
 
     alignment_files = files_structure.get('alignments').values()
     alignment_files = get_non_tophat_alignment_files(alignment_files)
-    gene_quantifications = files_structure.get('gene_quantifications_files').values()
 
     star_quality_metrics = get_metrics(alignment_files, 'StarQualityMetric')
     if star_quality_metrics is not None and \
@@ -1498,7 +1436,7 @@ def check_analysis_cage_rampage_standards(
     replicated = value['datasets'][0]['replication_type'] if 'replication_type' in value['datasets'][0] else None
     if replicated == 'unreplicated' or replicated is None:
         return
-    mad_metrics = get_metrics(gene_quantifications, 'MadQualityMetric')
+    mad_metrics = files_structure.metrics('gene_quantifications_files', 'MadQualityMetric')
 
     yield from check_spearman(mad_metrics, replicated, 0.9, 0.8, pipeline_title, assay_term_name, value['title'])
     return
@@ -1522,12 +1460,11 @@ def check_analysis_micro_rna_standards(
 
     alignment_files = files_structure.get('alignments').values()
     alignment_files = get_non_tophat_alignment_files(alignment_files)
-    microRNA_quantifications = files_structure.get('microRNA_quantifications_files').values()
 
-    quantification_metrics = get_metrics(microRNA_quantifications, 'MicroRnaQuantificationQualityMetric')
+    quantification_metrics = files_structure.metrics('microRNA_quantifications_files', 'MicroRnaQuantificationQualityMetric')
     # Desired annotation does not pertain to alignment files
     alignment_metrics = get_metrics(alignment_files, 'MicroRnaMappingQualityMetric')
-    correlation_metrics = get_metrics(microRNA_quantifications, 'CorrelationQualityMetric')
+    correlation_metrics = files_structure.metrics('microRNA_quantifications_files', 'CorrelationQualityMetric')
 
     # Audit Spearman correlations
     yield from check_replicate_metric_dual_threshold(
@@ -1578,20 +1515,17 @@ def check_analysis_long_read_rna_standards(
     if pipeline_title not in expected_pipeline_titles:
         return
 
-    unfiltered_alignment_files = files_structure.get('unfiltered_alignments').values()
-    transcript_quantifications = files_structure.get('transcript_quantifications_files').values()
-
-    quantification_metrics = get_metrics(
-        transcript_quantifications,
+    quantification_metrics = files_structure.metrics(
+        'transcript_quantifications_files',
         'LongReadRnaQuantificationQualityMetric',
     )
     # Desired annotation does not pertain to alignment files
-    unfiltered_alignment_metrics = get_metrics(
-        unfiltered_alignment_files,
+    unfiltered_alignment_metrics = files_structure.metrics(
+        'unfiltered_alignments',
         'LongReadRnaMappingQualityMetric'
     )
-    correlation_metrics = get_metrics(
-        transcript_quantifications,
+    correlation_metrics = files_structure.metrics(
+        'transcript_quantifications_files',
         'CorrelationQualityMetric'
     )
     # Audit Spearman correlations
@@ -1666,17 +1600,15 @@ def check_analysis_wgbs_encode3_standards(
     ):
         return
 
-    alignment_files = files_structure.get('alignments').values()
-    cpg_quantifications = files_structure.get('cpg_quantifications').values()
 
     pipeline_title = value['pipelines'][0]['title']
     if pipeline_title not in expected_pipeline_titles:
         return
 
-    samtools_stats_metrics = get_metrics(alignment_files, 'SamtoolsStatsQualityMetric')
-    bismark_metrics = get_metrics(cpg_quantifications, 'BismarkQualityMetric')
-    cpg_metrics = get_metrics(cpg_quantifications, 'CorrelationQualityMetric')
-    samtools_metrics = get_metrics(cpg_quantifications, 'SamtoolsFlagstatsQualityMetric')
+    samtools_stats_metrics = files_structure.metrics('alignments', 'SamtoolsStatsQualityMetric')
+    bismark_metrics = files_structure.metrics('cpg_quantifications', 'BismarkQualityMetric')
+    cpg_metrics = files_structure.metrics('cpg_quantifications', 'CorrelationQualityMetric')
+    samtools_metrics = files_structure.metrics('cpg_quantifications', 'SamtoolsFlagstatsQualityMetric')
 
     read_lengths = []
     for m in samtools_stats_metrics:
@@ -1754,11 +1686,8 @@ def check_analysis_wgbs_encode4_standards(
     if pipeline_title not in expected_pipeline_titles:
         return
 
-    alignment_files = files_structure.get('alignments').values()
-    cpg_quantifications = files_structure.get('cpg_quantifications').values()
-
-    gembs_metrics = get_metrics(alignment_files, 'GembsAlignmentQualityMetric')
-    cpg_metrics = get_metrics(cpg_quantifications, 'CpgCorrelationQualityMetric')
+    gembs_metrics = files_structure.metrics('alignments', 'GembsAlignmentQualityMetric')
+    cpg_metrics = files_structure.metrics('cpg_quantifications', 'CpgCorrelationQualityMetric')
 
     # Check coverage
     for m in gembs_metrics:
@@ -1850,7 +1779,6 @@ def check_analysis_atac_encode4_qc_standards(
     ):
         return
 
-    alignment_files = files_structure.get('alignments').values()
     pseudo_replicated_peaks_files = files_structure.get('pseudo_replicated_peaks_files').values()
     all_peaks_files = files_structure.get('overlap_and_idr_peaks').values()
     overlap_peaks_files = []
@@ -1869,9 +1797,9 @@ def check_analysis_atac_encode4_qc_standards(
         for each in pseudo_replicated_peaks_files:
             overlap_peaks_files.append(each)
 
-    alignment_metrics = get_metrics(alignment_files, 'AtacAlignmentQualityMetric')
-    align_enrich_metrics = get_metrics(alignment_files, 'AtacAlignmentEnrichmentQualityMetric')
-    library_metrics = get_metrics(alignment_files, 'AtacLibraryQualityMetric')
+    alignment_metrics = files_structure.metrics('alignments', 'AtacAlignmentQualityMetric')
+    align_enrich_metrics = files_structure.metrics('alignments', 'AtacAlignmentEnrichmentQualityMetric')
+    library_metrics = files_structure.metrics('alignments', 'AtacLibraryQualityMetric')
     peak_enrich_metrics = get_metrics(overlap_peaks_files, 'AtacPeakEnrichmentQualityMetric')
 
     # Checks in AtacAlignmentQualityMetric
@@ -2173,13 +2101,9 @@ def check_analysis_chiapet_encode4_qc_standards(
     ):
         return
 
-    alignment_files = files_structure.get('alignments').values()
-    peak_files = files_structure.get('peaks_files').values()
-    chr_int_files = files_structure.get('chromatin_interaction_files').values()
-
-    alignment_metric = get_metrics(alignment_files, 'ChiaPetAlignmentQualityMetric')
-    peak_metric = get_metrics(peak_files, 'ChiaPetPeakEnrichmentQualityMetric')
-    int_metric = get_metrics(chr_int_files, 'ChiaPetChrInteractionsQualityMetric')
+    alignment_metric = files_structure.metrics('alignments', 'ChiaPetAlignmentQualityMetric')
+    peak_metric = files_structure.metrics('peaks_files', 'ChiaPetPeakEnrichmentQualityMetric')
+    int_metric = files_structure.metrics('chromatin_interaction_files', 'ChiaPetChrInteractionsQualityMetric')
 
     # Checks in ChiaPetAlignmentQualityMetric
     if alignment_metric is not None and len(alignment_metric) > 0:
@@ -2284,9 +2208,7 @@ def check_analysis_hic_encode4_qc_standards(
     ):
         return
 
-    chr_int_files = files_structure.get('chromatin_interaction_files').values()
-
-    hic_metrics = get_metrics(chr_int_files, 'HicQualityMetric')
+    hic_metrics = files_structure.metrics('chromatin_interaction_files', 'HicQualityMetric')
 
     # Checks in HicQualityMetric
     if hic_metrics is not None and len(hic_metrics) > 0:
@@ -2499,11 +2421,13 @@ def audit_analysis(value, system):
     files_structure = create_files_mapping(
         value['files'], excluded_files)
 
-    for function_name in function_dispatcher.keys():
-        for failure in function_dispatcher[function_name](value, system):
-            yield failure
+    yield from run_audit_checks(
+        function_dispatcher, value, system, incremental=False,
+    )
 
-    for function_name in function_dispatcher_with_files.keys():
-        yield from function_dispatcher_with_files[function_name](value, system, files_structure)
+    yield from run_audit_checks(
+        function_dispatcher_with_files, value, system, files_structure,
+        incremental=False,
+    )
 
     return
@@ -6,7 +6,9 @@ from .formatter import (
     audit_link,
     path_to_text,
 )
+from .file_index import FileIndex
 from .gtex_data import gtexDonorsList
+from .incremental import run_audit_checks
 from .standards_data import pipelines_with_read_depth, minimal_read_depth_requirements
 
 
@@ -152,9 +154,8 @@ def audit_experiment_chipseq_control_read_depth(value, system, files_structure):
         control_objects = {}
         for control_experiment in controls:
             control_objects[control_experiment.get('@id')] = control_experiment
-            controls_files_structures[control_experiment.get('@id')] = create_files_mapping(
-                control_experiment.get('original_files'),
-                files_structure.get('excluded_types'))
+            controls_files_structures[control_experiment.get('@id')] = files_structure.dataset_index(
+                control_experiment)
         awards_to_be_checked = [
                         'ENCODE3',
                         'ENCODE4',
@@ -457,7 +458,7 @@ def audit_experiment_mixed_libraries(value, system, excluded_types):
 
 
 def audit_experiment_pipeline_assay_details(value, system, files_structure):
-    for pipeline in get_pipeline_objects(files_structure.get('original_files').values()):
+    for pipeline in files_structure.pipelines('original_files'):
         pipeline_assays = pipeline.get('assay_term_names')
         if not pipeline_assays or value.get('assay_term_name') not in pipeline_assays:
             detail = ('This experiment '
@@ -487,8 +488,7 @@ def audit_experiment_missing_unfiltered_bams(value, system, files_structure):
                         'Transcription factor ChIP-seq 2',
                         'Transcription factor ChIP-seq 2 (unreplicated)']                    
     for pipeline in pipeline_title:
-        if pipeline in get_pipeline_titles(
-                get_pipeline_objects(files_structure.get('alignments').values())):
+        if pipeline in get_pipeline_titles(files_structure.pipelines('alignments')):
             for filtered_file in files_structure.get('alignments').values():
                 if has_only_raw_files_in_derived_from(filtered_file, files_structure) and \
                    filtered_file.get('lab') == '/labs/encode-processing-pipeline/' and \
@@ -2225,7 +2225,7 @@ def audit_experiment_platforms_mismatches(value, system, files_structure):
             for control in value['possible_controls']:
                 if control.get('original_files'):
                     control_platforms = get_platforms_used_in_experiment(
-                        create_files_mapping(control.get('original_files'), files_structure.get('excluded_types')))
+                        files_structure.dataset_index(control))
                     if len(control_platforms) > 1:
                         control_platforms_string = str(
                             list(control_platforms)).replace('\'', '')
@@ -3236,8 +3236,7 @@ def get_control_bam(experiment_bam, pipeline_name, derived_from_fastqs, files_st
             return False
 
         control_bam = False
-        control_files_structure = create_files_mapping(control_fastq['dataset'].get('original_files'),
-                                                       files_structure.get('excluded_types'))
+        control_files_structure = files_structure.dataset_index(control_fastq['dataset'])
 
         for control_file in control_files_structure.get('alignments').values():
             if 'assembly' in control_file and 'assembly' in experiment_bam and \
@@ -3402,122 +3401,37 @@ def get_chip_seq_bam_read_depth(bam_file):
     return read_depth
 
 
-def create_files_mapping(files_list, excluded):
-    to_return = {'original_files': {},
-                 'fastq_files': {},
-                 'alignments': {},
-                 'unfiltered_alignments': {},
-                 'alignments_unfiltered_alignments': {},
-                 'transcriptome_alignments': {},
-                 'peaks_files': {},
-                 'gene_quantifications_files': {},
-                 'transcript_quantifications_files': {},
-                 'microRNA_quantifications_files': {},
-                 'signal_files': {},
-                 'preferred_default_idr_peaks': {},
-                 'idr_thresholded_peaks': {},
-                 'cpg_quantifications': {},
-                 'contributing_files': {},
-                 'chromatin_interaction_files': {},
-                 'raw_data': {},
-                 'processed_data': {},
-                 'pseudo_replicated_peaks_files': {},
-                 'overlap_and_idr_peaks': {},
-                 'excluded_types': excluded}
-    if files_list:
-        for file_object in files_list:
-            if file_object['status'] not in excluded:
-                to_return['original_files'][file_object['@id']] = file_object
-
-                file_format = file_object.get('file_format')
-                file_output = file_object.get('output_type')
-                file_output_category = file_object.get('output_category')
-
-                if file_format and file_format == 'fastq' and \
-                        file_output and file_output == 'reads':
-                    to_return['fastq_files'][file_object['@id']] = file_object
-
-                if file_format and file_format == 'bam' and \
-                        file_output and (
-                            file_output == 'alignments' or
-                            file_output and file_output == 'redacted alignments'):
-                    to_return['alignments'][file_object['@id']] = file_object
-
-                if file_format and file_format == 'bam' and \
-                        file_output and (
-                            file_output == 'unfiltered alignments' or
-                            file_output == 'redacted unfiltered alignments'):
-                    to_return['unfiltered_alignments'][file_object['@id']
-                                                       ] = file_object
-
-                if file_format and file_format == 'bam' and \
-                        file_output and file_output == 'transcriptome alignments':
-                    to_return['transcriptome_alignments'][file_object['@id']
-                                                          ] = file_object
-
-                if file_format and file_format == 'bed' and \
-                        file_output and file_output in ['peaks',
-                                                        'peaks and background as input for IDR']:
-                    to_return['peaks_files'][file_object['@id']] = file_object
-
-                if file_output and file_output == 'gene quantifications':
-                    to_return['gene_quantifications_files'][file_object['@id']
-                                                            ] = file_object
-
-                if file_output and file_output == 'transcript quantifications':
-                    to_return['transcript_quantifications_files'][file_object['@id']
-                                                            ] = file_object
-
-                if file_output and file_output == 'microRNA quantifications':
-                    to_return['microRNA_quantifications_files'][file_object['@id']
-                                                            ] = file_object
-
-                if file_output and file_output in ['contact matrix', 'loops']:
-                    to_return['chromatin_interaction_files'][file_object['@id']] = file_object
-
-                if file_output and file_output == 'signal of unique reads':
-                    to_return['signal_files'][file_object['@id']] = file_object
-
-                if file_output and file_output == 'optimal IDR thresholded peaks':
-                    to_return['preferred_default_idr_peaks'][
-                        file_object['@id']
-                    ] = file_object
-                if (
-                    file_object.get('preferred_default')
-                    and file_output == 'IDR thresholded peaks'
-                ):
-                    to_return['preferred_default_idr_peaks'][
-                        file_object['@id']
-                    ] = file_object
-                if file_output and file_output == 'IDR thresholded peaks':
-                    to_return['idr_thresholded_peaks'][
-                        file_object['@id']
-                    ] = file_object
-                if file_output and file_output == 'methylation state at CpG':
-                    to_return['cpg_quantifications'][file_object['@id']
-                                                     ] = file_object
-                if (
-                    file_format
-                    and file_format == 'bed'
-                    and file_output
-                    and file_output == 'pseudoreplicated peaks'
-                ):
-                    to_return['pseudo_replicated_peaks_files'][
-                        file_object['@id']
-                    ] = file_object
-
-                if file_format and file_format == 'bed' and file_output and \
-                        file_output in ['replicated peaks', 'pseudoreplicated peaks',
-                                        'conservative IDR thresholded peaks',
-                                        'IDR thresholded peaks']:
-                    to_return['overlap_and_idr_peaks'][file_object['@id']] = file_object
-                    
-                if file_output_category == 'raw data':
-                    to_return['raw_data'][file_object['@id']] = file_object
-                else:
-                    to_return['processed_data'][file_object['@id']] = file_object
+EXPERIMENT_FILE_BUCKETS = [
+    'original_files',
+    'fastq_files',
+    'alignments',
+    'unfiltered_alignments',
+    'alignments_unfiltered_alignments',
+    'transcriptome_alignments',
+    'peaks_files',
+    'gene_quantifications_files',
+    'transcript_quantifications_files',
+    'microRNA_quantifications_files',
+    'signal_files',
+    'preferred_default_idr_peaks',
+    'idr_thresholded_peaks',
+    'cpg_quantifications',
+    'contributing_files',
+    'chromatin_interaction_files',
+    'raw_data',
+    'processed_data',
+    'pseudo_replicated_peaks_files',
+    'overlap_and_idr_peaks',
+]
 
-    return to_return
+
+def create_files_mapping(files_list, excluded):
+    return FileIndex(
+        files_list,
+        excluded,
+        EXPERIMENT_FILE_BUCKETS,
+        excluded_key='excluded_types',
+    )
 
 
 def get_contributing_files(files_list, excluded_types):
@@ -3548,19 +3462,12 @@ def get_derived_from_files_set(list_of_files, files_structure, file_format, obje
     derived_from_set = set()
     derived_from_objects_list = []
     for file_object in list_of_files:
-        if 'derived_from' in file_object:
-            for derived_id in file_object['derived_from']:
-                derived_object = files_structure.get(
-                    'original_files').get(derived_id)
-                if not derived_object:
-                    derived_object = files_structure.get(
-                        'contributing_files').get(derived_id)
-                if derived_object and \
-                   derived_object.get('file_format') == file_format and \
-                   derived_object.get('accession') not in derived_from_set:
-                    derived_from_set.add(derived_object.get('accession'))
-                    if object_flag:
-                        derived_from_objects_list.append(derived_object)
+        for derived_object in files_structure.derived_from(file_object):
+            if derived_object.get('file_format') == file_format and \
+               derived_object.get('accession') not in derived_from_set:
+                derived_from_set.add(derived_object.get('accession'))
+                if object_flag:
+                    derived_from_objects_list.append(derived_object)
     if object_flag:
         return derived_from_objects_list
     return list(derived_from_set)
@@ -3692,20 +3599,6 @@ def get_pipeline_titles(pipeline_objects):
     return list(to_return)
 
 
-def get_pipeline_objects(files):
-    added_pipelines = []
-    pipelines_to_return = []
-    for inspected_file in files:
-        if 'analysis_step_version' in inspected_file and \
-           'analysis_step' in inspected_file['analysis_step_version'] and \
-           'pipelines' in inspected_file['analysis_step_version']['analysis_step']:
-            for p in inspected_file['analysis_step_version']['analysis_step']['pipelines']:
-                if p['title'] not in added_pipelines:
-                    added_pipelines.append(p['title'])
-                    pipelines_to_return.append(p)
-    return pipelines_to_return
-
-
 def get_biosamples(experiment):
     accessions_set = set()
     biosamples_list = []
@@ -3779,6 +3672,13 @@ function_dispatcher_with_files = {
     'audit_experiment_inconsistent_analysis_files_mismatched_dataset': audit_experiment_inconsistent_analysis_files_mismatched_dataset,
 }
 
+# Checks that read more than the audited frame (the ontology, or items
+# embedded on the fly) and so are rerun on every audit.
+function_always_run = {
+    'audit_experiment_biosample',
+    'audit_AB_characterization',
+}
+
 
 @audit_checker(
     'Experiment',
@@ -3839,12 +3739,18 @@ def audit_experiment(value, system):
     files_structure['contributing_files'] = get_contributing_files(
         value.get('contributing_files'), excluded_files)
 
-    for function_name in function_dispatcher_with_files.keys():
-        yield from function_dispatcher_with_files[function_name](value, system, files_structure)
+    yield from run_audit_checks(
+        function_dispatcher_with_files, value, system, files_structure,
+        inputs=('status', 'original_files', 'contributing_files'),
+        always_run=function_always_run,
+    )
 
     excluded_types = excluded_files + ['deleted', 'replaced']
-    for function_name in function_dispatcher_without_files.keys():
-        yield from function_dispatcher_without_files[function_name](value, system, excluded_types)
+    yield from run_audit_checks(
+        function_dispatcher_without_files, value, system, excluded_types,
+        inputs=('status',),
+        always_run=function_always_run,
+    )
 
     return
 
@@ -0,0 +1,202 @@
+from functools import lru_cache
+
+
+# Buckets of a file by (file_format, output_type, output_category,
+# preferred_default); a file goes in every bucket whose rule matches.
+FILE_BUCKET_RULES = [
+    ('fastq_files', lambda fmt, out, cat, pref: fmt == 'fastq' and out == 'reads'),
+    ('alignments', lambda fmt, out, cat, pref: fmt == 'bam' and out in (
+        'alignments',
+        'redacted alignments',
+    )),
+    ('unfiltered_alignments', lambda fmt, out, cat, pref: fmt == 'bam' and out in (
+        'unfiltered alignments',
+        'redacted unfiltered alignments',
+    )),
+    ('transcriptome_alignments', lambda fmt, out, cat, pref: fmt == 'bam' and out == 'transcriptome alignments'),
+    ('peaks_files', lambda fmt, out, cat, pref: fmt == 'bed' and out in (
+        'peaks',
+        'peaks and background as input for IDR',
+    )),
+    ('pseudo_replicated_peaks_files', lambda fmt, out, cat, pref: fmt == 'bed' and out == 'pseudoreplicated peaks'),
+    ('overlap_and_idr_peaks', lambda fmt, out, cat, pref: fmt == 'bed' and out in (
+        'replicated peaks',
+        'pseudoreplicated peaks',
+        'conservative IDR thresholded peaks',
+        'IDR thresholded peaks',
+    )),
+    ('idr_thresholded_peaks', lambda fmt, out, cat, pref: out == 'IDR thresholded peaks'),
+    ('preferred_default_idr_peaks', lambda fmt, out, cat, pref: (
+        out == 'optimal IDR thresholded peaks'
+        or (pref and out == 'IDR thresholded peaks')
+    )),
+    ('signal_files', lambda fmt, out, cat, pref: out == 'signal of unique reads'),
+    ('normalized_signal_files', lambda fmt, out, cat, pref: out == 'read-depth normalized signal'),
+    ('gene_quantifications_files', lambda fmt, out, cat, pref: out == 'gene quantifications'),
+    ('transcript_quantifications_files', lambda fmt, out, cat, pref: out == 'transcript quantifications'),
+    ('microRNA_quantifications_files', lambda fmt, out, cat, pref: out == 'microRNA quantifications'),
+    ('cpg_quantifications', lambda fmt, out, cat, pref: out == 'methylation state at CpG'),
+    ('chromatin_interaction_files', lambda fmt, out, cat, pref: out in ('contact matrix', 'loops')),
+    ('raw_data', lambda fmt, out, cat, pref: cat == 'raw data'),
+    ('processed_data', lambda fmt, out, cat, pref: cat != 'raw data'),
+]
+
+
+@lru_cache(maxsize=None)
+def _matching_buckets(key):
+    return tuple(
+        bucket
+        for bucket, rule in FILE_BUCKET_RULES
+        if rule(*key)
+    )
+
+
+def file_key(file_object):
+    return (
+        file_object.get('file_format'),
+        file_object.get('output_type'),
+        file_object.get('output_category'),
+        bool(file_object.get('preferred_default')),
+    )
+
+
+def get_pipelines(file_object):
+    return file_object.get(
+        'analysis_step_version', {}
+    ).get(
+        'analysis_step', {}
+    ).get(
+        'pipelines', []
+    )
+
+
+class FileIndex(dict):
+    '''
+    Files of an audited object grouped into buckets in one pass, as
+    {bucket: {@id: file}}. Each distinct (file_format, output_type,
+    output_category, preferred_default) is matched against
+    FILE_BUCKET_RULES once per process; the original_files bucket holds
+    every file that is not excluded. Secondary indexes by @id,
+    derived_from, pipeline and quality metric type are built the first
+    time an audit asks for them and shared by all audits of the object.
+    '''
+
+    def __init__(self, files, excluded, buckets, required_fields=(), excluded_key=None):
+        super().__init__((bucket, {}) for bucket in buckets)
+        if excluded_key is not None:
+            self[excluded_key] = excluded
+        self.excluded = excluded
+        self.buckets = buckets
+        self.required_fields = required_fields
+        self.excluded_key = excluded_key
+        self.files = {}
+        self._derived = None
+        self._pipelines = {}
+        self._by_pipeline_title = None
+        self._metrics = {}
+        self._datasets = {}
+        for file_object in files or []:
+            if file_object['status'] in excluded:
+                continue
+            if any(field not in file_object for field in required_fields):
+                continue
+            file_id = file_object['@id']
+            self.files[file_id] = file_object
+            if 'original_files' in self:
+                self['original_files'][file_id] = file_object
+            for bucket in _matching_buckets(file_key(file_object)):
+                if bucket in self:
+                    self[bucket][file_id] = file_object
+
+    def get_file(self, file_id):
+        '''
+        Looks up a file among the object's files and then its contributing
+        files.
+        '''
+        file_object = self.files.get(file_id)
+        if file_object is None:
+            file_object = self.get('contributing_files', {}).get(file_id)
+        return file_object
+
+    def derived_from(self, file_object):
+        '''
+        Returns the known files that file_object is derived from.
+        '''
+        return [
+            derived
+            for derived in (
+                self.get_file(file_id)
+                for file_id in file_object.get('derived_from', [])
+            )
+            if derived is not None
+        ]
+
+    def files_derived_from(self, file_id):
+        '''
+        Returns the object's files that list file_id in derived_from.
+        '''
+        if self._derived is None:
+            self._derived = {}
+            for file_object in self.files.values():
+                for derived_id in file_object.get('derived_from', []):
+                    self._derived.setdefault(derived_id, []).append(file_object)
+        return self._derived.get(file_id, [])
+
+    def pipelines(self, bucket):
+        '''
+        Returns the distinct pipelines (by title) of the files in bucket,
+        in file order.
+        '''
+        if bucket not in self._pipelines:
+            pipelines = {}
+            for file_object in self[bucket].values():
+                for pipeline in get_pipelines(file_object):
+                    pipelines.setdefault(pipeline['title'], pipeline)
+            self._pipelines[bucket] = list(pipelines.values())
+        return self._pipelines[bucket]
+
+    def files_with_pipeline(self, title):
+        '''
+        Returns the object's files produced by the pipeline with title.
+        '''
+        if self._by_pipeline_title is None:
+            self._by_pipeline_title = {}
+            for file_object in self.files.values():
+                for pipeline in get_pipelines(file_object):
+                    self._by_pipeline_title.setdefault(
+                        pipeline['title'], []
+                    ).append(file_object)
+        return self._by_pipeline_title.get(title, [])
+
+    def metrics(self, bucket, metric_type):
+        '''
+        Returns the distinct quality metrics of metric_type attached to
+        the files in bucket, in file order.
+        '''
+        if bucket not in self._metrics:
+            by_type = {}
+            for file_object in self[bucket].values():
+                for metric in file_object.get('quality_metrics') or []:
+                    for item_type in metric['@type']:
+                        by_type.setdefault(item_type, {}).setdefault(metric['uuid'], metric)
+            self._metrics[bucket] = by_type
+        return list(self._metrics[bucket].get(metric_type, {}).values())
+
+    def dataset_index(self, dataset, excluded=None):
+        '''
+        Returns the index of another dataset's original_files (e.g. a
+        control) with the same buckets, built once however many audits
+        ask for it.
+        '''
+        if excluded is None:
+            excluded = self.excluded
+        key = (dataset.get('@id'), tuple(excluded))
+        if key not in self._datasets:
+            self._datasets[key] = FileIndex(
+                dataset.get('original_files'),
+                excluded,
+                self.buckets,
+                required_fields=self.required_fields,
+                excluded_key=self.excluded_key,
+            )
+        return self._datasets[key]
@@ -16,6 +16,7 @@ from .formatter import (
     audit_link,
     path_to_text,
 )
+from .incremental import run_audit_checks
 
 
 def audit_experiment_biosample(value, system, excluded_types):
@@ -242,16 +243,16 @@ def audit_fcc_experiment(value, system):
     files_structure = create_files_mapping(
         value.get('original_files'), excluded_files)
 
-    for function_name in function_dispatcher_with_files.keys():
-        yield from function_dispatcher_with_files[function_name](
-            value, system, files_structure
-        )
+    yield from run_audit_checks(
+        function_dispatcher_with_files, value, system, files_structure,
+        incremental=False,
+    )
 
     excluded_types = excluded_files + ['deleted', 'replaced']
-    for function_name in function_dispatcher_without_files.keys():
-        yield from function_dispatcher_without_files[function_name](
-            value, system, excluded_types
-        )
+    yield from run_audit_checks(
+        function_dispatcher_without_files, value, system, excluded_types,
+        incremental=False,
+    )
 
 
 
@@ -0,0 +1,374 @@
+import hashlib
+import json
+import logging
+import threading
+import zlib
+
+from collections import OrderedDict
+from concurrent.futures.process import BrokenProcessPool
+from pyramid.settings import asbool
+from redis import StrictRedis
+from redis.exceptions import RedisError
+from .pool import collect_failures
+from .pool import failure_from_tuple
+from .pool import failure_to_tuple
+from .pool import get_audit_pool
+from .pool import reset_audit_pool
+from .stats import record_check
+from .stats import timed_iteration
+
+
+log = logging.getLogger(__name__)
+
+
+AUDIT_RESULT_CACHE = 'audit_result_cache'
+
+DEFAULT_CACHE_SIZE = 50000
+DEFAULT_REDIS_TTL = 7 * 24 * 60 * 60
+COMPRESSION_LEVEL = 1
+KEY_PREFIX = 'audit_result'
+
+_MISSING = object()
+
+# Fewest checks worth sending to the audit pool for one item.
+MIN_POOL_CHECKS = 2
+
+# Read marker for checks that look at the whole frame, whose digest
+# covers which fields are present. A string, so it survives pickling
+# from pool workers.
+ALL_FIELDS = '@@all'
+
+
+class ReadTrackingDict(dict):
+    '''
+    Copy of an audited frame that records which top level fields a check
+    reads. Iterating or copying the whole frame counts as reading every
+    field.
+    '''
+
+    def __init__(self, value):
+        super().__init__(value)
+        self.reads = set()
+
+    def __getitem__(self, key):
+        self.reads.add(key)
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.reads.add(key)
+        return super().get(key, default)
+
+    def __contains__(self, key):
+        self.reads.add(key)
+        return super().__contains__(key)
+
+    def _read_all(self):
+        self.reads.add(ALL_FIELDS)
+        self.reads.update(super().keys())
+
+    def __iter__(self):
+        self._read_all()
+        return super().__iter__()
+
+    def keys(self):
+        self._read_all()
+        return super().keys()
+
+    def values(self):
+        self._read_all()
+        return super().values()
+
+    def items(self):
+        self._read_all()
+        return super().items()
+
+    def copy(self):
+        self._read_all()
+        return dict(super().items())
+
+
+class FieldDigests:
+    '''
+    Lazily computed digest of each top level field of a frame, so that a
+    large embedded field shared by many checks is serialized only once
+    per audit.
+    '''
+
+    def __init__(self, value):
+        self.value = value
+        self._digests = {}
+
+    def get(self, field):
+        digest = self._digests.get(field)
+        if digest is None:
+            if field is ALL_FIELDS:
+                data = sorted(self.value)
+            else:
+                data = self.value.get(field, _MISSING)
+            if data is _MISSING:
+                digest = '-'
+            else:
+                digest = hashlib.sha1(
+                    json.dumps(data, sort_keys=True, default=str).encode('utf-8')
+                ).hexdigest()
+            self._digests[field] = digest
+        return digest
+
+    def digest(self, fields):
+        return tuple(self.get(field) for field in fields)
+
+
+class AuditResultCache:
+    '''
+    Bounded in-process LRU of audit check results keyed by (item, check).
+    Each entry keeps the fields the check read on its last run, their
+    digests and the failures it yielded.
+    '''
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def get_many(self, keys):
+        entries = {}
+        for key in keys:
+            entry = self.get(key)
+            if entry is not None:
+                entries[key] = entry
+        return entries
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+class RedisAuditResultCache:
+    '''
+    Audit check results shared through Redis by every process on the
+    host, so an item audited again by another indexer worker still finds
+    its previous results. Each item's entries are kept in one hash, read
+    with a single round trip per audit, that expires ttl seconds after
+    the item was last audited. Results must be AuditFailures. Redis
+    errors are treated as misses.
+    '''
+
+    def __init__(self, client, ttl=DEFAULT_REDIS_TTL):
+        self.client = client
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _make_key(self, item):
+        return f'{KEY_PREFIX}:{item}'
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        item = keys[0][0]
+        try:
+            values = self.client.hmget(self._make_key(item), [name for _, name in keys])
+        except RedisError:
+            log.warning('Unable to read audit result cache entries', exc_info=True)
+            return {}
+        entries = {}
+        for key, value in zip(keys, values):
+            if value is None:
+                continue
+            reads, digest, failures = json.loads(zlib.decompress(value).decode('utf-8'))
+            entries[key] = (
+                tuple(reads),
+                tuple(digest),
+                [failure_from_tuple(values) for values in failures],
+            )
+        return entries
+
+    def set(self, key, entry):
+        item, name = key
+        reads, digest, results = entry
+        value = json.dumps([
+            reads,
+            digest,
+            [failure_to_tuple(failure) for failure in results],
+        ]).encode('utf-8')
+        cache_key = self._make_key(item)
+        try:
+            pipeline = self.client.pipeline(transaction=False)
+            pipeline.hset(cache_key, name, zlib.compress(value, COMPRESSION_LEVEL))
+            pipeline.expire(cache_key, self.ttl)
+            pipeline.execute()
+        except RedisError:
+            log.warning('Unable to write audit result cache entry', exc_info=True)
+
+    def count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+
+audit_result_cache = AuditResultCache()
+
+
+def make_audit_result_cache(settings):
+    '''
+    Returns the Redis backed cache shared by the processes on this host,
+    or None to use this process's own LRU when audit.result_cache is
+    memory or there is no local Redis.
+    '''
+    if settings.get('audit.result_cache', 'redis') != 'redis':
+        return None
+    if not settings.get('local_storage_host'):
+        return None
+    client = StrictRedis(
+        host=settings.get('local_storage_host'),
+        port=settings.get('local_storage_port'),
+        socket_timeout=3,
+        db=4,
+    )
+    return RedisAuditResultCache(
+        client,
+        ttl=int(settings.get('audit.result_cache_ttl', DEFAULT_REDIS_TTL)),
+    )
+
+
+def get_audit_result_cache(system):
+    registry = system.get('registry')
+    cache = None
+    if isinstance(registry, dict):
+        cache = registry.get(AUDIT_RESULT_CACHE)
+    if cache is None:
+        cache = audit_result_cache
+    return cache
+
+
+def is_incremental_enabled(system):
+    registry = system.get('registry')
+    settings = getattr(registry, 'settings', None) or {}
+    return asbool(settings.get('audit.incremental', True))
+
+
+def run_audit_checks(checks, value, system, *args, inputs=(), always_run=(), cache=None, incremental=True):
+    '''
+    Runs each check in the checks dict as check(value, system, *args) and
+    yields its failures in dispatcher order. A check whose top level
+    frame fields (as read on its previous run) and declared inputs are
+    unchanged for this item is not run again, and its previous failures
+    are yielded instead. inputs names the frame fields args are derived
+    from. Checks named in always_run depend on more than the frame: they
+    are never cached and always run in this process. With audit.parallel
+    set, the other checks that need running are fanned out to the audit
+    pool together. With incremental=False every check runs and nothing
+    is cached, for dispatchers that only want the pool.
+    '''
+    incremental = incremental and is_incremental_enabled(system)
+    pool = get_audit_pool(system)
+    if cache is None:
+        cache = get_audit_result_cache(system)
+    item = value.get('uuid') or value.get('@id')
+    if item is None:
+        incremental = False
+    digests = FieldDigests(value)
+    cached = {}
+    if incremental:
+        entries = cache.get_many(
+            (item, name) for name in checks
+            if name not in always_run
+        )
+        for (_, name), (reads, digest, results) in entries.items():
+            if digests.digest(reads) == digest:
+                cached[name] = results
+    futures = {}
+    if pool is not None:
+        pooled = [
+            name for name in checks
+            if name not in cached and name not in always_run
+        ]
+        if len(pooled) >= MIN_POOL_CHECKS:
+            futures = dict(zip(
+                pooled,
+                pool.submit_checks(
+                    [checks[name] for name in pooled],
+                    value,
+                    args,
+                    track_reads=incremental,
+                )
+            ))
+    item_type = (value.get('@type') or [None])[0]
+    for name, check in checks.items():
+
+        def on_done(elapsed, failures, error, check=check):
+            record_check(item_type, check, elapsed, failures, error=error)
+
+        if name in cached:
+            cache.count(hit=True)
+            record_check(item_type, check, 0, len(cached[name]), cached=True)
+            yield from cached[name]
+            continue
+        if name in always_run or (not incremental and name not in futures):
+            yield from timed_iteration(check(value, system, *args), on_done)
+            continue
+        if incremental:
+            cache.count(hit=False)
+        results = None
+        if name in futures:
+            try:
+                results, reads, elapsed = collect_failures(futures[name])
+            except BrokenProcessPool:
+                log.warning('Audit pool broke, running %s serially', name, exc_info=True)
+                reset_audit_pool()
+            except Exception:
+                on_done(0, 0, True)
+                raise
+            else:
+                on_done(elapsed, len(results), False)
+        if results is None:
+            tracked = ReadTrackingDict(value)
+            results = []
+            try:
+                for failure in timed_iteration(check(tracked, system, *args), on_done):
+                    results.append(failure)
+            except Exception:
+                # Keep what the check yielded before failing, as when it
+                # is iterated directly, and let the auditor report the error.
+                yield from results
+                raise
+            reads = tracked.reads
+        yield from results
+        if incremental:
+            reads = tuple(sorted(set(reads) | set(inputs), key=str))
+            cache.set((item, name), (reads, digests.digest(reads), results))
@@ -0,0 +1,136 @@
+import multiprocessing
+import os
+import pickle
+import threading
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from pyramid.settings import asbool
+from snovault import AuditFailure
+
+
+DEFAULT_START_METHOD = 'spawn'
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def failure_to_tuple(failure):
+    return (failure.category, failure.detail, failure.level, failure.path, failure.name)
+
+
+def failure_from_tuple(values):
+    return AuditFailure(*values)
+
+
+def _run_checks_in_worker(payload, checks, track_reads):
+    from .incremental import ReadTrackingDict
+    value, args = pickle.loads(payload)
+    results = []
+    for check in checks:
+        checked = ReadTrackingDict(value) if track_reads else value
+        start = time.perf_counter()
+        try:
+            failures = [
+                failure_to_tuple(failure)
+                for failure in check(checked, {}, *args)
+            ]
+        except Exception as e:
+            results.append((None, None, time.perf_counter() - start, e))
+            continue
+        elapsed = time.perf_counter() - start
+        reads = checked.reads if track_reads else None
+        results.append((failures, reads, elapsed, None))
+    return results
+
+
+class AuditPool:
+    '''
+    Runs audit checks in a pool of worker processes. The audited frame
+    and the check arguments are pickled once per item, and the item's
+    checks are dealt round robin into one task per worker, so the frame
+    crosses to each worker once rather than once per check. Only checks
+    that are pure functions of the frame and their arguments can be run
+    here: workers get an empty system dict.
+    '''
+
+    def __init__(self, workers, start_method=DEFAULT_START_METHOD):
+        self.workers = workers
+        self.start_method = start_method
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(self.start_method),
+            )
+        return self._executor
+
+    def submit_checks(self, checks, value, args, track_reads=False):
+        '''
+        Starts every check in checks (a list of functions) on value and
+        returns a handle for each, in the same order, to pass to
+        collect_failures.
+        '''
+        payload = pickle.dumps((value, args), protocol=pickle.HIGHEST_PROTOCOL)
+        tasks = min(self.workers, len(checks))
+        futures = [
+            self.executor.submit(_run_checks_in_worker, payload, checks[n::tasks], track_reads)
+            for n in range(tasks)
+        ]
+        return [
+            (futures[n % tasks], n // tasks)
+            for n in range(len(checks))
+        ]
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+def get_audit_pool(system):
+    '''
+    Returns the process's audit pool if audit.parallel is set, creating
+    it on first use, or None. Audits in daemonic processes (e.g. the
+    multiprocessing indexer's workers) can't start children and always
+    run serially.
+    '''
+    global _pool
+    registry = system.get('registry')
+    settings = getattr(registry, 'settings', None) or {}
+    if not asbool(settings.get('audit.parallel', False)):
+        return None
+    if multiprocessing.current_process().daemon:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = AuditPool(
+                workers=int(settings.get('audit.pool_workers', os.cpu_count() or 1)),
+                start_method=settings.get('audit.pool_start_method', DEFAULT_START_METHOD),
+            )
+        return _pool
+
+
+def reset_audit_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = None
+
+
+def collect_failures(handle):
+    '''
+    Waits for a check submitted with submit_checks and returns
+    (failures, reads, elapsed), reads being the frame fields the check
+    read when track_reads was set and elapsed its time in the worker.
+    Exceptions raised by the check are re-raised here.
+    '''
+    future, position = handle
+    failures, reads, elapsed, error = future.result()[position]
+    if error is not None:
+        raise error
+    return [failure_from_tuple(values) for values in failures], reads, elapsed
@@ -0,0 +1,253 @@
+import bisect
+import functools
+import threading
+import time
+
+from pyramid.view import view_config
+from snovault import AUDITOR
+from snovault import AuditFailure
+from encoded.types.base import record_stats
+
+
+# Upper bounds in milliseconds of the timing histogram buckets. The last
+# bucket holds everything slower.
+HISTOGRAM_BOUNDS = (
+    0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000,
+)
+
+PERCENTILES = (50, 90, 99)
+
+DEFAULT_LIMIT = 25
+
+SORT_KEYS = ('total_ms', 'mean_ms', 'max_ms', 'count', 'failures', 'errors')
+
+
+class CheckStats:
+    '''
+    Invocation count, failure and error counts and a timing histogram of
+    one audit check for one item type.
+    '''
+
+    def __init__(self):
+        self.count = 0
+        self.cached = 0
+        self.failures = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+
+    def add(self, elapsed, failures=0, error=False, cached=False):
+        elapsed_ms = elapsed * 1000
+        self.count += 1
+        self.cached += int(cached)
+        self.failures += failures
+        self.errors += int(error)
+        self.total += elapsed_ms
+        self.max = max(self.max, elapsed_ms)
+        self.histogram[bisect.bisect_left(HISTOGRAM_BOUNDS, elapsed_ms)] += 1
+
+    def percentile(self, percent):
+        '''
+        Upper bound of the histogram bucket holding the given percentile,
+        or the slowest time seen for the last bucket.
+        '''
+        if not self.count:
+            return 0
+        rank = self.count * percent / 100
+        seen = 0
+        for bound, count in zip(HISTOGRAM_BOUNDS, self.histogram):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'cached': self.cached,
+            'failures': self.failures,
+            'errors': self.errors,
+            'total_ms': round(self.total, 3),
+            'mean_ms': round(self.total / self.count, 3) if self.count else 0,
+            'max_ms': round(self.max, 3),
+            'percentiles_ms': {
+                'p{}'.format(percent): round(self.percentile(percent), 3)
+                for percent in PERCENTILES
+            },
+            'histogram': [
+                {'le_ms': bound, 'count': count}
+                for bound, count in zip(HISTOGRAM_BOUNDS + ('inf',), self.histogram)
+            ],
+        }
+
+
+class AuditStats:
+    '''
+    Per check and item type audit timings of this process since it
+    started. Checks registered with the auditor and the checks they
+    dispatch to through run_audit_checks are recorded separately, so a
+    dispatcher's time includes its checks' time.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checks = {}
+        self.started = time.time()
+
+    def record(self, item_type, name, elapsed, failures=0, error=False, cached=False):
+        with self._lock:
+            stats = self._checks.get((item_type, name))
+            if stats is None:
+                stats = self._checks[(item_type, name)] = CheckStats()
+            stats.add(elapsed, failures=failures, error=error, cached=cached)
+
+    def report(self, limit=DEFAULT_LIMIT, item_type=None, sort='total_ms'):
+        with self._lock:
+            checks = [
+                dict(stats.as_dict(), item_type=check_item_type, name=name)
+                for (check_item_type, name), stats in self._checks.items()
+                if item_type is None or check_item_type == item_type
+            ]
+        checks.sort(key=lambda check: check[sort], reverse=True)
+        return {
+            'started': self.started,
+            'uptime': round(time.time() - self.started, 3),
+            'sort': sort,
+            'totals': {
+                'checks': len(checks),
+                'count': sum(check['count'] for check in checks),
+                'cached': sum(check['cached'] for check in checks),
+                'failures': sum(check['failures'] for check in checks),
+                'errors': sum(check['errors'] for check in checks),
+            },
+            'checks': checks[:limit],
+        }
+
+    def reset(self):
+        with self._lock:
+            self._checks.clear()
+            self.started = time.time()
+
+
+audit_stats = AuditStats()
+
+
+def timed_iteration(results, on_done):
+    '''
+    Yields from results, timing only the work done producing them, and
+    calls on_done(elapsed, failures, error) once exhausted or failed.
+    '''
+    elapsed = 0.0
+    failures = 0
+    iterator = iter(results)
+    while True:
+        start = time.perf_counter()
+        try:
+            failure = next(iterator)
+        except StopIteration:
+            elapsed += time.perf_counter() - start
+            on_done(elapsed, failures, False)
+            return
+        except Exception:
+            elapsed += time.perf_counter() - start
+            on_done(elapsed, failures, True)
+            raise
+        elapsed += time.perf_counter() - start
+        failures += 1
+        yield failure
+
+
+def record_check(item_type, check, elapsed, failures, error=False, cached=False):
+    '''
+    Records a run of a check dispatched by run_audit_checks. Reused
+    results are counted in the request's X-Stats as audit_cached_count.
+    '''
+    audit_stats.record(
+        item_type, check.__name__, elapsed,
+        failures=failures, error=error, cached=cached,
+    )
+    if cached:
+        record_stats(audit_cached_count=1)
+
+
+def timed_checker(checker, item_type):
+    '''
+    Wraps an audit checker registered with the auditor so that its runs
+    are recorded in audit_stats and added to the request's X-Stats
+    (audit_time in microseconds, like db_time). Checkers returning None
+    or a single AuditFailure are passed through.
+    '''
+
+    def record(elapsed, failures, error):
+        audit_stats.record(item_type, checker.__name__, elapsed, failures=failures, error=error)
+        record_stats(
+            audit_count=1,
+            audit_time=int(elapsed * 1e6),
+            audit_failure_count=failures,
+            audit_error_count=int(error),
+        )
+
+    @functools.wraps(checker)
+    def wrapper(value, system):
+        start = time.perf_counter()
+        try:
+            result = checker(value, system)
+        except AuditFailure:
+            record(time.perf_counter() - start, 1, False)
+            raise
+        except Exception:
+            record(time.perf_counter() - start, 0, True)
+            raise
+        elapsed = time.perf_counter() - start
+        if result is None or isinstance(result, AuditFailure):
+            record(elapsed, 0 if result is None else 1, False)
+            return result
+
+        def on_done(iteration_elapsed, failures, error):
+            record(elapsed + iteration_elapsed, failures, error)
+
+        return timed_iteration(result, on_done)
+
+    wrapper.audit_timed = True
+    return wrapper
+
+
+def instrument_audit_checkers(registry):
+    '''
+    Replaces every checker registered with the auditor by a timed
+    wrapper. Runs once all checkers have been registered.
+    '''
+    auditor = registry[AUDITOR]
+    for item_type, checkers in auditor.type_checkers.items():
+        checkers[:] = [
+            (
+                order,
+                checker if getattr(checker, 'audit_timed', False) else timed_checker(checker, item_type),
+                condition,
+                frame,
+            )
+            for order, checker, condition, frame in checkers
+        ]
+
+
+@view_config(route_name='_audit_stats', request_method='GET', permission='index')
+def audit_stats_view(context, request):
+    try:
+        limit = int(request.params.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        limit = DEFAULT_LIMIT
+    sort = request.params.get('sort', 'total_ms')
+    if sort not in SORT_KEYS:
+        sort = 'total_ms'
+    return audit_stats.report(
+        limit=limit,
+        item_type=request.params.get('item_type'),
+        sort=sort,
+    )
+
+
+@view_config(route_name='_audit_stats', request_method='DELETE', permission='index')
+def audit_stats_reset(context, request):
+    audit_stats.reset()
+    return audit_stats.report(limit=0)
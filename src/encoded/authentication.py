@@ -1,16 +1,38 @@
 import base64
+import hashlib
+import hmac
 import os
+import threading
+import time
+from collections import OrderedDict
 from passlib.context import CryptContext
 from pyramid.authentication import (
     BasicAuthAuthenticationPolicy as _BasicAuthAuthenticationPolicy,
 )
+from pyramid.events import subscriber
 from pyramid.path import (
     DottedNameResolver,
     caller_package,
 )
-from snovault import COLLECTIONS
+from snovault import (
+    COLLECTIONS,
+    DBSESSION,
+    AfterModified,
+)
+from snovault.storage import (
+    CurrentPropertySheet,
+    PropertySheet,
+)
+from uuid import UUID
 
 CRYPT_CONTEXT = __name__ + ':crypt_context'
+ACCESS_KEY_CACHE = __name__ + ':access_key_cache'
+
+# environ key of the cache key of the access key verified for a request
+VERIFIED_ACCESS_KEY = 'encoded.verified_access_key'
+
+DEFAULT_ACCESS_KEY_CACHE_SIZE = 10000
+DEFAULT_ACCESS_KEY_CACHE_TTL = 60
 
 
 def includeme(config):
@@ -25,6 +47,12 @@ def includeme(config):
         passlib_settings = {'schemes': 'edw_hash, unix_disabled'}
     crypt_context = CryptContext(**passlib_settings)
     config.registry[CRYPT_CONTEXT] = crypt_context
+    settings = config.registry.settings
+    config.registry[ACCESS_KEY_CACHE] = AccessKeyCache(
+        maxsize=int(settings.get('access_key_cache.size', DEFAULT_ACCESS_KEY_CACHE_SIZE)),
+        ttl=float(settings.get('access_key_cache.ttl', DEFAULT_ACCESS_KEY_CACHE_TTL)),
+    )
+    config.scan(__name__)
 
 
 class NamespacedAuthenticationPolicy(object):
@@ -90,7 +118,177 @@ class BasicAuthAuthenticationPolicy(_BasicAuthAuthenticationPolicy):
         super(BasicAuthAuthenticationPolicy, self).__init__(check, *args, **kw)
 
 
+class AccessKeyCache(object):
+    """ Process-local cache of verified access keys
+
+    Maps (access_key_id, secret digest) to the principals groupfinder found
+    for the access key, so that repeated requests with the same credentials
+    skip loading the access key, checking its secret hash and loading its
+    user. Each entry keeps the tids of the access key and user it was built
+    from, and a hit is only used while they are still current in the
+    database, so changes made through any process (revoked keys, removed
+    groups) take effect on the next request. Entries also expire ``ttl``
+    seconds after the secret was checked and are dropped as soon as this
+    process sees the access key or its user change. Failed checks are never
+    cached.
+
+    Secrets are only kept as an HMAC under a random per-process key.
+    """
+
+    def __init__(self, maxsize=DEFAULT_ACCESS_KEY_CACHE_SIZE, ttl=DEFAULT_ACCESS_KEY_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # Bumped on every invalidation, so a check that raced one is not cached
+        self.generation = 0
+        self._hmac_key = os.urandom(32)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.maxsize and self.ttl)
+
+    def key(self, access_key_id, password):
+        if not isinstance(password, bytes):
+            password = password.encode('utf-8')
+        digest = hmac.new(self._hmac_key, password, hashlib.sha256).digest()
+        return (access_key_id, digest)
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry['expires'] <= time.monotonic():
+            del self._entries[key]
+            entry = None
+        return entry
+
+    def verified(self, key, is_current=None):
+        """ Returns whether key is cached. is_current, if given, is called
+        outside the lock with the entry's {uuid: tid} and an entry it
+        rejects is dropped.
+        """
+        with self._lock:
+            entry = self._get(key)
+            tids = None if entry is None else dict(entry['tids'])
+        if entry is not None and is_current is not None and not is_current(tids):
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return False
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+            return True
+
+    def add(self, key, user, generation, tids=None):
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = {
+                'expires': time.monotonic() + self.ttl,
+                'user': user,
+                'tids': dict(tids or {}),
+                'principals': None,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def principals(self, key):
+        with self._lock:
+            entry = self._get(key)
+            return None if entry is None else entry['principals']
+
+    def set_principals(self, key, principals, generation, tids=None):
+        with self._lock:
+            entry = self._get(key)
+            if entry is not None and generation == self.generation:
+                entry['principals'] = list(principals)
+                entry['tids'].update(tids or {})
+
+    def _invalidate(self, match):
+        with self._lock:
+            self.generation += 1
+            for key in [key for key, entry in self._entries.items() if match(key, entry)]:
+                del self._entries[key]
+
+    def invalidate_access_key(self, access_key_id):
+        self._invalidate(lambda key, entry: key[0] == access_key_id)
+
+    def invalidate_user(self, user):
+        self._invalidate(lambda key, entry: entry['user'] == user)
+
+    def clear(self):
+        self._invalidate(lambda key, entry: True)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+@subscriber(AfterModified)
+def invalidate_access_key_cache(event):
+    cache = event.request.registry.get(ACCESS_KEY_CACHE)
+    if cache is None:
+        return
+    item_type = getattr(event.object, 'item_type', None)
+    if item_type == 'access_key':
+        cache.invalidate_access_key(event.object.properties.get('access_key_id'))
+    elif item_type == 'user':
+        cache.invalidate_user(str(event.object.uuid))
+
+
+def current_tids(request, uuids):
+    """ Returns {uuid: tid} for uuids as currently stored in the database,
+    with tid formatted as the items' tid property.
+    """
+    if not uuids:
+        return {}
+    session = request.registry[DBSESSION]
+    query = session.query(
+        CurrentPropertySheet.rid,
+        PropertySheet.tid,
+    ).join(
+        PropertySheet,
+        PropertySheet.sid == CurrentPropertySheet.sid
+    ).filter(
+        CurrentPropertySheet.rid.in_([UUID(uuid) for uuid in uuids])
+    )
+    tids = {}
+    for rid, tid in query:
+        tids.setdefault(str(rid), set()).add(str(tid))
+    return {
+        uuid: ','.join(sorted(values))
+        for uuid, values in tids.items()
+    }
+
+
 def basic_auth_check(username, password, request):
+    cache = request.registry.get(ACCESS_KEY_CACHE)
+    if cache is not None and cache.enabled:
+        key = cache.key(username, password)
+        if cache.verified(key, lambda tids: current_tids(request, tids) == tids):
+            request.environ[VERIFIED_ACCESS_KEY] = key
+            return []
+        generation = cache.generation
+    else:
+        cache = None
+
     # We may get called before the context is found and the root set
     root = request.registry[COLLECTIONS]
     collection = root['access-keys']
@@ -111,6 +309,14 @@ def basic_auth_check(username, password, request):
     #if new_hash:
     #    replace_user_hash(user, new_hash)
 
+    if cache is not None:
+        cache.add(
+            key,
+            properties['user'],
+            generation,
+            tids={str(access_key.uuid): access_key.tid},
+        )
+        request.environ[VERIFIED_ACCESS_KEY] = key
     return []
 
 
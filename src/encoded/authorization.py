@@ -1,4 +1,8 @@
 from snovault import COLLECTIONS
+from .authentication import (
+    ACCESS_KEY_CACHE,
+    VERIFIED_ACCESS_KEY,
+)
 
 
 def groupfinder(login, request):
@@ -6,6 +10,7 @@ def groupfinder(login, request):
         return None
     namespace, localname = login.split('.', 1)
     user = None
+    cache_key = None
 
     collections = request.registry[COLLECTIONS]
 
@@ -27,6 +32,17 @@ def groupfinder(login, request):
             return None
 
     elif namespace == 'accesskey':
+        # Set by basic_auth_check once it has verified this access key's secret
+        cache = request.registry.get(ACCESS_KEY_CACHE)
+        cache_key = request.environ.get(VERIFIED_ACCESS_KEY)
+        if cache is None or cache_key is None or cache_key[0] != localname:
+            cache_key = None
+        else:
+            generation = cache.generation
+            principals = cache.principals(cache_key)
+            if principals is not None:
+                return list(principals)
+
         access_keys = collections.by_item_type['access_key']
         try:
             access_key = access_keys[localname]
@@ -60,4 +76,11 @@ def groupfinder(login, request):
     principals.extend('group.%s' % group for group in groups)
     viewing_groups = user_properties.get('viewing_groups', [])
     principals.extend('viewing_group.%s' % group for group in viewing_groups)
+    if cache_key is not None:
+        cache.set_principals(
+            cache_key,
+            principals,
+            generation,
+            tids={str(user.uuid): user.tid},
+        )
     return principals
@@ -1,23 +1,26 @@
 from collections import OrderedDict
-from pyramid.compat import bytes_
 from pyramid.httpexceptions import HTTPBadRequest
 from pyramid.view import view_config
 from pyramid.response import Response
 from snovault import TYPES
 from snosearch.parsers import QueryString
 from snovault.util import simple_path_ids
+from snovault.elasticsearch.interfaces import ELASTIC_SEARCH
 from urllib.parse import (
     parse_qs,
     urlencode,
     quote,
 )
+from encoded.reports.csv import CHUNK_SIZE
+from encoded.reports.csv import CSVGenerator
+from encoded.reports.csv import WhitespaceCollapsingCSVGenerator
+from encoded.reports.serializers import PathTree
 from encoded.search_views import search_generator
 from encoded.search_views import cart_search_generator
 from encoded.search_views import rna_expression_search_generator
 from encoded.searches.interfaces import RNA_EXPRESSION
 from .vis_defines import is_file_visualizable
-import csv
-import io
+import itertools
 import json
 import datetime
 import re
@@ -29,18 +32,12 @@ def includeme(config):
     config.scan(__name__)
 
 
-def get_file_uuids(result_dict):
-    file_uuids = []
-    for item in result_dict['@graph']:
-        for file in item['files']:
-            file_uuids.append(file['uuid'])
-    return list(set(file_uuids))
-
-
 def get_biosample_accessions(file_json, experiment_json):
     for f in experiment_json['files']:
         if file_json['uuid'] == f['uuid']:
-            accession = f.get('replicate', {}).get('library', {}).get('biosample', {}).get('accession')
+            library = f.get('replicate', {}).get('library', {})
+            # Only embedded libraries have a biosample accession.
+            accession = library.get('biosample', {}).get('accession') if isinstance(library, dict) else None
             if accession:
                 return accession
     accessions = []
@@ -64,61 +61,230 @@ def get_peak_metadata_links(request):
         host_url=request.host_url,
         search_params=quote(search_params)
     )
-    return [peak_metadata_tsv_link, peak_metadata_json_link]
+    peak_metadata_ndjson_link = '{host_url}/peak_metadata/{search_params}/peak_metadata.ndjson'.format(
+        host_url=request.host_url,
+        search_params=quote(search_params)
+    )
+    return [peak_metadata_tsv_link, peak_metadata_json_link, peak_metadata_ndjson_link]
+
+
+PEAK_METADATA_HEADER = [
+    'assay_term_name',
+    'coordinates',
+    'target.label',
+    'biosample.accession',
+    'file.accession',
+    'experiment.accession',
+]
+
+PEAK_METADATA_MGET_CHUNK_SIZE = 1000
+
+PEAK_FILE_SOURCE = [
+    'embedded.uuid',
+    'embedded.accession',
+    'principals_allowed.view',
+]
+
+PEAK_EXPERIMENT_SOURCE = [
+    'embedded.uuid',
+    'embedded.accession',
+    'embedded.assay_term_name',
+    'embedded.target.label',
+    'embedded.files.uuid',
+    'embedded.files.replicate',
+    'embedded.replicates.library.biosample.accession',
+    'principals_allowed.view',
+]
+
+
+def mget_embedded(es, docs, principals, chunk_size=PEAK_METADATA_MGET_CHUNK_SIZE):
+    """
+    Fetches (index, uuid) docs with ES multi-get, chunk_size at a time,
+    and returns the embedded frames the principals may view by uuid.
+    """
+    principals = set(principals)
+    embedded = {}
+    for n in range(0, len(docs), chunk_size):
+        response = es.mget(
+            body={
+                'docs': [
+                    {
+                        '_index': index,
+                        '_type': index,
+                        '_id': uuid,
+                        '_source': (
+                            PEAK_FILE_SOURCE
+                            if index == 'file' else
+                            PEAK_EXPERIMENT_SOURCE
+                        ),
+                    }
+                    for index, uuid in docs[n:n + chunk_size]
+                ]
+            }
+        )
+        for doc in response['docs']:
+            if not doc.get('found'):
+                continue
+            source = doc['_source']
+            if principals.isdisjoint(source.get('principals_allowed', {}).get('view', [])):
+                continue
+            embedded[doc['_id']] = source['embedded']
+    return embedded
+
+
+def get_peak_file_metadata(es, results, principals):
+    """
+    Maps the uuid of each peak file of the region search results to its
+    (assay_term_name, target label, biosample accession, file accession,
+    experiment accession), fetching the files and their experiments in
+    one multi-get instead of embedding them one by one.
+    """
+    experiment_by_file = {}
+    for experiment in results['@graph']:
+        for file in experiment['files']:
+            experiment_by_file[file['uuid']] = experiment['uuid']
+    file_uuids = list(OrderedDict.fromkeys(
+        row['_id'] for row in results['peaks']
+        if row['_id'] in experiment_by_file
+    ))
+    experiment_uuids = list(OrderedDict.fromkeys(
+        experiment_by_file[uuid] for uuid in file_uuids
+    ))
+    embedded = mget_embedded(
+        es,
+        [('file', uuid) for uuid in file_uuids] + [('experiment', uuid) for uuid in experiment_uuids],
+        principals,
+    )
+    metadata = {}
+    for uuid in file_uuids:
+        file_json = embedded.get(uuid)
+        experiment_json = embedded.get(experiment_by_file[uuid])
+        if file_json is None or experiment_json is None:
+            continue
+        metadata[uuid] = (
+            experiment_json['assay_term_name'],
+            experiment_json.get('target', {}).get('label'), # not all experiments have targets
+            get_biosample_accessions(file_json, experiment_json),
+            file_json['accession'],
+            experiment_json['accession'],
+        )
+    return metadata
+
+
+def iter_peak_metadata(results, metadata):
+    """
+    Yields (assay_term_name, coordinates, target label, biosample
+    accession, file accession, experiment accession) for every peak.
+    """
+    for row in results['peaks']:
+        file_metadata = metadata.get(row['_id'])
+        if file_metadata is None:
+            continue
+        assay_name, target_name, biosample_accession, file_accession, experiment_accession = file_metadata
+        for hit in row['inner_hits']['positions']['hits']['hits']:
+            coordinates = '{}:{}-{}'.format(row['_index'], hit['_source']['start'], hit['_source']['end'])
+            yield (assay_name, coordinates, target_name, biosample_accession, file_accession, experiment_accession)
+
+
+def peak_json_entry(row):
+    assay_name, coordinates, target_name, biosample_accession, file_accession, experiment_accession = row
+    return {
+        'coordinates': coordinates,
+        'target.name': target_name,
+        'biosample.accession': list(biosample_accession.split(', ')),
+        'file.accession': file_accession,
+        'experiment.accession': experiment_accession
+    }
+
+
+def iter_text_chunks(pieces, chunk_size=CHUNK_SIZE):
+    """Joins text pieces into utf-8 chunks of roughly chunk_size bytes."""
+    buffered = []
+    size = 0
+    for piece in pieces:
+        buffered.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield ''.join(buffered).encode('utf-8')
+            buffered = []
+            size = 0
+    if buffered:
+        yield ''.join(buffered).encode('utf-8')
+
+
+def iter_peak_metadata_json(results, metadata):
+    """
+    The peaks grouped by assay as one JSON object, written assay by
+    assay. Only the file metadata is grouped in memory, not the peaks.
+    """
+    by_assay = OrderedDict()
+    for row in results['peaks']:
+        file_metadata = metadata.get(row['_id'])
+        if file_metadata is not None:
+            by_assay.setdefault(file_metadata[0], []).append(row)
+    yield '{'
+    for n, (assay_name, rows) in enumerate(by_assay.items()):
+        yield '{}{}: ['.format(', ' if n else '', json.dumps(assay_name))
+        for m, peak_row in enumerate(iter_peak_metadata({'peaks': rows}, metadata)):
+            yield '{}{}'.format(', ' if m else '', json.dumps(peak_json_entry(peak_row)))
+        yield ']'
+    yield '}'
+
+
+def iter_peak_metadata_ndjson(results, metadata):
+    for row in iter_peak_metadata(results, metadata):
+        entry = peak_json_entry(row)
+        entry['assay_term_name'] = row[0]
+        yield json.dumps(entry) + '\n'
 
 
 @view_config(route_name='peak_metadata', request_method='GET')
 def peak_metadata(context, request):
     param_list = parse_qs(request.matchdict['search_params'])
     param_list['field'] = []
-    header = ['assay_term_name', 'coordinates', 'target.label', 'biosample.accession', 'file.accession', 'experiment.accession']
     param_list['limit'] = ['all']
     path = '/region-search/?{}&{}'.format(quote(urlencode(param_list, True)),'referrer=peak_metadata')
     results = request.embed(path, as_user=True)
-    uuids_in_results = get_file_uuids(results)
-    rows = []
-    json_doc = {}
-    for row in results['peaks']:
-        if row['_id'] in uuids_in_results:
-            file_json = request.embed(row['_id'])
-            experiment_json = request.embed(file_json['dataset'])
-            for hit in row['inner_hits']['positions']['hits']['hits']:
-                data_row = []
-                coordinates = '{}:{}-{}'.format(row['_index'], hit['_source']['start'], hit['_source']['end'])
-                file_accession = file_json['accession']
-                experiment_accession = experiment_json['accession']
-                assay_name = experiment_json['assay_term_name']
-                target_name = experiment_json.get('target', {}).get('label') # not all experiments have targets
-                biosample_accession = get_biosample_accessions(file_json, experiment_json)
-                data_row.extend([assay_name, coordinates, target_name, biosample_accession, file_accession, experiment_accession])
-                rows.append(data_row)
-                if assay_name not in json_doc:
-                    json_doc[assay_name] = []
-                else:
-                    json_doc[assay_name].append({
-                        'coordinates': coordinates,
-                        'target.name': target_name,
-                        'biosample.accession': list(biosample_accession.split(', ')),
-                        'file.accession': file_accession,
-                        'experiment.accession': experiment_accession
-                    })
-    if 'peak_metadata.json' in request.url:
+    metadata = get_peak_file_metadata(
+        request.registry[ELASTIC_SEARCH],
+        results,
+        request.effective_principals,
+    )
+    # Rows are written as they are produced, in chunks.
+    filename = request.matchdict['tsv']
+    if filename == 'peak_metadata.ndjson':
+        return Response(
+            content_type='application/x-ndjson',
+            app_iter=iter_text_chunks(iter_peak_metadata_ndjson(results, metadata)),
+            content_disposition='attachment;filename="%s"' % 'peak_metadata.ndjson'
+        )
+    if filename == 'peak_metadata.json':
         return Response(
             content_type='text/plain',
-            body=json.dumps(json_doc),
+            app_iter=iter_text_chunks(iter_peak_metadata_json(results, metadata)),
             content_disposition='attachment;filename="%s"' % 'peak_metadata.json'
         )
-    fout = io.StringIO()
-    writer = csv.writer(fout, delimiter='\t')
-    writer.writerow(header)
-    writer.writerows(rows)
+    rows = itertools.chain([PEAK_METADATA_HEADER], iter_peak_metadata(results, metadata))
     return Response(
         content_type='text/tsv',
-        body=fout.getvalue(),
+        app_iter=CSVGenerator(lineterminator='\r\n').iter_chunks(rows),
         content_disposition='attachment;filename="%s"' % 'peak_metadata.tsv'
     )
 
 
+def format_column_nodes(nodes):
+    # if we ended with an embedded object, show the @id
+    if nodes and hasattr(nodes[0], '__contains__') and '@id' in nodes[0]:
+        nodes = [node['@id'] for node in nodes]
+    deduped_nodes = []
+    for n in nodes:
+        if isinstance(n, dict):
+            n = str(n)
+        if n not in deduped_nodes:
+            deduped_nodes.append(n)
+    return u','.join(u'{}'.format(n) for n in deduped_nodes)
+
+
 def lookup_column_value(value, path):
     nodes = [value]
     names = path.split('.')
@@ -135,21 +301,22 @@ def lookup_column_value(value, path):
         nodes = nextnodes
         if not nodes:
             return ''
-    # if we ended with an embedded object, show the @id
-    if nodes and hasattr(nodes[0], '__contains__') and '@id' in nodes[0]:
-        nodes = [node['@id'] for node in nodes]
-    deduped_nodes = []
-    for n in nodes:
-        if isinstance(n, dict):
-            n = str(n)
-        if n not in deduped_nodes:
-            deduped_nodes.append(n)
-    return u','.join(u'{}'.format(n) for n in deduped_nodes)
+    return format_column_nodes(nodes)
+
+
+def make_column_values_getter(paths):
+    """Compile report columns into a getter that walks each item once."""
+    tree = PathTree(paths, include_none=True)
+
+    def get_column_values(item):
+        values = tree.extract(item)
+        return [format_column_nodes(values[path]) for path in paths]
+    return get_column_values
 
 
 def format_row(columns):
     """Format a list of text columns as a tab-separated byte string."""
-    return b'\t'.join([bytes_(" ".join(c.strip('\t\n\r').split()), 'utf-8') for c in columns]) + b'\r\n'
+    return WhitespaceCollapsingCSVGenerator().writerow(columns)
 
 
 def _convert_camel_to_snake(type_str):
@@ -212,12 +379,13 @@ def report_download(context, request):
 
     header = [column.get('title') or field for field, column in columns.items()]
 
+    get_column_values = make_column_values_getter(list(columns))
+
     def generate_rows():
         yield format_header(header)
-        yield format_row(header)
+        yield header
         for item in results['@graph']:
-            values = [lookup_column_value(item, path) for path in columns]
-            yield format_row(values)
+            yield get_column_values(item)
 
     
     # Stream response using chunked encoding.
@@ -230,7 +398,9 @@ def report_download(context, request):
         downloadtime.hour,
         downloadtime.minute
     )
-    request.response.app_iter = generate_rows()
+    request.response.app_iter = WhitespaceCollapsingCSVGenerator().iter_chunks(
+        generate_rows()
+    )
     return request.response
 
 
@@ -0,0 +1,127 @@
+"""\
+Load many items of one type in one request.
+
+loadxl's bulk mode posts chunks of workbook rows here instead of making a
+POST or PUT per row. Every row is validated against the type's schema and
+written with the same create_item/update_item (and so the same events and
+indexing invalidation) as the item views, but without a traversal and a
+rendered response per row. Each row is written in its own savepoint so a
+failed row doesn't roll back the rest of the chunk, and the chunk commits
+as one transaction.
+
+Only the generic collection POST is reproduced, so types whose collection
+has its own POST view (access_key_add generates an access key's id and
+secret) can't be bulk posted; they're in CUSTOM_ADD_TYPES and loadxl posts
+them one at a time. PUT always goes through the generic item edit.
+"""
+from pyramid.httpexceptions import HTTPBadRequest
+from pyramid.httpexceptions import HTTPException
+from pyramid.traversal import find_resource
+from pyramid.view import view_config
+from snovault import COLLECTIONS
+from snovault import STORAGE
+from snovault.crud_views import create_item
+from snovault.crud_views import update_item
+from snovault.schema_utils import validate
+from snovault.validation import ValidationFailure
+from uuid import UUID
+
+
+# Types whose collection POST view does more than collection_add.
+CUSTOM_ADD_TYPES = {
+    'access_key',
+}
+
+
+def includeme(config):
+    config.add_route('_bulk_load', '/_bulk_load')
+    config.scan(__name__)
+
+
+def validation_errors(errors):
+    return [
+        {'location': 'body', 'name': list(error.path), 'description': error.message}
+        for error in errors
+    ]
+
+
+def bulk_post(request, collection, value):
+    if not request.has_permission('add', collection):
+        return {'status': 403, 'detail': 'add forbidden to %s' % request.resource_path(collection)}
+    validated, errors = validate(collection.type_info.schema, value)
+    if errors:
+        return {'status': 422, 'errors': validation_errors(errors)}
+    item = create_item(collection.type_info, request, validated)
+    return {'status': 201, 'uuid': str(item.uuid), 'location': request.resource_path(item)}
+
+
+def bulk_put(request, url, value):
+    try:
+        context = find_resource(request.root, url)
+    except KeyError:
+        return {'status': 404, 'detail': 'not found: %s' % url}
+    if not request.has_permission('edit', context):
+        return {'status': 403, 'detail': 'edit forbidden to %s' % url}
+    if 'uuid' in value and UUID(value['uuid']) != context.uuid:
+        return {'status': 422, 'errors': [
+            {'location': 'body', 'name': ['uuid'], 'description': 'uuid may not be changed'}
+        ]}
+    accession = context.properties.get('accession')
+    if accession and accession != value.get('accession'):
+        return {'status': 422, 'errors': [
+            {'location': 'body', 'name': ['accession'], 'description': 'must specify original accession'}
+        ]}
+    current = context.upgrade_properties().copy()
+    current['uuid'] = str(context.uuid)
+    validated, errors = validate(context.type_info.schema, value, current)
+    if errors:
+        return {'status': 422, 'errors': validation_errors(errors)}
+    update_item(context, request, validated)
+    return {'status': 200, 'uuid': str(context.uuid), 'location': request.resource_path(context)}
+
+
+@view_config(route_name='_bulk_load', request_method='POST', permission='import_items')
+def bulk_load(request):
+    """ Create (POST) or replace (PUT) the rows of one item type
+
+    The body is {"item_type": ..., "method": "POST" or "PUT", "rows": [{"url": ...,
+    "value": ...}, ...]} and results has a status and uuid, errors or detail for
+    each row, in order, as the item views would have responded.
+    """
+    request.datastore = 'database'
+    item_type = request.json['item_type']
+    method = request.json['method']
+    if method not in ('POST', 'PUT'):
+        raise HTTPBadRequest('method must be POST or PUT')
+    try:
+        collection = request.registry[COLLECTIONS][item_type]
+    except KeyError:
+        raise HTTPBadRequest('unknown item_type: %s' % item_type)
+    if method == 'POST' and collection.type_info.name in CUSTOM_ADD_TYPES:
+        raise HTTPBadRequest('%s has its own POST view and must be posted one at a time' % item_type)
+    session = request.registry[STORAGE].write.DBSession()
+    results = []
+    for row in request.json['rows']:
+        sp = session.begin_nested()
+        try:
+            if method == 'POST':
+                result = bulk_post(request, collection, row['value'])
+            else:
+                result = bulk_put(request, row['url'], row['value'])
+        except ValidationFailure as e:
+            sp.rollback()
+            result = {'status': e.code, 'errors': [e.detail] if e.detail is not None else []}
+        except HTTPException as e:
+            sp.rollback()
+            result = {'status': e.code, 'detail': e.detail}
+        else:
+            if result['status'] // 100 == 2:
+                sp.commit()
+            else:
+                sp.rollback()
+        results.append(result)
+    return {
+        'status': 'success',
+        '@type': ['result'],
+        'results': results,
+    }
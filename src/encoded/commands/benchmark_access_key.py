@@ -0,0 +1,100 @@
+"""\
+Benchmark authenticated GET throughput with and without the access key cache.
+
+Sends the same GET with an access key's basic auth credentials the given
+number of times with the access key cache turned off and then on, and
+reports requests/sec for each. The access key must belong to an enabled
+user (see /access-keys/ to create one).
+
+Examples
+
+    %(prog)s development.ini --app-name app --access-key-id ABCDEFGH --secret abcdefghijklmnop
+
+    %(prog)s development.ini --app-name app --access-key-id ABCDEFGH --secret abcdefghijklmnop \\
+        --path "/experiments/ENCSR000AAA/?frame=object" --requests 2000
+
+"""
+import base64
+import logging
+import time
+
+from pyramid import paster
+from webob import Request
+
+from encoded.authentication import ACCESS_KEY_CACHE
+from encoded.commands.benchmark_utils import format_rate
+
+
+EPILOG = __doc__
+
+logger = logging.getLogger(__name__)
+
+
+def authorization(access_key_id, secret):
+    credentials = '{}:{}'.format(access_key_id, secret).encode('utf-8')
+    return 'Basic ' + base64.b64encode(credentials).decode('ascii')
+
+
+def get(app, path, auth):
+    request = Request.blank(
+        path,
+        environ={
+            'HTTP_ACCEPT': 'application/json',
+            'HTTP_AUTHORIZATION': auth,
+        }
+    )
+    response = request.get_response(app)
+    if response.status_int != 200:
+        raise RuntimeError('GET {} returned {}'.format(path, response.status))
+    return response
+
+
+def run(app, path, access_key_id, secret, requests):
+    cache = app.registry[ACCESS_KEY_CACHE]
+    maxsize = cache.maxsize
+    auth = authorization(access_key_id, secret)
+    try:
+        for name, cache_size in [('uncached', 0), ('cached', maxsize)]:
+            cache.maxsize = cache_size
+            cache.clear()
+            # Load the item and warm the cache outside the measurement.
+            get(app, path, auth)
+            start = time.perf_counter()
+            for n in range(requests):
+                get(app, path, auth)
+            elapsed = time.perf_counter() - start
+            print(
+                '{}\trequests={}\telapsed={:.3f}s\trequests/sec={}\tmean={:.2f}ms\tcache={}'.format(
+                    name,
+                    requests,
+                    elapsed,
+                    format_rate(requests, elapsed),
+                    1000 * elapsed / requests,
+                    cache.stats(),
+                )
+            )
+    finally:
+        cache.maxsize = maxsize
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Benchmark the access key cache", epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--app-name', help="Pyramid app name in configfile")
+    parser.add_argument('--access-key-id', required=True, help="Access key id")
+    parser.add_argument('--secret', required=True, help="Secret access key")
+    parser.add_argument('--path', default='/session-properties', help="Path to GET")
+    parser.add_argument('--requests', default=1000, type=int, help="Requests per mode")
+    parser.add_argument('config_uri', help="path to configfile")
+    args = parser.parse_args()
+
+    logging.basicConfig()
+    app = paster.get_app(args.config_uri, args.app_name)
+    run(app, args.path, args.access_key_id, args.secret, args.requests)
+
+
+if __name__ == '__main__':
+    main()
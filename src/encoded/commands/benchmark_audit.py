@@ -0,0 +1,129 @@
+"""\
+Benchmark audits serially and with the audit process pool.
+
+Audits every item of the given type (e.g. the test inserts loaded by
+dev-servers) once to load their frames, then times the audit checks of
+each item serially and with audit.parallel set, and reports wall time
+per audited item for each mode. The incremental audit cache is turned
+off while measuring so that every check runs.
+
+Examples
+
+    %(prog)s development.ini --app-name app
+
+    %(prog)s development.ini --app-name app --item-type experiment --workers 8 --repeat 3
+
+"""
+import logging
+import time
+import transaction
+
+from pyramid import paster
+from pyramid.request import apply_request_extensions
+from pyramid.threadlocal import manager
+
+from encoded.audit.pool import reset_audit_pool
+from encoded.commands.benchmark_utils import format_rate
+
+
+EPILOG = __doc__
+
+logger = logging.getLogger(__name__)
+
+
+def make_request(app):
+    request = app.request_factory.blank('/_benchmark_audit')
+    request.registry = app.registry
+    request._stats = {}
+    apply_request_extensions(request)
+    request.datastore = 'database'
+    request.root = app.root_factory(request)
+    return request
+
+
+def audit_item(request, item):
+    types = [item.type_info.name] + item.type_info.base_types
+    return request.audit(types=types, path=request.resource_path(item), context=item)
+
+
+def time_audits(request, items, repeat):
+    elapsed = []
+    results = []
+    for item in items:
+        start = time.perf_counter()
+        for n in range(repeat):
+            result = audit_item(request, item)
+        elapsed.append((time.perf_counter() - start) / repeat)
+        results.append(result)
+    return results, elapsed
+
+
+def run(app, item_type, limit, workers, repeat):
+    settings = app.registry.settings
+    settings['audit.incremental'] = 'false'
+    settings['audit.pool_workers'] = str(workers)
+    request = make_request(app)
+    manager.push({'request': request, 'registry': app.registry})
+    txn = transaction.begin()
+    try:
+        collection = request.root.by_item_type[item_type]
+        items = [collection.get(uuid) for uuid in collection]
+        if limit:
+            items = items[:limit]
+        print('{}\titems={}\tworkers={}'.format(item_type, len(items), workers))
+        # Load every frame into the embed cache so the modes time only checks.
+        settings['audit.parallel'] = 'false'
+        for item in items:
+            audit_item(request, item)
+        expected = None
+        for name, parallel in [('serial', 'false'), ('parallel', 'true')]:
+            settings['audit.parallel'] = parallel
+            reset_audit_pool()
+            if items:
+                # Start the pool's workers outside the measurement.
+                audit_item(request, items[0])
+            results, elapsed = time_audits(request, items, repeat)
+            if expected is None:
+                expected = results
+            elif results != expected:
+                logger.error('%s returned different audits', name)
+            total = sum(elapsed)
+            ordered = sorted(elapsed)
+            print(
+                '{}\titems={}\ttotal={:.3f}s\titems/sec={}\tmean={:.1f}ms\tmedian={:.1f}ms\tmax={:.1f}ms'.format(
+                    name,
+                    len(items),
+                    total,
+                    format_rate(len(items), total),
+                    1000 * total / len(items) if items else 0,
+                    1000 * ordered[len(ordered) // 2] if items else 0,
+                    1000 * ordered[-1] if items else 0,
+                )
+            )
+    finally:
+        reset_audit_pool()
+        txn.abort()
+        manager.pop()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Benchmark the audit process pool", epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--app-name', help="Pyramid app name in configfile")
+    parser.add_argument('--item-type', default='experiment', help="Item type to audit")
+    parser.add_argument('--limit', default=0, type=int, help="Audit at most this many items")
+    parser.add_argument('--workers', default=4, type=int, help="Audit pool workers")
+    parser.add_argument('--repeat', default=1, type=int, help="Audits per item per mode")
+    parser.add_argument('config_uri', help="path to configfile")
+    args = parser.parse_args()
+
+    logging.basicConfig()
+    app = paster.get_app(args.config_uri, args.app_name)
+    run(app, args.item_type, args.limit, args.workers, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
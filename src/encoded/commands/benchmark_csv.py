@@ -0,0 +1,121 @@
+"""\
+Microbenchmark the TSV encoders used by metadata.tsv, batch_download
+and report.tsv against the per-row csv.writer round trip they replaced.
+
+Examples
+
+    %(prog)s --rows 200000 --columns 59
+
+"""
+import csv
+import logging
+import random
+import string
+import time
+
+from encoded.reports.csv import CSVGenerator
+from encoded.reports.csv import WhitespaceCollapsingCSVGenerator
+
+
+EPILOG = __doc__
+
+logger = logging.getLogger(__name__)
+
+
+class PerRowCSVWriter:
+
+    def __init__(self):
+        self.writer = csv.writer(self, delimiter='\t', lineterminator='\n')
+
+    def writerow(self, row):
+        self.writer.writerow(row)
+        return self.row
+
+    def write(self, row):
+        self.row = row.encode('utf-8')
+
+
+def per_row_format_row(columns):
+    return b'\t'.join(
+        [bytes(' '.join(c.strip('\t\n\r').split()), 'utf-8') for c in columns]
+    ) + b'\r\n'
+
+
+def make_rows(rows, columns, seed=0):
+    rng = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits + ' '
+    cells = [
+        ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+        for _ in range(1000)
+    ]
+    return [
+        [rng.choice(cells) for _ in range(columns)]
+        for _ in range(rows)
+    ]
+
+
+def consume(chunks):
+    count = 0
+    size = 0
+    for chunk in chunks:
+        count += 1
+        size += len(chunk)
+    return count, size
+
+
+def timed(name, fn, rows):
+    start = time.perf_counter()
+    count, size = fn()
+    elapsed = time.perf_counter() - start
+    print(
+        '{}\tchunks={}\tbytes={}\telapsed={:.3f}s\trows/sec={:.0f}'.format(
+            name,
+            count,
+            size,
+            elapsed,
+            len(rows) / elapsed if elapsed else 0,
+        )
+    )
+
+
+def run(rows):
+    per_row_writer = PerRowCSVWriter()
+    csv_generator = CSVGenerator()
+    collapsing_generator = WhitespaceCollapsingCSVGenerator()
+    timed(
+        'metadata per-row csv.writer',
+        lambda: consume(per_row_writer.writerow(row) for row in rows),
+        rows
+    )
+    timed(
+        'metadata chunked CSVGenerator',
+        lambda: consume(csv_generator.iter_chunks(rows)),
+        rows
+    )
+    timed(
+        'report per-row format_row',
+        lambda: consume(per_row_format_row(row) for row in rows),
+        rows
+    )
+    timed(
+        'report chunked WhitespaceCollapsingCSVGenerator',
+        lambda: consume(collapsing_generator.iter_chunks(rows)),
+        rows
+    )
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Benchmark TSV encoding", epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--rows', default=100000, type=int, help="Rows to encode")
+    parser.add_argument('--columns', default=59, type=int, help="Cells per row")
+    args = parser.parse_args()
+    logging.basicConfig()
+    run(make_rows(args.rows, args.columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""\
+Benchmark rendering items with and without the embed loader.
+
+Renders the index data of every item of the given types (e.g. the test
+inserts loaded by dev-servers), each in its own transaction so that the
+session and the connection's item, unique key and embed caches start
+cold as they do for an indexer batch, with embed_loader.enabled off and
+then on. Reports items per second and SQL statements per item for each
+mode.
+
+Examples
+
+    %(prog)s development.ini --app-name app
+
+    %(prog)s development.ini --app-name app --item-type reference_epigenome --item-type experiment --limit 100
+
+"""
+import logging
+import time
+import transaction
+
+from pyramid import paster
+from pyramid.request import apply_request_extensions
+from pyramid.threadlocal import manager
+from snovault import DBSESSION
+from sqlalchemy import event
+
+from encoded.commands.benchmark_utils import format_rate
+
+
+EPILOG = __doc__
+
+DEFAULT_ITEM_TYPES = [
+    'reference_epigenome',
+    'experiment_series',
+    'experiment',
+]
+
+logger = logging.getLogger(__name__)
+
+
+class StatementCounter:
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def make_request(app):
+    request = app.request_factory.blank('/_benchmark_embed_loader')
+    request.registry = app.registry
+    request._stats = {}
+    apply_request_extensions(request)
+    request.datastore = 'database'
+    request.root = app.root_factory(request)
+    return request
+
+
+def list_paths(app, item_type, limit):
+    request = make_request(app)
+    manager.push({'request': request, 'registry': app.registry})
+    txn = transaction.begin()
+    try:
+        collection = request.root.by_item_type[item_type]
+        uuids = list(collection)
+        if limit:
+            uuids = uuids[:limit]
+        return ['/{}/'.format(uuid) for uuid in uuids]
+    finally:
+        txn.abort()
+        manager.pop()
+
+
+def render(app, path):
+    request = make_request(app)
+    manager.push({'request': request, 'registry': app.registry})
+    txn = transaction.begin()
+    try:
+        return request.embed(path, '@@index-data')
+    finally:
+        txn.abort()
+        manager.pop()
+
+
+def run(app, item_types, limit):
+    settings = app.registry.settings
+    engine = app.registry[DBSESSION].bind
+    counter = StatementCounter()
+    event.listen(engine, 'before_cursor_execute', counter)
+    try:
+        for item_type in item_types:
+            paths = list_paths(app, item_type, limit)
+            expected = None
+            for name, enabled in [('off', 'false'), ('on', 'true')]:
+                settings['embed_loader.enabled'] = enabled
+                counter.count = 0
+                results = []
+                start = time.perf_counter()
+                for path in paths:
+                    results.append(render(app, path))
+                elapsed = time.perf_counter() - start
+                if expected is None:
+                    expected = results
+                elif results != expected:
+                    logger.error('%s loader returned different index data for %s', name, item_type)
+                print(
+                    '{}\tloader={}\titems={}\ttotal={:.3f}s\titems/sec={}\tstatements/item={:.1f}'.format(
+                        item_type,
+                        name,
+                        len(paths),
+                        elapsed,
+                        format_rate(len(paths), elapsed),
+                        counter.count / len(paths) if paths else 0,
+                    )
+                )
+    finally:
+        settings.pop('embed_loader.enabled', None)
+        event.remove(engine, 'before_cursor_execute', counter)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Benchmark the embed loader", epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--app-name', help="Pyramid app name in configfile")
+    parser.add_argument(
+        '--item-type', action='append', dest='item_types',
+        help="Item type to render (repeatable, default: reference_epigenome, experiment_series, experiment)"
+    )
+    parser.add_argument('--limit', default=0, type=int, help="Render at most this many items per type")
+    parser.add_argument('config_uri', help="path to configfile")
+    args = parser.parse_args()
+
+    logging.basicConfig()
+    app = paster.get_app(args.config_uri, args.app_name)
+    run(app, args.item_types or DEFAULT_ITEM_TYPES, args.limit)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""\
+Benchmark metadata.tsv generation with and without batch prefetching.
+
+Streams the response (nothing is buffered by the benchmark itself) and
+reports rows/sec and peak RSS for the serial path and the prefetching path.
+
+Examples
+
+    %(prog)s development.ini --app-name app "/metadata/?type=Experiment&status=released"
+
+    %(prog)s development.ini --app-name app --workers 4 --buffer-size 500 \\
+        "/metadata/?type=Experiment&cart=/carts/my-cart/"
+
+"""
+import logging
+
+from pyramid import paster
+from webob import Request
+
+from encoded.commands.benchmark_utils import format_bytes
+from encoded.commands.benchmark_utils import format_rate
+from encoded.commands.benchmark_utils import measure
+from encoded.reports.metadata import MetadataReport
+
+
+EPILOG = __doc__
+
+logger = logging.getLogger(__name__)
+
+
+def stream_rows(app, path, username):
+    request = Request.blank(
+        path,
+        environ={
+            'REMOTE_USER': username,
+            'HTTP_ACCEPT': 'text/tsv',
+        }
+    )
+    status, headers, app_iter = request.call_application(app)
+    rows = 0
+    try:
+        for chunk in app_iter:
+            rows += chunk.count(b'\n')
+    finally:
+        if hasattr(app_iter, 'close'):
+            app_iter.close()
+    return rows
+
+
+def run(app, path, username, workers, buffer_size, repeat):
+    settings = app.registry.settings
+    modes = [
+        ('serial', 0),
+        ('prefetch', workers),
+    ]
+    for name, prefetch_workers in modes:
+        settings[MetadataReport.PREFETCH_WORKERS_SETTING] = prefetch_workers
+        settings[MetadataReport.PREFETCH_BUFFER_SIZE_SETTING] = buffer_size
+        for n in range(repeat):
+            rows, elapsed, peak_rss = measure(stream_rows, app, path, username)
+            print(
+                '{}\trun={}\trows={}\telapsed={:.2f}s\trows/sec={}\tpeak_rss={}'.format(
+                    name,
+                    n + 1,
+                    rows,
+                    elapsed,
+                    format_rate(rows, elapsed),
+                    format_bytes(peak_rss),
+                )
+            )
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Benchmark metadata.tsv generation", epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--app-name', help="Pyramid app name in configfile")
+    parser.add_argument('--username', '-u', default='TEST', help="User uuid/email")
+    parser.add_argument('--workers', default=2, type=int, help="Prefetch workers")
+    parser.add_argument('--buffer-size', default=1000, type=int, help="Hits buffered per batch")
+    parser.add_argument('--repeat', default=1, type=int, help="Runs per mode")
+    parser.add_argument('config_uri', help="path to configfile")
+    parser.add_argument('path', help="metadata path to benchmark")
+    args = parser.parse_args()
+
+    logging.basicConfig()
+    app = paster.get_app(args.config_uri, args.app_name)
+    run(app, args.path, args.username, args.workers, args.buffer_size, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""\
+Benchmark generate-ontology's closure and slim computation.
+
+Builds a synthetic ontology DAG (every term has one to three data links to
+terms near its parent, some develops_from links and a few cycles, and the
+slim terms are at the top) and times setSlims over all of it against the
+previous per-term BFS on a sample of terms, extrapolated to all terms.
+The sample's slim closures are checked to match.
+
+Examples
+
+    %(prog)s
+
+    %(prog)s --terms 100000 --baseline-terms 2000
+
+"""
+import copy
+import random
+import time
+
+from encoded.commands.benchmark_utils import format_rate
+from encoded.commands.generate_ontology import getTermStructure
+from encoded.commands.generate_ontology import setSlims
+from encoded.commands.generate_ontology import slimBits
+from encoded.commands.generate_ontology import slimClosures
+from encoded.commands.generate_ontology import slimTypes
+
+
+EPILOG = __doc__
+
+
+def synthetic_terms(count, seed=0):
+    rng = random.Random(seed)
+    slim_term_ids = sorted(slimBits)
+    term_ids = slim_term_ids + [
+        'SYN:{:07d}'.format(n) for n in range(max(count - len(slim_term_ids), 0))
+    ]
+    terms = {}
+    for n, term_id in enumerate(term_ids):
+        term = getTermStructure()
+        if n:
+            # A tree of about four children per term, with a second and
+            # third parent for some terms from near their first parent.
+            parent = (n - 1) // 4
+            term['data'] = [term_ids[parent]]
+            for link in range(rng.choice([0, 0, 1, 2])):
+                term['data'].append(term_ids[max(0, parent - rng.randrange(100))])
+            term['data'] = list(set(term['data']))
+            if rng.random() < 0.2:
+                term['develops_from'] = [term_ids[max(0, parent - rng.randrange(100))]]
+            if rng.random() < 0.001:
+                # Occasional cycle with the first parent.
+                terms[term_ids[parent]]['data'].append(term_id)
+        terms[term_id] = term
+    for term in terms.values():
+        term['data_with_develops_from'] = list(set(term['data']) | set(term['develops_from']))
+    return terms
+
+
+def iterativeChildren(nodes, terms, closure):
+    """ The per-term BFS generate-ontology used before slimClosures """
+    if closure == 'data':
+        data = 'data'
+    else:
+        data = 'data_with_develops_from'
+    results = []
+    while 1:
+        newNodes = []
+        if len(nodes) == 0:
+            break
+        for node in nodes:
+            results.append(node)
+            if terms[node][data]:
+                for child in terms[node][data]:
+                    if child not in results:
+                        newNodes.append(child)
+        nodes = list(set(newNodes))
+    return list(set(results))
+
+
+def baseline_slims(term_id, terms):
+    closure = iterativeChildren(terms[term_id]['data'], terms, 'data') + [term_id]
+    closure_with_develops_from = iterativeChildren(
+        terms[term_id]['data_with_develops_from'], terms, 'data_with_develops_from'
+    ) + [term_id]
+    for slim_type, slim_terms in slimTypes:
+        search = closure_with_develops_from if slim_type == 'developmental' else closure
+        [slim_terms[slim_term] for slim_term in slim_terms if slim_term in search]
+    return closure, closure_with_develops_from
+
+
+def closure_bits(closure):
+    bits = 0
+    for term_id in closure:
+        bits |= slimBits.get(term_id, 0)
+    return bits
+
+
+def run(count, baseline_count, seed):
+    terms = synthetic_terms(count, seed)
+    print('terms={}\tlinks={}'.format(
+        len(terms), sum(len(term['data_with_develops_from']) for term in terms.values())
+    ))
+
+    sample = random.Random(seed).sample(sorted(terms), min(baseline_count, len(terms)))
+    start = time.perf_counter()
+    baseline = {term_id: baseline_slims(term_id, terms) for term_id in sample}
+    elapsed = time.perf_counter() - start
+    print('baseline\tterms={}\telapsed={:.3f}s\tterms/sec={}\testimated_all={:.1f}s'.format(
+        len(sample), elapsed, format_rate(len(sample), elapsed), elapsed * len(terms) / len(sample)
+    ))
+
+    closures = slimClosures(terms, 'data', slimBits)
+    closures_with_develops_from = slimClosures(terms, 'data_with_develops_from', slimBits)
+    for term_id, (closure, closure_with_develops_from) in baseline.items():
+        if (
+            closures[term_id] != closure_bits(closure)
+            or closures_with_develops_from[term_id] != closure_bits(closure_with_develops_from)
+        ):
+            raise ValueError('Slim closures of {} differ'.format(term_id))
+
+    terms = copy.deepcopy(terms)
+    start = time.perf_counter()
+    setSlims(terms)
+    elapsed = time.perf_counter() - start
+    print('setSlims\tterms={}\telapsed={:.3f}s\tterms/sec={}'.format(
+        len(terms), elapsed, format_rate(len(terms), elapsed)
+    ))
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Benchmark ontology closure computation", epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--terms', default=100000, type=int, help="Terms in the synthetic ontology")
+    parser.add_argument(
+        '--baseline-terms', default=1000, type=int,
+        help="Terms to time the previous implementation on"
+    )
+    parser.add_argument('--seed', default=0, type=int, help="Random seed")
+    args = parser.parse_args()
+    run(args.terms, args.baseline_terms, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""\
+Benchmark region search queries on many peak files.
+
+Builds the experiment query region_search sends for 1x to 10x
+MAX_CLAUSES_FOR_ES file uuids (indexed file uuids, padded with random
+ones) and runs it against Elasticsearch, reporting the request body
+size, Elasticsearch's took and wall time per size. The first MAX_CLAUSES_FOR_ES
+uuids alone (what region search used to truncate to) are run as the
+baseline.
+
+Examples
+
+    %(prog)s development.ini --app-name app
+
+    %(prog)s development.ini --app-name app --multiples 1 5 10 --repeat 5
+
+"""
+import json
+import logging
+import time
+import uuid
+
+from elasticsearch.helpers import scan
+from pyramid import paster
+from snovault.elasticsearch.indexer import MAX_CLAUSES_FOR_ES
+from snovault.elasticsearch.interfaces import ELASTIC_SEARCH
+
+from encoded.region_search import _FACETS
+from encoded.region_search import get_files_query
+from encoded.region_search import set_facets
+
+
+EPILOG = __doc__
+
+logger = logging.getLogger(__name__)
+
+PRINCIPALS = ['system.Everyone']
+
+
+def get_file_uuids(es, count):
+    file_uuids = []
+    for hit in scan(es, index='file', query={'_source': False}, size=1000):
+        file_uuids.append(hit['_id'])
+        if len(file_uuids) >= count:
+            break
+    while len(file_uuids) < count:
+        file_uuids.append(str(uuid.uuid4()))
+    return file_uuids
+
+
+def region_query(file_uuids):
+    query = get_files_query(file_uuids, PRINCIPALS)
+    query['aggs'] = set_facets(_FACETS, {}, PRINCIPALS, ['Experiment'])
+    return query
+
+
+def time_query(es, file_uuids, repeat):
+    start = time.perf_counter()
+    query = region_query(file_uuids)
+    build = time.perf_counter() - start
+    took = []
+    elapsed = []
+    for n in range(repeat):
+        start = time.perf_counter()
+        results = es.search(body=query, index='experiment', doc_type='experiment', size=25, request_timeout=60)
+        elapsed.append(time.perf_counter() - start)
+        took.append(results['took'])
+    return {
+        'body': len(json.dumps(query)),
+        'build': build,
+        'took': sorted(took)[len(took) // 2],
+        'elapsed': sorted(elapsed)[len(elapsed) // 2],
+        'total': results['hits']['total'],
+    }
+
+
+def run(app, multiples, repeat):
+    es = app.registry[ELASTIC_SEARCH]
+    file_uuids = get_file_uuids(es, max(multiples) * MAX_CLAUSES_FOR_ES)
+    runs = [('baseline', file_uuids[:MAX_CLAUSES_FOR_ES])] + [
+        ('{}x'.format(multiple), file_uuids[:multiple * MAX_CLAUSES_FOR_ES])
+        for multiple in multiples
+    ]
+    for name, run_uuids in runs:
+        stats = time_query(es, run_uuids, repeat)
+        print(
+            '{}\tfiles={}\tbody={:.1f}KB\tbuild={:.1f}ms\ttook={}ms\telapsed={:.1f}ms\texperiments={}'.format(
+                name,
+                len(run_uuids),
+                stats['body'] / 1024,
+                1000 * stats['build'],
+                stats['took'],
+                1000 * stats['elapsed'],
+                stats['total'],
+            )
+        )
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Benchmark region search queries", epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--app-name', help="Pyramid app name in configfile")
+    parser.add_argument(
+        '--multiples', default=[1, 2, 5, 10], type=int, nargs='+',
+        help="Numbers of files to search, in multiples of MAX_CLAUSES_FOR_ES"
+    )
+    parser.add_argument('--repeat', default=3, type=int, help="Searches per size, median reported")
+    parser.add_argument('config_uri', help="path to configfile")
+    args = parser.parse_args()
+
+    logging.basicConfig()
+    app = paster.get_app(args.config_uri, args.app_name)
+    run(app, args.multiples, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""\
+Benchmark status filtering of a dataset's files.
+
+Compares reading each file's status by traversing to the item and
+copying its properties (the previous paths_filtered_by_status) with the
+bulk StatusIndex lookup, on the original_files of the given dataset.
+Reports paths/sec, database queries and peak RSS for each.
+
+Examples
+
+    %(prog)s development.ini --app-name app /experiments/ENCSR000AKS/
+
+    %(prog)s development.ini --app-name app --repeat 5 /experiments/ENCSR000AKS/
+
+"""
+import logging
+import transaction
+
+from pyramid import paster
+from pyramid.request import apply_request_extensions
+from pyramid.threadlocal import manager
+from pyramid.traversal import traverse
+
+from encoded.commands.benchmark_utils import format_bytes
+from encoded.commands.benchmark_utils import format_rate
+from encoded.commands.benchmark_utils import measure
+from encoded.types.base import StatusIndex
+
+
+EPILOG = __doc__
+
+logger = logging.getLogger(__name__)
+
+
+def make_request(app):
+    request = app.request_factory.blank('/_benchmark_status')
+    request.registry = app.registry
+    request._stats = {}
+    apply_request_extensions(request)
+    request.datastore = 'database'
+    request.root = app.root_factory(request)
+    return request
+
+
+def per_path_statuses(request, paths):
+    return [
+        traverse(request.root, path)['context'].__json__(request).get('status')
+        for path in paths
+    ]
+
+
+def bulk_statuses(request, paths):
+    return [
+        entry['status']
+        for entry in StatusIndex(request).get_many(paths)
+    ]
+
+
+def run(app, path, repeat):
+    modes = [
+        ('per-path', per_path_statuses),
+        ('bulk', bulk_statuses),
+    ]
+    request = make_request(app)
+    manager.push({'request': request, 'registry': app.registry})
+    txn = transaction.begin()
+    try:
+        paths = request.embed(path, '@@object').get('original_files', [])
+        print('{}\tfiles={}'.format(path, len(paths)))
+        expected = None
+        for name, get_statuses in modes:
+            for n in range(repeat):
+                # Start cold, without items cached by the previous run.
+                txn.abort()
+                txn = transaction.begin()
+                request._stats = {}
+                statuses, elapsed, peak_rss = measure(get_statuses, request, paths)
+                if expected is None:
+                    expected = statuses
+                elif statuses != expected:
+                    logger.error('%s returned different statuses', name)
+                print(
+                    '{}\trun={}\tpaths={}\telapsed={:.3f}s\tpaths/sec={}\tdb_queries={}\tpeak_rss={}'.format(
+                        name,
+                        n + 1,
+                        len(paths),
+                        elapsed,
+                        format_rate(len(paths), elapsed),
+                        request._stats.get('db_count', 0),
+                        format_bytes(peak_rss),
+                    )
+                )
+    finally:
+        txn.abort()
+        manager.pop()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Benchmark status filtering", epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--app-name', help="Pyramid app name in configfile")
+    parser.add_argument('--repeat', default=1, type=int, help="Runs per mode")
+    parser.add_argument('config_uri', help="path to configfile")
+    parser.add_argument('path', help="dataset path, e.g. /experiments/ENCSR000AKS/")
+    args = parser.parse_args()
+
+    logging.basicConfig()
+    app = paster.get_app(args.config_uri, args.app_name)
+    run(app, args.path, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""\
+Shared helpers for the benchmark commands.
+"""
+import psutil
+import threading
+import time
+
+
+class PeakRSSMonitor:
+    '''
+    Samples the resident set size of the current process in a
+    background thread and records the high-water mark.
+    '''
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak_rss = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stopped.is_set():
+            self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.peak_rss = self.process.memory_info().rss
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stopped.set()
+        self._thread.join()
+        self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+
+
+def measure(fn, *args, **kwargs):
+    '''
+    Runs fn and returns (result, elapsed seconds, peak rss in bytes).
+    '''
+    with PeakRSSMonitor() as monitor:
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+    return result, elapsed, monitor.peak_rss
+
+
+def format_rate(count, elapsed):
+    if not elapsed:
+        return 'n/a'
+    return '{:.1f}/s'.format(count / elapsed)
+
+
+def format_bytes(value):
+    return '{:.1f} MB'.format(value / (1024 ** 2))
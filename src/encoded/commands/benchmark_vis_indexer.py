@@ -0,0 +1,113 @@
+"""\
+Benchmark vis indexing serially and with a pool of vis indexer processes.
+
+Rebuilds the vis_blobs of the visualizable datasets in Elasticsearch
+(e.g. the test inserts indexed by dev-servers) once per process count
+and reports uuids and vis_blobs written per second. Pool processes are
+started before timing. vis_blobs are overwritten with the same content;
+the vis indexer state is not touched.
+
+Examples
+
+    %(prog)s development.ini --app-name app
+
+    %(prog)s development.ini --app-name app --processes 1 2 4 8 --limit 5000
+
+"""
+import logging
+import time
+
+from pyramid import paster
+from pyramid.request import apply_request_extensions
+from pyramid.threadlocal import manager
+
+from encoded.commands.benchmark_utils import format_rate
+from encoded.vis_indexer import MPVisIndexer
+from encoded.vis_indexer import VisIndexer
+from encoded.vis_indexer import all_visualizable_uuids
+
+
+EPILOG = __doc__
+
+logger = logging.getLogger(__name__)
+
+
+class UnrecordedState:
+    def viscached_uuids(self, uuids):
+        pass
+
+
+def make_request(app):
+    request = app.request_factory.blank('/_benchmark_vis_indexer')
+    request.registry = app.registry
+    request._stats = {}
+    apply_request_extensions(request)
+    request.datastore = 'elasticsearch'
+    request.root = app.root_factory(request)
+    return request
+
+
+def make_indexer(registry, processes):
+    if processes > 1:
+        indexer = MPVisIndexer(registry, processes=processes)
+    else:
+        indexer = VisIndexer(registry)
+    indexer.state = UnrecordedState()
+    return indexer
+
+
+def run(app, processes_list, limit):
+    request = make_request(app)
+    manager.push({'request': request, 'registry': app.registry})
+    try:
+        uuids = all_visualizable_uuids(app.registry)
+        if limit:
+            uuids = uuids[:limit]
+        print('uuids={}'.format(len(uuids)))
+        for processes in processes_list:
+            indexer = make_indexer(app.registry, processes)
+            try:
+                # Start the pool's processes outside the measurement.
+                indexer.update_objects(request, uuids[:processes], None)
+                start = time.perf_counter()
+                errors = indexer.update_objects(request, uuids, None)
+                elapsed = time.perf_counter() - start
+            finally:
+                indexer.shutdown()
+            print(
+                'processes={}\tuuids={}\telapsed={:.3f}s\tuuids/sec={}\tvis_blobs={}\tvis_blobs/sec={}\terrors={}'.format(
+                    processes,
+                    len(uuids),
+                    elapsed,
+                    format_rate(len(uuids), elapsed),
+                    indexer.flush_stats.get('written', 0),
+                    format_rate(indexer.flush_stats.get('written', 0), elapsed),
+                    len(errors) + indexer.flush_stats.get('errors', 0),
+                )
+            )
+    finally:
+        manager.pop()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Benchmark the multiprocess vis indexer", epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--app-name', help="Pyramid app name in configfile")
+    parser.add_argument(
+        '--processes', default=[1, 2, 4], type=int, nargs='+',
+        help="Numbers of vis indexer processes to time"
+    )
+    parser.add_argument('--limit', default=0, type=int, help="Index at most this many uuids")
+    parser.add_argument('config_uri', help="path to configfile")
+    args = parser.parse_args()
+
+    logging.basicConfig()
+    app = paster.get_app(args.config_uri, args.app_name)
+    run(app, args.processes, args.limit)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""\
+Convert ontology.json to the compact, memory-mapped ontology the app loads.
+
+generate-ontology writes both files; run this after downloading an
+ontology.json. Reports the time to load each file, and with --verify
+checks that every term reads back the same.
+
+Examples
+
+    %(prog)s
+
+    %(prog)s ontology-2022-11-01.json ontology.bin --verify
+
+"""
+import json
+import logging
+import os
+import time
+
+from encoded.ontology_store import OntologyStore
+from encoded.ontology_store import write_ontology_store
+
+
+EPILOG = __doc__
+
+logger = logging.getLogger(__name__)
+
+
+def run(json_path, store_path, verify=False):
+    start = time.perf_counter()
+    with open(json_path) as f:
+        ontology = json.load(f)
+    json_load = time.perf_counter() - start
+    write_ontology_store(ontology, store_path)
+    start = time.perf_counter()
+    store = OntologyStore(store_path)
+    store_load = time.perf_counter() - start
+    print(
+        'terms={}\tjson={:.1f}MB\tjson_load={:.3f}s\tstore={:.1f}MB\tstore_load={:.3f}s'.format(
+            len(store),
+            os.path.getsize(json_path) / 2 ** 20,
+            json_load,
+            os.path.getsize(store_path) / 2 ** 20,
+            store_load,
+        )
+    )
+    if verify:
+        for term_id, term in ontology.items():
+            if dict(store[term_id]) != term:
+                raise ValueError('{} differs in {}'.format(term_id, store_path))
+        if len(store) != len(ontology):
+            raise ValueError('{} has {} terms, expected {}'.format(store_path, len(store), len(ontology)))
+        print('verified')
+    store.close()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Convert ontology.json to the compact ontology", epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('json_path', nargs='?', default='ontology.json', help="ontology.json to convert")
+    parser.add_argument('store_path', nargs='?', default='ontology.bin', help="Compact ontology to write")
+    parser.add_argument('--verify', action='store_true', help="Check every term reads back the same")
+    args = parser.parse_args()
+
+    logging.basicConfig()
+    run(args.json_path, args.store_path, args.verify)
+
+
+if __name__ == '__main__':
+    main()
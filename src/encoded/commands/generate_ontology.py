@@ -6,6 +6,8 @@ from .ntr_terms import (
     ntr_biosamples
 )
 from .manual_slims import slim_shims
+from functools import lru_cache
+from encoded.ontology_store import write_ontology_store
 import json
 
 EPILOG = __doc__
@@ -510,54 +512,111 @@ def splitNameFromNamespace(aUri):
     return (name, ns)
 
 
-def iterativeChildren(nodes, terms, closure):
-    if closure == 'data':
-        data = 'data'
-    else:
-        data = 'data_with_develops_from'
-    results = []
-    while 1:
-        newNodes = []
-        if len(nodes) == 0:
-            break
-        for node in nodes:
-            results.append(node)
-            if terms[node][data]:
-                for child in terms[node][data]:
-                    if child not in results:
-                        newNodes.append(child)
-        nodes = list(set(newNodes))
-    return list(set(results))
+def slimClosures(terms, data, slimBits):
+    ''' Map every term to the slimBits of the terms in its closure, i.e.
+    the term itself and every term reachable from it over terms[term][data].
+
+    The closures are computed once over the whole graph. Tarjan's
+    algorithm finishes a strongly connected component only after every
+    component reachable from it, so the component's closure is its
+    members' bits or-ed with the closures of the components it reaches.
+    '''
+
+    def successors(node):
+        term = terms.get(node)
+        return term[data] if term else []
+
+    closures = {}
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    for root in terms:
+        if root in index:
+            continue
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(successors(root)))]
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in index:
+                    index[child] = lowlink[child] = len(index)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(successors(child))))
+                    break
+                if child in on_stack:
+                    lowlink[node] = min(lowlink[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] != index[node]:
+                    continue
+                component = set()
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.add(member)
+                    if member == node:
+                        break
+                closure = 0
+                for member in component:
+                    closure |= slimBits.get(member, 0)
+                    for child in successors(member):
+                        if child not in component:
+                            closure |= closures[child]
+                for member in component:
+                    closures[member] = closure
+    return closures
+
+
+slimTypes = [
+    ('system', system_slims),
+    ('organ', organ_slims),
+    ('cell', cell_slims),
+    ('developmental', developental_slims),
+    ('assay', assay_slims),
+    ('category', category_slims),
+    ('objective', objective_slims),
+    ('type', type_slims),
+]
+
+# One bit per slim of every slimType, in the order of the slimType's slims
+slimBits = {}
+slimMasks = {}
+slimNames = []
+for slimType, slimTerms in slimTypes:
+    slimMasks[slimType] = 0
+    for slimTerm, slimName in slimTerms.items():
+        bit = 1 << len(slimNames)
+        slimBits[slimTerm] = slimBits.get(slimTerm, 0) | bit
+        slimMasks[slimType] |= bit
+        slimNames.append(slimName)
+
+
+@lru_cache(maxsize=None)
+def closureSlims(bits):
+    ''' Slim names of the set bits, in bit order '''
+    slims = []
+    while bits:
+        bit = bits & -bits
+        slims.append(slimNames[bit.bit_length() - 1])
+        bits ^= bit
+    return tuple(slims)
 
 
 def getSlims(goid, terms, slimType):
     ''' Get Slims '''
 
-    slims = []
-    slimTerms = {}
     if slimType == 'developmental':
-        slimTerms = developental_slims
-    elif slimType == 'organ':
-        slimTerms = organ_slims
-    elif slimType == 'cell':
-        slimTerms = cell_slims
-    elif slimType == 'system':
-        slimTerms = system_slims
-    elif slimType == 'assay':
-        slimTerms = assay_slims
-    elif slimType == 'category':
-        slimTerms = category_slims
-    elif slimType == 'objective':
-        slimTerms = objective_slims
-    elif slimType == 'type':
-        slimTerms = type_slims
-    for slimTerm in slimTerms:
-        if slimType == 'developmental':
-            if slimTerm in terms[goid]['closure_with_develops_from']:
-                slims.append(slimTerms[slimTerm])
-        else:
-            if slimTerm in terms[goid]['closure']:
-                slims.append(slimTerms[slimTerm])
+        closure = terms[goid]['closure_with_develops_from']
+    else:
+        closure = terms[goid]['closure']
+    slims = list(closureSlims(closure & slimMasks[slimType]))
 
     if slim_shims.get(slimType, {}):
         # Overrides all Ontology based-slims
@@ -569,6 +628,27 @@ def getSlims(goid, terms, slimType):
     return slims
 
 
+def setSlims(terms):
+    ''' Set every term's slims from the closures of its data links '''
+
+    closures = slimClosures(terms, 'data', slimBits)
+    closures_with_develops_from = slimClosures(terms, 'data_with_develops_from', slimBits)
+    for term in terms:
+        terms[term]['closure'] = closures[term]
+        terms[term]['closure_with_develops_from'] = closures_with_develops_from[term]
+
+        terms[term]['systems'] = getSlims(term, terms, 'system')
+        terms[term]['organs'] = getSlims(term, terms, 'organ')
+        terms[term]['cells'] = getSlims(term, terms, 'cell')
+        terms[term]['developmental'] = getSlims(term, terms, 'developmental')
+        terms[term]['assay'] = getSlims(term, terms, 'assay')
+        terms[term]['category'] = getSlims(term, terms, 'category')
+        terms[term]['objectives'] = getSlims(term, terms, 'objective')
+        terms[term]['types'] = getSlims(term, terms, 'type')
+
+        del terms[term]['closure'], terms[term]['closure_with_develops_from']
+
+
 def getTermStructure():
     return {
         'id': '',
@@ -726,29 +806,8 @@ def main():
         terms[term]['data'] = list(set(terms[term]['parents']) | set(terms[term]['part_of']) | set(terms[term]['derives_from']) | set(terms[term]['achieves_planned_objective']))
         terms[term]['data_with_develops_from'] = list(set(terms[term]['data']) | set(terms[term]['develops_from']))
 
-    for term in terms:
-        words = iterativeChildren(terms[term]['data'], terms, 'data')
-        for word in words:
-            terms[term]['closure'].append(word)
+    setSlims(terms)
 
-        d = iterativeChildren(terms[term]['data_with_develops_from'], terms, 'data_with_develops_from')
-        for dd in d:
-            terms[term]['closure_with_develops_from'].append(dd)
-       
-        terms[term]['closure'].append(term)
-        terms[term]['closure_with_develops_from'].append(term)
-
-        terms[term]['systems'] = getSlims(term, terms, 'system')
-        terms[term]['organs'] = getSlims(term, terms, 'organ')
-        terms[term]['cells'] = getSlims(term, terms, 'cell')
-        terms[term]['developmental'] = getSlims(term, terms, 'developmental')
-        terms[term]['assay'] = getSlims(term, terms, 'assay')
-        terms[term]['category'] = getSlims(term, terms, 'category')
-        terms[term]['objectives'] = getSlims(term, terms, 'objective')
-        terms[term]['types'] = getSlims(term, terms, 'type')
-
-        del terms[term]['closure'], terms[term]['closure_with_develops_from']
-    
     for term in terms:
         del terms[term]['parents'], terms[term]['develops_from']
         del terms[term]['has_part'], terms[term]['achieves_planned_objective']
@@ -758,6 +817,7 @@ def main():
     terms.update(ntr_biosamples)
     with open('ontology.json', 'w') as outfile:
         json.dump(terms, outfile)
+    write_ontology_store(terms, 'ontology.bin')
 
 
 if __name__ == '__main__':
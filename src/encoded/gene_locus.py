@@ -0,0 +1,370 @@
+import bisect
+import logging
+import threading
+import time
+
+from elasticsearch.helpers import scan
+from pyramid.events import ApplicationCreated
+from pyramid.events import subscriber
+from pyramid.settings import asbool
+from snovault import AfterModified
+from snovault import Created
+from snovault.elasticsearch.interfaces import ELASTIC_SEARCH
+from encoded.searches.caches import IndexerGeneration
+
+
+log = logging.getLogger(__name__)
+
+
+GENE_LOCUS_RESOLVER = 'gene_locus_resolver'
+
+DEFAULT_REFRESH_INTERVAL = 60 * 60
+DEFAULT_RETRY_INTERVAL = 60
+DEFAULT_SUGGEST_LIMIT = 10
+
+GENE_INDEX = 'gene'
+
+GENE_FIELDS = [
+    '@id',
+    'symbol',
+    'title',
+    'dbxrefs',
+    'locations',
+]
+
+# Genes anyone can see that have coordinates, as the /search/ subrequest
+# this replaces would return them to an anonymous user.
+GENE_QUERY = {
+    'query': {
+        'bool': {
+            'filter': [
+                {'terms': {'principals_allowed.view': ['system.Everyone']}},
+                {'exists': {'field': 'embedded.locations.assembly'}},
+            ]
+        }
+    }
+}
+
+
+def includeme(config):
+    config.scan(__name__)
+    settings = config.registry.settings
+    config.registry[GENE_LOCUS_RESOLVER] = GeneLocusResolver(
+        config.registry,
+        refresh_interval=float(settings.get('gene_locus.refresh_interval', DEFAULT_REFRESH_INTERVAL)),
+        retry_interval=float(settings.get('gene_locus.retry_interval', DEFAULT_RETRY_INTERVAL)),
+    )
+
+
+class IntervalTree:
+    '''
+    Static interval tree over closed (start, end, value) intervals, laid
+    out as an implicit balanced search tree on the intervals sorted by
+    start. Every node keeps the largest end in its subtree, so an overlap
+    query skips subtrees ending before it and is O(log n + matches).
+    '''
+
+    def __init__(self, intervals):
+        intervals = sorted(intervals, key=lambda interval: (interval[0], interval[1]))
+        self.starts = [interval[0] for interval in intervals]
+        self.ends = [interval[1] for interval in intervals]
+        self.values = [interval[2] for interval in intervals]
+        self.max_ends = list(self.ends)
+        self._set_max_ends(0, len(intervals))
+
+    def _set_max_ends(self, lo, hi):
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        max_end = self.ends[mid]
+        for child in (self._set_max_ends(lo, mid), self._set_max_ends(mid + 1, hi)):
+            if child is not None and child > max_end:
+                max_end = child
+        self.max_ends[mid] = max_end
+        return max_end
+
+    def __len__(self):
+        return len(self.starts)
+
+    def overlapping(self, start, end):
+        '''
+        Values of the intervals overlapping [start, end], ordered by start.
+        '''
+        found = []
+        stack = [(0, len(self.starts))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if self.max_ends[mid] < start:
+                continue
+            if self.starts[mid] <= end:
+                if self.ends[mid] >= start:
+                    found.append(mid)
+                stack.append((mid + 1, hi))
+            stack.append((lo, mid))
+        return [self.values[n] for n in sorted(found)]
+
+
+class GeneLocusIndex:
+    '''
+    In-memory index of gene locations: symbol lookups, prefix suggestions
+    (by symbol or dbxref) and region to gene lookups per assembly, with one
+    interval tree per chromosome. Genes are dicts with GENE_FIELDS.
+    '''
+
+    def __init__(self, genes):
+        self._by_symbol = {}
+        self._symbols = {}
+        self._by_dbxref = {}
+        self._dbxrefs = {}
+        intervals = {}
+        self.gene_count = 0
+        for gene in genes:
+            self.gene_count += 1
+            symbol = gene.get('symbol', '').lower()
+            for location in gene.get('locations', []):
+                assembly = location['assembly']
+                genes_with_symbol = self._by_symbol.setdefault(assembly, {}).setdefault(symbol, [])
+                if not genes_with_symbol or genes_with_symbol[-1] is not gene:
+                    genes_with_symbol.append(gene)
+                    for dbxref in dbxref_keys(gene):
+                        self._by_dbxref.setdefault(assembly, {}).setdefault(dbxref, []).append(gene)
+                intervals.setdefault(assembly, {}).setdefault(location['chromosome'], []).append(
+                    (location['start'], location['end'], gene)
+                )
+        for assembly, symbols in self._by_symbol.items():
+            self._symbols[assembly] = sorted(symbols)
+        for assembly, dbxrefs in self._by_dbxref.items():
+            self._dbxrefs[assembly] = sorted(dbxrefs)
+        self._trees = {
+            assembly: {
+                chromosome: IntervalTree(chromosome_intervals)
+                for chromosome, chromosome_intervals in chromosomes.items()
+            }
+            for assembly, chromosomes in intervals.items()
+        }
+
+    def __len__(self):
+        return self.gene_count
+
+    def assemblies(self):
+        return sorted(self._by_symbol)
+
+    def genes(self, symbol, assembly):
+        return self._by_symbol.get(assembly, {}).get(symbol.lower(), [])
+
+    def locate(self, symbol, assembly):
+        '''
+        (chromosome, start, end) of the first gene with this symbol
+        (case-insensitive) located on the assembly, or None.
+        '''
+        for gene in self.genes(symbol, assembly):
+            for location in gene['locations']:
+                if location['assembly'] == assembly:
+                    return (location['chromosome'], location['start'], location['end'])
+        return None
+
+    def genes_in_region(self, assembly, chromosome, start, end):
+        tree = self._trees.get(assembly, {}).get(chromosome)
+        if tree is None:
+            return []
+        return tree.overlapping(start, end)
+
+    def suggest(self, text, assembly, limit=DEFAULT_SUGGEST_LIMIT):
+        '''
+        Genes located on the assembly whose symbol starts with text, the
+        exact match first and the rest alphabetically, then those with a
+        dbxref (e.g. HGNC:13723, or ENSG00000102974 without its prefix)
+        starting with text.
+        '''
+        prefix = text.lower()
+        if not prefix:
+            return []
+        suggestions = []
+        for keys, genes in (
+                (self._symbols.get(assembly, []), self._by_symbol.get(assembly, {})),
+                (self._dbxrefs.get(assembly, []), self._by_dbxref.get(assembly, {})),
+        ):
+            n = bisect.bisect_left(keys, prefix)
+            while n < len(keys) and keys[n].startswith(prefix) and len(suggestions) < limit:
+                for gene in genes[keys[n]]:
+                    if len(suggestions) < limit and all(gene is not found for found in suggestions):
+                        suggestions.append(gene)
+                n += 1
+        return suggestions
+
+
+def dbxref_keys(gene):
+    '''
+    Lower case keys a gene is suggested by for its dbxrefs: each whole
+    dbxref, and its id without the prefix when that has one of its own
+    (ENSEMBL:ENSG00000102974 gives ensg00000102974).
+    '''
+    keys = set()
+    for dbxref in gene.get('dbxrefs', []):
+        dbxref = dbxref.lower()
+        keys.add(dbxref)
+        keys.add(dbxref.split(':')[-1])
+    return keys
+
+
+def iter_indexed_genes(es):
+    for hit in scan(
+            es,
+            index=GENE_INDEX,
+            query=dict(GENE_QUERY, _source=[f'embedded.{field}' for field in GENE_FIELDS]),
+            size=1000,
+            request_timeout=60,
+    ):
+        yield hit['_source']['embedded']
+
+
+def count_indexed_genes(es):
+    return es.count(index=GENE_INDEX, body=GENE_QUERY)['count']
+
+
+class GeneLocusResolver:
+    '''
+    Holds the process's GeneLocusIndex. It is built from the indexed
+    Gene items in a background thread at startup and rebuilt once an
+    indexing cycle has completed after Gene items changed: edited through
+    this process, created or deleted anywhere (the number of indexed
+    genes changed), or refresh_interval after the last build for edits
+    made through other processes. Lookups never wait for a build; until
+    the first one succeeds get() returns None.
+    '''
+
+    def __init__(
+            self,
+            registry,
+            refresh_interval=DEFAULT_REFRESH_INTERVAL,
+            retry_interval=DEFAULT_RETRY_INTERVAL,
+            generation=None
+    ):
+        self.registry = registry
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self.generation = generation or IndexerGeneration(registry)
+        self._index = None
+        self._loaded_generation = None
+        self._loaded_at = None
+        self._counted_generation = None
+        self._failed_at = None
+        self._changed = False
+        self._loading = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        '''
+        Builds a new index from Elasticsearch and swaps it in. Returns
+        False if a build is already running or this one failed.
+        '''
+        with self._lock:
+            if self._loading:
+                return False
+            self._loading = True
+            self._changed = False
+        started = time.monotonic()
+        try:
+            generation = self.generation.get()
+            es = self.registry[ELASTIC_SEARCH]
+            index = GeneLocusIndex(iter_indexed_genes(es))
+        except Exception:
+            log.warning('Unable to load gene locations', exc_info=True)
+            with self._lock:
+                self._failed_at = time.monotonic()
+                self._loading = False
+            return False
+        with self._lock:
+            self._index = index
+            self._loaded_generation = generation
+            self._counted_generation = generation
+            self._loaded_at = time.monotonic()
+            self._failed_at = None
+            self._loading = False
+        log.info(
+            'Loaded %d gene locations in %.2fs',
+            len(index),
+            self._loaded_at - started,
+        )
+        return True
+
+    def load_in_background(self):
+        if self._loading:
+            return
+        if self._failed_at is not None and time.monotonic() - self._failed_at < self.retry_interval:
+            return
+        threading.Thread(target=self.load, daemon=True).start()
+
+    def mark_changed(self):
+        self._changed = True
+
+    def needs_refresh(self):
+        if self._index is None:
+            return True
+        generation = self.generation.get()
+        if generation is None or generation == self._loaded_generation:
+            return False
+        if self._changed or time.monotonic() - self._loaded_at >= self.refresh_interval:
+            return True
+        if generation == self._counted_generation:
+            return False
+        self._counted_generation = generation
+        try:
+            return count_indexed_genes(self.registry[ELASTIC_SEARCH]) != len(self._index)
+        except Exception:
+            return False
+
+    def get(self):
+        '''
+        Returns the current GeneLocusIndex or None, starting a build in
+        the background if there is none yet or it is out of date.
+        '''
+        if self._index is None or self.needs_refresh():
+            self.load_in_background()
+        return self._index
+
+    def stats(self):
+        index = self._index
+        return {
+            'loaded': index is not None,
+            'genes': len(index) if index is not None else 0,
+            'assemblies': index.assemblies() if index is not None else [],
+            'generation': self._loaded_generation,
+            'age': round(time.monotonic() - self._loaded_at, 3) if self._loaded_at is not None else None,
+        }
+
+
+def get_gene_locus_index(request):
+    resolver = request.registry.get(GENE_LOCUS_RESOLVER)
+    if resolver is None:
+        return None
+    return resolver.get()
+
+
+def _gene_changed(event):
+    if getattr(event.object, 'item_type', None) != 'gene':
+        return
+    resolver = event.request.registry.get(GENE_LOCUS_RESOLVER)
+    if resolver is not None:
+        resolver.mark_changed()
+
+
+@subscriber(Created)
+def gene_created(event):
+    _gene_changed(event)
+
+
+@subscriber(AfterModified)
+def gene_modified(event):
+    _gene_changed(event)
+
+
+@subscriber(ApplicationCreated)
+def preload_gene_locations(event):
+    registry = event.app.registry
+    resolver = registry.get(GENE_LOCUS_RESOLVER)
+    if resolver is not None and asbool(registry.settings.get('gene_locus.preload', True)):
+        resolver.load_in_background()
@@ -1,10 +1,26 @@
 import json
+import os
+import threading
+import time
 import requests
 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
 
 REGISTRY_DATA_SERVICE = 'genomic_data_service'
+REGISTRY_DATA_SERVICE_CLIENT = 'genomic_data_service_client'
 REGION_SEARCH = '/region-search'
 
+DEFAULT_TIMEOUT = 10
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CACHE_SIZE = 1000
+DEFAULT_CACHE_TTL = 60 * 60
+# Searches that found nothing may start matching once the service's
+# data is updated, so they are only cached briefly.
+DEFAULT_NEGATIVE_CACHE_TTL = 60
+
 RNAGET_SEARCH_STREAM_URL = 'https://rnaget.encodeproject.org/rnaget-search-stream/'
 RNAGET_REPORT_URL = 'https://rnaget.encodeproject.org/rnaget-report/'
 
@@ -51,13 +67,114 @@ def set_status_and_parse_ndjson(response_field, results):
     }
 
 
-class GenomicDataService():
+def region_key(assembly, query=None, chrom=None, start=None, end=None, expand_kb=0):
+    '''
+    Cache key of a region search: (assembly, chrom, start, end, expand).
+    Searches by annotation (a gene name or rsID) have no coordinates yet
+    and are keyed on the lowercased query in place of the chromosome.
+    '''
+    if chrom and start and end:
+        return (assembly, chrom, int(start), int(end), int(expand_kb))
+    return (assembly, (query or '').lower(), None, None, int(expand_kb))
 
-    def __init__(self, registry, request):
-        self.path = registry.settings.get(REGISTRY_DATA_SERVICE)
-        self.request = request
 
-    def region_search(self, assembly, query=None, chrom=None, start=None, end=None, expand_kb=0):
+def is_empty_result(results):
+    '''
+    True for a search that found no coordinates or no regions.
+    '''
+    return not results.get('chr') or not results.get('regions_per_file')
+
+
+class RegionSearchCache():
+    '''
+    Thread-safe in-process LRU of region search results whose entries
+    expire ttl seconds (or the ttl given to set) after they were stored.
+    '''
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+        if not self.maxsize or not ttl:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class GenomicDataClient():
+    '''
+    Keep-alive client of the genomic data service shared by all requests
+    of a process. Connections are pooled per process (a forked worker
+    opens its own) and successful region searches are cached, for
+    negative_cache_ttl seconds only when they found nothing.
+    '''
+
+    def __init__(
+            self,
+            path,
+            timeout=DEFAULT_TIMEOUT,
+            pool_size=DEFAULT_POOL_SIZE,
+            cache_size=DEFAULT_CACHE_SIZE,
+            cache_ttl=DEFAULT_CACHE_TTL,
+            negative_cache_ttl=DEFAULT_NEGATIVE_CACHE_TTL
+    ):
+        self.path = path
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.negative_cache_ttl = negative_cache_ttl
+        self.cache = RegionSearchCache(maxsize=cache_size, ttl=cache_ttl)
+        self._session = None
+        self._session_pid = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        with self._session_lock:
+            if self._session is None or self._session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=self.pool_size,
+                    pool_maxsize=self.pool_size,
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+                self._session_pid = os.getpid()
+            return self._session
+
+    def _get_region(self, assembly, query=None, chrom=None, start=None, end=None, expand_kb=0):
         params = {
             'assembly': assembly,
             'query': query,
@@ -71,10 +188,121 @@ class GenomicDataService():
             params['start'] = start
             params['end']   = end
 
-        query_params = '&'.join([f'{k}={params[k]}' for k in params.keys()])
+        response = self.session.get(
+            f'{self.path}{REGION_SEARCH}',
+            params=params,
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()
 
-        url = f'{self.path}{REGION_SEARCH}?{query_params}'
+    def _cache_results(self, key, results):
+        if is_empty_result(results):
+            self.cache.set(key, results, ttl=self.negative_cache_ttl)
+        else:
+            self.cache.set(key, results)
 
-        results = requests.get(url, timeout=10).json()
+    def region_search(self, assembly, query=None, chrom=None, start=None, end=None, expand_kb=0):
+        key = region_key(assembly, query, chrom, start, end, expand_kb)
+        results = self.cache.get(key)
+        if results is None:
+            results = self._get_region(assembly, query, chrom, start, end, expand_kb)
+            self._cache_results(key, results)
+        return results
 
+    def batch_region_search(self, assembly, regions, expand_kb=0):
+        '''
+        Searches several regions and returns their results in the same
+        order. Each region is either an annotation (str) or a (chrom,
+        start, end) tuple. Cached regions are answered here and the rest
+        are searched concurrently over the pooled connections, at most
+        pool_size at a time. The first error is raised once all searches
+        are done.
+        '''
+        searches = [
+            {'query': region}
+            if isinstance(region, str) else
+            dict(zip(('chrom', 'start', 'end'), region))
+            for region in regions
+        ]
+        keys = [
+            region_key(assembly, expand_kb=expand_kb, **search)
+            for search in searches
+        ]
+        results = [self.cache.get(key) for key in keys]
+        missing = [n for n, result in enumerate(results) if result is None]
+        if not missing:
+            return results
+        with ThreadPoolExecutor(max_workers=min(self.pool_size, len(missing))) as executor:
+            futures = [
+                executor.submit(self._get_region, assembly, expand_kb=expand_kb, **searches[n])
+                for n in missing
+            ]
+        errors = [future.exception() for future in futures]
+        for n, future, error in zip(missing, futures, errors):
+            if error is None:
+                results[n] = future.result()
+                self._cache_results(keys[n], results[n])
+        for error in errors:
+            if error is not None:
+                raise error
         return results
+
+    def remember(self, assembly, query, expand_kb, results):
+        '''
+        Caches results found for an annotation by other means (e.g. the
+        coordinates of a gene) so the next search for it is answered here.
+        '''
+        self._cache_results(region_key(assembly, query, expand_kb=expand_kb), results)
+
+    def stats(self):
+        return {
+            'cached': len(self.cache),
+            'hits': self.cache.hits,
+            'misses': self.cache.misses,
+        }
+
+
+def get_genomic_data_client(registry):
+    '''
+    Returns the registry's GenomicDataClient, creating it on first use
+    from the genomic_data_service settings.
+    '''
+    client = registry.get(REGISTRY_DATA_SERVICE_CLIENT)
+    if client is None:
+        settings = registry.settings
+        client = registry[REGISTRY_DATA_SERVICE_CLIENT] = GenomicDataClient(
+            settings.get(REGISTRY_DATA_SERVICE),
+            timeout=float(settings.get('genomic_data_service.timeout', DEFAULT_TIMEOUT)),
+            pool_size=int(settings.get('genomic_data_service.pool_size', DEFAULT_POOL_SIZE)),
+            cache_size=int(settings.get('genomic_data_service.cache_size', DEFAULT_CACHE_SIZE)),
+            cache_ttl=float(settings.get('genomic_data_service.cache_ttl', DEFAULT_CACHE_TTL)),
+            negative_cache_ttl=float(
+                settings.get('genomic_data_service.negative_cache_ttl', DEFAULT_NEGATIVE_CACHE_TTL)
+            ),
+        )
+    return client
+
+
+class GenomicDataService():
+
+    def __init__(self, registry, request):
+        self.path = registry.settings.get(REGISTRY_DATA_SERVICE)
+        self.request = request
+        self.client = get_genomic_data_client(registry)
+
+    def region_search(self, assembly, query=None, chrom=None, start=None, end=None, expand_kb=0):
+        return self.client.region_search(
+            assembly,
+            query=query,
+            chrom=chrom,
+            start=start,
+            end=end,
+            expand_kb=expand_kb,
+        )
+
+    def batch_region_search(self, assembly, regions, expand_kb=0):
+        return self.client.batch_region_search(assembly, regions, expand_kb=expand_kb)
+
+    def remember(self, assembly, query, expand_kb, results):
+        self.client.remember(assembly, query, expand_kb, results)
@@ -0,0 +1,184 @@
+"""\
+Cache the database loaded from the test inserts.
+
+Loading the inserts through loadxl posts every item, which takes minutes.
+The loaded tables only change when the inserts, documents, schemas, types,
+upgraders or the loader change, so after a load into an empty database the
+tables are copied out (with COPY, in postgres' text format) to a directory
+named for a hash of those files, and later loads with the same hash copy
+them back in instead.
+
+The copy is made on the app's own database connection, so within the tests
+it is part of the open transaction the workbook fixtures roll back.
+Elasticsearch isn't snapshotted; the indexer indexes the restored
+transactions as it does loaded ones.
+"""
+from contextlib import contextmanager
+from pkg_resources import get_distribution
+from pkg_resources import resource_filename
+from snovault import DBSESSION
+from snovault.storage import Base
+from sqlalchemy import types
+from sqlalchemy.engine import Connection
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# Package paths whose content determines the loaded tables.
+SNAPSHOT_SOURCES = [
+    'tests/data/inserts',
+    'tests/data/documents',
+    'schemas',
+    'types',
+    'upgrade',
+    'loadxl.py',
+    'bulk_load.py',
+    'typedsheets.py',
+]
+
+# Columns left to their defaults on restore. A transaction's xid is that of
+# the database transaction it committed in, which the restore is.
+RESTORE_DEFAULTS = {
+    ('transactions', 'xid'),
+}
+
+
+def _source_files(path):
+    if os.path.isfile(path):
+        yield path
+        return
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames[:] = sorted(name for name in dirnames if name != '__pycache__')
+        for filename in sorted(filenames):
+            if not filename.endswith('.pyc'):
+                yield os.path.join(dirpath, filename)
+
+
+def _columns(table):
+    return [
+        column.name for column in table.columns
+        if (table.name, column.name) not in RESTORE_DEFAULTS
+    ]
+
+
+def snapshot_key(sources=None):
+    """ Hash of the files in sources and the table layout they're loaded into
+    """
+    if sources is None:
+        sources = [resource_filename('encoded', source) for source in SNAPSHOT_SOURCES]
+    digest = hashlib.sha256()
+    digest.update(get_distribution('snovault').version.encode('utf-8'))
+    for table in Base.metadata.sorted_tables:
+        digest.update(('\0%s(%s)' % (table.name, ','.join(_columns(table)))).encode('utf-8'))
+    for source in sources:
+        for filename in _source_files(source):
+            digest.update(('\0%s\0' % os.path.relpath(filename, source)).encode('utf-8'))
+            with open(filename, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+@contextmanager
+def raw_connection(app):
+    """ DBAPI connection to the app's database
+
+    Within the tests the app's session is bound to a connection with a
+    transaction open, which is used as is. Otherwise the work is committed.
+    """
+    bind = app.registry[DBSESSION].bind
+    if isinstance(bind, Connection):
+        yield bind.connection
+        return
+    connection = bind.raw_connection()
+    try:
+        yield connection
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+def is_empty(connection):
+    cursor = connection.cursor()
+    try:
+        cursor.execute('SELECT EXISTS (SELECT 1 FROM resources)')
+        return not cursor.fetchone()[0]
+    finally:
+        cursor.close()
+
+
+def dump_tables(connection, path):
+    """ Copy every table out to path, replacing it atomically
+    """
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    tmpdir = tempfile.mkdtemp(dir=parent, prefix='.tmp-')
+    cursor = connection.cursor()
+    try:
+        for table in Base.metadata.sorted_tables:
+            with open(os.path.join(tmpdir, table.name), 'w', encoding='utf-8') as f:
+                cursor.copy_expert('COPY %s (%s) TO STDOUT' % (
+                    table.name, ', '.join('"%s"' % column for column in _columns(table))
+                ), f)
+        try:
+            os.rename(tmpdir, path)
+        except OSError:
+            # Another process wrote the same snapshot first.
+            shutil.rmtree(tmpdir)
+    except BaseException:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        raise
+    finally:
+        cursor.close()
+
+
+def restore_tables(connection, path):
+    """ Copy the tables dumped to path into empty tables
+    """
+    cursor = connection.cursor()
+    try:
+        for table in Base.metadata.sorted_tables:
+            with open(os.path.join(path, table.name), encoding='utf-8') as f:
+                cursor.copy_expert('COPY %s (%s) FROM STDIN' % (
+                    table.name, ', '.join('"%s"' % column for column in _columns(table))
+                ), f)
+            for column in table.primary_key.columns:
+                if isinstance(column.type, types.Integer) and column.autoincrement:
+                    # Move serial keys' sequences past the restored rows.
+                    cursor.execute(
+                        'SELECT setval(pg_get_serial_sequence(%%s, %%s), COALESCE(MAX("%s"), 1), '
+                        'MAX("%s") IS NOT NULL) FROM %s' % (column.name, column.name, table.name),
+                        (table.name, column.name),
+                    )
+    finally:
+        cursor.close()
+
+
+def load_with_snapshot(app, cache_dir, load):
+    """ Restore the snapshot for the current sources, or load() and save one
+
+    Only an empty database is restored into or saved from. Returns whether
+    the snapshot was restored.
+    """
+    path = os.path.join(cache_dir, snapshot_key())
+    with raw_connection(app) as connection:
+        empty = is_empty(connection)
+        if empty and os.path.isdir(path):
+            start = time.time()
+            restore_tables(connection, path)
+            logger.info('Restored test data from %s in %.1fs', path, time.time() - start)
+            return True
+    load()
+    if empty:
+        with raw_connection(app) as connection:
+            dump_tables(connection, path)
+        logger.info('Saved test data to %s', path)
+    return False
@@ -1,9 +1,11 @@
 from past.builtins import basestring
+from .bulk_load import CUSTOM_ADD_TYPES
 from .typedsheets import cast_row_values
 from functools import reduce
 import io
 import logging
 import os.path
+import time
 
 text = type(u'')
 
@@ -11,6 +13,9 @@ DEFAULT_LOG_LEVEL = logging.INFO
 logger = logging.getLogger('encoded')
 logger.setLevel(DEFAULT_LOG_LEVEL)  # doesn't work to shut off sqla INFO
 
+# Rows per /_bulk_load request, each committed as one transaction
+BULK_LOAD_CHUNK_SIZE = 500
+
 
 ORDER = [
     'user',
@@ -459,6 +464,54 @@ def make_request(testapp, item_type, method):
     return component
 
 
+class BulkLoadResponse(object):
+    """ The result of one row of a bulk load, with the parts of a webtest
+    response that pipeline_logger uses.
+    """
+
+    def __init__(self, result):
+        self.status_int = result['status']
+        self.status = str(result['status'])
+        self.location = result.get('location')
+        self.json = result
+
+
+def make_bulk_request(testapp, item_type, method, chunk_size=None):
+    """ Load rows chunk_size at a time with one request to /_bulk_load
+
+    Rows are yielded in order once their chunk has been loaded.
+    """
+    if chunk_size is None:
+        chunk_size = BULK_LOAD_CHUNK_SIZE
+
+    def load(chunk):
+        loaded = [row for row in chunk if '_value' in row]
+        if loaded:
+            res = testapp.post_json('/_bulk_load', {
+                'item_type': item_type,
+                'method': method,
+                'rows': [{'url': row['_url'], 'value': row['_value']} for row in loaded],
+            })
+            for row, result in zip(loaded, res.json['results']):
+                row['_response'] = BulkLoadResponse(result)
+        return chunk
+
+    def component(rows):
+        chunk = []
+        for row in rows:
+            if not (row.get('_skip') or row.get('_errors') or not row.get('_url')):
+                row['_value'] = {
+                    k: v for k, v in row.items() if not k.startswith('_') and not k.startswith('@')
+                }
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield from load(chunk)
+                chunk = []
+        yield from load(chunk)
+
+    return component
+
+
 ##############################################################################
 # Logging
 
@@ -477,6 +530,7 @@ def trim(value):
 
 def pipeline_logger(item_type, phase):
     def component(rows):
+        start = time.time()
         created = 0
         updated = 0
         errors = 0
@@ -522,8 +576,10 @@ def pipeline_logger(item_type, phase):
             yield row
 
         loaded = created + updated
-        logger.info('Loaded %d of %d %s (phase %s). CREATED: %d, UPDATED: %d, SKIPPED: %d, ERRORS: %d' % (
-            loaded, count, item_type, phase, created, updated, skipped, errors))
+        elapsed = time.time() - start
+        logger.info('Loaded %d of %d %s (phase %s). CREATED: %d, UPDATED: %d, SKIPPED: %d, ERRORS: %d. %.2fs, %.1f rows/sec' % (
+            loaded, count, item_type, phase, created, updated, skipped, errors,
+            elapsed, count / elapsed if elapsed else 0))
 
     return component
 
@@ -613,7 +669,7 @@ def process(rows):
         pass
 
 
-def get_pipeline(testapp, docsdir, test_only, item_type, phase=None, method=None):
+def get_pipeline(testapp, docsdir, test_only, item_type, phase=None, method=None, bulk=False):
     pipeline = [
         skip_rows_with_all_key_value(test='skip'),
         skip_rows_with_all_key_value(_test='skip'),
@@ -640,10 +696,13 @@ def get_pipeline(testapp, docsdir, test_only, item_type, phase=None, method=None
         method = 'PUT'
         pipeline.extend(PHASE2_PIPELINES.get(item_type, []))
 
+    if method == 'POST' and item_type in CUSTOM_ADD_TYPES:
+        # /_bulk_load doesn't run type-specific POST views.
+        bulk = False
     pipeline.extend([
         request_url(item_type, method),
         remove_keys('uuid') if method in ('PUT', 'PATCH') else noop,
-        make_request(testapp, item_type, method),
+        make_bulk_request(testapp, item_type, method) if bulk else make_request(testapp, item_type, method),
         pipeline_logger(item_type, phase),
     ])
     return pipeline
@@ -888,7 +947,12 @@ PHASE2_PIPELINES = {
 }
 
 
-def load_all(testapp, filename, docsdir, log_level=None, test=False):
+def load_all(testapp, filename, docsdir, log_level=None, test=False, bulk=False):
+    """ Load every item type's sheet in two phases
+
+    With bulk, rows are validated and written BULK_LOAD_CHUNK_SIZE at a time
+    by /_bulk_load instead of with a POST or PUT per row.
+    """
     if log_level is not None:
         _reset_log_level(log_level)
     for item_type in ORDER:
@@ -897,7 +961,7 @@ def load_all(testapp, filename, docsdir, log_level=None, test=False):
         except ValueError:
             logger.error('Opening %s %s failed.', filename, item_type)
             continue
-        pipeline = get_pipeline(testapp, docsdir, test, item_type, phase=1)
+        pipeline = get_pipeline(testapp, docsdir, test, item_type, phase=1, bulk=bulk)
         process(combine(source, pipeline))
 
     for item_type in ORDER:
@@ -907,11 +971,16 @@ def load_all(testapp, filename, docsdir, log_level=None, test=False):
             source = read_single_sheet(filename, item_type)
         except ValueError:
             continue
-        pipeline = get_pipeline(testapp, docsdir, test, item_type, phase=2)
+        pipeline = get_pipeline(testapp, docsdir, test, item_type, phase=2, bulk=bulk)
         process(combine(source, pipeline))
 
 
-def load_test_data(app):
+def load_test_data(app, log_level=None):
+    """ Load the test inserts
+
+    With the load_test_data_cache setting, a snapshot of the tables loaded
+    from the same inserts is restored from there instead when it exists.
+    """
     from webtest import TestApp
     environ = {
         'HTTP_ACCEPT': 'application/json',
@@ -922,4 +991,13 @@ def load_test_data(app):
     from pkg_resources import resource_filename
     inserts = resource_filename('encoded', 'tests/data/inserts/')
     docsdir = [resource_filename('encoded', 'tests/data/documents/')]
-    load_all(testapp, inserts, docsdir)
+
+    def load():
+        load_all(testapp, inserts, docsdir, log_level=log_level, bulk=True)
+
+    cache_dir = app.registry.settings.get('load_test_data_cache')
+    if not cache_dir:
+        load()
+        return
+    from .inserts_snapshot import load_with_snapshot
+    load_with_snapshot(app, cache_dir, load)
@@ -0,0 +1,268 @@
+"""\
+Compact, read-only, memory-mapped ontology.
+
+ontology.json maps term ids to dicts of a term's name and its slims, e.g.
+
+    {"UBERON:0002048": {"name": "lung", "organs": ["lung"], ...}, ...}
+
+Loading it gives every app, indexer and vis indexer process its own copy
+of a few hundred thousand small dicts, lists and strings. The compact
+store holds the same data in one file that is memory-mapped read-only,
+so the pages are shared by all processes on a host and loading it only
+reads the header.
+
+File layout, all integers little-endian uint32:
+
+    header      MAGIC, strings, fields, terms, values, slots
+    strings     string offsets (strings + 1) into the string data
+    fields      string id of each field name
+    kinds       KIND_STRING or KIND_LIST for each field
+    terms       string id of each term id, sorted by their utf-8 bytes
+    slots       open addressing hash table of term index + 1 (0 is empty)
+                by the crc32 of the term id
+    cells       index into values of each term's fields (terms * fields + 1),
+                MISSING is set when the term has no such field
+    values      string ids, one for a string field and one per list item
+    string data interned utf-8 strings
+
+OntologyStore is a Mapping of term ids to OntologyTerm, itself a Mapping of
+field names to a str or a new list of str, so it can be used in place of
+the ontology.json dict.
+"""
+import array
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+from collections.abc import Mapping
+from functools import lru_cache
+
+
+log = logging.getLogger(__name__)
+
+
+MAGIC = b'ENCONT01'
+KIND_STRING = 0
+KIND_LIST = 1
+MISSING = 1 << 31
+TERM_INDEX_CACHE_SIZE = 16384
+
+_HEADER = struct.Struct('<8s5I')
+
+
+def _uint_array(values):
+    return struct.pack('<%dI' % len(values), *values)
+
+
+def write_ontology_store(ontology, path):
+    """Write the ontology dict to path in the compact format."""
+    strings = {}
+
+    def intern(value):
+        if not isinstance(value, str):
+            raise ValueError('Ontology values must be strings: {!r}'.format(value))
+        string_id = strings.get(value)
+        if string_id is None:
+            string_id = strings[value] = len(strings)
+        return string_id
+
+    kinds = {}
+    for term_id, term in ontology.items():
+        for field, value in term.items():
+            kind = KIND_LIST if isinstance(value, list) else KIND_STRING
+            if kinds.setdefault(field, kind) != kind:
+                raise ValueError(
+                    'Ontology field {} mixes strings and lists at {}'.format(field, term_id)
+                )
+    fields = sorted(kinds)
+    term_ids = sorted(ontology, key=lambda term_id: term_id.encode('utf-8'))
+    field_names = [intern(field) for field in fields]
+    terms = [intern(term_id) for term_id in term_ids]
+    n_slots = 1
+    while n_slots < 2 * len(terms):
+        n_slots *= 2
+    slots = [0] * n_slots
+    for term_index, term_id in enumerate(term_ids):
+        slot = zlib.crc32(term_id.encode('utf-8')) & (n_slots - 1)
+        while slots[slot]:
+            slot = (slot + 1) & (n_slots - 1)
+        slots[slot] = term_index + 1
+    cells = []
+    values = []
+    for term_id in term_ids:
+        term = ontology[term_id]
+        for field in fields:
+            if field not in term:
+                cells.append(len(values) | MISSING)
+            elif kinds[field] == KIND_LIST:
+                cells.append(len(values))
+                values.extend(intern(item) for item in term[field])
+            else:
+                cells.append(len(values))
+                values.append(intern(term[field]))
+    cells.append(len(values))
+    if len(values) >= MISSING:
+        raise ValueError('Ontology is too large for the compact format')
+    data = [string.encode('utf-8') for string in strings]
+    offsets = [0]
+    for encoded in data:
+        offsets.append(offsets[-1] + len(encoded))
+    temp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(temp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, len(data), len(fields), len(terms), len(values), n_slots))
+        f.write(_uint_array(offsets))
+        f.write(_uint_array(field_names))
+        f.write(_uint_array([kinds[field] for field in fields]))
+        f.write(_uint_array(terms))
+        f.write(_uint_array(slots))
+        f.write(_uint_array(cells))
+        f.write(_uint_array(values))
+        f.write(b''.join(data))
+    os.replace(temp_path, path)
+
+
+class OntologyStore(Mapping):
+    """Read-only Mapping of term ids to OntologyTerm over a compact file."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n_strings, n_fields, n_terms, n_values, n_slots = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError('{} is not a compact ontology file'.format(path))
+        self._n_fields = n_fields
+        self._n_terms = n_terms
+        # Sections are indexes into the file as uint32s.
+        self._strings = _HEADER.size // 4
+        fields = self._strings + n_strings + 1
+        kinds = fields + n_fields
+        self._terms = kinds + n_fields
+        self._slots = self._terms + n_terms
+        self._slot_mask = n_slots - 1
+        self._cells = self._slots + n_slots
+        self._values = self._cells + n_terms * n_fields + 1
+        self._data = 4 * (self._values + n_values)
+        if sys.byteorder == 'little':
+            self._uints = memoryview(self._mmap)[:self._data].cast('I')
+        else:
+            self._uints = array.array('I', self._mmap[:self._data])
+            self._uints.byteswap()
+        if len(self._mmap) != self._data + self._uints[self._strings + n_strings]:
+            raise ValueError('{} is truncated'.format(path))
+        self._fields = {
+            self._string(self._uints[fields + n]): (n, self._uints[kinds + n])
+            for n in range(n_fields)
+        }
+        self._term_index = lru_cache(maxsize=TERM_INDEX_CACHE_SIZE)(self._find_term)
+
+    def _string_bytes(self, string_id):
+        offset = self._strings + string_id
+        return self._mmap[self._data + self._uints[offset]:self._data + self._uints[offset + 1]]
+
+    def _string(self, string_id):
+        return self._string_bytes(string_id).decode('utf-8')
+
+    def _find_term(self, term_id):
+        if not isinstance(term_id, str):
+            return None
+        key = term_id.encode('utf-8')
+        slot = zlib.crc32(key) & self._slot_mask
+        while True:
+            term_index = self._uints[self._slots + slot] - 1
+            if term_index < 0:
+                return None
+            if self._string_bytes(self._uints[self._terms + term_index]) == key:
+                return term_index
+            slot = (slot + 1) & self._slot_mask
+
+    def _cell(self, term_index, field_index):
+        cell = self._cells + term_index * self._n_fields + field_index
+        start = self._uints[cell]
+        if start & MISSING:
+            return None
+        return start, self._uints[cell + 1] & ~MISSING
+
+    def _value(self, term_index, field_index, kind):
+        cell = self._cell(term_index, field_index)
+        if cell is None:
+            raise KeyError
+        start, end = cell
+        string_ids = self._uints[self._values + start:self._values + end]
+        if kind == KIND_STRING:
+            return self._string(string_ids[0])
+        return [self._string(string_id) for string_id in string_ids]
+
+    def __getitem__(self, term_id):
+        term_index = self._term_index(term_id)
+        if term_index is None:
+            raise KeyError(term_id)
+        return OntologyTerm(self, term_index)
+
+    def __contains__(self, term_id):
+        return self._term_index(term_id) is not None
+
+    def __iter__(self):
+        for n in range(self._n_terms):
+            yield self._string(self._uints[self._terms + n])
+
+    def __len__(self):
+        return self._n_terms
+
+    def close(self):
+        self._term_index.cache_clear()
+        if isinstance(self._uints, memoryview):
+            self._uints.release()
+        self._mmap.close()
+
+
+class OntologyTerm(Mapping):
+    """Read-only Mapping of a term's field names to its values."""
+
+    __slots__ = ('_store', '_index')
+
+    def __init__(self, store, index):
+        self._store = store
+        self._index = index
+
+    def __getitem__(self, field):
+        try:
+            field_index, kind = self._store._fields[field]
+            return self._store._value(self._index, field_index, kind)
+        except KeyError:
+            raise KeyError(field) from None
+
+    def __contains__(self, field):
+        field_index, kind = self._store._fields.get(field, (None, None))
+        return field_index is not None and self._store._cell(self._index, field_index) is not None
+
+    def __iter__(self):
+        for field, (field_index, kind) in self._store._fields.items():
+            if self._store._cell(self._index, field_index) is not None:
+                yield field
+
+    def __len__(self):
+        return sum(1 for field in self)
+
+    def __repr__(self):
+        return '<OntologyTerm {!r}>'.format(dict(self))
+
+
+def load_ontology(json_path, store_path):
+    """Memory-map the compact ontology, else load ontology.json.
+
+    The compact ontology is only used when it is at least as new as
+    ontology.json. Returns an empty dict when there is neither.
+    """
+    has_json = os.path.exists(json_path)
+    if os.path.exists(store_path):
+        if not has_json or os.path.getmtime(store_path) >= os.path.getmtime(json_path):
+            return OntologyStore(store_path)
+        log.warning('%s is older than %s, loading %s', store_path, json_path, json_path)
+    if has_json:
+        with open(json_path) as f:
+            return json.load(f)
+    return {}
@@ -7,6 +7,7 @@ from collections import OrderedDict
 import requests
 from urllib.parse import urlencode
 
+from encoded.gene_locus import get_gene_locus_index
 from encoded.genomic_data_service import GenomicDataService
 
 import logging
@@ -94,6 +95,7 @@ REGION_SEARCH_UNNECESSARY_FIELDS = [
 def includeme(config):
     config.add_route('region-search', '/region-search{slash:/?}')
     config.add_route('suggest', '/suggest{slash:/?}')
+    config.include('encoded.gene_locus')
     config.scan(__name__)
 
 
@@ -170,6 +172,10 @@ def get_peak_query(start, end, with_inner_hits=False, within_peaks=False):
 def get_suggested_coordinates(request, query, assembly):
     coordinates, start, end = '', '' , ''
 
+    gene_loci = get_gene_locus_index(request)
+    if gene_loci is not None:
+        return gene_loci.locate(query, _GENOME_TO_ALIAS.get(assembly, assembly)) or (coordinates, start, end)
+
     search_params = '&'.join([
         'type=Gene',
         'field=locations',
@@ -264,6 +270,13 @@ def region_search(context, request):
                 result['notification'] = 'Error during search'
                 return result
 
+            # Next time answer the annotation without resolving it again.
+            data_service.remember(
+                _GENOME_TO_ALIAS[assembly],
+                query,
+                2 if expand else 0,
+                peak_results
+            )
             file_uuids = [f['uuid'] for f in peak_results['regions_per_file']]
 
         if not chromosome or not start or not end:
@@ -277,6 +290,15 @@ def region_search(context, request):
     result['coordinates'] = '{chr}:{start}-{end}'.format(chr=chromosome, start=start, end=end)
     result['coordinates_msg'] = result['coordinates']
 
+    gene_loci = get_gene_locus_index(request)
+    if gene_loci is not None:
+        result['genes'] = [
+            gene['symbol']
+            for gene in gene_loci.genes_in_region(
+                _GENOME_TO_ALIAS[assembly], chromosome, int(start), int(end)
+            )
+        ]
+
     if expand:
         result['coordinates_msg'] = '{label}: ({coords}) +/- 2kb'.format(label=(region or annotation), coords=result['coordinates'])
         result['coordinates'] = '{chr}:{start}-{end}'.format(
@@ -284,22 +306,8 @@ def region_search(context, request):
         )
 
     # if more than one peak found return the experiments with those peak files
-    uuid_count = len(file_uuids)
-    if uuid_count > MAX_CLAUSES_FOR_ES:
-        log.error("REGION_SEARCH WARNING: region with %d file_uuids is being restricted to %d" % \
-                                                            (uuid_count, MAX_CLAUSES_FOR_ES))
-        file_uuids = file_uuids[:MAX_CLAUSES_FOR_ES]
-        uuid_count = len(file_uuids)
-
-    query = get_filtered_query('', [], set(), principals, ['Experiment'])
-    del query['query']
-    query['post_filter']['bool']['must'].append({
-        'terms': {
-            'embedded.files.uuid': file_uuids
-        }
-    })
+    query = get_files_query(file_uuids, principals)
     used_filters = set_filters(request, query, result)
-    used_filters['files.uuid'] = file_uuids
     query['aggs'] = set_facets(_FACETS, used_filters, principals, ['Experiment'])
     schemas = (types[item_type].schema for item_type in ['Experiment'])
 
@@ -329,6 +337,15 @@ def suggest(context, request):
         'title': 'Suggest',
         '@graph': [],
     }
+
+    # Genes matching by symbol or dbxref come from the gene locus index,
+    # anything else from the annotations completion suggester.
+    gene_loci = get_gene_locus_index(request)
+    if gene_loci is not None and requested_genome in _GENOME_TO_ALIAS:
+        result['@graph'] = gene_loci.suggest(text, _GENOME_TO_ALIAS[requested_genome])
+        if result['@graph']:
+            return result
+
     es = request.registry[ELASTIC_SEARCH]
 
     query = {
@@ -368,17 +385,51 @@ def genome_browser_files(es, principals, graph):
     del query['query']
 
     query['_source'] = [f"embedded.{field}" for field in GBROWSER_EMBEDDED_FIELDS]
-    query['post_filter']['bool']['must'].append({
-        'terms': {
-            'uuid': list(set(uuids))
-        }
-    })
+    query['post_filter']['bool']['must'].append(
+        get_terms_filter('uuid', list(set(uuids)))
+    )
 
     es_results = es.search(body=query, index='file', size=9999, request_timeout=60)
 
     return [result['_source']['embedded'] for result in es_results['hits']['hits']]
 
 
+def get_terms_filter(field, terms, chunk_size=MAX_CLAUSES_FOR_ES):
+    """
+    Terms filter matching any of terms, split into terms clauses of at
+    most chunk_size values when there are more than Elasticsearch allows
+    in one.
+    """
+    if len(terms) <= chunk_size:
+        return {'terms': {field: terms}}
+    return {
+        'bool': {
+            'should': [
+                {'terms': {field: terms[n:n + chunk_size]}}
+                for n in range(0, len(terms), chunk_size)
+            ],
+            'minimum_should_match': 1
+        }
+    }
+
+
+def get_files_query(file_uuids, principals):
+    """
+    Experiments with any of the files. The files are filtered in the
+    query rather than the post_filter so that the aggregations only
+    count these experiments without repeating the uuids in every facet.
+    """
+    query = get_filtered_query('', [], set(), principals, ['Experiment'])
+    query['query'] = {
+        'bool': {
+            'filter': [
+                get_terms_filter('embedded.files.uuid', file_uuids)
+            ]
+        }
+    }
+    return query
+
+
 def format_facets(
         es_results,
         facets,
@@ -81,9 +81,7 @@ class BatchDownload(BatchDownloadMixin, MetadataReport):
                 if self._should_not_report_file(file_):
                     continue
                 file_data = self._get_file_data(file_)
-                yield self.csv.writerow(
-                    self._output_sorted_row({}, file_data)
-                )
+                yield self._output_sorted_row({}, file_data)
 
 
 class SeriesBatchDownload(BatchDownloadMixin, SeriesMetadataReport):
@@ -112,9 +110,7 @@ class SeriesBatchDownload(BatchDownloadMixin, SeriesMetadataReport):
                 if self._should_not_report_file(file_):
                     continue
                 file_data = self._get_file_data(file_)
-                yield self.csv.writerow(
-                    self._output_sorted_row({}, file_data)
-                )
+                yield self._output_sorted_row({}, file_data)
 
 
 class PublicationDataBatchDownload(BatchDownloadMixin, PublicationDataMetadataReport):
@@ -134,9 +130,7 @@ class PublicationDataBatchDownload(BatchDownloadMixin, PublicationDataMetadataRe
                 if self._should_not_report_file(file_):
                     continue
                 file_data = self._get_file_data(file_)
-                yield self.csv.writerow(
-                    self._output_sorted_row({}, file_data)
-                )
+                yield self._output_sorted_row({}, file_data)
 
 
 def _get_batch_download(context, request):
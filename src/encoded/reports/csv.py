@@ -1,18 +1,104 @@
-import csv
+import re
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _to_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return value
+    return str(value)
 
 
 class CSVGenerator:
+    '''
+    Delimited text encoder that matches csv.writer's minimal quoting.
+    Use iter_chunks to turn an iterable of rows into utf-8 chunks of
+    roughly chunk_size bytes, so a large download is encoded and sent in
+    a few big pieces instead of one small bytes object per row. Rows are
+    lists of cell values; bytes are passed through unchanged.
+    '''
 
-    def __init__(self, delimiter='\t', lineterminator='\n'):
-        self.writer = csv.writer(
-            self,
-            delimiter=delimiter,
-            lineterminator=lineterminator
+    def __init__(self, delimiter='\t', lineterminator='\n', quotechar='"', chunk_size=CHUNK_SIZE):
+        self.delimiter = delimiter
+        self.lineterminator = lineterminator
+        self.quotechar = quotechar
+        self.escaped_quotechar = quotechar * 2
+        self.chunk_size = chunk_size
+        # Like csv.writer up to Python 3.12, quote cells containing the
+        # delimiter, the quotechar or a character of the lineterminator
+        # (so a lone '\r' isn't quoted with a '\n' lineterminator).
+        self._needs_quoting = re.compile(
+            '[{}]'.format(re.escape(delimiter + quotechar + lineterminator))
+        ).search
+        self._has_special_characters = re.compile(
+            '[{}]'.format(re.escape(quotechar + lineterminator))
+        ).search
+
+    def _quote(self, value):
+        if self._needs_quoting(value):
+            return (
+                self.quotechar
+                + value.replace(self.quotechar, self.escaped_quotechar)
+                + self.quotechar
+            )
+        return value
+
+    def format_row(self, row):
+        values = [_to_text(value) for value in row]
+        line = self.delimiter.join(values)
+        # One scan over the joined line decides whether any cell needs
+        # quoting, which is almost never the case.
+        clean = (
+            line.count(self.delimiter) == len(values) - 1
+            and not self._has_special_characters(line)
+        )
+        if clean:
+            if len(values) == 1 and not line:
+                # Like csv.writer, distinguish a single empty cell from an empty row.
+                return self.quotechar * 2
+            return line
+        return self.delimiter.join(
+            [self._quote(value) for value in values]
         )
 
     def writerow(self, row):
-        self.writer.writerow(row)
-        return self.row
+        return (self.format_row(row) + self.lineterminator).encode('utf-8')
 
-    def write(self, row):
-        self.row = row.encode('utf-8')
+    def iter_chunks(self, rows):
+        lines = []
+        size = 0
+        for row in rows:
+            if isinstance(row, bytes):
+                line = row.decode('utf-8')
+            else:
+                line = self.format_row(row) + self.lineterminator
+            lines.append(line)
+            size += len(line)
+            if size >= self.chunk_size:
+                yield ''.join(lines).encode('utf-8')
+                lines = []
+                size = 0
+        if lines:
+            yield ''.join(lines).encode('utf-8')
+
+
+class WhitespaceCollapsingCSVGenerator(CSVGenerator):
+    '''
+    Instead of quoting, strips each cell and collapses internal
+    whitespace runs (tabs and newlines included) to a single space.
+    '''
+
+    def __init__(self, delimiter='\t', lineterminator='\r\n', chunk_size=CHUNK_SIZE):
+        super().__init__(
+            delimiter=delimiter,
+            lineterminator=lineterminator,
+            chunk_size=chunk_size
+        )
+
+    def format_row(self, row):
+        return self.delimiter.join(
+            [' '.join(_to_text(value).split()) for value in row]
+        )
@@ -13,9 +13,11 @@ from encoded.reports.decorators import allowed_types
 from encoded.reports.inequalities import map_param_values_to_inequalities
 from encoded.reports.inequalities import try_to_evaluate_inequality
 from encoded.reports.search import BatchedSearchGenerator
-from encoded.reports.serializers import make_experiment_cell
-from encoded.reports.serializers import make_file_cell
+from encoded.reports.search import PrefetchingBatchedSearchGenerator
+from encoded.reports.serializers import compile_experiment_cell
+from encoded.reports.serializers import compile_file_cell
 from encoded.reports.serializers import map_strings_to_booleans_and_ints
+from encoded.reports.serializers import RowSerializer
 from encoded.search_views import search_generator
 from encoded.vis_defines import is_file_visualizable
 from pyramid.httpexceptions import HTTPBadRequest
@@ -105,6 +107,11 @@ class MetadataReport:
     CONTENT_TYPE = 'text/tsv'
     CONTENT_DISPOSITION = 'attachment; filename="metadata.tsv"'
     FILES_PREFIX = 'files.'
+    PREFETCH_WORKERS_SETTING = 'metadata.prefetch_workers'
+    PREFETCH_BUFFER_SIZE_SETTING = 'metadata.prefetch_buffer_size'
+    # Set metadata.prefetch_workers to 0 to fetch one batch at a time.
+    DEFAULT_PREFETCH_WORKERS = 2
+    DEFAULT_PREFETCH_BUFFER_SIZE = 1000
 
     def __init__(self, request):
         self.request = request
@@ -116,6 +123,8 @@ class MetadataReport:
         self.header = []
         self.experiment_column_to_fields_mapping = OrderedDict()
         self.file_column_to_fields_mapping = OrderedDict()
+        self.experiment_row_serializer = None
+        self.file_row_serializer = None
         self.visualizable_only = self.query_string.is_param('option', 'visualizable')
         self.raw_only = self.query_string.is_param('option', 'raw')
         self.csv = CSVGenerator()
@@ -140,6 +149,16 @@ class MetadataReport:
             else:
                 self.experiment_column_to_fields_mapping[column] = fields
 
+    def _compile_row_serializers(self):
+        self.experiment_row_serializer = RowSerializer(
+            self.experiment_column_to_fields_mapping,
+            compile_experiment_cell,
+        )
+        self.file_row_serializer = RowSerializer(
+            self.file_column_to_fields_mapping,
+            compile_file_cell,
+        )
+
     def _set_split_file_filters(self):
         file_params = self.query_string.get_filters_by_condition(
             key_and_value_condition=lambda k, _: k.startswith(self.FILES_PREFIX)
@@ -239,7 +258,34 @@ class MetadataReport:
         request.path_info = self._get_search_path()
         return request
 
+    def _get_prefetch_workers(self):
+        settings = self.request.registry.settings or {}
+        return int(
+            settings.get(
+                self.PREFETCH_WORKERS_SETTING,
+                self.DEFAULT_PREFETCH_WORKERS
+            )
+        )
+
+    def _get_prefetch_buffer_size(self):
+        settings = self.request.registry.settings or {}
+        return int(
+            settings.get(
+                self.PREFETCH_BUFFER_SIZE_SETTING,
+                self.DEFAULT_PREFETCH_BUFFER_SIZE
+            )
+        )
+
     def _get_search_results_generator(self):
+        # Streaming mode: fetch upcoming batches in the background
+        # through bounded buffers instead of one batch at a time.
+        prefetch_workers = self._get_prefetch_workers()
+        if prefetch_workers > 0:
+            return PrefetchingBatchedSearchGenerator(
+                self._build_new_request(),
+                max_workers=prefetch_workers,
+                buffer_size=self._get_prefetch_buffer_size(),
+            ).results()
         return BatchedSearchGenerator(
             self._build_new_request()
         ).results()
@@ -256,17 +302,11 @@ class MetadataReport:
         return any(conditions)
 
     def _get_experiment_data(self, experiment):
-        return {
-            column: make_experiment_cell(fields, experiment)
-            for column, fields in self.experiment_column_to_fields_mapping.items()
-        }
+        return self.experiment_row_serializer.serialize(experiment)
 
     def _get_file_data(self, file_):
         file_['href'] = self.request.host_url + file_['href']
-        return {
-            column: make_file_cell(fields, file_)
-            for column, fields in self.file_column_to_fields_mapping.items()
-        }
+        return self.file_row_serializer.serialize(file_)
 
     def _get_audit_data(self, grouped_audits_for_file, grouped_other_audits):
         return {
@@ -290,7 +330,7 @@ class MetadataReport:
         return row
 
     def _generate_rows(self):
-        yield self.csv.writerow(self.header)
+        yield self.header
         for experiment in self._get_search_results_generator():
             if not experiment.get('files', []):
                 continue
@@ -307,9 +347,7 @@ class MetadataReport:
                     grouped_other_audits
                 )
                 file_data.update(audit_data)
-                yield self.csv.writerow(
-                    self._output_sorted_row(experiment_data, file_data)
-                )
+                yield self._output_sorted_row(experiment_data, file_data)
 
     def _validate_request(self):
         type_params = self.param_list.get('type', [])
@@ -320,6 +358,7 @@ class MetadataReport:
     def _initialize_report(self):
         self._build_header()
         self._split_column_and_fields_by_experiment_and_file()
+        self._compile_row_serializers()
         self._set_split_file_filters()
         self._set_positive_file_param_set()
         self._set_positive_file_inequalities()
@@ -336,7 +375,7 @@ class MetadataReport:
         self._build_params()
         return Response(
              content_type=self.CONTENT_TYPE,
-             app_iter=self._generate_rows(),
+             app_iter=self.csv.iter_chunks(self._generate_rows()),
              content_disposition=self.CONTENT_DISPOSITION,
         )
 
@@ -465,7 +504,7 @@ class PublicationDataMetadataReport(MetadataReport):
 
     # Overrides parent.
     def _generate_rows(self):
-        yield self.csv.writerow(self.header)
+        yield self.header
         for experiment in self._get_search_results_generator():
             self.file_at_ids = experiment.get('files', [])
             if not self.file_at_ids:
@@ -475,9 +514,7 @@ class PublicationDataMetadataReport(MetadataReport):
                 if self._should_not_report_file(file_):
                     continue
                 file_data = self._get_file_data(file_)
-                yield self.csv.writerow(
-                    self._output_sorted_row(experiment_data, file_data)
-                )
+                yield self._output_sorted_row(experiment_data, file_data)
 
 
 class SeriesMetadataReport(MetadataReport):
@@ -500,16 +537,14 @@ class SeriesMetadataReport(MetadataReport):
         return SERIES_METADATA_COLUMN_TO_FIELDS_MAPPING
 
     def _generate_rows(self):
-        yield self.csv.writerow(self.header)
+        yield self.header
         for series in self._get_search_results_generator():
             series_data = self._get_experiment_data(series)
             for file_ in series.get('series_files', []):
                 if self._should_not_report_file(file_):
                     continue
                 file_data = self._get_file_data(file_)
-                yield self.csv.writerow(
-                    self._output_sorted_row(series_data, file_data)
-                )
+                yield self._output_sorted_row(series_data, file_data)
 
 
 def _get_metadata(context, request):
@@ -1,5 +1,15 @@
+import queue
+import threading
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from encoded.search_views import search_generator
+from encoded.searches.defaults import DEFAULT_ITEM_TYPES
+from encoded.searches.defaults import RESERVED_KEYS
+from snosearch.parsers import ParamsParser
 from snosearch.parsers import QueryString
+from snosearch.queries import BasicSearchQueryFactory
+from snosearch.responses import BasicQueryResponseWithFacets
 
 
 class BatchedSearchGenerator:
@@ -46,3 +56,104 @@ class BatchedSearchGenerator:
             batched_params = self._make_batched_params_from_batched_values(batched_values)
             request = self._build_new_request(batched_params)
             yield from search_generator(request)['@graph']
+
+
+class BatchError:
+
+    def __init__(self, exception):
+        self.exception = exception
+
+
+BATCH_DONE = object()
+
+
+class PrefetchingBatchedSearchGenerator(BatchedSearchGenerator):
+    '''
+    Like BatchedSearchGenerator but keeps up to max_workers batches
+    in flight on a thread pool while the caller consumes the current one.
+    Only the Elasticsearch scan runs in the workers; building each query
+    (principals, registry lookups) and formatting its hits happen on the
+    calling thread, which has the request. Each batch's raw hits are
+    buffered in a bounded queue so memory is capped at roughly
+    max_workers * buffer_size hits no matter how many batch values are
+    requested. Results are yielded in batch order.
+    '''
+
+    PUT_TIMEOUT = 0.5
+
+    def __init__(self, request, batch_field='@id', batch_size=5000, max_workers=2, buffer_size=1000):
+        super().__init__(request, batch_field=batch_field, batch_size=batch_size)
+        self.max_workers = max(1, max_workers)
+        self.buffer_size = max(1, buffer_size)
+
+    def _make_batched_requests(self):
+        if not self.batch_param_values:
+            yield self._build_new_request([])
+        for batched_values in self._make_batched_values_from_batch_param_values():
+            batched_params = self._make_batched_params_from_batched_values(batched_values)
+            yield self._build_new_request(batched_params)
+
+    def _build_query_builder(self, request):
+        # Same query as search_generator.
+        return BasicSearchQueryFactory(
+            params_parser=ParamsParser(request),
+            default_item_types=DEFAULT_ITEM_TYPES,
+            reserved_keys=RESERVED_KEYS,
+        )
+
+    def _put(self, buffer, item, stopped):
+        # Poll so abandoned workers notice when the consumer goes away.
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=self.PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _fill_buffer(self, query, buffer, stopped):
+        try:
+            for hit in query.scan():
+                if not self._put(buffer, hit, stopped):
+                    return
+        except Exception as e:
+            self._put(buffer, BatchError(e), stopped)
+            return
+        self._put(buffer, BATCH_DONE, stopped)
+
+    def _drain_buffer(self, buffer):
+        while True:
+            item = buffer.get()
+            if item is BATCH_DONE:
+                return
+            if isinstance(item, BatchError):
+                raise item.exception
+            yield item
+
+    def _submit(self, executor, request, stopped):
+        buffer = queue.Queue(maxsize=self.buffer_size)
+        query_builder = self._build_query_builder(request)
+        query = query_builder.build_query()
+        executor.submit(self._fill_buffer, query, buffer, stopped)
+        return query_builder, buffer
+
+    def _format_batch(self, query_builder, buffer):
+        return BasicQueryResponseWithFacets(
+            results=self._drain_buffer(buffer),
+            query_builder=query_builder
+        ).to_graph()
+
+    def results(self):
+        stopped = threading.Event()
+        batches = deque()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            for request in self._make_batched_requests():
+                batches.append(self._submit(executor, request, stopped))
+                if len(batches) >= self.max_workers:
+                    yield from self._format_batch(*batches.popleft())
+            while batches:
+                yield from self._format_batch(*batches.popleft())
+        finally:
+            stopped.set()
+            executor.shutdown(wait=True)
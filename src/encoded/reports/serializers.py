@@ -2,13 +2,61 @@ from snovault.util import simple_path_ids
 from encoded.reports.constants import BOOLEAN_MAP
 
 
-def make_experiment_cell(paths, experiment):
+class PathTree:
+    '''
+    Prefix tree of dotted field paths. Extracting walks every shared
+    prefix once per object and returns the values for all paths, in the
+    same order simple_path_ids would yield them.
+    '''
+
+    def __init__(self, paths=(), include_none=False):
+        self.children = {}
+        self.paths = []
+        self.terminal_paths = []
+        self.include_none = include_none
+        for path in paths:
+            self.add(path)
+
+    def add(self, path):
+        if path in self.paths:
+            return
+        self.paths.append(path)
+        node = self
+        for name in path.split('.'):
+            if name not in node.children:
+                node.children[name] = PathTree(include_none=self.include_none)
+            node = node.children[name]
+        node.terminal_paths.append(path)
+
+    def _extract(self, obj, values):
+        for path in self.terminal_paths:
+            values[path].append(obj)
+        if not self.children or not isinstance(obj, dict):
+            return
+        for name, child in self.children.items():
+            if name not in obj:
+                continue
+            value = obj[name]
+            if value is None and not child.include_none:
+                continue
+            if isinstance(value, list):
+                for member in value:
+                    child._extract(member, values)
+            else:
+                child._extract(value, values)
+
+    def extract(self, obj):
+        values = {
+            path: []
+            for path in self.paths
+        }
+        self._extract(obj, values)
+        return values
+
+
+def _combine_cell_values(cell_values):
     last = []
-    for path in paths:
-        cell_value = []
-        for value in simple_path_ids(experiment, path):
-            if str(value) not in cell_value:
-                cell_value.append(str(value))
+    for cell_value in cell_values:
         if last and cell_value:
             last = [
                 v + ' ' + cell_value[0]
@@ -16,30 +64,101 @@ def make_experiment_cell(paths, experiment):
             ]
         else:
             last = cell_value
-    return ', '.join(set(last))
+    return last
 
 
-def make_file_cell(paths, file_):
+def _dedupe_as_strings(values):
+    cell_value = []
+    for value in values:
+        if str(value) not in cell_value:
+            cell_value.append(str(value))
+    return cell_value
+
+
+def compile_experiment_cell(paths):
+    def get_cell(obj, values):
+        return ', '.join(
+            set(
+                _combine_cell_values(
+                    _dedupe_as_strings(values[path])
+                    for path in paths
+                )
+            )
+        )
+    return get_cell, paths
+
+
+def compile_file_cell(paths):
     # Quick return if one level deep.
     if len(paths) == 1 and '.' not in paths[0]:
-        value = file_.get(paths[0], '')
-        if isinstance(value, list):
-            return ', '.join([str(v) for v in value])
-        return value
-    # Else crawl nested objects.
-    last = []
-    for path in paths:
-        cell_value = []
-        for value in simple_path_ids(file_, path):
-            cell_value.append(str(value))
-        if last and cell_value:
-            last = [
-                v + ' ' + cell_value[0]
-                for v in last
-            ]
-        else:
-            last = cell_value
-    return ', '.join(sorted(set(last)))
+        path = paths[0]
+
+        def get_cell(obj, values):
+            value = obj.get(path, '')
+            if isinstance(value, list):
+                return ', '.join([str(v) for v in value])
+            return value
+        return get_cell, []
+
+    # Else use values crawled from nested objects.
+    def get_cell(obj, values):
+        return ', '.join(
+            sorted(
+                set(
+                    _combine_cell_values(
+                        [str(value) for value in values[path]]
+                        for path in paths
+                    )
+                )
+            )
+        )
+    return get_cell, paths
+
+
+class RowSerializer:
+    '''
+    Compiles a column to fields mapping once per report into cell
+    getters plus one PathTree, so serializing a row traverses the
+    object a single time no matter how many columns share prefixes.
+    '''
+
+    def __init__(self, column_to_fields_mapping, compile_cell):
+        self.tree = PathTree()
+        self.cells = []
+        for column, fields in column_to_fields_mapping.items():
+            get_cell, paths = compile_cell(fields)
+            for path in paths:
+                self.tree.add(path)
+            self.cells.append((column, get_cell))
+
+    def serialize(self, obj):
+        values = self.tree.extract(obj)
+        return {
+            column: get_cell(obj, values)
+            for column, get_cell in self.cells
+        }
+
+
+def make_experiment_cell(paths, experiment):
+    get_cell, paths = compile_experiment_cell(paths)
+    return get_cell(
+        experiment,
+        {
+            path: list(simple_path_ids(experiment, path))
+            for path in paths
+        }
+    )
+
+
+def make_file_cell(paths, file_):
+    get_cell, paths = compile_file_cell(paths)
+    return get_cell(
+        file_,
+        {
+            path: list(simple_path_ids(file_, path))
+            for path in paths
+        }
+    )
 
 
 def maybe_int(value):
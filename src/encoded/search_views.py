@@ -1,4 +1,3 @@
-from functools import partial
 from pyramid.view import view_config
 
 from encoded.cart_view import CartWithElements
@@ -9,9 +8,7 @@ from encoded.genomic_data_service import set_status_and_parse_ndjson
 from encoded.genomic_data_service import RNAGET_REPORT_URL
 from encoded.genomic_data_service import RNAGET_SEARCH_STREAM_URL
 from encoded.searches.caches import cached_fielded_response_factory
-from encoded.searches.caches import get_redis_lru_cache
-from encoded.searches.caches import make_key_from_request
-from encoded.searches.caches import should_cache_search_results
+from encoded.searches.caches import cached_search
 from encoded.searches.defaults import DEFAULT_ITEM_TYPES
 from encoded.searches.defaults import DEFAULT_RNA_EXPRESSION_SORT
 from encoded.searches.defaults import HOMEPAGE_SEARCH_FACETS
@@ -27,7 +24,6 @@ from encoded.searches.fields import RemoteResponseField
 from encoded.searches.fields import TypeOnlyClearFiltersResponseFieldWithCarts
 from encoded.searches.interfaces import RNA_CLIENT
 from encoded.searches.interfaces import RNA_EXPRESSION
-from snosearch.decorators import conditional_cache
 from snosearch.interfaces import AUDIT_TITLE
 from snosearch.interfaces import MATRIX_TITLE
 from snosearch.interfaces import REPORT_TITLE
@@ -108,10 +104,11 @@ def includeme(config):
 
 
 @view_config(route_name='search', request_method='GET', permission='search')
+@cached_search('search')
 def search(context, request):
     # Note the order of rendering matters for some fields, e.g. AllResponseField and
     # NotificationResponseField depend on results from BasicSearchWithFacetsResponseField.
-    fr = FieldedResponse(
+    fr = cached_fielded_response_factory(context, request)(
         _meta={
             'params_parser': ParamsParser(request)
         },
@@ -367,8 +364,9 @@ def rna_expression_search_generator(request):
 
 
 @view_config(route_name='report', request_method='GET', permission='search')
+@cached_search('report')
 def report(context, request):
-    fr = FieldedResponse(
+    fr = cached_fielded_response_factory(context, request)(
         _meta={
             'params_parser': ParamsParser(request)
         },
@@ -416,8 +414,9 @@ def matrixv2_raw(context, request):
 
 
 @view_config(route_name='matrix', request_method='GET', permission='search')
+@cached_search('matrix')
 def matrix(context, request):
-    fr = FieldedResponse(
+    fr = cached_fielded_response_factory(context, request)(
         _meta={
             'params_parser': ParamsParser(request)
         },
@@ -446,8 +445,9 @@ def matrix(context, request):
 
 
 @view_config(route_name='human_donor_matrix', request_method='GET', permission='search')
+@cached_search('human-donor-matrix')
 def human_donor_matrix(context, request):
-    fr = FieldedResponse(
+    fr = cached_fielded_response_factory(context, request)(
         _meta={
             'params_parser': ParamsParser(request)
         },
@@ -477,8 +477,9 @@ def human_donor_matrix(context, request):
 
 
 @view_config(route_name='stem-cell-matrix', request_method='GET', permission='search')
+@cached_search('stem-cell-matrix')
 def sescc_stem_cell_matrix(context, request):
-    fr = FieldedResponse(
+    fr = cached_fielded_response_factory(context, request)(
         _meta={
             'params_parser': ParamsParser(request)
         },
@@ -539,8 +540,9 @@ def immune_cells(context, request):
 
 
 @view_config(route_name='chip-seq-matrix', request_method='GET', permission='search')
+@cached_search('chip-seq-matrix')
 def chip_seq_matrix(context, request):
-    fr = FieldedResponse(
+    fr = cached_fielded_response_factory(context, request)(
         _meta={
             'params_parser': ParamsParser(request)
         },
@@ -570,8 +572,9 @@ def chip_seq_matrix(context, request):
 
 
 @view_config(route_name='deeply-profiled-matrix', request_method='GET', permission='search')
+@cached_search('deeply-profiled-matrix')
 def deeply_profiled_matrix(context, request):
-    fr = FieldedResponse(
+    fr = cached_fielded_response_factory(context, request)(
         _meta={
             'params_parser': ParamsParser(request)
         },
@@ -600,8 +603,9 @@ def deeply_profiled_matrix(context, request):
 
 
 @view_config(route_name='deeply-profiled-uniform-batch-matrix', request_method='GET', permission='search')
+@cached_search('deeply-profiled-uniform-batch-matrix')
 def deeply_profiled_uniform_batch_matrix(context, request):
-    fr = FieldedResponse(
+    fr = cached_fielded_response_factory(context, request)(
         _meta={
             'params_parser': ParamsParser(request)
         },
@@ -630,8 +634,9 @@ def deeply_profiled_uniform_batch_matrix(context, request):
 
 
 @view_config(route_name='reference-epigenome-matrix', request_method='GET', permission='search')
+@cached_search('reference-epigenome-matrix')
 def reference_epigenome_matrix(context, request):
-    fr = FieldedResponse(
+    fr = cached_fielded_response_factory(context, request)(
         _meta={
             'params_parser': ParamsParser(request)
         },
@@ -661,8 +666,9 @@ def reference_epigenome_matrix(context, request):
 
 
 @view_config(route_name='entex-matrix', request_method='GET', permission='search')
+@cached_search('entex-matrix')
 def entex_matrix(context, request):
-    fr = FieldedResponse(
+    fr = cached_fielded_response_factory(context, request)(
         _meta={
             'params_parser': ParamsParser(request)
         },
@@ -692,8 +698,9 @@ def entex_matrix(context, request):
 
 
 @view_config(route_name='brain-matrix', request_method='GET', permission='search')
+@cached_search('brain-matrix')
 def brain_matrix(context, request):
-    fr = FieldedResponse(
+    fr = cached_fielded_response_factory(context, request)(
         _meta={
             'params_parser': ParamsParser(request)
         },
@@ -723,8 +730,9 @@ def brain_matrix(context, request):
 
 
 @view_config(route_name='functional-characterization-matrix', request_method='GET', permission='search')
+@cached_search('functional-characterization-matrix')
 def functional_characterization_matrix(context, request):
-    fr = FieldedResponse(
+    fr = cached_fielded_response_factory(context, request)(
         _meta={
             'params_parser': ParamsParser(request)
         },
@@ -754,8 +762,9 @@ def functional_characterization_matrix(context, request):
 
 
 @view_config(route_name='mouse-development-matrix', request_method='GET', permission='search')
+@cached_search('mouse-development-matrix')
 def mouse_development(context, request):
-    fr = FieldedResponse(
+    fr = cached_fielded_response_factory(context, request)(
         _meta={
             'params_parser': ParamsParser(request)
         },
@@ -785,8 +794,9 @@ def mouse_development(context, request):
 
 
 @view_config(route_name='encore-matrix', request_method='GET', permission='search')
+@cached_search('encore-matrix')
 def encore_matrix(context, request):
-    fr = FieldedResponse(
+    fr = cached_fielded_response_factory(context, request)(
         _meta={
             'params_parser': ParamsParser(request)
         },
@@ -816,8 +826,9 @@ def encore_matrix(context, request):
 
 
 @view_config(route_name='encore-rna-seq-matrix', request_method='GET', permission='search')
+@cached_search('encore-rna-seq-matrix')
 def encore_rna_seq_matrix(context, request):
-    fr = FieldedResponse(
+    fr = cached_fielded_response_factory(context, request)(
         _meta={
             'params_parser': ParamsParser(request)
         },
@@ -847,8 +858,9 @@ def encore_rna_seq_matrix(context, request):
 
 
 @view_config(route_name='degron-matrix', request_method='GET', permission='search')
+@cached_search('degron-matrix')
 def degron_matrix(context, request):
-    fr = FieldedResponse(
+    fr = cached_fielded_response_factory(context, request)(
         _meta={
             'params_parser': ParamsParser(request)
         },
@@ -877,8 +889,9 @@ def degron_matrix(context, request):
 
 
 @view_config(route_name='summary', request_method='GET', permission='search')
+@cached_search('summary')
 def summary(context, request):
-    fr = FieldedResponse(
+    fr = cached_fielded_response_factory(context, request)(
         _meta={
             'params_parser': ParamsParser(request)
         },
@@ -1068,11 +1081,7 @@ def top_hits(context, request):
 
 
 @view_config(route_name='rnaget-report', request_method='GET', permission='search')
-@conditional_cache(
-    cache=get_redis_lru_cache(),
-    condition=should_cache_search_results,
-    key=partial(make_key_from_request, 'rnaget-report'),
-)
+@cached_search('rnaget-report')
 def rnaget_report(context, request):
     fr = FieldedResponse(
         _meta={
@@ -1,19 +1,44 @@
+import copy
+import hashlib
 import json
+import logging
+import time
+import uuid
+import zlib
 
+from functools import wraps
+from pyramid.settings import asbool
+from pyramid.view import view_config
 from redis import StrictRedis
+from redis.exceptions import RedisError
+from encoded.searches.coalescing import SingleFlight
 from encoded.searches.interfaces import REDIS_LRU_CACHE
 from snosearch.parsers import ParamsParser
 from snosearch.responses import FieldedInMemoryResponse
 from snosearch.responses import FieldedResponse
+from snovault.elasticsearch.interfaces import ELASTIC_SEARCH
 
 
-_redis_lru_cache = None
+log = logging.getLogger(__name__)
+
+
+DEFAULT_MAX_LIMIT = 25
+DEFAULT_TTL = 60 * 60
+DEFAULT_GENERATION_CHECK_INTERVAL = 1
+DEFAULT_LOCK_TIMEOUT = 30
+LOCK_POLL_INTERVAL = 0.05
+COMPRESSION_LEVEL = 1
+KEY_PREFIX = 'search_cache'
+LOCK_PREFIX = f'{KEY_PREFIX}:lock'
+STATS_KEY = f'{KEY_PREFIX}:stats'
+
+
+_single_flight = SingleFlight(timeout=DEFAULT_LOCK_TIMEOUT)
 
 
 def includeme(config):
-    # Handle to grab outside of the request cycle
-    # for configuring decorator.
-    global _redis_lru_cache
+    config.add_route('_search_cache_stats', '/_search_cache_stats')
+    config.scan(__name__)
     settings = config.registry.settings
     client = StrictRedis(
         host=settings.get('local_storage_host'),
@@ -21,21 +46,246 @@ def includeme(config):
         socket_timeout=3,
         db=4,
     )
-    config.registry[REDIS_LRU_CACHE] = RedisLRUCache(client)
-    _redis_lru_cache = config.registry[REDIS_LRU_CACHE]
+    config.registry[REDIS_LRU_CACHE] = RedisLRUCache(
+        client,
+        ttl=int(settings.get('search_cache.ttl', DEFAULT_TTL)),
+        generation=IndexerGeneration(
+            config.registry,
+            check_interval=float(
+                settings.get(
+                    'search_cache.generation_check_interval',
+                    DEFAULT_GENERATION_CHECK_INTERVAL
+                )
+            ),
+        ),
+        enabled=asbool(settings.get('search_cache.enabled', True)),
+        lock_timeout=float(settings.get('search_cache.lock_timeout', DEFAULT_LOCK_TIMEOUT)),
+    )
+    _single_flight.timeout = config.registry[REDIS_LRU_CACHE].lock_timeout
+
+
+class IndexerGeneration:
+    '''
+    Cache generation tied to the xmin of the last completed indexing
+    cycle. Every reindex moves the generation forward so entries written
+    for older data are never read again and simply expire. The value is
+    rechecked at most once per check_interval seconds per process.
+    '''
+
+    INDEXING_ID = 'indexing'
+
+    def __init__(self, registry, check_interval=DEFAULT_GENERATION_CHECK_INTERVAL):
+        self.registry = registry
+        self.check_interval = check_interval
+        self._value = None
+        self._checked_at = None
+
+    def _get_last_xmin(self):
+        es = self.registry[ELASTIC_SEARCH]
+        index = self.registry.settings['snovault.elasticsearch.index']
+        status = es.get(index=index, id=self.INDEXING_ID)
+        return status['_source']['xmin']
+
+    def get(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return self._value
+        try:
+            self._value = self._get_last_xmin()
+        except Exception:
+            # No indexing state (or no Elasticsearch), don't cache.
+            self._value = None
+        self._checked_at = now
+        return self._value
 
 
 class RedisLRUCache():
+    '''
+    Stores zlib-compressed JSON with a per-entry TTL under a key
+    namespaced by the current generation. Redis failures are treated as
+    misses so a cache outage never breaks a search.
+    '''
 
-    def __init__(self, client):
+    def __init__(self, client, ttl=None, generation=None, enabled=True, lock_timeout=DEFAULT_LOCK_TIMEOUT):
         self.client = client
+        self.ttl = ttl
+        self.generation = generation
+        self.enabled = enabled
+        self.lock_timeout = lock_timeout
+
+    def get_generation(self):
+        if self.generation is None:
+            return None
+        return self.generation.get()
+
+    def _make_key(self, key):
+        if self.generation is None:
+            return f'{KEY_PREFIX}:{key}'
+        generation = self.get_generation()
+        if generation is None:
+            return None
+        return f'{KEY_PREFIX}:{generation}:{key}'
+
+    def _incr_stats(self, **counts):
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for name, count in counts.items():
+                pipe.hincrby(STATS_KEY, name, count)
+            pipe.execute()
+        except RedisError:
+            pass
 
     def __setitem__(self, key, item):
-        self.client[key] = json.dumps(item)
+        if not self.enabled or not should_store_search_results(item):
+            return
+        key = self._make_key(key)
+        if key is None:
+            return
+        value = json.dumps(item).encode('utf-8')
+        compressed = zlib.compress(value, COMPRESSION_LEVEL)
+        try:
+            self.client.set(key, compressed, ex=self.ttl)
+        except RedisError:
+            log.warning('Unable to write search cache entry', exc_info=True)
+            self._incr_stats(errors=1)
+            return
+        self._incr_stats(
+            sets=1,
+            bytes_written=len(compressed),
+            bytes_uncompressed=len(value),
+        )
 
     def __getitem__(self, key):
-        value = self.client[key]
-        return json.loads(value)
+        if not self.enabled:
+            raise KeyError(key)
+        cache_key = self._make_key(key)
+        if cache_key is None:
+            raise KeyError(key)
+        try:
+            value = self.client.get(cache_key)
+        except RedisError:
+            log.warning('Unable to read search cache entry', exc_info=True)
+            self._incr_stats(errors=1)
+            raise KeyError(key)
+        if value is None:
+            self._incr_stats(misses=1)
+            raise KeyError(key)
+        self._incr_stats(hits=1, bytes_read=len(value))
+        return json.loads(zlib.decompress(value).decode('utf-8'))
+
+    def expire(self, key, ttl):
+        '''
+        Changes the TTL of an existing entry. Returns False if there
+        is no such entry.
+        '''
+        cache_key = self._make_key(key)
+        if not self.enabled or cache_key is None:
+            return False
+        try:
+            return bool(self.client.expire(cache_key, ttl))
+        except RedisError:
+            return False
+
+    def _make_lock_key(self, key):
+        cache_key = self._make_key(key)
+        if cache_key is None:
+            return None
+        return LOCK_PREFIX + cache_key[len(KEY_PREFIX):]
+
+    def acquire_lock(self, key):
+        '''
+        Cross-process single-flight lock. Returns a token if this caller
+        should compute the value, or None if another process already is.
+        The lock expires after lock_timeout in case its holder dies.
+        '''
+        token = uuid.uuid4().hex
+        lock_key = self._make_lock_key(key)
+        if not self.enabled or lock_key is None:
+            return token
+        try:
+            acquired = self.client.set(
+                lock_key,
+                token,
+                nx=True,
+                px=int(self.lock_timeout * 1000),
+            )
+        except RedisError:
+            return token
+        return token if acquired else None
+
+    def release_lock(self, key, token):
+        lock_key = self._make_lock_key(key)
+        if not self.enabled or lock_key is None:
+            return
+        try:
+            value = self.client.get(lock_key)
+            if value is not None and value.decode('utf-8') == token:
+                self.client.delete(lock_key)
+        except RedisError:
+            pass
+
+    def wait_for(self, key, poll_interval=LOCK_POLL_INTERVAL):
+        '''
+        Waits until the lock for key is released (or lock_timeout passes)
+        and returns the cached value, raising KeyError if the holder
+        didn't store one.
+        '''
+        lock_key = self._make_lock_key(key)
+        deadline = time.monotonic() + self.lock_timeout
+        try:
+            while lock_key and time.monotonic() < deadline:
+                if not self.client.exists(lock_key):
+                    break
+                time.sleep(poll_interval)
+        except RedisError:
+            pass
+        self._incr_stats(coalesced=1)
+        return self[key]
+
+    def stats(self):
+        stats = {
+            'enabled': self.enabled,
+            'ttl': self.ttl,
+            'generation': self.get_generation(),
+        }
+        try:
+            counters = {
+                k.decode('utf-8'): int(v)
+                for k, v in self.client.hgetall(STATS_KEY).items()
+            }
+        except RedisError:
+            counters = {}
+        lookups = counters.get('hits', 0) + counters.get('misses', 0)
+        stats['counters'] = counters
+        stats['hit_ratio'] = (
+            round(counters.get('hits', 0) / lookups, 4)
+            if lookups else None
+        )
+        if counters.get('bytes_written'):
+            stats['compression_ratio'] = round(
+                counters.get('bytes_uncompressed', 0) / counters['bytes_written'],
+                2
+            )
+        return stats
+
+    def reset_stats(self):
+        try:
+            self.client.delete(STATS_KEY)
+        except RedisError:
+            pass
+
+
+def should_store_search_results(item):
+    # Don't cache failed or empty searches, cache hits can't restore
+    # the status code set on the original response.
+    if isinstance(item, dict):
+        return item.get('notification', 'Success') == 'Success'
+    return True
+
+
+def get_max_cached_limit(request):
+    settings = getattr(request.registry, 'settings', None) or {}
+    return int(settings.get('search_cache.max_limit', DEFAULT_MAX_LIMIT))
 
 
 def should_cache_search_results(context, request):
@@ -46,14 +296,19 @@ def should_cache_search_results(context, request):
     if limit is None:
         return True
     limit = pr.maybe_int(limit)
-    if isinstance(limit, int) and limit <= 25:
+    if isinstance(limit, int) and limit <= get_max_cached_limit(request):
         return True
     return False
 
 
+def make_principals_key(request):
+    principals = ','.join(sorted(request.effective_principals))
+    return hashlib.sha1(principals.encode('utf-8')).hexdigest()
+
+
 def make_key_from_request(prefix, context, request):
     pr = ParamsParser(request)
-    return f'{prefix}.{str(tuple(sorted(pr._params())))}'
+    return f'{prefix}.{make_principals_key(request)}.{str(tuple(sorted(pr._params())))}'
 
 
 def cached_fielded_response_factory(context, request):
@@ -64,5 +319,60 @@ def cached_fielded_response_factory(context, request):
     return FieldedResponse
 
 
-def get_redis_lru_cache():
-    return _redis_lru_cache
+def _compute_and_store(cache, key, view, context, request):
+    token = cache.acquire_lock(key)
+    if token is None:
+        # Another process is computing the same response.
+        try:
+            return cache.wait_for(key), request.response.status_code
+        except KeyError:
+            pass
+        token = cache.acquire_lock(key)
+    try:
+        result = view(context, request)
+        cache[key] = result
+    finally:
+        if token is not None:
+            cache.release_lock(key, token)
+    return result, request.response.status_code
+
+
+def cached_search(prefix):
+    '''
+    Caches the view's response in the search cache and coalesces
+    concurrent misses for the same key, so a cold popular page runs its
+    Elasticsearch query once: in-process on a shared future, across
+    processes on a Redis lock whose holder stores the result. The cache
+    is looked up in the request's registry, as views are decorated at
+    import, before includeme creates it.
+    '''
+    def decorator(view):
+        @wraps(view)
+        def wrapper(context, request):
+            if not should_cache_search_results(context, request):
+                return view(context, request)
+            cache = request.registry[REDIS_LRU_CACHE]
+            key = make_key_from_request(prefix, context, request)
+            try:
+                return cache[key]
+            except KeyError:
+                pass
+            (result, status_code), shared = _single_flight.do(
+                key,
+                lambda: _compute_and_store(cache, key, view, context, request),
+            )
+            if shared:
+                request.response.status_code = status_code
+                # Each request gets its own copy to render.
+                result = copy.deepcopy(result)
+            return result
+        return wrapper
+    return decorator
+
+
+@view_config(route_name='_search_cache_stats', request_method='GET', permission='index')
+def search_cache_stats(context, request):
+    cache = request.registry[REDIS_LRU_CACHE]
+    if asbool(request.params.get('reset', False)):
+        cache.reset_stats()
+    return cache.stats()
@@ -0,0 +1,54 @@
+import threading
+
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError
+
+
+DEFAULT_WAIT_TIMEOUT = 30
+
+
+class SingleFlight:
+    '''
+    Coalesces concurrent calls for the same key within a process. The
+    first caller (the leader) runs the function, everyone else arriving
+    while it is in flight waits on a future and gets the leader's result
+    or exception. Followers that wait longer than timeout stop waiting
+    and run the function themselves.
+    '''
+
+    def __init__(self, timeout=DEFAULT_WAIT_TIMEOUT):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def do(self, key, func):
+        '''
+        Returns (result, shared) where shared is True if the result came
+        from another caller's call.
+        '''
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+        if not leader:
+            try:
+                return future.result(timeout=self.timeout), True
+            except TimeoutError:
+                return func(), False
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
@@ -1,3 +1,4 @@
+MATRIX_SNAPSHOTS = 'matrix_snapshots'
 REDIS_LRU_CACHE = 'redis_lru_cache'
 RNA_EXPRESSION = 'RNAExpression'
 RNA_CLIENT = 'rna_client'
@@ -0,0 +1,192 @@
+import json
+import logging
+import time
+
+from pyramid.request import Request
+from pyramid.settings import asbool
+from pyramid.settings import aslist
+from pyramid.view import view_config
+from redis.exceptions import RedisError
+from encoded.searches.caches import KEY_PREFIX
+from encoded.searches.caches import make_key_from_request
+from encoded.searches.interfaces import MATRIX_SNAPSHOTS
+from encoded.searches.interfaces import REDIS_LRU_CACHE
+
+
+log = logging.getLogger(__name__)
+
+
+DEFAULT_SNAPSHOT_TTL = 7 * 24 * 60 * 60
+# Seconds refresh_if_stale spends per call before leaving the rest for the next.
+DEFAULT_SNAPSHOT_TIME_LIMIT = 30
+SNAPSHOT_STATE_KEY = f'{KEY_PREFIX}:snapshots'
+
+
+# Landing page of each matrix, used unless matrix_snapshots.paths lists
+# others. The first path segment is the prefix its view passes to
+# cached_search. Params are order-insensitive when matched.
+DEFAULT_MATRIX_SNAPSHOTS = [
+    '/matrix/?type=Experiment&control_type!=*&status=released',
+    '/human-donor-matrix/?type=Experiment&control_type!=*&replicates.library.biosample.donor.organism.scientific_name=Homo+sapiens&biosample_ontology.classification=tissue&status=released&config=HumanDonorMatrix',
+    '/stem-cell-matrix/?type=Experiment&internal_tags=SESCC',
+    '/chip-seq-matrix/?type=Experiment&replicates.library.biosample.donor.organism.scientific_name=Homo%20sapiens&assay_title=Histone%20ChIP-seq&assay_title=Mint-ChIP-seq&status=released',
+    '/deeply-profiled-uniform-batch-matrix/?type=Experiment&control_type!=*&status=released',
+    '/reference-epigenome-matrix/?type=Experiment&related_series.@type=ReferenceEpigenome&replicates.library.biosample.donor.organism.scientific_name=Homo+sapiens&status=released',
+    '/entex-matrix/?type=Experiment&status=released&internal_tags=ENTEx',
+    '/brain-matrix/?type=Experiment&status=released&internal_tags=RushAD',
+    '/functional-characterization-matrix/?type=FunctionalCharacterizationExperiment&type=FunctionalCharacterizationSeries&type=TransgenicEnhancerExperiment&config=FunctionalCharacterization&datapoint=false&control_type!=*&status=released',
+    '/mouse-development-matrix/?type=Experiment&status=released&related_series.@type=OrganismDevelopmentSeries&replicates.library.biosample.organism.scientific_name=Mus+musculus',
+    '/encore-matrix/?type=Experiment&status=released&internal_tags=ENCORE',
+    '/degron-matrix/?type=Experiment&control_type!=*&status=released&internal_tags=Degron',
+]
+
+
+def includeme(config):
+    config.add_route('_matrix_snapshots', '/_matrix_snapshots')
+    config.scan(__name__)
+    settings = config.registry.settings
+    config.registry[MATRIX_SNAPSHOTS] = MatrixSnapshots(
+        config.registry,
+        snapshots=aslist(settings.get('matrix_snapshots.paths', DEFAULT_MATRIX_SNAPSHOTS)),
+        ttl=int(settings.get('matrix_snapshots.ttl', DEFAULT_SNAPSHOT_TTL)),
+        time_limit=float(settings.get('matrix_snapshots.time_limit', DEFAULT_SNAPSHOT_TIME_LIMIT)),
+        enabled=asbool(settings.get('matrix_snapshots.enabled', True)),
+    )
+
+
+def snapshot_prefix(path):
+    return path.split('?', 1)[0].strip('/')
+
+
+class MatrixSnapshots:
+    '''
+    Materializes the public landing page of every matrix once per
+    indexing generation. Each snapshot is computed through an anonymous
+    subrequest, so it is stored by cached_search under exactly the key a
+    matching public request looks up, and then kept for ttl instead of
+    the regular search cache TTL. Requests with other filters or other
+    principals miss and fall back to a live query as before.
+
+    refresh_if_stale stops starting subrequests once time_limit seconds
+    have passed and leaves the rest pending, so the indexer cycle that
+    calls it is only held up that long; the next call picks them up.
+    '''
+
+    def __init__(self, registry, snapshots=DEFAULT_MATRIX_SNAPSHOTS, ttl=DEFAULT_SNAPSHOT_TTL,
+                 time_limit=DEFAULT_SNAPSHOT_TIME_LIMIT, enabled=True):
+        self.registry = registry
+        self.snapshots = snapshots
+        self.ttl = ttl
+        self.time_limit = time_limit
+        self.enabled = enabled
+
+    @property
+    def cache(self):
+        return self.registry[REDIS_LRU_CACHE]
+
+    def _make_subrequest(self, path):
+        subreq = Request.blank(path)
+        subreq.environ['HTTP_ACCEPT'] = 'application/json'
+        subreq.registry = self.registry
+        return subreq
+
+    def _refresh_one(self, request, path):
+        subreq = self._make_subrequest(path)
+        start = time.time()
+        response = request.invoke_subrequest(subreq)
+        elapsed = time.time() - start
+        key = make_key_from_request(snapshot_prefix(path), None, subreq)
+        stored = (
+            response.status_int == 200
+            and self.cache.expire(key, self.ttl)
+        )
+        return {
+            'path': path,
+            'stored': stored,
+            'elapsed': round(elapsed, 3),
+        }
+
+    def _refresh(self, request, generation, paths, results, time_limit=None):
+        start = time.time()
+        pending = list(paths)
+        while pending:
+            path = pending.pop(0)
+            try:
+                results.append(self._refresh_one(request, path))
+            except Exception as e:
+                log.warning('Unable to snapshot %s', path, exc_info=True)
+                results.append({'path': path, 'stored': False, 'error': repr(e)})
+            if time_limit is not None and time.time() - start >= time_limit:
+                break
+        state = {
+            'generation': generation,
+            'refreshed_at': time.time(),
+            'snapshots': results,
+            'pending': pending,
+        }
+        self._set_state(state)
+        return state
+
+    def refresh(self, request):
+        return self._refresh(request, self.cache.get_generation(), self.snapshots, [])
+
+    def is_stale(self):
+        generation = self.cache.get_generation()
+        if generation is None:
+            return False
+        state = self.get_state()
+        return state.get('generation') != generation or bool(state.get('pending'))
+
+    def refresh_if_stale(self, request):
+        if not self.enabled or not self.cache.enabled or not self.is_stale():
+            return None
+        generation = self.cache.get_generation()
+        state = self.get_state()
+        if state.get('generation') == generation:
+            # Finish the snapshots left over by the last call.
+            paths, results = state['pending'], state.get('snapshots', [])
+        else:
+            paths, results = self.snapshots, []
+        return self._refresh(request, generation, paths, results, time_limit=self.time_limit)
+
+    def get_state(self):
+        try:
+            state = self.cache.client.get(SNAPSHOT_STATE_KEY)
+        except RedisError:
+            return {}
+        if state is None:
+            return {}
+        return json.loads(state)
+
+    def _set_state(self, state):
+        try:
+            self.cache.client.set(SNAPSHOT_STATE_KEY, json.dumps(state))
+        except RedisError:
+            pass
+
+
+def refresh_matrix_snapshots_if_stale(request):
+    snapshots = request.registry.get(MATRIX_SNAPSHOTS)
+    if snapshots is None:
+        return None
+    try:
+        return snapshots.refresh_if_stale(request)
+    except Exception:
+        log.warning('Unable to refresh matrix snapshots', exc_info=True)
+        return None
+
+
+@view_config(route_name='_matrix_snapshots', request_method='GET', permission='index')
+def matrix_snapshots_state(context, request):
+    snapshots = request.registry[MATRIX_SNAPSHOTS]
+    state = snapshots.get_state()
+    state['enabled'] = snapshots.enabled
+    state['ttl'] = snapshots.ttl
+    state['time_limit'] = snapshots.time_limit
+    state['current_generation'] = snapshots.cache.get_generation()
+    return state
+
+
+@view_config(route_name='_matrix_snapshots', request_method='POST', permission='index')
+def matrix_snapshots_refresh(context, request):
+    return request.registry[MATRIX_SNAPSHOTS].refresh(request)
@@ -2,6 +2,7 @@
 
 http://pyramid.readthedocs.org/en/latest/narr/testing.html
 '''
+import os
 import tempfile
 
 import pkg_resources
@@ -23,6 +24,7 @@ pytest_plugins = [
 
     'encoded.tests.fixtures.batch_download',
     'encoded.tests.fixtures.ontology',
+    'encoded.tests.fixtures.search_cache',
     'encoded.tests.fixtures.testapp',
 
     'encoded.tests.fixtures.schemas.access_key',
@@ -173,9 +175,25 @@ def app_settings(request, wsgi_server_host_port, conn, DBSession, redis_server):
     settings = _app_settings.copy()
     settings['auth0.audiences'] = 'http://%s:%s' % wsgi_server_host_port
     settings[DBSESSION] = DBSession
+    settings['load_test_data_cache'] = load_test_data_cache_dir(request.config)
     return settings
 
 
+def load_test_data_cache_dir(config):
+    '''
+    Where workbook snapshots are kept: $ENCODED_LOAD_TEST_DATA_CACHE if
+    set (empty to always load the inserts), else this checkout's pytest
+    cache directory.
+    '''
+    cache_dir = os.environ.get('ENCODED_LOAD_TEST_DATA_CACHE')
+    if cache_dir is not None:
+        return cache_dir
+    cache = getattr(config, 'cache', None)
+    if cache is None:
+        return None
+    return str(cache.makedir('encoded-load-test-data'))
+
+
 @fixture(scope='session')
 def app(app_settings):
     '''WSGI application level functional testing.
@@ -189,19 +207,8 @@ def app(app_settings):
 def workbook(conn, app, app_settings):
     tx = conn.begin_nested()
     try:
-        from webtest import TestApp
-        environ = {
-            'HTTP_ACCEPT': 'application/json',
-            'REMOTE_USER': 'TEST',
-        }
-        testapp = TestApp(app, environ)
-
-        from encoded.loadxl import load_all
-        from pkg_resources import resource_filename
-        inserts = resource_filename('encoded', 'tests/data/inserts/')
-        docsdir = [resource_filename('encoded', 'tests/data/documents/')]
-        load_all(testapp, inserts, docsdir)
-
+        from encoded.loadxl import load_test_data
+        load_test_data(app)
         yield
     finally:
         tx.rollback()
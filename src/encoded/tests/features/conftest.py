@@ -61,11 +61,8 @@ def index_workbook(request, app):
     }
     testapp = TestApp(app, environ)
 
-    from encoded.loadxl import load_all
-    from pkg_resources import resource_filename
-    inserts = resource_filename('encoded', 'tests/data/inserts/')
-    docsdir = [resource_filename('encoded', 'tests/data/documents/')]
-    load_all(testapp, inserts, docsdir, log_level=log_level)
+    from encoded.loadxl import load_test_data
+    load_test_data(app, log_level=log_level)
 
     testapp.post_json('/index', {'is_testing_full': True})
     yield
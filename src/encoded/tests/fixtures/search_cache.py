@@ -0,0 +1,113 @@
+import pytest
+
+
+class FakeRedis:
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None, px=None, nx=False):
+        if nx and key in self.data:
+            return None
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        self.data[key] = value
+        self.expires[key] = ex
+        return True
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def expire(self, key, ttl):
+        if key not in self.data:
+            return False
+        self.expires[key] = ttl
+        return True
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def hmget(self, key, fields):
+        values = self.data.get(key, {})
+        return [values.get(field) for field in fields]
+
+    def hgetall(self, key):
+        return {
+            k.encode('utf-8'): str(v).encode('utf-8')
+            for k, v in self.data.get(key, {}).items()
+        }
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+
+    def __init__(self, client):
+        self.client = client
+
+    def hincrby(self, key, field, amount):
+        stats = self.client.data.setdefault(key, {})
+        stats[field] = stats.get(field, 0) + amount
+
+    def hset(self, key, field, value):
+        self.client.data.setdefault(key, {})[field] = value
+
+    def expire(self, key, ttl):
+        self.client.expire(key, ttl)
+
+    def execute(self):
+        pass
+
+
+class BrokenRedis(FakeRedis):
+
+    def get(self, key):
+        from redis.exceptions import ConnectionError
+        raise ConnectionError()
+
+    def set(self, key, value, ex=None, px=None, nx=False):
+        from redis.exceptions import ConnectionError
+        raise ConnectionError()
+
+    def hmget(self, key, fields):
+        from redis.exceptions import ConnectionError
+        raise ConnectionError()
+
+    def pipeline(self, transaction=True):
+        return BrokenPipeline(self)
+
+
+class BrokenPipeline(FakePipeline):
+
+    def hset(self, key, field, value):
+        from redis.exceptions import ConnectionError
+        raise ConnectionError()
+
+
+class FakeGeneration:
+
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+@pytest.fixture
+def fake_redis():
+    return FakeRedis()
+
+
+@pytest.fixture
+def broken_redis():
+    return BrokenRedis()
+
+
+@pytest.fixture
+def fake_generation():
+    return FakeGeneration(1)
@@ -133,3 +133,103 @@ def test_access_key_uses_edw_hash(app, access_key_3):
     obj = root.by_item_type['access_key'][access_key_3['access_key_id']]
     pwhash = obj.properties['secret_access_key_hash']
     assert EDWHash.hash(access_key_3['secret_access_key']) == pwhash
+
+
+def test_access_key_principals_cached(anontestapp, execute_counter, access_key_3):
+    headers = {'Authorization': auth_header(access_key_3)}
+    res = anontestapp.get('/@@testing-user', headers=headers)
+    # Only the check that the access key and user tids are still current
+    with execute_counter.expect(1):
+        cached = anontestapp.get('/@@testing-user', headers=headers)
+    assert cached.json['effective_principals'] == res.json['effective_principals']
+    headers = {'Authorization': basic_auth(access_key_3['access_key_id'], 'bad_password')}
+    anontestapp.get('/@@testing-user', headers=headers, status=401)
+
+
+def test_access_key_cache_user_change(anontestapp, testapp, access_key_3, submitter):
+    headers = {'Authorization': auth_header(access_key_3)}
+    res = anontestapp.get('/@@testing-user', headers=headers)
+    assert 'viewing_group.ENCODE4' not in res.json['effective_principals']
+    testapp.patch_json(submitter['@id'], {'viewing_groups': ['ENCODE4']})
+    res = anontestapp.get('/@@testing-user', headers=headers)
+    assert 'viewing_group.ENCODE4' in res.json['effective_principals']
+    testapp.patch_json(submitter['@id'], {'status': 'disabled'})
+    anontestapp.get('/@@testing-user', headers=headers, status=401)
+
+
+def test_access_key_cache_delete_disable_login(anontestapp, testapp, access_key_3):
+    headers = {'Authorization': auth_header(access_key_3)}
+    anontestapp.get('/@@testing-user', headers=headers)
+    testapp.patch_json(access_key_3['@id'], {'status': 'deleted'})
+    anontestapp.get('/@@testing-user', headers=headers, status=401)
+
+
+def test_access_key_cache_sees_changes_from_other_processes(anontestapp, testapp, access_key_3, submitter, mocker):
+    from encoded.authentication import ACCESS_KEY_CACHE
+    cache = testapp.app.registry[ACCESS_KEY_CACHE]
+    # As if the changes were made through another process
+    mocker.patch.object(cache, '_invalidate')
+    headers = {'Authorization': auth_header(access_key_3)}
+    res = anontestapp.get('/@@testing-user', headers=headers)
+    assert 'viewing_group.ENCODE4' not in res.json['effective_principals']
+    testapp.patch_json(submitter['@id'], {'viewing_groups': ['ENCODE4']})
+    res = anontestapp.get('/@@testing-user', headers=headers)
+    assert 'viewing_group.ENCODE4' in res.json['effective_principals']
+    testapp.patch_json(access_key_3['@id'], {'status': 'deleted'})
+    anontestapp.get('/@@testing-user', headers=headers, status=401)
+
+
+def test_access_key_cache_expires_and_evicts(mocker):
+    from encoded import authentication
+    cache = authentication.AccessKeyCache(maxsize=2, ttl=10)
+    now = [100.0]
+    mocker.patch.object(authentication.time, 'monotonic', lambda: now[0])
+    keys = [cache.key('KEY%d' % n, 'secret') for n in range(3)]
+    assert keys[0] != cache.key('KEY0', 'other secret')
+    for key in keys:
+        cache.add(key, 'user-uuid', cache.generation)
+    assert not cache.verified(keys[0])
+    assert cache.verified(keys[1])
+    cache.set_principals(keys[1], ['userid.user-uuid'], cache.generation)
+    assert cache.principals(keys[1]) == ['userid.user-uuid']
+    now[0] += 10
+    assert not cache.verified(keys[1])
+    assert cache.stats() == {'size': 1, 'hits': 1, 'misses': 2}
+
+
+def test_access_key_cache_invalidation():
+    from encoded.authentication import AccessKeyCache
+    cache = AccessKeyCache()
+    one = cache.key('ONE', 'secret')
+    two = cache.key('TWO', 'secret')
+    generation = cache.generation
+    cache.add(one, 'user-1', generation)
+    cache.add(two, 'user-2', generation)
+    cache.invalidate_user('user-1')
+    assert not cache.verified(one)
+    assert cache.verified(two)
+    cache.invalidate_access_key('TWO')
+    assert not cache.verified(two)
+    # A check that started before an invalidation is not cached.
+    cache.add(one, 'user-1', generation)
+    assert not cache.verified(one)
+    assert not AccessKeyCache(maxsize=0).enabled
+
+
+def test_access_key_cache_checks_tids():
+    from encoded.authentication import AccessKeyCache
+    cache = AccessKeyCache()
+    key = cache.key('ONE', 'secret')
+    cache.add(key, 'user-1', cache.generation, tids={'key-uuid': '1'})
+    cache.set_principals(key, ['userid.user-1'], cache.generation, tids={'user-1': '2'})
+    seen = []
+
+    def is_current(tids):
+        seen.append(tids)
+        return tids == {'key-uuid': '1', 'user-1': '2'}
+
+    assert cache.verified(key, is_current)
+    assert seen == [{'key-uuid': '1', 'user-1': '2'}]
+    assert not cache.verified(key, lambda tids: False)
+    assert not cache.verified(key)
+    assert cache.stats() == {'size': 0, 'hits': 1, 'misses': 2}
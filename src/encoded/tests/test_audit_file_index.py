@@ -0,0 +1,127 @@
+import pytest
+
+
+def make_file(accession, file_format, output_type, output_category='processed data', **kwargs):
+    file_object = {
+        '@id': '/files/{}/'.format(accession),
+        'accession': accession,
+        'status': 'released',
+        'file_format': file_format,
+        'output_type': output_type,
+        'output_category': output_category,
+    }
+    file_object.update(kwargs)
+    return file_object
+
+
+def pipeline_step(*titles):
+    return {
+        'analysis_step': {
+            'pipelines': [{'title': title} for title in titles],
+        },
+    }
+
+
+@pytest.fixture
+def indexed_files():
+    return [
+        make_file('ENCFF001AAA', 'fastq', 'reads', 'raw data'),
+        make_file(
+            'ENCFF002AAA', 'bam', 'alignments',
+            derived_from=['/files/ENCFF001AAA/'],
+            analysis_step_version=pipeline_step('ChIP-seq read mapping'),
+            quality_metrics=[
+                {'uuid': 'qm-1', '@type': ['SamtoolsFlagstatsQualityMetric', 'QualityMetric']},
+                {'uuid': 'qm-2', '@type': ['ChipAlignmentEnrichmentQualityMetric', 'QualityMetric']},
+            ],
+        ),
+        make_file(
+            'ENCFF003AAA', 'bed', 'IDR thresholded peaks',
+            preferred_default=True,
+            derived_from=['/files/ENCFF002AAA/', '/files/ENCFF999AAA/'],
+            analysis_step_version=pipeline_step('ChIP-seq read mapping', 'Histone ChIP-seq 2'),
+        ),
+        make_file('ENCFF004AAA', 'bed', 'pseudoreplicated peaks'),
+        make_file('ENCFF005AAA', 'bam', 'alignments', status='revoked'),
+    ]
+
+
+def test_audit_experiment_files_mapping_buckets(indexed_files):
+    from encoded.audit.experiment import create_files_mapping
+    files_structure = create_files_mapping(indexed_files, ['revoked', 'archived'])
+    assert files_structure['excluded_types'] == ['revoked', 'archived']
+    assert list(files_structure['original_files']) == [
+        '/files/ENCFF001AAA/',
+        '/files/ENCFF002AAA/',
+        '/files/ENCFF003AAA/',
+        '/files/ENCFF004AAA/',
+    ]
+    assert list(files_structure['fastq_files']) == ['/files/ENCFF001AAA/']
+    assert list(files_structure['alignments']) == ['/files/ENCFF002AAA/']
+    assert list(files_structure['idr_thresholded_peaks']) == ['/files/ENCFF003AAA/']
+    assert list(files_structure['preferred_default_idr_peaks']) == ['/files/ENCFF003AAA/']
+    assert list(files_structure['overlap_and_idr_peaks']) == [
+        '/files/ENCFF003AAA/',
+        '/files/ENCFF004AAA/',
+    ]
+    assert list(files_structure['pseudo_replicated_peaks_files']) == ['/files/ENCFF004AAA/']
+    assert list(files_structure['raw_data']) == ['/files/ENCFF001AAA/']
+    assert len(files_structure['processed_data']) == 3
+    assert files_structure['contributing_files'] == {}
+    assert files_structure['alignments_unfiltered_alignments'] == {}
+
+
+def test_audit_analysis_files_mapping_requires_step(indexed_files):
+    from encoded.audit.analysis import create_files_mapping
+    files_structure = create_files_mapping(indexed_files, ['revoked', 'deleted'])
+    assert 'original_files' not in files_structure
+    assert 'excluded_types' not in files_structure
+    assert list(files_structure['alignments']) == ['/files/ENCFF002AAA/']
+    assert files_structure['pseudo_replicated_peaks_files'] == {}
+
+
+def test_audit_file_index_derived_from(indexed_files):
+    from encoded.audit.experiment import create_files_mapping
+    from encoded.audit.experiment import get_derived_from_files_set
+    files_structure = create_files_mapping(indexed_files, ['revoked'])
+    files_structure['contributing_files'] = {
+        '/files/ENCFF999AAA/': make_file('ENCFF999AAA', 'bam', 'alignments'),
+    }
+    peaks = files_structure['original_files']['/files/ENCFF003AAA/']
+    assert [f['accession'] for f in files_structure.derived_from(peaks)] == [
+        'ENCFF002AAA',
+        'ENCFF999AAA',
+    ]
+    assert sorted(get_derived_from_files_set([peaks], files_structure, 'bam', False)) == [
+        'ENCFF002AAA',
+        'ENCFF999AAA',
+    ]
+    assert [
+        f['accession'] for f in files_structure.files_derived_from('/files/ENCFF001AAA/')
+    ] == ['ENCFF002AAA']
+
+
+def test_audit_file_index_pipelines_and_metrics(indexed_files):
+    from encoded.audit.experiment import create_files_mapping
+    files_structure = create_files_mapping(indexed_files, ['revoked'])
+    assert [p['title'] for p in files_structure.pipelines('original_files')] == [
+        'ChIP-seq read mapping',
+        'Histone ChIP-seq 2',
+    ]
+    assert [
+        f['accession'] for f in files_structure.files_with_pipeline('ChIP-seq read mapping')
+    ] == ['ENCFF002AAA', 'ENCFF003AAA']
+    assert [
+        m['uuid'] for m in files_structure.metrics('alignments', 'QualityMetric')
+    ] == ['qm-1', 'qm-2']
+    assert files_structure.metrics('peaks_files', 'QualityMetric') == []
+
+
+def test_audit_file_index_dataset_index_is_shared(indexed_files):
+    from encoded.audit.experiment import create_files_mapping
+    files_structure = create_files_mapping([], ['revoked'])
+    control = {'@id': '/experiments/ENCSR000CTL/', 'original_files': indexed_files}
+    control_structure = files_structure.dataset_index(control)
+    assert control_structure is files_structure.dataset_index(control)
+    assert control_structure['excluded_types'] == ['revoked']
+    assert list(control_structure['alignments']) == ['/files/ENCFF002AAA/']
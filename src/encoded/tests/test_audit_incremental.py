@@ -0,0 +1,200 @@
+import pytest
+
+
+class FakeRegistry:
+    def __init__(self, settings=None):
+        self.settings = settings or {}
+
+
+@pytest.fixture
+def audit_cache():
+    from encoded.audit.incremental import AuditResultCache
+    return AuditResultCache(maxsize=10)
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+@pytest.fixture
+def checks(calls):
+    def check_status(value, system, excluded):
+        calls.append('status')
+        if value.get('status') == 'in progress':
+            yield 'status ' + value['status']
+
+    def check_lab(value, system, excluded):
+        calls.append('lab')
+        if value['lab'] not in excluded:
+            yield 'lab ' + value['lab']
+
+    def check_all(value, system, excluded):
+        calls.append('all')
+        yield len(value.keys())
+
+    return {
+        'check_status': check_status,
+        'check_lab': check_lab,
+        'check_all': check_all,
+    }
+
+
+def run(checks, value, audit_cache, registry=None, **kwargs):
+    from encoded.audit.incremental import run_audit_checks
+    system = {'registry': registry or FakeRegistry()}
+    return list(
+        run_audit_checks(checks, value, system, ['x'], cache=audit_cache, **kwargs)
+    )
+
+
+def test_audit_incremental_reuses_unchanged_results(checks, calls, audit_cache):
+    value = {'uuid': 'a', 'status': 'in progress', 'lab': 'y'}
+    first = run(checks, value, audit_cache)
+    assert calls == ['status', 'lab', 'all']
+    second = run(checks, dict(value), audit_cache)
+    assert second == first
+    assert calls == ['status', 'lab', 'all']
+    assert audit_cache.hits == 3
+    assert audit_cache.misses == 3
+
+
+def test_audit_incremental_reruns_only_checks_reading_changed_field(checks, calls, audit_cache):
+    value = {'uuid': 'a', 'status': 'in progress', 'lab': 'y'}
+    run(checks, value, audit_cache)
+    del calls[:]
+    results = run(checks, dict(value, lab='z'), audit_cache)
+    assert calls == ['lab', 'all']
+    assert results == ['status in progress', 'lab z', 3]
+
+
+def test_audit_incremental_added_field_reruns_whole_frame_checks(checks, calls, audit_cache):
+    value = {'uuid': 'a', 'status': 'released', 'lab': 'y'}
+    run(checks, value, audit_cache)
+    del calls[:]
+    results = run(checks, dict(value, award='b'), audit_cache)
+    assert calls == ['all']
+    assert results == ['lab y', 4]
+
+
+def test_audit_incremental_declared_inputs(checks, calls, audit_cache):
+    value = {'uuid': 'a', 'status': 'released', 'lab': 'y', 'original_files': []}
+    run(checks, value, audit_cache, inputs=('original_files',))
+    del calls[:]
+    run(checks, dict(value, original_files=['/files/f/']), audit_cache, inputs=('original_files',))
+    assert calls == ['status', 'lab', 'all']
+
+
+def test_audit_incremental_always_run(checks, calls, audit_cache):
+    value = {'uuid': 'a', 'status': 'released', 'lab': 'y'}
+    run(checks, value, audit_cache, always_run={'check_lab'})
+    run(checks, value, audit_cache, always_run={'check_lab'})
+    assert calls == ['status', 'lab', 'all', 'lab']
+
+
+def test_audit_incremental_items_cached_separately(checks, calls, audit_cache):
+    run(checks, {'uuid': 'a', 'status': 'released', 'lab': 'y'}, audit_cache)
+    del calls[:]
+    run(checks, {'uuid': 'b', 'status': 'released', 'lab': 'y'}, audit_cache)
+    assert calls == ['status', 'lab', 'all']
+
+
+def test_audit_incremental_disabled(checks, calls, audit_cache):
+    registry = FakeRegistry({'audit.incremental': 'false'})
+    value = {'uuid': 'a', 'status': 'released', 'lab': 'y'}
+    run(checks, value, audit_cache, registry=registry)
+    run(checks, value, audit_cache, registry=registry)
+    assert calls == ['status', 'lab', 'all'] * 2
+    assert len(audit_cache) == 0
+
+
+def test_audit_incremental_error_not_cached(calls, audit_cache):
+    def check_error(value, system, excluded):
+        calls.append('error')
+        yield 'before'
+        raise ValueError(value['lab'])
+
+    from encoded.audit.incremental import run_audit_checks
+    value = {'uuid': 'a', 'lab': 'y'}
+    for n in range(2):
+        results = []
+        with pytest.raises(ValueError):
+            for failure in run_audit_checks(
+                    {'check_error': check_error}, value, {}, [], cache=audit_cache):
+                results.append(failure)
+        assert results == ['before']
+    assert calls == ['error', 'error']
+
+
+def test_audit_incremental_cache_is_bounded(checks, audit_cache):
+    for n in range(10):
+        run(checks, {'uuid': str(n), 'status': 'released', 'lab': 'y'}, audit_cache)
+    assert len(audit_cache) == audit_cache.maxsize
+
+
+def test_audit_experiment_rerun_after_edit(testapp, base_experiment):
+    from .test_audit_experiment import collect_audit_errors
+    res = testapp.get(base_experiment['@id'] + '@@index-data')
+    assert all(
+        error['category'] != 'missing target'
+        for error in collect_audit_errors(res)
+    )
+    testapp.patch_json(base_experiment['@id'], {'assay_term_name': 'ChIP-seq'})
+    res = testapp.get(base_experiment['@id'] + '@@index-data')
+    assert any(
+        error['category'] == 'missing target'
+        for error in collect_audit_errors(res)
+    )
+
+
+def audit_failure_checks(calls):
+    from snovault import AuditFailure
+
+    def check_lab(value, system, excluded):
+        calls.append('lab')
+        if value['lab'] not in excluded:
+            yield AuditFailure('lab', value['lab'], level='WARNING', path=value['uuid'])
+
+    def check_status(value, system, excluded):
+        calls.append('status')
+        yield AuditFailure('status', value['status'], level='ERROR')
+
+    return {'check_lab': check_lab, 'check_status': check_status}
+
+
+def test_audit_incremental_redis_cache_shared_between_processes(calls, fake_redis):
+    from encoded.audit.incremental import RedisAuditResultCache
+    checks = audit_failure_checks(calls)
+    value = {'uuid': 'a', 'status': 'released', 'lab': 'y'}
+    first = [
+        failure.__json__()
+        for failure in run(checks, value, RedisAuditResultCache(fake_redis, ttl=60))
+    ]
+    assert fake_redis.expires['audit_result:a'] == 60
+    # A second process's cache on the same Redis reuses the results.
+    other = RedisAuditResultCache(fake_redis, ttl=60)
+    second = [failure.__json__() for failure in run(checks, dict(value), other)]
+    assert second == first
+    assert calls == ['lab', 'status']
+    assert other.hits == 2
+    run(checks, dict(value, lab='z'), other)
+    assert calls == ['lab', 'status', 'lab']
+
+
+def test_audit_incremental_redis_cache_errors_are_misses(calls, broken_redis):
+    from encoded.audit.incremental import RedisAuditResultCache
+    checks = audit_failure_checks(calls)
+    cache = RedisAuditResultCache(broken_redis)
+    value = {'uuid': 'a', 'status': 'released', 'lab': 'y'}
+    assert len(run(checks, value, cache)) == 2
+    assert len(run(checks, value, cache)) == 2
+    assert calls == ['lab', 'status'] * 2
+
+
+def test_audit_incremental_make_audit_result_cache():
+    from encoded.audit.incremental import RedisAuditResultCache
+    from encoded.audit.incremental import make_audit_result_cache
+    assert make_audit_result_cache({}) is None
+    settings = {'local_storage_host': 'localhost', 'local_storage_port': '6379'}
+    assert isinstance(make_audit_result_cache(settings), RedisAuditResultCache)
+    assert make_audit_result_cache(dict(settings, **{'audit.result_cache': 'memory'})) is None
@@ -0,0 +1,138 @@
+import pytest
+
+from snovault import AuditFailure
+
+
+def check_lab(value, system, excluded):
+    if value['lab'] not in excluded:
+        yield AuditFailure('lab', value['lab'], level='WARNING')
+
+
+def check_status(value, system, excluded):
+    yield AuditFailure('status', value['status'], level='ERROR')
+    yield AuditFailure('excluded', ','.join(excluded), level='INTERNAL_ACTION')
+
+
+def check_raises(value, system, excluded):
+    raise ValueError(value['lab'])
+    yield
+
+
+def check_system(value, system, excluded):
+    yield AuditFailure('system', system['marker'], level='WARNING')
+
+
+class FakeRegistry:
+    def __init__(self, settings=None):
+        self.settings = settings or {}
+
+
+@pytest.fixture
+def audit_pool_settings():
+    from encoded.audit.pool import reset_audit_pool
+    reset_audit_pool()
+    yield {
+        'audit.parallel': 'true',
+        'audit.pool_workers': '2',
+    }
+    reset_audit_pool()
+
+
+def run(checks, value, settings, **kwargs):
+    from encoded.audit.incremental import AuditResultCache
+    from encoded.audit.incremental import run_audit_checks
+    system = {'registry': FakeRegistry(settings), 'marker': 'in process'}
+    kwargs.setdefault('cache', AuditResultCache())
+    return [
+        failure.__json__()
+        for failure in run_audit_checks(checks, value, system, ['x'], **kwargs)
+    ]
+
+
+def test_audit_pool_matches_serial(audit_pool_settings):
+    checks = {
+        'check_lab': check_lab,
+        'check_status': check_status,
+        'check_system': check_system,
+    }
+    value = {'uuid': 'a', 'lab': 'y', 'status': 'released'}
+    serial = run(checks, value, {}, always_run={'check_system'})
+    parallel = run(checks, value, audit_pool_settings, always_run={'check_system'})
+    assert parallel == serial
+    assert [failure['category'] for failure in parallel] == [
+        'lab',
+        'status',
+        'excluded',
+        'system',
+    ]
+    assert parallel[-1]['detail'] == 'in process'
+
+
+def test_audit_pool_records_reads_for_cache(audit_pool_settings):
+    from encoded.audit.incremental import AuditResultCache
+    cache = AuditResultCache()
+    checks = {'check_lab': check_lab, 'check_status': check_status}
+    value = {'uuid': 'a', 'lab': 'y', 'status': 'released'}
+    first = run(checks, value, audit_pool_settings, cache=cache)
+    assert cache.get(('a', 'check_lab'))[0] == ('lab',)
+    assert run(checks, dict(value), audit_pool_settings, cache=cache) == first
+    assert cache.hits == 2
+
+
+def test_audit_pool_raises_check_errors(audit_pool_settings):
+    checks = {'check_lab': check_lab, 'check_raises': check_raises}
+    with pytest.raises(ValueError):
+        run(checks, {'uuid': 'a', 'lab': 'y'}, audit_pool_settings)
+
+
+def test_audit_pool_disabled_by_default():
+    from encoded.audit.pool import get_audit_pool
+    assert get_audit_pool({'registry': FakeRegistry()}) is None
+
+
+def test_audit_pool_sends_item_once_per_worker(audit_pool_settings):
+    from encoded.audit.pool import AuditPool
+    from encoded.audit.pool import collect_failures
+    pool = AuditPool(workers=2)
+    submitted = []
+    submit = pool.executor.submit
+
+    def counting_submit(fn, *args):
+        submitted.append(args)
+        return submit(fn, *args)
+
+    pool.executor.submit = counting_submit
+    checks = [check_lab, check_status, check_raises, check_lab, check_status]
+    value = {'uuid': 'a', 'lab': 'y', 'status': 'released'}
+    try:
+        handles = pool.submit_checks(checks, value, (['x'],))
+        assert len(submitted) == 2
+        assert sorted(len(args[1]) for args in submitted) == [2, 3]
+        categories = []
+        for handle in handles:
+            try:
+                failures, reads, elapsed = collect_failures(handle)
+            except ValueError:
+                categories.append('raised')
+            else:
+                categories.append([failure.category for failure in failures])
+    finally:
+        pool.shutdown()
+    assert categories == [
+        ['lab'],
+        ['status', 'excluded'],
+        'raised',
+        ['lab'],
+        ['status', 'excluded'],
+    ]
+
+
+def test_audit_pool_without_incremental_does_not_cache(audit_pool_settings):
+    from encoded.audit.incremental import AuditResultCache
+    cache = AuditResultCache()
+    checks = {'check_lab': check_lab, 'check_status': check_status}
+    value = {'uuid': 'a', 'lab': 'y', 'status': 'released'}
+    serial = run(checks, value, {}, incremental=False)
+    parallel = run(checks, value, audit_pool_settings, cache=cache, incremental=False)
+    assert parallel == serial
+    assert cache.get(('a', 'check_lab')) is None
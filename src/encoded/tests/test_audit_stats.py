@@ -0,0 +1,126 @@
+import pytest
+
+from snovault import AuditFailure
+
+
+def check_two_failures(value, system):
+    yield AuditFailure('one', 'detail', level='WARNING')
+    yield AuditFailure('two', 'detail', level='ERROR')
+
+
+def check_nothing(value, system):
+    return None
+
+
+def check_raises(value, system):
+    raise ValueError('broken')
+    yield
+
+
+@pytest.fixture
+def audit_stats():
+    from encoded.audit.stats import AuditStats
+    return AuditStats()
+
+
+def test_audit_stats_check_stats_percentiles():
+    from encoded.audit.stats import CheckStats
+    stats = CheckStats()
+    for elapsed in [0.0002] * 90 + [0.02] * 9 + [3]:
+        stats.add(elapsed)
+    result = stats.as_dict()
+    assert result['count'] == 100
+    assert result['max_ms'] == 3000
+    assert result['percentiles_ms'] == {'p50': 0.25, 'p90': 0.25, 'p99': 25}
+    assert sum(bucket['count'] for bucket in result['histogram']) == 100
+    assert result['histogram'][-1] == {'le_ms': 'inf', 'count': 0}
+
+
+def test_audit_stats_report_sorted_and_limited(audit_stats):
+    audit_stats.record('Experiment', 'audit_fast', 0.001)
+    audit_stats.record('Experiment', 'audit_slow', 0.5, failures=2)
+    audit_stats.record('File', 'audit_slow', 0.1, error=True)
+    report = audit_stats.report(limit=2)
+    assert [(c['item_type'], c['name']) for c in report['checks']] == [
+        ('Experiment', 'audit_slow'),
+        ('File', 'audit_slow'),
+    ]
+    assert report['totals'] == {
+        'checks': 3,
+        'count': 3,
+        'cached': 0,
+        'failures': 2,
+        'errors': 1,
+    }
+    report = audit_stats.report(item_type='File')
+    assert [c['name'] for c in report['checks']] == ['audit_slow']
+    report = audit_stats.report(sort='failures', limit=1)
+    assert report['checks'][0]['failures'] == 2
+
+
+def test_audit_stats_timed_checker(mocker, audit_stats):
+    from encoded.audit import stats
+    mocker.patch.object(stats, 'audit_stats', audit_stats)
+    wrapped = stats.timed_checker(check_two_failures, 'Experiment')
+    assert wrapped.__name__ == 'check_two_failures'
+    assert [failure.category for failure in wrapped({}, {})] == ['one', 'two']
+    assert stats.timed_checker(check_nothing, 'Experiment')({}, {}) is None
+    with pytest.raises(ValueError):
+        list(stats.timed_checker(check_raises, 'Experiment')({}, {}))
+    checks = {
+        check['name']: check
+        for check in audit_stats.report()['checks']
+    }
+    assert checks['check_two_failures']['count'] == 1
+    assert checks['check_two_failures']['failures'] == 2
+    assert checks['check_nothing']['failures'] == 0
+    assert checks['check_raises']['errors'] == 1
+
+
+def test_audit_stats_instrument_audit_checkers():
+    from snovault import AUDITOR
+    from encoded.audit.stats import instrument_audit_checkers
+
+    class FakeAuditor:
+        type_checkers = {
+            'Experiment': [(1, check_two_failures, None, 'embedded')],
+        }
+
+    registry = {AUDITOR: FakeAuditor()}
+    instrument_audit_checkers(registry)
+    instrument_audit_checkers(registry)
+    order, checker, condition, frame = FakeAuditor.type_checkers['Experiment'][0]
+    assert checker.audit_timed
+    assert checker.__wrapped__ is check_two_failures
+
+
+def test_audit_stats_records_dispatched_checks(mocker, audit_stats):
+    from encoded.audit import stats
+    from encoded.audit.incremental import AuditResultCache
+    from encoded.audit.incremental import run_audit_checks
+    mocker.patch.object(stats, 'audit_stats', audit_stats)
+
+    def check_dispatched(value, system, excluded):
+        yield AuditFailure('dispatched', value['lab'], level='WARNING')
+
+    cache = AuditResultCache()
+    value = {'uuid': 'a', '@type': ['Experiment', 'Dataset', 'Item'], 'lab': 'y'}
+    for n in range(2):
+        list(run_audit_checks({'check': check_dispatched}, value, {}, [], cache=cache))
+    check = audit_stats.report()['checks'][0]
+    assert (check['item_type'], check['name']) == ('Experiment', 'check_dispatched')
+    assert check['count'] == 2
+    assert check['cached'] == 1
+    assert check['failures'] == 2
+
+
+def test_audit_stats_view(testapp, base_experiment):
+    from urllib.parse import parse_qs
+    res = testapp.get(base_experiment['@id'] + '@@audit-self')
+    stats = parse_qs(res.headers['X-Stats'])
+    assert int(stats['audit_count'][0]) >= 1
+    assert 'audit_time' in stats
+    res = testapp.get('/_audit_stats?item_type=Experiment&limit=100')
+    names = [check['name'] for check in res.json['checks']]
+    assert 'audit_experiment' in names
+    assert all(check['item_type'] == 'Experiment' for check in res.json['checks'])
@@ -86,6 +86,28 @@ def test_batch_download_lookup_column_value(lookup_column_value_item, lookup_col
         assert lookup_column_value_validate[path] == lookup_column_value(lookup_column_value_item, path)
 
 
+def test_batch_download_make_column_values_getter(lookup_column_value_item, lookup_column_value_validate):
+    from encoded.batch_download import make_column_values_getter
+    paths = list(lookup_column_value_validate.keys())
+    get_column_values = make_column_values_getter(paths)
+    assert get_column_values(lookup_column_value_item) == [
+        lookup_column_value_validate[path]
+        for path in paths
+    ]
+    item = {
+        'lab': {'@id': '/labs/a/', 'title': 'A'},
+        'replicates': [
+            {'library': {'@id': '/libraries/1/', 'nucleic_acid_term_name': None}},
+            {'library': {'@id': '/libraries/2/', 'nucleic_acid_term_name': 'RNA'}},
+        ]
+    }
+    paths = ['lab', 'replicates.library', 'replicates.library.nucleic_acid_term_name']
+    assert make_column_values_getter(paths)(item) == [
+        lookup_column_value(item, path)
+        for path in paths
+    ]
+
+
 def test_batch_download_is_cart_search(dummy_request):
     from encoded.batch_download import is_cart_search
     dummy_request.environ['QUERY_STRING'] = (
@@ -108,3 +130,150 @@ def test_batch_download_get_report_search_generator(dummy_request):
         'type=Experiment&limit=all&cart=1234'
     )
     assert get_report_search_generator(dummy_request).__name__ == 'cart_search_generator'
+
+
+class FakePeakElasticsearch:
+    def __init__(self, sources):
+        self.sources = sources
+        self.mgets = []
+
+    def mget(self, body=None, **kwargs):
+        self.mgets.append(body['docs'])
+        return {
+            'docs': [
+                {'_id': doc['_id'], 'found': True, '_source': self.sources[doc['_id']]}
+                if doc['_id'] in self.sources else
+                {'_id': doc['_id'], 'found': False}
+                for doc in body['docs']
+            ]
+        }
+
+
+@pytest.fixture
+def peak_results():
+    def peak_row(file_uuid, chromosome, positions):
+        return {
+            '_id': file_uuid,
+            '_index': chromosome,
+            'inner_hits': {'positions': {'hits': {'hits': [
+                {'_source': {'start': start, 'end': end}}
+                for start, end in positions
+            ]}}},
+        }
+    return {
+        '@graph': [
+            {'uuid': 'e1', 'files': [{'uuid': 'f1'}, {'uuid': 'f2'}]},
+            {'uuid': 'e2', 'files': [{'uuid': 'f3'}]},
+        ],
+        'peaks': [
+            peak_row('f1', 'chr1', [(10, 20), (30, 40)]),
+            peak_row('f3', 'chr1', [(50, 60)]),
+            peak_row('f2', 'chr2', [(70, 80)]),
+            peak_row('f4', 'chr2', [(90, 100)]),
+        ],
+    }
+
+
+@pytest.fixture
+def peak_es():
+    public = {'view': ['system.Everyone']}
+    return FakePeakElasticsearch({
+        'f1': {'embedded': {'uuid': 'f1', 'accession': 'ENCFF001AAA'}, 'principals_allowed': public},
+        'f2': {'embedded': {'uuid': 'f2', 'accession': 'ENCFF002AAA'}, 'principals_allowed': {'view': ['group.admin']}},
+        'f3': {'embedded': {'uuid': 'f3', 'accession': 'ENCFF003AAA'}, 'principals_allowed': public},
+        'e1': {
+            'embedded': {
+                'uuid': 'e1',
+                'accession': 'ENCSR001AAA',
+                'assay_term_name': 'ChIP-seq',
+                'target': {'label': 'CTCF'},
+                'files': [{'uuid': 'f1', 'replicate': {'library': '/libraries/ENCLB001AAA/'}}],
+                'replicates': [{'library': {'biosample': {'accession': 'ENCBS001AAA'}}}],
+            },
+            'principals_allowed': public,
+        },
+        'e2': {
+            'embedded': {
+                'uuid': 'e2',
+                'accession': 'ENCSR002AAA',
+                'assay_term_name': 'DNase-seq',
+                'files': [{'uuid': 'f3', 'replicate': {'library': {'biosample': {'accession': 'ENCBS002AAA'}}}}],
+            },
+            'principals_allowed': public,
+        },
+    })
+
+
+def test_batch_download_peak_file_metadata_one_mget(peak_es, peak_results):
+    from encoded.batch_download import get_peak_file_metadata
+    metadata = get_peak_file_metadata(peak_es, peak_results, ['system.Everyone'])
+    assert len(peak_es.mgets) == 1
+    assert [(doc['_index'], doc['_id']) for doc in peak_es.mgets[0]] == [
+        ('file', 'f1'),
+        ('file', 'f3'),
+        ('file', 'f2'),
+        ('experiment', 'e1'),
+        ('experiment', 'e2'),
+    ]
+    assert metadata == {
+        'f1': ('ChIP-seq', 'CTCF', 'ENCBS001AAA', 'ENCFF001AAA', 'ENCSR001AAA'),
+        'f3': ('DNase-seq', None, 'ENCBS002AAA', 'ENCFF003AAA', 'ENCSR002AAA'),
+    }
+
+
+def test_batch_download_peak_file_metadata_chunked(peak_es):
+    from encoded.batch_download import mget_embedded
+    docs = [('file', 'f1'), ('file', 'f2'), ('file', 'f3'), ('experiment', 'e1'), ('file', 'missing')]
+    embedded = mget_embedded(peak_es, docs, ['system.Everyone', 'group.admin'], chunk_size=2)
+    assert [len(mget) for mget in peak_es.mgets] == [2, 2, 1]
+    assert sorted(embedded) == ['e1', 'f1', 'f2', 'f3']
+
+
+def test_batch_download_peak_metadata_formats(peak_es, peak_results):
+    import json
+    from encoded.batch_download import PEAK_METADATA_HEADER
+    from encoded.batch_download import get_peak_file_metadata
+    from encoded.batch_download import iter_peak_metadata
+    from encoded.batch_download import iter_peak_metadata_json
+    from encoded.batch_download import iter_peak_metadata_ndjson
+    from encoded.batch_download import iter_text_chunks
+    from encoded.reports.csv import CSVGenerator
+    metadata = get_peak_file_metadata(peak_es, peak_results, ['system.Everyone'])
+    rows = list(iter_peak_metadata(peak_results, metadata))
+    assert [row[1] for row in rows] == ['chr1:10-20', 'chr1:30-40', 'chr1:50-60']
+    tsv = b''.join(CSVGenerator(lineterminator='\r\n').iter_chunks([PEAK_METADATA_HEADER] + rows))
+    assert tsv.split(b'\r\n')[1] == b'ChIP-seq\tchr1:10-20\tCTCF\tENCBS001AAA\tENCFF001AAA\tENCSR001AAA'
+    doc = json.loads(b''.join(iter_text_chunks(iter_peak_metadata_json(peak_results, metadata), chunk_size=10)))
+    assert list(doc) == ['ChIP-seq', 'DNase-seq']
+    assert [entry['coordinates'] for entry in doc['ChIP-seq']] == ['chr1:10-20', 'chr1:30-40']
+    assert doc['DNase-seq'][0]['biosample.accession'] == ['ENCBS002AAA']
+    lines = b''.join(iter_text_chunks(iter_peak_metadata_ndjson(peak_results, metadata))).splitlines()
+    assert [json.loads(line)['assay_term_name'] for line in lines] == ['ChIP-seq', 'ChIP-seq', 'DNase-seq']
+
+
+def test_batch_download_peak_metadata_streams_many_peaks(peak_es):
+    from encoded.batch_download import get_peak_file_metadata
+    from encoded.batch_download import iter_peak_metadata_ndjson
+    from encoded.batch_download import iter_text_chunks
+    positions = [{'_source': {'start': n, 'end': n + 10}} for n in range(200000)]
+    results = {
+        '@graph': [{'uuid': 'e1', 'files': [{'uuid': 'f1'}]}],
+        'peaks': [{'_id': 'f1', '_index': 'chr1', 'inner_hits': {'positions': {'hits': {'hits': positions}}}}],
+    }
+    metadata = get_peak_file_metadata(peak_es, results, ['system.Everyone'])
+    chunks = iter_text_chunks(iter_peak_metadata_ndjson(results, metadata))
+    first = next(chunks)
+    assert len(first) < 2 * 64 * 1024
+    assert sum(chunk.count(b'\n') for chunk in chunks) + first.count(b'\n') == 200000
+
+
+def test_batch_download_get_peak_metadata_links():
+    from pyramid.testing import DummyRequest
+    from encoded.batch_download import get_peak_metadata_links
+    request = DummyRequest()
+    request.matchdict = {'search_params': 'genome=GRCh38&region=chr1:1-2'}
+    links = get_peak_metadata_links(request)
+    assert links == [
+        'http://example.com/peak_metadata/genome%3DGRCh38%26region%3Dchr1%3A1-2/peak_metadata.{}'.format(extension)
+        for extension in ['tsv', 'json', 'ndjson']
+    ]
@@ -0,0 +1,96 @@
+ITEMS = [
+    {
+        'uuid': '0f13ff76-c559-4e70-9497-a6130841df9f',
+        'required': 'required value 1',
+    },
+    {
+        'uuid': '6c3e444b-f290-43c4-bfb9-d20135377770',
+        'required': 'required value 2',
+        'simple1': 'supplied simple1',
+    },
+]
+
+
+def test_bulk_load_post_and_put(testapp):
+    res = testapp.post_json('/_bulk_load', {
+        'item_type': 'testing_post_put_patch',
+        'method': 'POST',
+        'rows': [
+            {'url': '/testing_post_put_patch', 'value': ITEMS[0]},
+            {'url': '/testing_post_put_patch', 'value': {'simple1': 'missing required'}},
+            {'url': '/testing_post_put_patch', 'value': ITEMS[1]},
+            {'url': '/testing_post_put_patch', 'value': ITEMS[0]},
+        ],
+    })
+    results = res.json['results']
+    assert [result['status'] for result in results] == [201, 422, 201, 409]
+    assert results[0]['uuid'] == ITEMS[0]['uuid']
+    assert results[1]['errors'][0]['description'] == "'required' is a required property"
+    item = testapp.get(results[2]['location']).json
+    assert item['simple1'] == 'supplied simple1'
+    assert item['simple2'] == 'simple2 default'
+
+    res = testapp.post_json('/_bulk_load', {
+        'item_type': 'testing_post_put_patch',
+        'method': 'PUT',
+        'rows': [
+            {'url': '/' + ITEMS[1]['uuid'], 'value': {'required': 'replaced'}},
+            {'url': '/e3be8d8c-7aa8-45a1-bd64-4ec0a1a0e0a5', 'value': {'required': 'missing'}},
+        ],
+    })
+    assert [result['status'] for result in res.json['results']] == [200, 404]
+    item = testapp.get('/' + ITEMS[1]['uuid']).json
+    assert item['required'] == 'replaced'
+    assert item['simple1'] == 'simple1 default'
+
+
+def test_bulk_load_requires_import_items(submitter_testapp):
+    submitter_testapp.post_json('/_bulk_load', {
+        'item_type': 'testing_post_put_patch',
+        'method': 'POST',
+        'rows': [{'url': '/testing_post_put_patch', 'value': ITEMS[0]}],
+    }, status=403)
+
+
+def test_bulk_load_rejects_unknown_item_type(testapp):
+    res = testapp.post_json('/_bulk_load', {
+        'item_type': 'not_a_type',
+        'method': 'POST',
+        'rows': [],
+    }, status=400)
+    assert 'not_a_type' in res.json['description']
+
+
+def test_bulk_load_rejects_custom_add_types(testapp):
+    testapp.post_json('/_bulk_load', {
+        'item_type': 'access_key',
+        'method': 'POST',
+        'rows': [{'url': '/access_key', 'value': {}}],
+    }, status=400)
+
+
+def test_bulk_load_pipeline_posts_custom_add_types_one_at_a_time(testapp, mocker):
+    from encoded import loadxl
+    make_bulk_request = mocker.spy(loadxl, 'make_bulk_request')
+    make_request = mocker.spy(loadxl, 'make_request')
+    loadxl.get_pipeline(testapp, [], False, 'access_key', method='POST', bulk=True)
+    assert not make_bulk_request.called
+    make_request.assert_called_once_with(testapp, 'access_key', 'POST')
+
+
+def test_bulk_load_pipeline(testapp, mocker):
+    from encoded import loadxl
+    mocker.patch.object(loadxl, 'BULK_LOAD_CHUNK_SIZE', 2)
+    rows = [dict(item) for item in ITEMS] + [
+        {'uuid': '7c6d0a1c-7d0e-4a52-a38f-6b9da06ae5a0', 'required': 'skipped', 'test': 'skip'},
+        {'uuid': 'c1e5f4f0-3f1a-4b8b-9a2b-6e4f86a6c3b1', 'simple1': 'missing required'},
+    ]
+    pipeline = loadxl.get_pipeline(testapp, [], False, 'testing_post_put_patch', method='POST', bulk=True)
+    loaded = list(loadxl.combine(rows, pipeline))
+    assert [row.get('uuid') for row in loaded] == [row['uuid'] for row in rows]
+    assert loaded[0]['_response'].status_int == 201
+    assert loaded[1]['_response'].status_int == 201
+    assert loaded[2]['_skip'] and '_response' not in loaded[2]
+    assert loaded[3]['_response'].status_int == 422
+    testapp.get('/' + ITEMS[0]['uuid'])
+    testapp.get('/' + ITEMS[1]['uuid'])
@@ -0,0 +1,241 @@
+import pytest
+
+
+GENES = [
+    {
+        '@id': '/genes/10664/',
+        'symbol': 'CTCF',
+        'title': 'CTCF (Homo sapiens)',
+        'dbxrefs': ['HGNC:13723', 'ENSEMBL:ENSG00000102974', 'UniProtKB:P49711'],
+        'locations': [
+            {'assembly': 'GRCh38', 'chromosome': 'chr16', 'start': 67562407, 'end': 67639185},
+            {'assembly': 'hg19', 'chromosome': 'chr16', 'start': 67596310, 'end': 67673088},
+        ],
+    },
+    {
+        '@id': '/genes/140690/',
+        'symbol': 'CTCFL',
+        'title': 'CTCFL (Homo sapiens)',
+        'dbxrefs': ['HGNC:16234', 'ENSEMBL:ENSG00000124092'],
+        'locations': [
+            {'assembly': 'GRCh38', 'chromosome': 'chr20', 'start': 57495910, 'end': 57525764},
+        ],
+    },
+    {
+        '@id': '/genes/13018/',
+        'symbol': 'Ctcf',
+        'title': 'Ctcf (Mus musculus)',
+        'locations': [
+            {'assembly': 'mm10', 'chromosome': 'chr8', 'start': 105636628, 'end': 105682924},
+        ],
+    },
+    {
+        '@id': '/genes/7157/',
+        'symbol': 'TP53',
+        'title': 'TP53 (Homo sapiens)',
+        'locations': [
+            {'assembly': 'GRCh38', 'chromosome': 'chr17', 'start': 7661779, 'end': 7687538},
+        ],
+    },
+    {
+        '@id': '/genes/23560/',
+        'symbol': 'GTPBP4',
+        'title': 'GTPBP4 (Homo sapiens)',
+        'locations': [
+            {'assembly': 'GRCh38', 'chromosome': 'chr16', 'start': 67600000, 'end': 67700000},
+        ],
+    },
+]
+
+
+class FakeGeneration:
+    def __init__(self, value=1):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+class FakeRegistry(dict):
+    settings = {}
+
+
+@pytest.fixture
+def gene_loci():
+    from encoded.gene_locus import GeneLocusIndex
+    return GeneLocusIndex(GENES)
+
+
+@pytest.fixture
+def indexed_genes(mocker):
+    from encoded import gene_locus
+    genes = list(GENES)
+    mocker.patch.object(gene_locus, 'iter_indexed_genes', lambda es: iter(list(genes)))
+    mocker.patch.object(gene_locus, 'count_indexed_genes', lambda es: len(genes))
+    return genes
+
+
+@pytest.fixture
+def resolver(indexed_genes):
+    from encoded.gene_locus import GeneLocusResolver
+    from snovault.elasticsearch.interfaces import ELASTIC_SEARCH
+    registry = FakeRegistry({ELASTIC_SEARCH: object()})
+    return GeneLocusResolver(registry, refresh_interval=3600, generation=FakeGeneration())
+
+
+def test_gene_locus_interval_tree_matches_linear_scan():
+    import random
+    from encoded.gene_locus import IntervalTree
+    rng = random.Random(0)
+    intervals = []
+    for n in range(500):
+        start = rng.randint(0, 100000)
+        intervals.append((start, start + rng.randint(0, 5000), n))
+    tree = IntervalTree(intervals)
+    assert len(tree) == 500
+    for _ in range(200):
+        start = rng.randint(0, 105000)
+        end = start + rng.randint(0, 2000)
+        expected = sorted(
+            (interval for interval in intervals if interval[0] <= end and interval[1] >= start),
+            key=lambda interval: (interval[0], interval[1]),
+        )
+        assert tree.overlapping(start, end) == [interval[2] for interval in expected]
+    assert IntervalTree([]).overlapping(0, 10) == []
+
+
+def test_gene_locus_locate(gene_loci):
+    assert gene_loci.locate('ctcf', 'GRCh38') == ('chr16', 67562407, 67639185)
+    assert gene_loci.locate('CTCF', 'hg19') == ('chr16', 67596310, 67673088)
+    assert gene_loci.locate('CTCF', 'mm10') == ('chr8', 105636628, 105682924)
+    assert gene_loci.locate('CTCF', 'mm9') is None
+    assert gene_loci.locate('CTC', 'GRCh38') is None
+    assert len(gene_loci) == 5
+    assert gene_loci.assemblies() == ['GRCh38', 'hg19', 'mm10']
+
+
+def test_gene_locus_genes_in_region(gene_loci):
+    genes = gene_loci.genes_in_region('GRCh38', 'chr16', 67639000, 67650000)
+    assert [gene['symbol'] for gene in genes] == ['CTCF', 'GTPBP4']
+    genes = gene_loci.genes_in_region('GRCh38', 'chr16', 1, 100)
+    assert genes == []
+    assert gene_loci.genes_in_region('GRCh38', 'chrY', 1, 100) == []
+    genes = gene_loci.genes_in_region('hg19', 'chr16', 67596310, 67596310)
+    assert [gene['symbol'] for gene in genes] == ['CTCF']
+
+
+def test_gene_locus_suggest(gene_loci):
+    suggestions = gene_loci.suggest('Ctc', 'GRCh38')
+    assert [gene['symbol'] for gene in suggestions] == ['CTCF', 'CTCFL']
+    assert [gene['symbol'] for gene in gene_loci.suggest('ctc', 'mm10')] == ['Ctcf']
+    assert [gene['symbol'] for gene in gene_loci.suggest('ctc', 'GRCh38', limit=1)] == ['CTCF']
+    assert gene_loci.suggest('', 'GRCh38') == []
+    assert gene_loci.suggest('ctc', 'ce11') == []
+
+
+def test_gene_locus_suggest_by_dbxref(gene_loci):
+    suggestions = gene_loci.suggest('HGNC:1', 'GRCh38')
+    assert [gene['symbol'] for gene in suggestions] == ['CTCF', 'CTCFL']
+    assert suggestions[0]['dbxrefs'][0] == 'HGNC:13723'
+    assert [gene['symbol'] for gene in gene_loci.suggest('ensg000001029', 'GRCh38')] == ['CTCF']
+    assert [gene['symbol'] for gene in gene_loci.suggest('ensembl:ensg', 'hg19')] == ['CTCF']
+    assert gene_loci.suggest('ENSG', 'mm10') == []
+
+
+def test_gene_locus_suggest_view_falls_back_to_annotations(resolver):
+    from encoded.gene_locus import GENE_LOCUS_RESOLVER
+    from encoded.region_search import suggest
+    from snovault.elasticsearch.interfaces import ELASTIC_SEARCH
+
+    annotation = {
+        'text': 'chr16:67562407-67639185',
+        '_source': {'payload': {'species': 'homo sapiens'}, 'annotations': []},
+    }
+
+    class FakeElasticsearch:
+        searches = 0
+
+        def search(self, index=None, body=None):
+            self.searches += 1
+            return {'suggest': {'default-suggest': [{'options': [annotation]}]}}
+
+    class FakeRequest:
+        def __init__(self, q):
+            self.params = {'q': q, 'genome': 'GRCh38'}
+            self.registry = FakeRegistry({GENE_LOCUS_RESOLVER: resolver, ELASTIC_SEARCH: es})
+
+    es = FakeElasticsearch()
+    resolver.load()
+    result = suggest(None, FakeRequest('HGNC:137'))
+    assert [gene['symbol'] for gene in result['@graph']] == ['CTCF']
+    assert es.searches == 0
+    result = suggest(None, FakeRequest('chr16:6756'))
+    assert result['@graph'] == [annotation]
+    assert es.searches == 1
+
+
+def test_gene_locus_resolver_loads_in_background(resolver):
+    import time
+    assert not resolver.stats()['loaded']
+    resolver.get()
+    deadline = time.monotonic() + 5
+    while resolver.get() is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert resolver.get().locate('TP53', 'GRCh38') == ('chr17', 7661779, 7687538)
+    assert resolver.stats()['genes'] == 5
+
+
+def test_gene_locus_resolver_refreshes_after_gene_changes(resolver, indexed_genes):
+    assert resolver.load()
+    assert not resolver.needs_refresh()
+    # Edited here, but not reindexed yet.
+    resolver.mark_changed()
+    assert not resolver.needs_refresh()
+    resolver.generation.value = 2
+    assert resolver.needs_refresh()
+    assert resolver.load()
+    assert not resolver.needs_refresh()
+    # Unrelated reindex.
+    resolver.generation.value = 3
+    assert not resolver.needs_refresh()
+    # Gene created elsewhere.
+    indexed_genes.append({
+        '@id': '/genes/1/',
+        'symbol': 'A1BG',
+        'title': 'A1BG (Homo sapiens)',
+        'locations': [{'assembly': 'GRCh38', 'chromosome': 'chr19', 'start': 1, 'end': 2}],
+    })
+    resolver.generation.value = 4
+    assert resolver.needs_refresh()
+    assert resolver.load()
+    assert resolver.get().locate('a1bg', 'GRCh38') == ('chr19', 1, 2)
+
+
+def test_gene_locus_resolver_keeps_index_when_load_fails(resolver, mocker):
+    from encoded import gene_locus
+    assert resolver.load()
+    index = resolver.get()
+
+    def broken(es):
+        raise ValueError('no elasticsearch')
+
+    mocker.patch.object(gene_locus, 'iter_indexed_genes', broken)
+    assert not resolver.load()
+    assert resolver.get() is index
+
+
+def test_gene_locus_get_suggested_coordinates(resolver):
+    from encoded.gene_locus import GENE_LOCUS_RESOLVER
+    from encoded.region_search import get_suggested_coordinates
+
+    class FakeRequest:
+        registry = FakeRegistry({GENE_LOCUS_RESOLVER: resolver})
+
+        def embed(self, path):
+            raise AssertionError('Gene search subrequest made')
+
+    resolver.load()
+    request = FakeRequest()
+    assert get_suggested_coordinates(request, 'ctcf', 'GRCh38') == ('chr16', 67562407, 67639185)
+    assert get_suggested_coordinates(request, 'CTCF', 'GRCh37') == ('chr16', 67596310, 67673088)
+    assert get_suggested_coordinates(request, 'NOTAGENE', 'GRCh38') == ('', '', '')
@@ -0,0 +1,45 @@
+def test_generate_ontology_slim_closures_with_cycles():
+    from encoded.commands.generate_ontology import slimClosures
+    terms = {
+        'A:1': {'data': []},
+        'A:2': {'data': ['A:1', 'A:3']},
+        'A:3': {'data': ['A:2', 'A:4']},
+        'A:4': {'data': ['B:1']},
+        'A:5': {'data': ['A:3']},
+        'A:6': {'data': []},
+    }
+    slim_bits = {'A:1': 1, 'A:4': 2, 'A:5': 4, 'B:1': 8}
+    closures = slimClosures(terms, 'data', slim_bits)
+    assert closures['A:1'] == 1
+    assert closures['A:2'] == closures['A:3'] == 1 | 2 | 8
+    assert closures['A:4'] == 2 | 8
+    assert closures['A:5'] == 1 | 2 | 4 | 8
+    assert closures['A:6'] == 0
+
+
+def test_generate_ontology_set_slims_matches_per_term_closures():
+    from encoded.commands.benchmark_ontology_closure import iterativeChildren
+    from encoded.commands.benchmark_ontology_closure import synthetic_terms
+    from encoded.commands.generate_ontology import setSlims
+    from encoded.commands.generate_ontology import slimTypes
+    from encoded.commands.manual_slims import slim_shims
+    terms = synthetic_terms(2000)
+    fields = {
+        'system': 'systems', 'organ': 'organs', 'cell': 'cells', 'developmental': 'developmental',
+        'assay': 'assay', 'category': 'category', 'objective': 'objectives', 'type': 'types',
+    }
+    expected = {}
+    for term_id in terms:
+        closure = iterativeChildren(terms[term_id]['data'], terms, 'data') + [term_id]
+        closure_with_develops_from = iterativeChildren(
+            terms[term_id]['data_with_develops_from'], terms, 'data_with_develops_from'
+        ) + [term_id]
+        for slim_type, slim_terms in slimTypes:
+            search = closure_with_develops_from if slim_type == 'developmental' else closure
+            slims = [slim_terms[slim_term] for slim_term in slim_terms if slim_term in search]
+            expected[term_id, fields[slim_type]] = slim_shims.get(slim_type, {}).get(term_id) or slims
+    setSlims(terms)
+    assert any(expected.values())
+    for (term_id, field), slims in expected.items():
+        assert terms[term_id][field] == slims
+        assert 'closure' not in terms[term_id]
@@ -36,3 +36,184 @@ def test_genomic_data_service_parse_empty_ndjson():
     results = remote_stream_get(RNAGET_SEARCH_STREAM_URL)
     data = list(parse_ndjson(results))
     assert len(data) == 0
+
+
+REGION_SEARCH_RESULTS = {
+    'ctcf': {'chr': 'chr16', 'start': 67562407, 'end': 67639185, 'regions_per_file': [{'uuid': 'a'}]},
+    'rs75982468': {'chr': 'chr10', 'start': 11699181, 'end': 11699181, 'regions_per_file': [{'uuid': 'b'}]},
+}
+
+
+@pytest.fixture
+def stub_data_service():
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler
+    from http.server import ThreadingHTTPServer
+    from urllib.parse import parse_qs
+    from urllib.parse import urlparse
+
+    calls = {'connections': 0, 'get': []}
+
+    def search(params):
+        if params.get('chr'):
+            return {
+                'chr': params['chr'],
+                'start': int(params['start']),
+                'end': int(params['end']),
+                'regions_per_file': [{'uuid': params['chr']}],
+            }
+        return REGION_SEARCH_RESULTS.get(
+            params.get('query', '').lower(),
+            {'chr': '', 'start': '', 'end': '', 'regions_per_file': []}
+        )
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def setup(self):
+            calls['connections'] += 1
+            super().setup()
+
+        def log_message(self, *args):
+            pass
+
+        def respond(self, status, body):
+            body = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            calls['get'].append(params)
+            if url.path != '/region-search' or params.get('assembly') == 'broken':
+                self.respond(500, {'error': 'broken'})
+                return
+            self.respond(200, search(params))
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.calls = calls
+    server.url = 'http://127.0.0.1:{}'.format(server.server_address[1])
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def data_client(stub_data_service):
+    from encoded.genomic_data_service import GenomicDataClient
+    return GenomicDataClient(stub_data_service.url)
+
+
+def test_genomic_data_service_region_search_cached(stub_data_service, data_client):
+    for n in range(3):
+        results = data_client.region_search('GRCh38', query='CTCF', expand_kb=2)
+        assert results['chr'] == 'chr16'
+        results = data_client.region_search('GRCh38', chrom='chr1', start=100, end=200)
+        assert results['regions_per_file'] == [{'uuid': 'chr1'}]
+    assert len(stub_data_service.calls['get']) == 2
+    assert stub_data_service.calls['get'][0]['expand'] == '2'
+    assert data_client.stats() == {'cached': 2, 'hits': 4, 'misses': 2}
+    # Same annotation in any case, different expansion.
+    data_client.region_search('GRCh38', query='ctcf', expand_kb=2)
+    data_client.region_search('GRCh38', query='CTCF', expand_kb=0)
+    assert len(stub_data_service.calls['get']) == 3
+
+
+def test_genomic_data_service_reuses_connections(stub_data_service, data_client):
+    for start in range(1, 6):
+        data_client.region_search('GRCh38', chrom='chr1', start=start, end=start + 10)
+    assert len(stub_data_service.calls['get']) == 5
+    assert stub_data_service.calls['connections'] == 1
+
+
+def test_genomic_data_service_errors_not_cached(stub_data_service, data_client):
+    import requests
+    for n in range(2):
+        with pytest.raises(requests.HTTPError):
+            data_client.region_search('broken', query='CTCF')
+    assert len(stub_data_service.calls['get']) == 2
+    assert len(data_client.cache) == 0
+
+
+def test_genomic_data_service_cache_expires_and_evicts(mocker):
+    from encoded import genomic_data_service
+    from encoded.genomic_data_service import RegionSearchCache
+    cache = RegionSearchCache(maxsize=2, ttl=10)
+    now = mocker.patch.object(genomic_data_service.time, 'monotonic', return_value=100)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    now.return_value = 111
+    assert cache.get('a') is None
+    assert cache.get('c') is None
+    assert len(cache) == 0
+
+
+def test_genomic_data_service_empty_results_cached_briefly(stub_data_service, data_client, mocker):
+    from encoded import genomic_data_service
+    now = mocker.patch.object(genomic_data_service.time, 'monotonic', return_value=100)
+    for n in range(2):
+        assert data_client.region_search('GRCh38', query='NOTAGENE')['chr'] == ''
+        assert data_client.region_search('GRCh38', query='CTCF')['chr'] == 'chr16'
+    assert len(stub_data_service.calls['get']) == 2
+    now.return_value = 100 + data_client.negative_cache_ttl
+    data_client.region_search('GRCh38', query='NOTAGENE')
+    data_client.region_search('GRCh38', query='CTCF')
+    assert [call['query'] for call in stub_data_service.calls['get']] == [
+        'NOTAGENE',
+        'CTCF',
+        'NOTAGENE',
+    ]
+
+
+def test_genomic_data_service_batch_region_search(stub_data_service, data_client):
+    data_client.region_search('GRCh38', query='CTCF')
+    results = data_client.batch_region_search(
+        'GRCh38',
+        ['CTCF', ('chr2', 10, 20), 'rs75982468', ('chr3', 1, 2)],
+    )
+    assert [result['chr'] for result in results] == ['chr16', 'chr2', 'chr10', 'chr3']
+    assert sorted(
+        call.get('chr', call.get('query'))
+        for call in stub_data_service.calls['get'][1:]
+    ) == ['chr2', 'chr3', 'rs75982468']
+    # All cached now.
+    data_client.batch_region_search('GRCh38', [('chr2', 10, 20), 'rs75982468'])
+    assert len(stub_data_service.calls['get']) == 4
+
+
+def test_genomic_data_service_batch_region_search_errors(stub_data_service, data_client):
+    import requests
+    with pytest.raises(requests.HTTPError):
+        data_client.batch_region_search('broken', ['CTCF', ('chr2', 10, 20)])
+    assert len(stub_data_service.calls['get']) == 2
+    assert len(data_client.cache) == 0
+
+
+def test_genomic_data_service_shared_per_registry(stub_data_service):
+    from encoded.genomic_data_service import GenomicDataService
+
+    class FakeRegistry(dict):
+        settings = {
+            'genomic_data_service': stub_data_service.url,
+            'genomic_data_service.cache_size': '5',
+        }
+
+    registry = FakeRegistry()
+    first = GenomicDataService(registry, None)
+    second = GenomicDataService(registry, None)
+    assert first.client is second.client
+    assert first.client.cache.maxsize == 5
+    first.remember('GRCh38', 'NOTAGENE', 2, {'chr': 'chr7', 'start': 1, 'end': 2, 'regions_per_file': []})
+    assert second.region_search('GRCh38', query='notagene', expand_kb=2)['chr'] == 'chr7'
+    assert stub_data_service.calls['get'] == []
@@ -32,6 +32,7 @@ def _app_settings(wsgi_server_host_port, elasticsearch_server, postgresql_server
     settings['queue_worker_chunk_size'] = 5000
     settings['queue_worker_batch_size'] = 2000
     settings['visindexer'] = True
+    settings['visindexer.processes'] = 2
     settings['regionindexer'] = True
     return settings
 
@@ -51,6 +52,7 @@ def _app(app_settings):
     # Shutdown multiprocessing pool to close db conns.
     from snovault.elasticsearch import INDEXER
     app.registry[INDEXER].shutdown()
+    app.registry['vis' + INDEXER].shutdown()
 
     from snovault import DBSESSION
     DBSession = app.registry[DBSESSION]
@@ -140,11 +142,42 @@ def test_indexing_workbook(testapp, indexer_testapp):
     res = indexer_testapp.post_json('/index_vis', {'record': True})
     assert res.json['cycle_took']
     assert res.json['title'] == 'vis_indexer'
+    assert res.json['vis_indexing']['processes'] == 2
+    assert not res.json['vis_cache_flush']['errors']
 
     res = testapp.get('/search/?type=Biosample')
     assert res.json['total'] > 5
 
 
+def test_indexing_mp_vis_indexer(app, testapp, indexer_testapp, dummy_request, threadlocals):
+    from encoded.loadxl import load_all
+    from encoded.vis_indexer import MPVisIndexer
+    from encoded.vis_indexer import VisIndexer
+    from encoded.vis_indexer import all_visualizable_uuids
+    from pkg_resources import resource_filename
+    from snovault.elasticsearch import INDEXER
+    inserts = resource_filename('encoded', 'tests/data/inserts/')
+    docsdir = [resource_filename('encoded', 'tests/data/documents/')]
+    load_all(testapp, inserts, docsdir)
+    indexer_testapp.post_json('/index', {'record': True, 'is_testing_full': True})
+    dummy_request.datastore = 'elasticsearch'
+    uuids = all_visualizable_uuids(app.registry)
+    assert uuids
+
+    mp_indexer = app.registry['vis' + INDEXER]
+    assert isinstance(mp_indexer, MPVisIndexer)
+    assert mp_indexer.processes == 2
+    assert mp_indexer.update_objects(dummy_request, uuids, None) == []
+    assert mp_indexer.cycle_stats['processes'] == 2
+    assert mp_indexer.cycle_stats['uuids'] == len(uuids)
+    assert mp_indexer.flush_stats['errors'] == 0
+
+    # The pool writes the same vis_blobs as a single process.
+    serial_indexer = VisIndexer(app.registry)
+    assert serial_indexer.update_objects(dummy_request, uuids, None) == []
+    assert mp_indexer.flush_stats['written'] == serial_indexer.flush_stats['written']
+
+
 def test_indexer_vis_state(dummy_request):
     from encoded.vis_indexer import VisIndexerState
     INDEX = dummy_request.registry.settings['snovault.elasticsearch.index']
@@ -0,0 +1,64 @@
+def test_inserts_snapshot_key_follows_content(tmpdir):
+    from encoded.inserts_snapshot import snapshot_key
+    inserts = tmpdir.mkdir('inserts')
+    inserts.join('lab.json').write('[{"name": "lab"}]')
+    schemas = tmpdir.mkdir('schemas')
+    schemas.join('lab.json').write('{"type": "object"}')
+    sources = [str(inserts), str(schemas)]
+    key = snapshot_key(sources)
+    assert snapshot_key(sources) == key
+    schemas.join('lab.json').write('{"type": "object", "required": ["name"]}')
+    changed = snapshot_key(sources)
+    assert changed != key
+    inserts.join('award.json').write('[]')
+    assert snapshot_key(sources) not in (key, changed)
+    inserts.join('award.json').remove()
+    assert snapshot_key(sources) == changed
+
+
+def test_inserts_snapshot_dump_and_restore(testapp, conn, tmpdir):
+    from encoded.inserts_snapshot import dump_tables
+    from encoded.inserts_snapshot import is_empty
+    from encoded.inserts_snapshot import restore_tables
+    res = testapp.post_json('/testing_post_put_patch', {'required': 'snapshot'}, status=201)
+    item = testapp.get(res.location).json
+    path = str(tmpdir.join('snapshot'))
+    connection = conn.connection
+    dump_tables(connection, path)
+    cursor = connection.cursor()
+    cursor.execute('TRUNCATE resources, transactions, blobs CASCADE')
+    assert is_empty(connection)
+    testapp.get(res.location, status=404)
+    restore_tables(connection, path)
+    assert testapp.get(res.location).json == item
+    # New items are still numbered after the restored ones.
+    testapp.patch_json(res.location, {'simple1': 'patched'}, status=200)
+
+
+def test_inserts_snapshot_load_with_snapshot(testapp, app, conn, tmpdir, mocker):
+    import os
+    from encoded.inserts_snapshot import load_with_snapshot
+    mocker.patch('encoded.inserts_snapshot.snapshot_key', return_value='key')
+    cursor = conn.connection.cursor()
+    cursor.execute('TRUNCATE resources, transactions, blobs CASCADE')
+    loads = []
+
+    def load():
+        res = testapp.post_json('/testing_post_put_patch', {'required': 'snapshot'}, status=201)
+        loads.append(res.location)
+
+    cache_dir = str(tmpdir.join('cache'))
+    assert load_with_snapshot(app, cache_dir, load) is False
+    assert len(loads) == 1
+    assert os.listdir(cache_dir) == ['key']
+    item = testapp.get(loads[0]).json
+    cursor.execute('TRUNCATE resources, transactions, blobs CASCADE')
+    assert load_with_snapshot(app, cache_dir, load) is True
+    # Restored from the snapshot without loading the inserts again.
+    assert len(loads) == 1
+    assert testapp.get(loads[0]).json == item
+    # A database that isn't empty is loaded into and not snapshotted.
+    tmpdir.join('cache', 'key').remove()
+    assert load_with_snapshot(app, cache_dir, load) is False
+    assert len(loads) == 2
+    assert os.listdir(cache_dir) == []
@@ -0,0 +1,104 @@
+import json
+import os
+
+import pytest
+
+
+TERMS = {
+    'UBERON:0002048': {
+        'name': 'lung',
+        'preferred_name': '',
+        'synonyms': ['pulmo', 'lungs'],
+        'organs': ['lung', 'respiratory'],
+        'systems': ['respiratory system'],
+        'part_of': ['UBERON:0001004'],
+    },
+    'UBERON:0001004': {
+        'name': 'respiratory system',
+        'preferred_name': '',
+        'synonyms': [],
+        'organs': [],
+        'systems': ['respiratory system'],
+        'part_of': [],
+    },
+    'EFO:0002067': {
+        'name': 'K562 é',
+        'preferred_name': '',
+        'synonyms': [],
+        'organs': ['bodily fluid', 'blood'],
+        'systems': ['immune system'],
+    },
+}
+
+
+def store_from(tmpdir, ontology):
+    from encoded.ontology_store import OntologyStore
+    from encoded.ontology_store import write_ontology_store
+    path = str(tmpdir.join('ontology.bin'))
+    write_ontology_store(ontology, path)
+    return OntologyStore(path)
+
+
+def test_ontology_store_reads_like_the_dict(tmpdir):
+    from encoded.commands.ntr_terms import ntr_assays
+    from encoded.commands.ntr_terms import ntr_biosamples
+    ontology = dict(TERMS, **ntr_assays, **ntr_biosamples)
+    store = store_from(tmpdir, ontology)
+    assert len(store) == len(ontology)
+    assert sorted(store) == sorted(ontology)
+    for term_id, term in ontology.items():
+        assert term_id in store
+        assert dict(store[term_id]) == term
+    assert store['UBERON:0002048']['name'] == 'lung'
+    assert store['UBERON:0002048']['synonyms'] + ['lung'] == ['pulmo', 'lungs', 'lung']
+    assert store['EFO:0002067']['name'] == 'K562 é'
+    assert store['NTR:0000762'].get('preferred_name', 'x') == 'shRNA RNA-seq'
+    assert 'part_of' in store['UBERON:0001004']
+    assert 'part_of' not in store['EFO:0002067']
+    assert store['EFO:0002067'].get('part_of') is None
+    with pytest.raises(KeyError):
+        store['EFO:0002067']['part_of']
+    assert 'UBERON:9999999' not in store
+    assert store.get('UBERON:9999999') is None
+    assert None not in store
+    with pytest.raises(KeyError):
+        store['UBERON:9999999']
+
+
+def test_ontology_store_is_part_of(tmpdir, ontology):
+    from encoded.audit.biosample import is_part_of
+    store = store_from(tmpdir, ontology)
+    for term_id in ontology:
+        for part_of_term_id in ontology:
+            assert is_part_of(term_id, part_of_term_id, store) == is_part_of(
+                term_id, part_of_term_id, ontology
+            )
+
+
+def test_ontology_store_rejects_mixed_fields(tmpdir):
+    from encoded.ontology_store import write_ontology_store
+    with pytest.raises(ValueError):
+        write_ontology_store(
+            {'A:1': {'name': 'a'}, 'A:2': {'name': ['b']}},
+            str(tmpdir.join('ontology.bin')),
+        )
+
+
+def test_load_ontology_prefers_a_current_store(tmpdir):
+    from encoded.ontology_store import OntologyStore
+    from encoded.ontology_store import load_ontology
+    from encoded.ontology_store import write_ontology_store
+    json_path = str(tmpdir.join('ontology.json'))
+    store_path = str(tmpdir.join('ontology.bin'))
+    assert load_ontology(json_path, store_path) == {}
+    with open(json_path, 'w') as f:
+        json.dump(TERMS, f)
+    assert load_ontology(json_path, store_path) == TERMS
+    write_ontology_store(TERMS, store_path)
+    loaded = load_ontology(json_path, store_path)
+    assert isinstance(loaded, OntologyStore)
+    assert loaded['UBERON:0002048']['organs'] == ['lung', 'respiratory']
+    # A newer ontology.json is loaded instead of a stale store.
+    mtime = os.path.getmtime(store_path)
+    os.utime(json_path, (mtime + 10, mtime + 10))
+    assert load_ontology(json_path, store_path) == TERMS
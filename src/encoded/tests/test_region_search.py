@@ -0,0 +1,106 @@
+import pytest
+
+
+class FakeElasticsearch:
+    def __init__(self):
+        self.searches = []
+
+    def search(self, body=None, index=None, **kwargs):
+        self.searches.append((index, body))
+        return {
+            'hits': {'hits': [], 'total': 0},
+            'aggregations': {},
+        }
+
+
+class FakeType:
+    schema = {'properties': {}}
+
+
+class FakeRequest:
+    def __init__(self, registry, params):
+        from urllib.parse import urlencode
+        from webob.multidict import MultiDict
+        self.registry = registry
+        self.params = MultiDict(params)
+        self.query_string = urlencode(params)
+        self.path = '/region-search/'
+        self.effective_principals = ['system.Everyone']
+        self.__parent__ = None
+
+
+@pytest.fixture
+def many_file_uuids():
+    import uuid
+    from snovault.elasticsearch.indexer import MAX_CLAUSES_FOR_ES
+    return [str(uuid.uuid4()) for _ in range(10 * MAX_CLAUSES_FOR_ES)]
+
+
+def chunked_terms(terms_filter, field):
+    if 'terms' in terms_filter:
+        return [terms_filter['terms'][field]]
+    assert terms_filter['bool']['minimum_should_match'] == 1
+    return [clause['terms'][field] for clause in terms_filter['bool']['should']]
+
+
+def test_region_search_terms_filter_within_limit():
+    from encoded.region_search import get_terms_filter
+    assert get_terms_filter('uuid', ['a', 'b']) == {'terms': {'uuid': ['a', 'b']}}
+
+
+def test_region_search_terms_filter_chunked(many_file_uuids):
+    from snovault.elasticsearch.indexer import MAX_CLAUSES_FOR_ES
+    from encoded.region_search import get_terms_filter
+    chunks = chunked_terms(get_terms_filter('uuid', many_file_uuids), 'uuid')
+    assert len(chunks) == 10
+    assert all(len(chunk) <= MAX_CLAUSES_FOR_ES for chunk in chunks)
+    assert [uuid for chunk in chunks for uuid in chunk] == many_file_uuids
+    chunks = chunked_terms(get_terms_filter('uuid', many_file_uuids[:MAX_CLAUSES_FOR_ES + 1]), 'uuid')
+    assert [len(chunk) for chunk in chunks] == [MAX_CLAUSES_FOR_ES, 1]
+
+
+def test_region_search_keeps_all_files(mocker, many_file_uuids):
+    from snovault import TYPES
+    from snovault.elasticsearch.indexer import MAX_CLAUSES_FOR_ES
+    from snovault.elasticsearch.interfaces import ELASTIC_SEARCH
+    from encoded import region_search
+
+    class FakeGenomicDataService:
+        def __init__(self, registry, request):
+            pass
+
+        def region_search(self, assembly, query=None, **kwargs):
+            return {
+                'chr': 'chr1',
+                'start': 1000,
+                'end': 2000,
+                'regions_per_file': [{'uuid': uuid} for uuid in many_file_uuids],
+            }
+
+    mocker.patch.object(region_search, 'GenomicDataService', FakeGenomicDataService)
+    es = FakeElasticsearch()
+    registry = {
+        ELASTIC_SEARCH: es,
+        'snp_search': None,
+        TYPES: {'Experiment': FakeType()},
+    }
+    request = FakeRequest(
+        registry,
+        [('region', 'chr1:1000-2000'), ('genome', 'GRCh38'), ('assay_term_name', 'ChIP-seq')]
+    )
+
+    class FakeContext:
+        pass
+
+    context = FakeContext()
+    context.registry = registry
+    region_search.region_search(context, request)
+    index, body = es.searches[0]
+    assert index == 'experiment'
+    chunks = chunked_terms(body['query']['bool']['filter'][0], 'embedded.files.uuid')
+    assert all(len(chunk) <= MAX_CLAUSES_FOR_ES for chunk in chunks)
+    assert sum(len(chunk) for chunk in chunks) == len(many_file_uuids)
+    # The uuids are sent once, not once per facet.
+    for agg in body['aggs'].values():
+        assert 'embedded.files.uuid' not in str(agg)
+    assert {'terms': {'embedded.assay_term_name': ['ChIP-seq']}} in body['post_filter']['bool']['must']
@@ -6,3 +6,55 @@ def test_reports_csv_csv_generator():
     csv = CSVGenerator()
     row = csv.writerow(['a', 'b', '123'])
     assert row == b'a\tb\t123\n'
+
+
+def test_reports_csv_csv_generator_matches_csv_writer():
+    import csv
+    import io
+    from encoded.reports.csv import CSVGenerator
+    rows = [
+        ['a', 'b', '123'],
+        [1, 2.5, True, None, False],
+        ['with space', 'with\ttab', 'with "quote"', 'with\nnewline'],
+        [''],
+        [None],
+        ['', ''],
+        [],
+        ['ünïcödé', '/files/ENCFF244PJU/'],
+    ]
+    fout = io.StringIO()
+    writer = csv.writer(fout, delimiter='\t', lineterminator='\n')
+    writer.writerows(rows)
+    expected = fout.getvalue().encode('utf-8')
+    generator = CSVGenerator()
+    assert b''.join(generator.writerow(row) for row in rows) == expected
+    assert b''.join(generator.iter_chunks(rows)) == expected
+
+
+def test_reports_csv_csv_generator_carriage_return():
+    from encoded.reports.csv import CSVGenerator
+    # What csv.writer writes up to Python 3.12 (3.13 quotes any '\r').
+    assert CSVGenerator().writerow(['a\rb', 'c']) == b'a\rb\tc\n'
+    assert CSVGenerator(lineterminator='\r\n').writerow(['a\rb', 'c']) == b'"a\rb"\tc\r\n'
+
+
+def test_reports_csv_csv_generator_iter_chunks():
+    from encoded.reports.csv import CSVGenerator
+    generator = CSVGenerator(chunk_size=10)
+    rows = [['abc', 'def']] * 5
+    chunks = list(generator.iter_chunks(rows))
+    assert chunks == [b'abc\tdef\nabc\tdef\n'] * 2 + [b'abc\tdef\n']
+    generator = CSVGenerator()
+    chunks = list(generator.iter_chunks([b'link\n'] + rows))
+    assert chunks == [b'link\n' + b'abc\tdef\n' * 5]
+    assert list(generator.iter_chunks([])) == []
+
+
+def test_reports_csv_whitespace_collapsing_csv_generator():
+    from encoded.reports.csv import WhitespaceCollapsingCSVGenerator
+    generator = WhitespaceCollapsingCSVGenerator()
+    assert generator.writerow(['col1', 'col2', 'col3']) == b'col1\tcol2\tcol3\r\n'
+    assert generator.writerow([' a  b ', 'c\td\n', '\re']) == b'a b\tc d\te\r\n'
+    assert b''.join(
+        generator.iter_chunks([b'header\r\n', ['a', 'b']])
+    ) == b'header\r\na\tb\r\n'
@@ -2324,3 +2324,43 @@ def test_metadata_series_metadata_report_generate_rows(index_workbook, dummy_req
     results = list(pdmr._generate_rows())
     # One header, two TSV.
     assert len(results) == 3
+
+
+def test_metadata_metadata_report_get_search_results_generator_prefetch(index_workbook, dummy_request, mocker):
+    from encoded.reports.metadata import MetadataReport
+    dummy_request.environ['QUERY_STRING'] = (
+        'type=Experiment'
+    )
+    mr = MetadataReport(dummy_request)
+    assert mr._get_prefetch_workers() == 2
+    assert mr._get_prefetch_buffer_size() == 1000
+    mocker.patch.dict(
+        dummy_request.registry.settings,
+        {
+            'metadata.prefetch_workers': '3',
+            'metadata.prefetch_buffer_size': '10',
+        }
+    )
+    assert mr._get_prefetch_workers() == 3
+    assert mr._get_prefetch_buffer_size() == 10
+    mr._build_params()
+    search_results = mr._get_search_results_generator()
+    assert len(list(search_results)) >= 63
+
+
+def test_metadata_metadata_report_get_search_results_generator_prefetch_disabled(index_workbook, dummy_request, mocker):
+    from encoded.reports.metadata import MetadataReport
+    dummy_request.environ['QUERY_STRING'] = (
+        'type=Experiment'
+    )
+    mocker.patch.dict(
+        dummy_request.registry.settings,
+        {
+            'metadata.prefetch_workers': '0',
+        }
+    )
+    mr = MetadataReport(dummy_request)
+    assert mr._get_prefetch_workers() == 0
+    mr._build_params()
+    search_results = mr._get_search_results_generator()
+    assert len(list(search_results)) >= 63
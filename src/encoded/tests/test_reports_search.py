@@ -1,4 +1,5 @@
 import pytest
+import threading
 
 from encoded.tests.features.conftest import app, app_settings, index_workbook
 
@@ -173,3 +174,169 @@ def test_reports_search_batched_search_generator_results(index_workbook, dummy_r
     assert len(results) == 10
     for result in results:
         assert len(result.keys()) == 3
+
+
+def test_reports_search_prefetching_batched_search_generator_init(dummy_request):
+    from encoded.reports.search import PrefetchingBatchedSearchGenerator
+    dummy_request.environ['QUERY_STRING'] = (
+        'type=Experiment'
+    )
+    pbsg = PrefetchingBatchedSearchGenerator(dummy_request)
+    assert pbsg.batch_size == 5000
+    assert pbsg.max_workers == 2
+    assert pbsg.buffer_size == 1000
+    pbsg = PrefetchingBatchedSearchGenerator(dummy_request, max_workers=0, buffer_size=0)
+    assert pbsg.max_workers == 1
+    assert pbsg.buffer_size == 1
+
+
+class FakeQuery:
+
+    def __init__(self, hits, threads):
+        self.hits = hits
+        self.threads = threads
+
+    def scan(self):
+        self.threads.add(threading.get_ident())
+        yield from self.hits
+
+
+class FakeQueryBuilder:
+
+    def __init__(self, query):
+        self.query = query
+
+    def build_query(self):
+        return self.query
+
+
+def make_fake_query_response(threads):
+
+    class FakeQueryResponse:
+
+        def __init__(self, results, query_builder):
+            self.results = results
+
+        def to_graph(self):
+            for hit in self.results:
+                threads.add(threading.get_ident())
+                yield {'@id': hit['_id']}
+
+    return FakeQueryResponse
+
+
+def test_reports_search_prefetching_batched_search_generator_results_order(dummy_request, mocker):
+    from encoded.reports.search import PrefetchingBatchedSearchGenerator
+    dummy_request.environ['QUERY_STRING'] = (
+        'type=Experiment&@id=/experiments/ENCSR001ADI/'
+        '&@id=/experiments/ENCSR003CON/&@id=/experiments/ENCSR000ACY/'
+        '&@id=/experiments/ENCSR001CON/&@id=/experiments/ENCSR751STT/'
+    )
+    scan_threads = set()
+    format_threads = set()
+
+    def fake_query_builder(request):
+        return FakeQueryBuilder(
+            FakeQuery(
+                [{'_id': at_id} for at_id in request.params.getall('@id')],
+                scan_threads
+            )
+        )
+
+    mocker.patch.object(
+        PrefetchingBatchedSearchGenerator,
+        '_build_query_builder',
+        side_effect=fake_query_builder
+    )
+    mocker.patch(
+        'encoded.reports.search.BasicQueryResponseWithFacets',
+        make_fake_query_response(format_threads)
+    )
+    pbsg = PrefetchingBatchedSearchGenerator(
+        dummy_request,
+        batch_size=2,
+        max_workers=2,
+        buffer_size=1
+    )
+    results = [r['@id'] for r in pbsg.results()]
+    assert results == [
+        '/experiments/ENCSR001ADI/',
+        '/experiments/ENCSR003CON/',
+        '/experiments/ENCSR000ACY/',
+        '/experiments/ENCSR001CON/',
+        '/experiments/ENCSR751STT/',
+    ]
+    # Only the scan leaves the request thread.
+    assert format_threads == {threading.get_ident()}
+    assert threading.get_ident() not in scan_threads
+
+
+def test_reports_search_prefetching_batched_search_generator_raises_batch_errors(dummy_request, mocker):
+    from encoded.reports.search import PrefetchingBatchedSearchGenerator
+    dummy_request.environ['QUERY_STRING'] = (
+        'type=Experiment&@id=/experiments/ENCSR001ADI/'
+        '&@id=/experiments/ENCSR003CON/'
+    )
+
+    class FailingQuery:
+
+        def scan(self):
+            yield {'_id': '/experiments/ENCSR001ADI/'}
+            raise ValueError('search failed')
+
+    mocker.patch.object(
+        PrefetchingBatchedSearchGenerator,
+        '_build_query_builder',
+        return_value=FakeQueryBuilder(FailingQuery())
+    )
+    mocker.patch(
+        'encoded.reports.search.BasicQueryResponseWithFacets',
+        make_fake_query_response(set())
+    )
+    pbsg = PrefetchingBatchedSearchGenerator(dummy_request)
+    with pytest.raises(ValueError):
+        list(pbsg.results())
+
+
+def test_reports_search_prefetching_batched_search_generator_results(index_workbook, dummy_request):
+    from encoded.reports.search import BatchedSearchGenerator
+    from encoded.reports.search import PrefetchingBatchedSearchGenerator
+    dummy_request.environ['QUERY_STRING'] = (
+        'type=Experiment'
+        '&@id=/experiments/ENCSR001ADI/'
+        '&@id=/experiments/ENCSR003CON/'
+        '&@id=/experiments/ENCSR000ACY/'
+        '&@id=/experiments/ENCSR001CON/'
+        '&@id=/experiments/ENCSR751STT/'
+        '&@id=/experiments/ENCSR604DNT/'
+        '&@id=/experiments/ENCSR001SER/'
+        '&@id=/experiments/ENCSR000AEM/'
+        '&@id=/experiments/ENCSR334EJI/'
+        '&@id=/experiments/ENCSR123AAD/'
+        '&field=@id&field=status'
+    )
+    expected = sorted(
+        BatchedSearchGenerator(dummy_request, batch_size=3).results(),
+        key=lambda r: r['@id']
+    )
+    assert len(expected) == 10
+    for max_workers in [1, 2, 4]:
+        pbsg = PrefetchingBatchedSearchGenerator(
+            dummy_request,
+            batch_size=3,
+            max_workers=max_workers,
+            buffer_size=2
+        )
+        results = list(pbsg.results())
+        # Formatted the same as search_generator: (@type, @id, status).
+        assert sorted(results, key=lambda r: r['@id']) == expected
+    dummy_request.environ['QUERY_STRING'] = (
+        'type=Experiment&field=@id&field=status'
+    )
+    expected = sorted(
+        BatchedSearchGenerator(dummy_request).results(),
+        key=lambda r: r['@id']
+    )
+    assert len(expected) >= 63
+    pbsg = PrefetchingBatchedSearchGenerator(dummy_request)
+    assert sorted(pbsg.results(), key=lambda r: r['@id']) == expected
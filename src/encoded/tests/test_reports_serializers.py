@@ -186,3 +186,74 @@ def test_map_strings_to_booleans_and_ints():
     ]
     assert map_strings_to_booleans_and_ints(['3356650', '*']) == [3356650, '*']
     assert map_strings_to_booleans_and_ints(['20', 'nM']) == [20, 'nM']
+
+
+def test_reports_serializers_path_tree_extract():
+    from encoded.reports.serializers import PathTree
+    from snovault.util import simple_path_ids
+    paths = [
+        'assembly',
+        'protein_tags',
+        'protein_tags.location',
+        'protein_tags.target',
+        'replicates',
+        'missing.field',
+    ]
+    tree = PathTree(paths)
+    values = tree.extract(experiment())
+    assert list(values.keys()) == paths
+    for path in paths:
+        assert values[path] == list(simple_path_ids(experiment(), path))
+    assert values['protein_tags.location'] == ['C-terminal', 'C-terminal']
+    assert values['missing.field'] == []
+
+
+def test_reports_serializers_path_tree_include_none():
+    from encoded.reports.serializers import PathTree
+    item = {'a': None, 'b': [{'c': None}, {'c': 1}]}
+    assert PathTree(['a', 'b.c']).extract(item) == {'a': [], 'b.c': [1]}
+    assert PathTree(['a', 'b.c'], include_none=True).extract(item) == {
+        'a': [None],
+        'b.c': [None, 1]
+    }
+
+
+def test_reports_serializers_row_serializer():
+    from encoded.reports.serializers import RowSerializer
+    from encoded.reports.serializers import compile_experiment_cell
+    from encoded.reports.serializers import compile_file_cell
+    from encoded.reports.serializers import make_experiment_cell
+    from encoded.reports.serializers import make_file_cell
+    experiment_columns = {
+        'Assembly': ['assembly'],
+        'Tag location': ['protein_tags.location'],
+        'Tag': ['protein_tags.name', 'protein_tags.location'],
+        'Status': ['status'],
+    }
+    rs = RowSerializer(experiment_columns, compile_experiment_cell)
+    assert rs.serialize(experiment()) == {
+        column: make_experiment_cell(fields, experiment())
+        for column, fields in experiment_columns.items()
+    }
+    file_columns = {
+        'Size': ['file_size'],
+        'Lab': ['lab.title'],
+        'Format': ['file_format', 'file_format_type'],
+        'Concentration': [
+            'replicate.rbns_protein_concentration',
+            'replicate.rbns_protein_concentration_units'
+        ],
+        'Derived from': ['derived_from'],
+    }
+    rs = RowSerializer(file_columns, compile_file_cell)
+    assert rs.serialize(file_()) == {
+        'Size': 3356650,
+        'Lab': 'ENCODE Processing Pipeline',
+        'Format': 'bed idr_ranked_peak',
+        'Concentration': '20 nM',
+        'Derived from': '/files/ENCFF895UWM/, /files/ENCFF089RYQ/',
+    }
+    assert rs.serialize(file_()) == {
+        column: make_file_cell(fields, file_())
+        for column, fields in file_columns.items()
+    }
@@ -23,38 +23,293 @@ def test_searches_caches_should_cache_search_results(dummy_request):
     assert should_cache_search_results({}, dummy_request)
 
 
+def test_searches_caches_should_cache_search_results_max_limit_setting(dummy_request):
+    from encoded.searches.caches import should_cache_search_results
+    dummy_request.registry.settings['search_cache.max_limit'] = 100
+    dummy_request.environ['QUERY_STRING'] = 'type=Experiment&limit=100'
+    assert should_cache_search_results({}, dummy_request)
+    dummy_request.environ['QUERY_STRING'] = 'type=Experiment&limit=101'
+    assert not should_cache_search_results({}, dummy_request)
+
+
+def test_searches_caches_make_principals_key(dummy_request, mocker):
+    from encoded.searches.caches import make_principals_key
+    mocker.patch.object(type(dummy_request), 'effective_principals', ['system.Everyone', 'group.admin'])
+    admin = make_principals_key(dummy_request)
+    mocker.patch.object(type(dummy_request), 'effective_principals', ['group.admin', 'system.Everyone'])
+    assert make_principals_key(dummy_request) == admin
+    mocker.patch.object(type(dummy_request), 'effective_principals', ['system.Everyone'])
+    assert make_principals_key(dummy_request) != admin
+
+
 def test_searches_caches_make_key_from_request(dummy_request):
     from encoded.searches.caches import make_key_from_request
     from functools import partial
+    from encoded.searches.caches import make_principals_key
     make_key_from_request = partial(make_key_from_request, 'rnaget-request')
+    principals = make_principals_key(dummy_request)
     dummy_request.environ['QUERY_STRING'] = 'type=RNAExpression'
     assert (
         make_key_from_request({}, dummy_request)
-        == "rnaget-request.(('type', 'RNAExpression'),)"
+        == f"rnaget-request.{principals}.(('type', 'RNAExpression'),)"
     )
     dummy_request.environ['QUERY_STRING'] = 'type=RNAExpression&b.s=a&limit=10'
     assert (
         make_key_from_request({}, dummy_request)
-        == "rnaget-request.(('b.s', 'a'), ('limit', '10'), ('type', 'RNAExpression'))"
+        == f"rnaget-request.{principals}.(('b.s', 'a'), ('limit', '10'), ('type', 'RNAExpression'))"
     )
     dummy_request.environ['QUERY_STRING'] = 'limit=10&b.s=a&type=RNAExpression'
     assert (
         make_key_from_request({}, dummy_request)
-        == "rnaget-request.(('b.s', 'a'), ('limit', '10'), ('type', 'RNAExpression'))"
+        == f"rnaget-request.{principals}.(('b.s', 'a'), ('limit', '10'), ('type', 'RNAExpression'))"
     )
     dummy_request.environ['QUERY_STRING'] = 'type=Experiment&type=File&field=replicates.library.biosample'
     assert (
         make_key_from_request({}, dummy_request)
-        == "rnaget-request.(('field', 'replicates.library.biosample'), ('type', 'Experiment'), ('type', 'File'))"
+        == f"rnaget-request.{principals}.(('field', 'replicates.library.biosample'), ('type', 'Experiment'), ('type', 'File'))"
     )
 
 
-def test_searches_caches_redis_lru_cache():
+def test_searches_caches_redis_lru_cache(fake_redis):
     from encoded.searches.caches import RedisLRUCache
-    client = {}
+    client = fake_redis
     rc = RedisLRUCache(client)
     with pytest.raises(KeyError):
         rc['x']
     rc['x'] = {'a': 'b', 'c': 'd'}
     assert rc['x'] == {'a': 'b', 'c': 'd'}
-    assert client['x'] == '{"a": "b", "c": "d"}'
+    assert 'search_cache:x' in client.data
+
+
+def test_searches_caches_redis_lru_cache_compresses_values(fake_redis):
+    import json
+    import zlib
+    from encoded.searches.caches import RedisLRUCache
+    client = fake_redis
+    rc = RedisLRUCache(client)
+    item = {'@graph': [{'accession': 'ENCSR000AAA', 'status': 'released'}] * 100}
+    rc['x'] = item
+    stored = client.data['search_cache:x']
+    assert len(stored) < len(json.dumps(item))
+    assert json.loads(zlib.decompress(stored)) == item
+    assert rc['x'] == item
+
+
+def test_searches_caches_redis_lru_cache_ttl(fake_redis):
+    from encoded.searches.caches import RedisLRUCache
+    client = fake_redis
+    rc = RedisLRUCache(client, ttl=30)
+    rc['x'] = {'a': 'b'}
+    assert client.expires['search_cache:x'] == 30
+
+
+def test_searches_caches_redis_lru_cache_generation_invalidates(fake_redis, fake_generation):
+    from encoded.searches.caches import RedisLRUCache
+    client = fake_redis
+    generation = fake_generation
+    generation.value = 10
+    rc = RedisLRUCache(client, generation=generation)
+    rc['x'] = {'a': 'b'}
+    assert rc['x'] == {'a': 'b'}
+    assert 'search_cache:10:x' in client.data
+    generation.value = 11
+    with pytest.raises(KeyError):
+        rc['x']
+    rc['x'] = {'a': 'c'}
+    assert rc['x'] == {'a': 'c'}
+    # Unknown generation disables caching.
+    generation.value = None
+    rc['y'] = {'a': 'b'}
+    with pytest.raises(KeyError):
+        rc['y']
+    assert not any(k.endswith(':y') for k in client.data)
+
+
+def test_searches_caches_redis_lru_cache_disabled(fake_redis):
+    from encoded.searches.caches import RedisLRUCache
+    client = fake_redis
+    rc = RedisLRUCache(client, enabled=False)
+    rc['x'] = {'a': 'b'}
+    assert not client.data
+    with pytest.raises(KeyError):
+        rc['x']
+
+
+def test_searches_caches_redis_lru_cache_errors_are_misses(broken_redis):
+    from encoded.searches.caches import RedisLRUCache
+    client = broken_redis
+    rc = RedisLRUCache(client)
+    rc['x'] = {'a': 'b'}
+    with pytest.raises(KeyError):
+        rc['x']
+    assert rc.stats()['counters']['errors'] == 2
+
+
+def test_searches_caches_redis_lru_cache_skips_failed_searches(fake_redis):
+    from encoded.searches.caches import RedisLRUCache
+    client = fake_redis
+    rc = RedisLRUCache(client)
+    rc['x'] = {'notification': 'No results found', '@graph': []}
+    with pytest.raises(KeyError):
+        rc['x']
+    rc['x'] = {'notification': 'Success', '@graph': [{'a': 'b'}]}
+    assert rc['x']['@graph'] == [{'a': 'b'}]
+
+
+def test_searches_caches_should_store_search_results():
+    from encoded.searches.caches import should_store_search_results
+    assert should_store_search_results({'@graph': []})
+    assert should_store_search_results({'notification': 'Success'})
+    assert not should_store_search_results({'notification': 'No results found'})
+    assert should_store_search_results([1, 2, 3])
+
+
+def test_searches_caches_redis_lru_cache_stats(fake_redis, fake_generation):
+    from encoded.searches.caches import RedisLRUCache
+    fake_generation.value = 5
+    client = fake_redis
+    rc = RedisLRUCache(client, ttl=60, generation=fake_generation)
+    with pytest.raises(KeyError):
+        rc['x']
+    rc['x'] = {'a': 'b' * 1000}
+    rc['x']
+    rc['x']
+    stats = rc.stats()
+    assert stats['ttl'] == 60
+    assert stats['generation'] == 5
+    assert stats['counters']['hits'] == 2
+    assert stats['counters']['misses'] == 1
+    assert stats['counters']['sets'] == 1
+    assert stats['hit_ratio'] == 0.6667
+    assert stats['compression_ratio'] > 1
+    rc.reset_stats()
+    assert rc.stats()['counters'] == {}
+    assert rc.stats()['hit_ratio'] is None
+
+
+def test_searches_caches_redis_lru_cache_lock(fake_redis, fake_generation):
+    from encoded.searches.caches import RedisLRUCache
+    client = fake_redis
+    rc = RedisLRUCache(client, generation=fake_generation, lock_timeout=1)
+    token = rc.acquire_lock('x')
+    assert token
+    assert 'search_cache:lock:1:x' in client.data
+    assert rc.acquire_lock('x') is None
+    rc.release_lock('x', 'not-the-token')
+    assert rc.acquire_lock('x') is None
+    rc['x'] = {'a': 'b'}
+    rc.release_lock('x', token)
+    assert 'search_cache:lock:1:x' not in client.data
+    assert rc.wait_for('x') == {'a': 'b'}
+    assert rc.stats()['counters']['coalesced'] == 1
+
+
+def test_searches_caches_redis_lru_cache_lock_fails_open(broken_redis):
+    from encoded.searches.caches import RedisLRUCache
+    rc = RedisLRUCache(broken_redis)
+    assert rc.acquire_lock('x')
+    assert rc.acquire_lock('x')
+
+
+def test_searches_caches_cached_search_coalesces_concurrent_requests(dummy_request, mocker, fake_redis, fake_generation):
+    import threading
+    from pyramid.request import Request
+    from encoded.searches.caches import RedisLRUCache
+    from encoded.searches.caches import cached_search
+    from encoded.searches.interfaces import REDIS_LRU_CACHE
+    mocker.patch.dict(
+        dummy_request.registry,
+        {REDIS_LRU_CACHE: RedisLRUCache(fake_redis, generation=fake_generation)}
+    )
+    queries = []
+    started = threading.Event()
+    release = threading.Event()
+
+    @cached_search('matrix')
+    def matrix(context, request):
+        # Stand-in for the Elasticsearch aggregation.
+        queries.append(request)
+        started.set()
+        release.wait(5)
+        return {'matrix': {'x': 1}, 'notification': 'Success'}
+
+    def make_request():
+        request = Request.blank('/matrix/?type=Experiment')
+        request.registry = dummy_request.registry
+        return request
+
+    results = []
+
+    def get():
+        results.append(matrix({}, make_request()))
+
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    threads[0].start()
+    assert started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(queries) == 1
+    assert len(results) == 8
+    assert all(result == {'matrix': {'x': 1}, 'notification': 'Success'} for result in results)
+    # Followers get their own copy.
+    assert len({id(result) for result in results}) == 8
+    # Later requests are served from the cache.
+    assert matrix({}, make_request())['matrix'] == {'x': 1}
+    assert len(queries) == 1
+
+
+def test_searches_caches_cached_search_skips_uncacheable_requests(dummy_request):
+    from pyramid.request import Request
+    from encoded.searches.caches import cached_search
+    calls = []
+
+    @cached_search('search')
+    def search(context, request):
+        calls.append(request)
+        return {'@graph': []}
+
+    request = Request.blank('/search/?type=Experiment&limit=all')
+    request.registry = dummy_request.registry
+    search({}, request)
+    search({}, request)
+    assert len(calls) == 2
+
+
+def test_searches_caches_cached_search_uses_the_registry_cache(dummy_request, mocker, fake_redis, fake_generation):
+    from pyramid.request import Request
+    from encoded.searches.caches import RedisLRUCache
+    from encoded.searches.caches import cached_search
+    from encoded.searches.interfaces import REDIS_LRU_CACHE
+    calls = []
+
+    # Decorated before any cache exists, as views are at import.
+    @cached_search('search')
+    def search(context, request):
+        calls.append(request)
+        return {'@graph': [], 'notification': 'Success'}
+
+    client = fake_redis
+    mocker.patch.dict(
+        dummy_request.registry,
+        {REDIS_LRU_CACHE: RedisLRUCache(client, generation=fake_generation)}
+    )
+    request = Request.blank('/search/?type=Experiment')
+    request.registry = dummy_request.registry
+    search({}, request)
+    search({}, request)
+    assert len(calls) == 1
+    assert any(key.startswith('search_cache:1:search.') for key in client.data)
+
+
+def test_searches_caches_redis_lru_cache_expire(fake_redis, fake_generation):
+    from encoded.searches.caches import RedisLRUCache
+    fake_generation.value = 3
+    client = fake_redis
+    rc = RedisLRUCache(client, ttl=60, generation=fake_generation)
+    assert not rc.expire('x', 600)
+    rc['x'] = {'a': 'b'}
+    assert rc.expire('x', 600)
+    assert client.expires['search_cache:3:x'] == 600
@@ -0,0 +1,86 @@
+import pytest
+
+
+def test_searches_coalescing_single_flight_runs_once_for_concurrent_callers():
+    import threading
+    import time
+    from encoded.searches.coalescing import SingleFlight
+    sf = SingleFlight(timeout=5)
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def query():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {'hits': 10}
+
+    results = []
+
+    def run():
+        results.append(sf.do('key', query))
+
+    threads = [threading.Thread(target=run) for _ in range(10)]
+    threads[0].start()
+    assert started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    # Give followers time to queue up on the leader's future.
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 1
+    assert len(results) == 10
+    assert all(result == {'hits': 10} for result, shared in results)
+    assert sum(1 for result, shared in results if shared) == 9
+    assert sf.in_flight() == 0
+
+
+def test_searches_coalescing_single_flight_sequential_calls_are_not_shared():
+    from encoded.searches.coalescing import SingleFlight
+    sf = SingleFlight()
+    calls = []
+
+    def query():
+        calls.append(1)
+        return len(calls)
+
+    assert sf.do('key', query) == (1, False)
+    assert sf.do('key', query) == (2, False)
+    assert sf.do('other', query) == (3, False)
+
+
+def test_searches_coalescing_single_flight_shares_exceptions():
+    import threading
+    from encoded.searches.coalescing import SingleFlight
+    sf = SingleFlight(timeout=5)
+    started = threading.Event()
+    release = threading.Event()
+
+    def query():
+        started.set()
+        release.wait(5)
+        raise ValueError('es down')
+
+    errors = []
+
+    def run():
+        try:
+            sf.do('key', query)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=run)
+    leader.start()
+    assert started.wait(5)
+    follower = threading.Thread(target=run)
+    follower.start()
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert len(errors) == 2
+    assert sf.in_flight() == 0
+    with pytest.raises(ValueError):
+        sf.do('key', query)
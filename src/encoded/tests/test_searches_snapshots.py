@@ -0,0 +1,163 @@
+import pytest
+
+
+class FakeResponse:
+
+    def __init__(self, status_int):
+        self.status_int = status_int
+
+
+class FakeIndexerRequest:
+    '''
+    Stands in for the indexer request, runs subrequests through a
+    cached_search view keyed by the path's route.
+    '''
+
+    def __init__(self, status_int=200):
+        self.paths = []
+        self.status_int = status_int
+
+    def invoke_subrequest(self, subreq):
+        from encoded.searches.caches import cached_search
+        self.paths.append(subreq.path_qs)
+        prefix = subreq.path.strip('/')
+
+        @cached_search(prefix)
+        def view(context, request):
+            if self.status_int != 200:
+                return {'notification': 'No results found'}
+            return {'matrix': {'path': request.path}, 'notification': 'Success'}
+
+        view(None, subreq)
+        return FakeResponse(self.status_int)
+
+
+@pytest.fixture
+def snapshots(dummy_request, mocker, fake_redis, fake_generation):
+    from encoded.searches.caches import RedisLRUCache
+    from encoded.searches.interfaces import REDIS_LRU_CACHE
+    from encoded.searches.snapshots import MatrixSnapshots
+    fake_generation.value = 100
+    cache = RedisLRUCache(fake_redis, ttl=60, generation=fake_generation)
+    mocker.patch.dict(dummy_request.registry, {REDIS_LRU_CACHE: cache})
+    return MatrixSnapshots(
+        dummy_request.registry,
+        snapshots=[
+            '/chip-seq-matrix/?type=Experiment&status=released',
+            '/brain-matrix/?type=Experiment&internal_tags=RushAD',
+        ],
+        ttl=3600,
+    )
+
+
+def test_searches_snapshots_refresh(snapshots):
+    request = FakeIndexerRequest()
+    state = snapshots.refresh(request)
+    assert request.paths == [
+        '/chip-seq-matrix/?type=Experiment&status=released',
+        '/brain-matrix/?type=Experiment&internal_tags=RushAD',
+    ]
+    assert state['generation'] == 100
+    assert [s['stored'] for s in state['snapshots']] == [True, True]
+    client = snapshots.cache.client
+    stored = [k for k in client.data if k.startswith('search_cache:100:')]
+    assert len(stored) == 2
+    assert all(client.expires[k] == 3600 for k in stored)
+    assert snapshots.get_state()['generation'] == 100
+
+
+def test_searches_snapshots_served_to_matching_public_request(snapshots, dummy_request):
+    from pyramid.request import Request
+    from encoded.searches.caches import cached_search
+    snapshots.refresh(FakeIndexerRequest())
+    calls = []
+
+    @cached_search('chip-seq-matrix')
+    def chip_seq_matrix(context, request):
+        calls.append(request)
+        return {'matrix': 'live', 'notification': 'Success'}
+
+    # Same filters in a different order hit the snapshot.
+    request = Request.blank('/chip-seq-matrix/?status=released&type=Experiment')
+    request.registry = dummy_request.registry
+    assert chip_seq_matrix(None, request)['matrix'] == {'path': '/chip-seq-matrix/'}
+    assert not calls
+    # Other filters fall back to a live query.
+    request = Request.blank('/chip-seq-matrix/?type=Experiment&status=archived')
+    request.registry = dummy_request.registry
+    assert chip_seq_matrix(None, request)['matrix'] == 'live'
+    assert len(calls) == 1
+
+
+def test_searches_snapshots_refresh_if_stale(snapshots):
+    request = FakeIndexerRequest()
+    assert snapshots.is_stale()
+    assert snapshots.refresh_if_stale(request)
+    assert len(request.paths) == 2
+    assert not snapshots.is_stale()
+    assert snapshots.refresh_if_stale(request) is None
+    assert len(request.paths) == 2
+    # New indexing generation.
+    snapshots.cache.generation.value = 101
+    assert snapshots.is_stale()
+    assert snapshots.refresh_if_stale(request)['generation'] == 101
+    assert len(request.paths) == 4
+
+
+def test_searches_snapshots_refresh_if_stale_disabled(snapshots):
+    request = FakeIndexerRequest()
+    snapshots.enabled = False
+    assert snapshots.refresh_if_stale(request) is None
+    snapshots.enabled = True
+    snapshots.cache.generation.value = None
+    assert not snapshots.is_stale()
+    assert snapshots.refresh_if_stale(request) is None
+    assert not request.paths
+
+
+def test_searches_snapshots_failed_search_not_stored(snapshots):
+    state = snapshots.refresh(FakeIndexerRequest(status_int=404))
+    assert [s['stored'] for s in state['snapshots']] == [False, False]
+
+
+def test_searches_snapshots_redis_errors(snapshots, broken_redis):
+    snapshots.cache.client = broken_redis
+    assert snapshots.get_state() == {}
+
+
+def test_searches_snapshots_refresh_if_stale_time_limit(snapshots):
+    request = FakeIndexerRequest()
+    snapshots.time_limit = 0
+    state = snapshots.refresh_if_stale(request)
+    # Stops after the first subrequest once out of time.
+    assert len(request.paths) == 1
+    assert state['pending'] == ['/brain-matrix/?type=Experiment&internal_tags=RushAD']
+    assert snapshots.is_stale()
+    state = snapshots.refresh_if_stale(request)
+    assert request.paths[1:] == ['/brain-matrix/?type=Experiment&internal_tags=RushAD']
+    assert state['pending'] == []
+    assert [s['stored'] for s in state['snapshots']] == [True, True]
+    assert not snapshots.is_stale()
+    assert snapshots.refresh_if_stale(request) is None
+    assert len(request.paths) == 2
+
+
+def test_searches_snapshots_paths_setting():
+    from pyramid.config import Configurator
+    from encoded.searches.interfaces import MATRIX_SNAPSHOTS
+    from encoded.searches.snapshots import DEFAULT_MATRIX_SNAPSHOTS
+    from encoded.searches.snapshots import includeme
+    config = Configurator(settings={})
+    includeme(config)
+    assert config.registry[MATRIX_SNAPSHOTS].snapshots == DEFAULT_MATRIX_SNAPSHOTS
+    config = Configurator(settings={
+        'matrix_snapshots.paths': '\n/matrix/?type=Experiment\n/entex-matrix/?type=Experiment&internal_tags=ENTEx',
+        'matrix_snapshots.time_limit': '5',
+    })
+    includeme(config)
+    snapshots = config.registry[MATRIX_SNAPSHOTS]
+    assert snapshots.snapshots == [
+        '/matrix/?type=Experiment',
+        '/entex-matrix/?type=Experiment&internal_tags=ENTEx',
+    ]
+    assert snapshots.time_limit == 5
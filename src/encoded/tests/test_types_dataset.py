@@ -32,4 +32,66 @@ def test_fcc_series_titles(testapp, base_functional_characterization_series, poo
         }
     )
     res = testapp.get(base_functional_characterization_series['@id'] + '@@index-data') 
-    assert res.json['object']['assay_title'] == [fcc_posted_CRISPR_screen.get('assay_title')]
\ No newline at end of file
+    assert res.json['object']['assay_title'] == [fcc_posted_CRISPR_screen.get('assay_title')]
+
+def test_dataset_status_index_entry(testapp, file, dummy_request, threadlocals):
+    index = dummy_request._status_index
+    entry = index.get(file['@id'])
+    assert entry['uuid'] == file['uuid']
+    assert entry['status'] == 'in progress'
+    assert entry['assembly'] is None
+    assert entry['@type'][0] == 'File'
+    # Same entry by path and by uuid.
+    assert index.get(file['@id']) is entry
+    assert index.get('/files/{}/'.format(file['uuid'])) is entry
+    assert file['uuid'] in dummy_request._embedded_uuids
+
+
+def test_dataset_status_index_filters(testapp, file, dummy_request, threadlocals):
+    from encoded.types.base import paths_filtered_by_status
+    from encoded.types.dataset import item_is_revoked
+    from encoded.types.dataset import calculate_assembly
+    paths = [file['@id']]
+    assert paths_filtered_by_status(dummy_request, paths) == paths
+    assert paths_filtered_by_status(dummy_request, paths, include=('released',)) == []
+    assert not item_is_revoked(dummy_request, file['@id'])
+    assert calculate_assembly(dummy_request, paths, 'in progress') == []
+
+
+def test_dataset_status_index_hits_in_x_stats(testapp, experiment, file):
+    from urllib.parse import parse_qs
+    res = testapp.get(experiment['@id'] + '@@index-data')
+    assert file['@id'] in res.json['object']['files']
+    stats = parse_qs(res.headers['X-Stats'])
+    # files, revoked_files, contributing_files and assembly share one lookup.
+    assert int(stats['status_index_hits'][0]) >= 2
+
+
+def test_dataset_status_index_bulk_lookup(testapp, lab, award, experiment, dummy_request, threadlocals, mocker):
+    from encoded.types.base import paths_filtered_by_status
+    paths = []
+    for i, status in enumerate(['in progress', 'deleted', 'revoked', 'released']):
+        item = {
+            'dataset': experiment['@id'],
+            'file_format': 'fasta',
+            'md5sum': '{:032x}'.format(i),
+            'output_type': 'raw data',
+            'lab': lab['@id'],
+            'file_size': 34,
+            'award': award['@id'],
+            'status': 'in progress',
+        }
+        res = testapp.post_json('/file', item).json['@graph'][0]
+        if status != 'in progress':
+            testapp.patch_json(res['@id'], {'status': status})
+        paths.append(res['@id'])
+    index = dummy_request._status_index
+    mocker.spy(index, '_load')
+    assert paths_filtered_by_status(dummy_request, paths) == [paths[0], paths[2], paths[3]]
+    assert paths_filtered_by_status(dummy_request, iter(paths), include=('released',)) == [paths[3]]
+    # Everything came from one bulk query, nothing was traversed.
+    assert index._load.call_count == 0
+    assert [index.get(path)['status'] for path in paths] == [
+        'in progress', 'deleted', 'revoked', 'released'
+    ]
+    assert index.get(paths[0])['@type'][0] == 'File'
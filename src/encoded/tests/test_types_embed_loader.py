@@ -0,0 +1,91 @@
+import pytest
+
+
+def test_types_embed_loader_prime_loads_resources(testapp, base_library, base_biosample, dummy_request, threadlocals):
+    from snovault import CONNECTION
+    connection = dummy_request.registry[CONNECTION]
+    loader = dummy_request._embed_loader
+    loader.prime([
+        base_library['@id'],
+        base_biosample['@id'],
+        '/not-a-collection/',
+    ])
+    assert sorted(loader._models) == sorted([base_library['uuid'], base_biosample['uuid']])
+    # Held by the loader, not the connection's bounded item cache.
+    assert connection.item_cache.get(base_library['uuid']) is None
+    assert connection.item_cache.get(base_biosample['uuid']) is None
+    assert str(
+        connection.unique_key_cache.get(('accession', base_biosample['accession']))
+    ) == base_biosample['uuid']
+
+
+def test_types_embed_loader_embed_many_matches_embed(testapp, base_library, base_biosample, dummy_request, threadlocals):
+    paths = [base_library['@id'], base_biosample['@id'], base_library['@id']]
+    loaded = dummy_request._embed_loader.embed_many(paths, frame='@@object')
+    assert loaded == [
+        testapp.get(path + '@@object').json
+        for path in paths
+    ]
+    assert dummy_request._embed_loader.embed_many(None) == []
+
+
+@pytest.fixture
+def key_queries(conn):
+    from sqlalchemy import event
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if 'FROM keys' in statement:
+            statements.append(statement)
+
+    event.listen(conn, 'before_cursor_execute', record)
+    yield statements
+    event.remove(conn, 'before_cursor_execute', record)
+
+
+def test_types_embed_loader_prefetch_follows_links(testapp, base_replicate, base_library, base_biosample, dummy_request, threadlocals, mocker):
+    from snovault import CONNECTION
+    testapp.patch_json(base_replicate['@id'], {'library': base_library['@id']})
+    loader = dummy_request._embed_loader
+    mocker.spy(dummy_request, 'embed')
+    loader.prefetch([base_replicate['@id']], [('library',), ('biosample',)])
+    assert dummy_request.embed.call_count == 0
+    assert set(loader._models) == {base_replicate['uuid'], base_library['uuid'], base_biosample['uuid']}
+    # Every level's unique keys are cached, not just the paths passed in.
+    unique_key_cache = dummy_request.registry[CONNECTION].unique_key_cache
+    assert str(unique_key_cache.get(('accession', base_library['accession']))) == base_library['uuid']
+    assert str(unique_key_cache.get(('accession', base_biosample['accession']))) == base_biosample['uuid']
+
+
+def test_types_embed_loader_prefetch_avoids_key_queries(testapp, base_replicate, base_library, base_biosample, dummy_request, threadlocals, key_queries):
+    testapp.patch_json(base_replicate['@id'], {'library': base_library['@id']})
+    dummy_request._embed_loader.prefetch([base_replicate['@id']], [('library',), ('biosample',)])
+    prefetch_queries = len(key_queries)
+    # The calculated properties embed linked items by accession.
+    dummy_request.embed(base_library['@id'], '@@object')
+    dummy_request.embed(base_biosample['@id'], '@@object')
+    assert len(key_queries) == prefetch_queries
+
+
+def test_types_embed_loader_disabled(testapp, base_library, dummy_request, threadlocals, key_queries):
+    dummy_request.registry.settings['embed_loader.enabled'] = 'false'
+    try:
+        loader = dummy_request._embed_loader
+        loader.prefetch([base_library['@id']], [('biosample',)])
+        assert loader._models == {}
+        assert key_queries == []
+    finally:
+        del dummy_request.registry.settings['embed_loader.enabled']
+
+
+def test_types_embed_loader_prefetch_skips_statuses(testapp, base_replicate, base_library, base_biosample, dummy_request, threadlocals):
+    testapp.patch_json(base_replicate['@id'], {'library': base_library['@id']})
+    testapp.patch_json(base_library['@id'], {'status': 'deleted'})
+    loader = dummy_request._embed_loader
+    loader.prefetch(
+        [base_replicate['@id']],
+        [('library',), ('biosample',)],
+        skip_statuses=[('deleted',), ('deleted',)],
+    )
+    assert base_library['uuid'] in loader._models
+    assert base_biosample['uuid'] not in loader._models
@@ -0,0 +1,194 @@
+import json
+
+import pytest
+
+
+class FakeIndices:
+    def __init__(self):
+        self.indices = set()
+        self.exists_calls = 0
+
+    def exists(self, index):
+        self.exists_calls += 1
+        return index in self.indices
+
+    def create(self, index=None, body=None, **kwargs):
+        self.indices.add(index)
+
+    def put_mapping(self, index=None, doc_type=None, body=None):
+        pass
+
+
+class FakeTransport:
+    def __init__(self):
+        from elasticsearch.serializer import JSONSerializer
+        self.serializer = JSONSerializer()
+
+
+class FakeElasticsearch:
+    def __init__(self):
+        self.indices = FakeIndices()
+        self.transport = FakeTransport()
+        self.docs = {}
+        self.bulk_requests = 0
+        self.index_requests = 0
+        self.mget_requests = []
+        self.fail_ids = set()
+
+    def bulk(self, body, **kwargs):
+        self.bulk_requests += 1
+        lines = body.strip().split('\n')
+        items = []
+        for action, source in zip(lines[::2], lines[1::2]):
+            meta = json.loads(action)['index']
+            if meta['_id'] in self.fail_ids:
+                items.append({'index': {'_id': meta['_id'], 'status': 429, 'error': 'rejected'}})
+                continue
+            self.docs[meta['_id']] = json.loads(source)
+            items.append({'index': {'_id': meta['_id'], 'status': 201}})
+        return {'errors': bool(self.fail_ids), 'items': items}
+
+    def index(self, index=None, doc_type=None, body=None, id=None):
+        self.index_requests += 1
+        self.docs[id] = body
+
+    def get(self, index=None, doc_type=None, id=None):
+        return {'_id': id, 'found': True, '_source': self.docs[id]}
+
+    def mget(self, index=None, doc_type=None, body=None):
+        self.mget_requests.append(len(body['ids']))
+        return {
+            'docs': [
+                {'_id': vis_id, 'found': True, '_source': self.docs[vis_id]}
+                if vis_id in self.docs else {'_id': vis_id, 'found': False}
+                for vis_id in body['ids']
+            ]
+        }
+
+
+class FakeRegistry(dict):
+    settings = {}
+
+
+class FakeRequest:
+    def __init__(self, es):
+        from snovault.elasticsearch.interfaces import ELASTIC_SEARCH
+        self.registry = FakeRegistry({ELASTIC_SEARCH: es})
+
+
+@pytest.fixture
+def es():
+    from encoded import vis_defines
+    vis_defines._vis_cache_indices.clear()
+    return FakeElasticsearch()
+
+
+def test_vis_cache_add_without_buffer(es):
+    from encoded.vis_defines import VisCache
+    vis_cache = VisCache(FakeRequest(es))
+    vis_cache.add('ENCSR000AAA_hg38', {'name': 'a'})
+    vis_cache.add('ENCSR000AAB_hg38', {'name': 'b'})
+    assert es.index_requests == 2
+    assert es.bulk_requests == 0
+    assert es.indices.exists_calls == 1
+    assert vis_cache.get('ENCSR000AAB_hg38') == {'name': 'b'}
+
+
+def test_vis_cache_buffered_adds_are_bulk_written(es):
+    from encoded.vis_defines import VisCache
+    from encoded.vis_defines import VisCacheBuffer
+    request = FakeRequest(es)
+    request._vis_cache_buffer = VisCacheBuffer(flush_size=3)
+    vis_cache = VisCache(request)
+    for n in range(7):
+        VisCache(request).add('ENCSR00%dAAA_hg38' % n, {'name': n})
+    assert es.bulk_requests == 2
+    assert len(es.docs) == 6
+    assert es.index_requests == 0
+    # Still pending blobs are visible to the request
+    assert vis_cache.get(accession='ENCSR006AAA', assembly='GRCh38') == {'name': 6}
+    assert vis_cache.search(['ENCSR000AAA', 'ENCSR006AAA'], 'GRCh38') == {
+        'ENCSR000AAA_hg38': {'name': 0},
+        'ENCSR006AAA_hg38': {'name': 6},
+    }
+    assert vis_cache.flush() == []
+    assert vis_cache.flush() == []
+    stats = request._vis_cache_buffer.stats()
+    assert stats['flushes'] == 3
+    assert stats['written'] == 7
+    assert stats['errors'] == 0
+    assert stats['pending'] == 0
+    assert len(es.docs) == 7
+    assert es.indices.exists_calls == 1
+
+
+def test_vis_cache_search_uses_bounded_mgets(es, mocker):
+    from encoded import vis_defines
+    mocker.patch.object(vis_defines, 'VIS_CACHE_MGET_CHUNK_SIZE', 4)
+    accessions = ['ENCSR%03dAAA' % n for n in range(10)]
+    for accession in accessions[::2]:
+        es.docs[accession + '_hg19'] = {'accession': accession}
+    results = vis_defines.VisCache(FakeRequest(es)).search(accessions, 'hg19')
+    assert es.mget_requests == [4, 4, 2]
+    assert sorted(results) == [accession + '_hg19' for accession in accessions[::2]]
+
+
+def test_vis_cache_flush_returns_failed_writes(es):
+    from encoded.vis_defines import VisCache
+    from encoded.vis_defines import VisCacheBuffer
+    es.fail_ids = {'ENCSR001AAA_hg38'}
+    request = FakeRequest(es)
+    request._vis_cache_buffer = VisCacheBuffer(flush_size=10)
+    vis_cache = VisCache(request)
+    for n, owner in enumerate(['uuid-0', 'uuid-1', 'uuid-1']):
+        request._vis_cache_buffer.owner = owner
+        vis_cache.add('ENCSR00%dAAA_hg38' % n, {'name': n})
+    assert vis_cache.flush() == ['ENCSR001AAA_hg38']
+    assert sorted(es.docs) == ['ENCSR000AAA_hg38', 'ENCSR002AAA_hg38']
+    assert request._vis_cache_buffer.take_failed() == {'uuid-1'}
+    assert request._vis_cache_buffer.take_failed() == set()
+    stats = request._vis_cache_buffer.stats()
+    assert stats['written'] == 2
+    assert stats['errors'] == 1
+
+
+class FakeState:
+    def __init__(self):
+        self.viscached = []
+
+    def viscached_uuids(self, uuids):
+        self.viscached.extend(uuids)
+
+
+class FakeResult:
+    def __init__(self, uuid):
+        self.source = {'embedded': {'uuid': uuid}}
+
+
+class FakeStorage:
+    def get_by_uuid(self, uuid):
+        return FakeResult(uuid)
+
+
+def test_vis_indexer_marks_only_flushed_uuids(es, mocker):
+    from snovault import STORAGE
+    from snovault.elasticsearch.interfaces import ELASTIC_SEARCH
+    from encoded import vis_indexer
+    from encoded.vis_defines import VisCache
+
+    def fake_vis_cache_add(request, dataset, is_vis_indexer=False):
+        vis_id = dataset['uuid'] + '_hg38'
+        VisCache(request).add(vis_id, {'name': dataset['uuid']})
+        return [vis_id]
+
+    mocker.patch.object(vis_indexer, 'vis_cache_add', fake_vis_cache_add)
+    registry = FakeRegistry({ELASTIC_SEARCH: es, STORAGE: FakeStorage()})
+    registry.settings = {'snovault.elasticsearch.index': 'snovault', 'visindexer.flush_size': 2}
+    indexer = vis_indexer.VisIndexer(registry)
+    indexer.state = FakeState()
+    es.fail_ids = {'uuid-1_hg38'}
+    uuids = ['uuid-%d' % n for n in range(5)]
+    errors = indexer.build_vis_blobs(FakeRequest(es), uuids, 1)
+    assert [error['uuid'] for error in errors] == ['uuid-1']
+    assert indexer.state.viscached == ['uuid-0', 'uuid-2', 'uuid-3', 'uuid-4']
+    assert indexer.flush_stats['errors'] == 1
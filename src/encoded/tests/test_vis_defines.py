@@ -0,0 +1,69 @@
+import pytest
+
+
+EXPERIMENT = {
+    'accession': 'ENCSR000AAA',
+    'assay_title': 'TF ChIP-seq',
+    'assay_term_name': 'ChIP-seq',
+    'target': {'label': 'CTCF'},
+    'biosample_ontology': {'term_name': 'K562'},
+    'lab': {'title': 'Some Lab'},
+}
+
+FILE = {
+    'accession': 'ENCFF000AAA',
+    'output_type': 'signal p-value',
+    'rep_tech': 'rep2_1',
+    'rep_tag': 'rep02',
+}
+
+
+@pytest.fixture
+def vis_defines():
+    from encoded.vis_defines import VisDefines
+    return VisDefines(None, EXPERIMENT)
+
+
+def test_vis_defines_compile_mask_segments():
+    from encoded.vis_defines import VisDefines
+    from encoded.vis_defines import compile_mask
+    template = compile_mask('{assay_title} of {biosample_term_name} - {file.accession}')
+    assert template is compile_mask('{assay_title} of {biosample_term_name} - {file.accession}')
+    assert [part if isinstance(part, str) else part[0] for part in template.parts] == [
+        '{assay_title}', ' of ', '{biosample_term_name}', ' - ', '{file.accession}',
+    ]
+    assert template.parts[0][1] is VisDefines._simple_dataset_token
+    assert compile_mask('no tokens').parts == ['no tokens']
+    # Unclosed tokens are left as they are.
+    assert [part if isinstance(part, str) else part[0] for part in compile_mask('{accession} {open').parts] == [
+        '{accession}', ' {open',
+    ]
+
+
+def test_vis_defines_convert_mask(vis_defines):
+    long_label = (
+        '{assay_title} of {biosample_term_name} {output_type} '
+        '{biological_replicate_number} {experiment.accession} - {file.accession}'
+    )
+    assert vis_defines.convert_mask(long_label, EXPERIMENT, FILE) == (
+        'TF ChIP-seq of K562 signal p-value 2 ENCSR000AAA - ENCFF000AAA'
+    )
+    assert vis_defines.convert_mask('{replicate} {output_type_short_label}', EXPERIMENT, FILE) == 'rep2 pval sig'
+    assert vis_defines.convert_mask('{target} in {lab.title}') == 'CTCF in Some Lab'
+    # File tokens are looked up in the dataset without a file.
+    assert vis_defines.convert_mask('{file.accession}') == 'unknown'
+    assert vis_defines.convert_mask('{not_a_token}') == 'unknown token'
+    assert vis_defines.convert_mask('') == ''
+
+
+def test_vis_defines_lookup_token(vis_defines):
+    assert vis_defines.lookup_token('{assay_title}', {'assay_term_name': 'DNase-seq'}) == 'DNase-seq'
+    assert vis_defines.lookup_token('{assay_title}', {}) == 'Unknown Assay'
+    assert vis_defines.lookup_token('{replicate_number}', EXPERIMENT, a_file=FILE) == '02'
+    bpnet = {
+        'annotation_type': 'BPNet-model',
+        'biosample_ontology': {'term_name': 'HepG2'},
+        'replicates': [{'library': {'biosample': {'summary': 'HepG2 cells'}}}],
+    }
+    assert vis_defines.lookup_token('{replicates.library.biosample.summary}', bpnet) == 'HepG2'
+    assert vis_defines.lookup_token('{replicates.library.biosample.summary|multiple}', bpnet) == 'HepG2 cells'
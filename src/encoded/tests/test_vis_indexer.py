@@ -0,0 +1,124 @@
+import pytest
+
+
+class FakeIndices:
+    def exists(self, index):
+        return True
+
+
+class FakeElasticsearch:
+    indices = FakeIndices()
+
+
+class FakeRegistry(dict):
+    settings = {
+        'snovault.elasticsearch.index': 'snovault',
+        'visindexer.chunk_size': 3,
+    }
+
+
+class FakeRequest:
+    def __init__(self, registry):
+        self.registry = registry
+
+
+class FakeState:
+    def __init__(self):
+        self.viscached = []
+
+    def viscached_uuids(self, uuids):
+        self.viscached.extend(uuids)
+
+
+class FakePool:
+    def __init__(self):
+        self.tasks = []
+
+    def imap_unordered(self, func, tasks):
+        for uuids, xmin in tasks:
+            self.tasks.append(uuids)
+            yield {
+                'pid': 1,
+                'uuids': len(uuids),
+                'errors': [{'uuid': uuid} for uuid in uuids if uuid.endswith('9')],
+                'viscached': [uuid for uuid in uuids if not uuid.endswith('9')],
+                'failed': [uuid for uuid in uuids if uuid.endswith('9')],
+                'flush': {'flushes': 1, 'written': len(uuids), 'errors': 0, 'seconds': 0.5},
+                'run_time': 0.5,
+            }
+
+
+@pytest.fixture
+def registry():
+    from snovault import STORAGE
+    from snovault.elasticsearch.interfaces import APP_FACTORY
+    from snovault.elasticsearch.interfaces import ELASTIC_SEARCH
+    return FakeRegistry({
+        ELASTIC_SEARCH: FakeElasticsearch(),
+        STORAGE: object(),
+        APP_FACTORY: object(),
+    })
+
+
+@pytest.fixture
+def mp_vis_indexer(registry):
+    from encoded.vis_indexer import MPVisIndexer
+    indexer = MPVisIndexer(registry, processes=2)
+    indexer.state = FakeState()
+    indexer.pool = FakePool()
+    return indexer
+
+
+def test_mp_vis_indexer_splits_and_gathers(registry, mp_vis_indexer):
+    request = FakeRequest(registry)
+    uuids = ['uuid-%d' % n for n in range(10)]
+    errors = mp_vis_indexer.update_objects(request, uuids, 1)
+    # At most chunk_size uuids per task, every uuid sent once
+    assert [len(task) for task in mp_vis_indexer.pool.tasks] == [3, 3, 3, 1]
+    assert errors == [{'uuid': 'uuid-9'}]
+    assert sorted(mp_vis_indexer.state.viscached) == sorted(uuids[:9])
+    assert mp_vis_indexer.flush_stats['flushes'] == 4
+    assert mp_vis_indexer.flush_stats['written'] == 10
+    assert mp_vis_indexer.flush_stats['written_per_second'] == 5.0
+    assert mp_vis_indexer.cycle_stats['processes'] == 2
+    assert mp_vis_indexer.cycle_stats['uuids'] == 10
+
+
+def test_vis_indexer_worker_returns_failed_uuids(registry, mocker):
+    from encoded import vis_indexer
+    worker = vis_indexer.VisIndexerWorker(registry)
+
+    def build_vis_blobs(request, uuids, xmin, create_cache=False):
+        # As if the bulk write of uuid-1's vis_blob failed
+        worker.record_viscached([uuid for uuid in uuids if uuid != 'uuid-1'])
+        worker.failed.append('uuid-1')
+        return [{'uuid': 'uuid-1'}]
+
+    mocker.patch.object(worker, 'build_vis_blobs', build_vis_blobs)
+    mocker.patch.object(vis_indexer, 'worker_indexer', worker)
+    mocker.patch.object(vis_indexer, 'worker_request', lambda: FakeRequest(registry))
+    info = vis_indexer.update_vis_objects_in_worker((['uuid-0', 'uuid-1', 'uuid-2'], 1))
+    assert info['viscached'] == ['uuid-0', 'uuid-2']
+    assert info['failed'] == ['uuid-1']
+    assert info['errors'] == [{'uuid': 'uuid-1'}]
+    assert worker.flushed == [] and worker.failed == []
+
+
+def test_mp_vis_indexer_skips_failed_uuids(registry, mp_vis_indexer, mocker):
+    def imap_unordered(func, tasks):
+        for uuids, xmin in tasks:
+            yield {
+                'pid': 1,
+                'uuids': len(uuids),
+                'errors': [{'uuid': 'uuid-1'}] if 'uuid-1' in uuids else [],
+                'viscached': list(uuids),
+                'failed': ['uuid-1'] if 'uuid-1' in uuids else [],
+                'flush': {},
+                'run_time': 0.5,
+            }
+
+    mocker.patch.object(mp_vis_indexer.pool, 'imap_unordered', imap_unordered)
+    uuids = ['uuid-%d' % n for n in range(4)]
+    errors = mp_vis_indexer.update_objects(FakeRequest(registry), uuids, 1)
+    assert errors == [{'uuid': 'uuid-1'}]
+    assert sorted(mp_vis_indexer.state.viscached) == ['uuid-0', 'uuid-2', 'uuid-3']
@@ -6,8 +6,10 @@ from snovault import (
 )
 from snovault.util import Path
 from pyramid.traversal import find_root
+from .embed_loader import EmbedLoader
 from .base import (
     Item,
+    StatusIndex,
     paths_filtered_by_status,
     ALLOW_CURRENT,
     DELETED,
@@ -18,6 +20,8 @@ def includeme(config):
     config.scan()
     config.add_request_method(lambda request: set(), '_set_status_changed_paths', reify=True)
     config.add_request_method(lambda request: set(), '_set_status_considered_paths', reify=True)
+    config.add_request_method(EmbedLoader, '_embed_loader', reify=True)
+    config.add_request_method(StatusIndex, '_status_index', reify=True)
 
 
 @collection(
@@ -15,6 +15,7 @@ from pyramid.traversal import (
     traverse,
     resource_path
 )
+from pyramid.events import subscriber
 from pyramid.view import (
     view_config
 )
@@ -23,6 +24,12 @@ import snovault
 from snovault.validation import ValidationFailure
 from snovault.schema_utils import validate_request
 from snovault.auditor import traversed_path_ids
+from snovault.util import get_root_request
+from .bulk import (
+    get_database_storage,
+    load_fields,
+    resolve_uuids,
+)
 from snovault import (
     AfterModified,
     BeforeModified
@@ -115,16 +122,123 @@ STATUS_HIERARCHY = {
 }
 
 
+def record_stats(**counts):
+    # Counters end up in the X-Stats header of the top level request.
+    request = get_root_request()
+    if request is None or not hasattr(request, '_stats'):
+        return
+    stats = request._stats
+    for name, count in counts.items():
+        stats[name] = stats.get(name, 0) + count
+
+
+class StatusIndex:
+    '''
+    Per-request index of the fields that status filtering and assembly
+    calculation read from linked items (status, assembly, @type), keyed
+    by path and uuid. Sibling calculated properties (files,
+    contributing_files, revoked_files, assembly, ...) all walk the same
+    file list, this loads each item once per request instead of once
+    per property. When reading from the database, get_many fills all
+    missing paths with one query for just those JSON fields instead of
+    traversing and copying each item.
+    '''
+
+    BULK_FIELDS = ('status', 'assembly')
+
+    def __init__(self, request):
+        self.request = request
+        self._by_path = {}
+        self._by_uuid = {}
+
+    def _load(self, path):
+        context = traverse(self.request.root, path)['context']
+        properties = context.__json__(self.request)
+        return {
+            'uuid': str(context.uuid),
+            'status': properties.get('status'),
+            'assembly': properties.get('assembly'),
+            '@type': context.jsonld_type(),
+        }
+
+    def _add(self, path, entry):
+        self._by_path[path] = entry
+        self._by_uuid[entry['uuid']] = entry
+
+    def get(self, path):
+        entry = self._by_path.get(path)
+        if entry is None:
+            entry = self._by_uuid.get(path.strip('/').rsplit('/', 1)[-1])
+        if entry is not None:
+            record_stats(status_index_hits=1)
+            # Keep invalidation tracking identical to loading the item.
+            self.request._embedded_uuids.add(entry['uuid'])
+            self._by_path[path] = entry
+            return entry
+        record_stats(status_index_misses=1)
+        entry = self._load(path)
+        self._add(path, entry)
+        return entry
+
+    def _load_many(self, paths):
+        storage = get_database_storage(self.request.registry)
+        if storage is None:
+            return
+        session = storage.DBSession()
+        uuids = resolve_uuids(self.request, session, paths)
+        types = self.request.registry[snovault.TYPES]
+        entries = {}
+        for uuid, item_type, fields in load_fields(
+                self.request, session, set(uuids.values()), self.BULK_FIELDS):
+            type_info = types.by_item_type.get(item_type)
+            if type_info is None or fields['status'] is None:
+                # Leave anything unusual to the full load.
+                continue
+            entries[uuid] = {
+                'uuid': uuid,
+                'status': fields['status'],
+                'assembly': fields['assembly'],
+                '@type': [type_info.name] + type_info.factory.base_types,
+            }
+        for path, uuid in uuids.items():
+            entry = entries.get(uuid)
+            if entry is not None:
+                self._add(path, entry)
+                self.request._embedded_uuids.add(uuid)
+        record_stats(status_index_bulk_count=1, status_index_bulk_items=len(entries))
+
+    def get_many(self, paths):
+        missing = [
+            path for path in dict.fromkeys(paths)
+            if path not in self._by_path
+        ]
+        if len(missing) > 1:
+            self._load_many(missing)
+        return [self.get(path) for path in paths]
+
+    def clear(self):
+        self._by_path.clear()
+        self._by_uuid.clear()
+
+
+@subscriber(AfterModified)
+def clear_status_index(event):
+    # Statuses read earlier in this request may no longer hold.
+    event.request._status_index.clear()
+
+
 def paths_filtered_by_status(request, paths, exclude=('deleted', 'replaced'), include=None):
+    paths = list(paths)
+    entries = request._status_index.get_many(paths)
     if include is not None:
         return [
-            path for path in paths
-            if traverse(request.root, path)['context'].__json__(request).get('status') in include
+            path for path, entry in zip(paths, entries)
+            if entry['status'] in include
         ]
     else:
         return [
-            path for path in paths
-            if traverse(request.root, path)['context'].__json__(request).get('status') not in exclude
+            path for path, entry in zip(paths, entries)
+            if entry['status'] not in exclude
         ]
 
 
@@ -0,0 +1,146 @@
+from snovault import (
+    CONNECTION,
+    STORAGE,
+)
+from snovault.storage import (
+    CurrentPropertySheet,
+    Key,
+    PropertySheet,
+    Resource,
+)
+from sqlalchemy import (
+    func,
+    tuple_,
+)
+from uuid import UUID
+
+
+BATCH_SIZE = 500
+
+
+def get_database_storage(registry):
+    '''
+    Returns the database storage if the current request reads from it,
+    or None when reads go to Elasticsearch.
+    '''
+    storage = registry[STORAGE]
+    # PickStorage picks per request between Elasticsearch and the database.
+    if hasattr(storage, 'storage'):
+        storage = storage.storage()
+    if not hasattr(storage, 'DBSession'):
+        return None
+    return storage
+
+
+def split_path(path):
+    parts = path.strip('/').split('/')
+    if len(parts) != 2:
+        return None, None
+    return parts
+
+
+def is_uuid(name):
+    try:
+        UUID(name)
+    except ValueError:
+        return False
+    return True
+
+
+def _batches(values):
+    for start in range(0, len(values), BATCH_SIZE):
+        yield values[start:start + BATCH_SIZE]
+
+
+def resolve_uuids(request, session, paths):
+    '''
+    Maps item paths (/collection/uuid-or-unique-key/) to uuids with at
+    most one unique key query per batch, using and seeding the
+    connection's unique key cache. Unresolvable paths are left out.
+    '''
+    connection = request.registry[CONNECTION]
+    uuids = {}
+    pending = {}
+    for path in paths:
+        collection_name, name = split_path(path)
+        if name is None:
+            continue
+        if is_uuid(name):
+            uuids[path] = name
+            continue
+        collection = request.root.get(collection_name)
+        unique_key = getattr(collection, 'unique_key', None)
+        if unique_key is None:
+            continue
+        cached = connection.unique_key_cache.get((unique_key, name))
+        if cached is not None:
+            uuids[path] = str(cached)
+        else:
+            pending.setdefault((unique_key, name), []).append(path)
+    for batch in _batches(list(pending)):
+        query = session.query(Key.name, Key.value, Key.rid).filter(
+            tuple_(Key.name, Key.value).in_(batch)
+        )
+        for name, value, rid in query:
+            connection.unique_key_cache[(name, value)] = rid
+            for path in pending[(name, value)]:
+                uuids[path] = str(rid)
+    return uuids
+
+
+def load_models(session, uuids):
+    '''
+    Loads the resources (with their current property sheets) for uuids in
+    batched queries. Returns {uuid: Resource}; while the caller holds
+    them the session's identity map serves later lookups of these uuids
+    (e.g. by request.embed) without a query.
+    '''
+    models = {}
+    for batch in _batches(list(uuids)):
+        rids = [UUID(uuid) for uuid in batch]
+        for model in session.query(Resource).filter(Resource.rid.in_(rids)):
+            models[str(model.rid)] = model
+    return models
+
+
+def load_unique_keys(session, uuids):
+    '''
+    Yields (name, value, rid) for every unique key of uuids (accession,
+    alias, ...) in batched queries, the entries Connection.get_by_unique_key
+    caches as it resolves paths by key one at a time.
+    '''
+    for batch in _batches(list(uuids)):
+        rids = [UUID(uuid) for uuid in batch]
+        yield from session.query(Key.name, Key.value, Key.rid).filter(
+            Key.rid.in_(rids)
+        )
+
+
+def load_fields(request, session, uuids, fields):
+    '''
+    Reads just the given top level properties of the current property
+    sheets for uuids, without loading or copying the rest of the item.
+    Yields (uuid, item_type, {field: value}) with values as text.
+    '''
+    columns = [
+        func.jsonb_extract_path_text(PropertySheet.properties, field)
+        for field in fields
+    ]
+    for batch in _batches(list(uuids)):
+        rids = [UUID(uuid) for uuid in batch]
+        query = session.query(
+            Resource.rid,
+            Resource.item_type,
+            *columns
+        ).join(
+            CurrentPropertySheet,
+            CurrentPropertySheet.rid == Resource.rid
+        ).join(
+            PropertySheet,
+            PropertySheet.sid == CurrentPropertySheet.sid
+        ).filter(
+            CurrentPropertySheet.name == '',
+            Resource.rid.in_(rids),
+        )
+        for rid, item_type, *values in query:
+            yield str(rid), item_type, dict(zip(fields, values))
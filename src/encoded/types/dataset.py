@@ -49,18 +49,17 @@ import datetime
 
 
 def item_is_revoked(request, path):
-    return request.embed(path, '@@object?skip_calculated=true').get('status') == 'revoked'
+    return request._status_index.get(path)['status'] == 'revoked'
 
 
 def calculate_assembly(request, files_list, status):
     assembly = set()
     viewable_file_status = ['released','in progress']
 
-    for path in files_list:
-        properties = request.embed(path, '@@object?skip_calculated=true')
-        if properties['status'] in viewable_file_status:
-            if 'assembly' in properties:
-                assembly.add(properties['assembly'])
+    for entry in request._status_index.get_many(files_list):
+        if entry['status'] in viewable_file_status:
+            if entry['assembly'] is not None:
+                assembly.add(entry['assembly'])
     return list(assembly)
 
 
@@ -996,6 +995,16 @@ class Series(Dataset, CalculatedSeriesAssay, CalculatedSeriesAssayType, Calculat
         gm_summaries = ''
         elements_references_summaries = ''
 
+        request._embed_loader.prefetch(
+            related_datasets,
+            [
+                ('replicates',),
+                ('library',),
+                ('biosample',),
+                ('treatments', 'genetic_modifications'),
+            ],
+            skip_statuses=[('deleted', 'replaced'), ('deleted',), ('deleted',), ('deleted',)],
+        )
         for dataset in related_datasets:
             datasetObject = request.embed(dataset, '@@object')
             if datasetObject['status'] not in ('deleted', 'replaced'):
@@ -1278,6 +1287,16 @@ class AggregateSeries(Series):
         elements_references_summaries = ''
         series_summaries = ''
 
+        request._embed_loader.prefetch(
+            related_datasets,
+            [
+                ('replicates',),
+                ('library',),
+                ('biosample',),
+                ('treatments', 'genetic_modifications'),
+            ],
+            skip_statuses=[('deleted', 'replaced'), ('deleted',), ('deleted',), ('deleted',)],
+        )
         for dataset in related_datasets:
             datasetObject = request.embed(dataset, '@@object')
             if datasetObject['status'] not in ('deleted', 'replaced'):
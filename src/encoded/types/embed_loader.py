@@ -0,0 +1,120 @@
+from pyramid.settings import asbool
+from snovault import CONNECTION
+from .base import record_stats
+from .bulk import (
+    get_database_storage,
+    is_uuid,
+    load_models,
+    load_unique_keys,
+    resolve_uuids,
+)
+
+
+class EmbedLoader:
+    '''
+    Request-scoped batch loader for embeds in calculated properties.
+    prime(paths) resolves every path with one unique key query and loads
+    the resources with one resource query, and the loader holds them so
+    the embeds that follow find them in the session instead of querying
+    one at a time. prefetch walks linked fields level by level through
+    the stored properties, loading a whole level in one batch, without
+    embedding anything itself. The unique keys of every loaded item are
+    put in the connection's unique key cache too, so embeds of their
+    accession paths (/libraries/ENCLB.../) don't query the keys table
+    one at a time either. That cache is bounded, so a series linking to
+    more items than it holds falls back to single lookups for the ones
+    evicted. Only applies when the request reads from the database
+    (indexing) and the embed_loader.enabled setting isn't false.
+    '''
+
+    def __init__(self, request):
+        self.request = request
+        self.registry = request.registry
+        self._primed = set()
+        # uuid: Resource, kept here rather than in the connection's
+        # bounded item cache so large series don't evict their own.
+        self._models = {}
+        self.enabled = asbool(self.registry.settings.get('embed_loader.enabled', True))
+
+    def _session(self):
+        if not self.enabled:
+            return None
+        storage = get_database_storage(self.registry)
+        if storage is None:
+            return None
+        return storage.DBSession()
+
+    def _load(self, session, uuids):
+        pending = [uuid for uuid in dict.fromkeys(uuids) if uuid not in self._models]
+        if not pending:
+            return
+        loaded = load_models(session, pending)
+        self._models.update(loaded)
+        unique_key_cache = self.registry[CONNECTION].unique_key_cache
+        for name, value, rid in load_unique_keys(session, loaded):
+            unique_key_cache[(name, value)] = rid
+        record_stats(embed_loader_count=1, embed_loader_items=len(loaded))
+
+    def prime(self, paths):
+        paths = [
+            path for path in dict.fromkeys(paths or [])
+            if path and path not in self._primed
+        ]
+        if not paths:
+            return
+        self._primed.update(paths)
+        session = self._session()
+        if session is None:
+            return
+        uuids = resolve_uuids(self.request, session, paths)
+        self._load(session, uuids.values())
+
+    def embed_many(self, paths, frame='@@object'):
+        paths = [path for path in paths or [] if path]
+        self.prime(paths)
+        return [
+            self.request.embed(path, frame)
+            for path in paths
+        ]
+
+    def prefetch(self, paths, fields_by_level, skip_statuses=()):
+        '''
+        Loads paths and then, for each tuple of field names in
+        fields_by_level, the items linked from the previous level through
+        those fields, one batch per level. skip_statuses[n] are the
+        statuses of the items at level n (paths being level 0) whose
+        links aren't followed, matching the calculated property's own
+        loop. Only loads; the property's request.embed calls are what
+        embed (and so what indexing invalidation sees).
+        '''
+        paths = [path for path in dict.fromkeys(paths or []) if path]
+        if not paths:
+            return
+        session = self._session()
+        if session is None:
+            return
+        uuids = list(resolve_uuids(self.request, session, paths).values())
+        for level, fields in enumerate(fields_by_level):
+            self._load(session, uuids)
+            skip = skip_statuses[level] if level < len(skip_statuses) else ()
+            next_uuids = []
+            for uuid in dict.fromkeys(uuids):
+                model = self._models.get(uuid)
+                if model is None:
+                    continue
+                properties = model.properties
+                if properties.get('status') in skip:
+                    continue
+                for field in fields:
+                    # Stored links are uuids.
+                    value = properties.get(field)
+                    if isinstance(value, str):
+                        value = [value]
+                    if isinstance(value, list):
+                        next_uuids.extend(
+                            v for v in value if isinstance(v, str) and is_uuid(v)
+                        )
+            if not next_uuids:
+                return
+            uuids = next_uuids
+        self._load(session, uuids)
@@ -235,6 +235,11 @@ class CalculatedBiosampleSummary:
         dictionaries_of_phrases = []
         biosample_accessions = set()
         if replicates is not None:
+            request._embed_loader.prefetch(
+                replicates,
+                [('library',), ('biosample',)],
+                skip_statuses=[('deleted',), ('deleted',)],
+            )
             for rep in replicates:
                 replicateObject = request.embed(rep, '@@object')
                 if replicateObject['status'] == 'deleted':
@@ -328,6 +333,11 @@ class CalculatedSimpleSummary:
         sub_summaries = set()
         biosample_accessions = set()
         if replicates is not None:
+            request._embed_loader.prefetch(
+                replicates,
+                [('library',), ('biosample',)],
+                skip_statuses=[('deleted',), ('deleted',)],
+            )
             for rep in replicates:
                 replicateObject = request.embed(rep, '@@object')
                 if replicateObject['status'] == 'deleted':
@@ -389,6 +399,7 @@ class CalculatedAssayTitle:
                 preferred_name = 'total RNA-seq'
             elif preferred_name == 'scRNA-seq':
                 subcellular_fractions = set()
+                request._embed_loader.prefetch(replicates, [('library',), ('biosample',)])
                 for rep in replicates:
                     replicate_object = request.embed(rep, '@@object?skip_calculated=true')
                     if 'library' in replicate_object:
@@ -410,6 +421,7 @@ class CalculatedAssayTitle:
                     else:
                         preferred_name = 'TF ChIP-seq'
             elif preferred_name == 'Hi-C' and replicates:
+                request._embed_loader.prefetch(replicates, [('library',)])
                 for rep in replicates:
                     replicate_object = request.embed(rep, '@@object?skip_calculated=true')
                     if 'library' in replicate_object:
@@ -492,6 +504,11 @@ class CalculatedReplicationType:
         biosample_donor_list = []
         biosample_number_list = []
 
+        request._embed_loader.prefetch(
+            replicates,
+            [('library',), ('biosample',), ('biosample_ontology',)],
+            skip_statuses=[('deleted',)],
+        )
         for rep in replicates:
             replicateObject = request.embed(rep, '@@object')
             if replicateObject['status'] == 'deleted':
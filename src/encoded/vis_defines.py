@@ -4,6 +4,7 @@ from pyramid.compat import bytes_
 from snovault import Item
 from collections import OrderedDict
 from copy import deepcopy
+from functools import lru_cache
 import json
 import os
 from urllib.parse import (
@@ -11,6 +12,7 @@ from urllib.parse import (
     urlencode,
 )
 from snovault.elasticsearch.interfaces import ELASTIC_SEARCH
+from elasticsearch.helpers import bulk
 import time
 from pkg_resources import resource_filename
 
@@ -195,6 +197,9 @@ SUPPORTED_MASK_TOKENS = [
     #                                   #    otherwise it bundles up in the biosample summary now"
     ]
 
+# Masks are compiled once; they come from vis_defs and a few fixed labels
+MASK_TEMPLATE_CACHE_SIZE = 4096
+
 # Simple tokens are a straight lookup, no questions asked
 SIMPLE_DATASET_TOKENS = ["{accession}", "{assay_title}",
                          "{assay_term_name}", "{annotation_type}", "{@id}", "{@type}"]
@@ -757,179 +762,171 @@ class VisDefines(object):
     def lookup_token(self, token, dataset, a_file=None):
         '''Encodes the string to swap special characters and remove spaces.'''
         # dataset might not be self.dataset
-
-        if token not in SUPPORTED_MASK_TOKENS:
-            log.warn("Attempting to look up unexpected token: '%s'" % token)
-            return "unknown token"
-
+        return token_resolver(token)(self, token, dataset, a_file)
+
+    def _unknown_token(self, token, dataset, a_file):
+        log.warn("Attempting to look up unexpected token: '%s'" % token)
+        return "unknown token"
+
+    def _simple_dataset_token(self, token, dataset, a_file):
+        term = dataset.get(token[1:-1])
+        if term is None:
+            if token == "{assay_title}":
+                term = dataset.get("assay_term_name")
+        if term is None:
+            return "Unknown " + token[1:-1].split('_')[0].capitalize()
+        elif isinstance(term,list) and len(term) > 3:
+            return "Collection of %d %ss" % (len(term),token[1:-1].split('_')[0].capitalize())
+        return term
+
+    def _experiment_accession(self, token, dataset, a_file):
+        return dataset['accession']
+
+    def _target(self, token, dataset, a_file):
+        if token == '{target}':
+            token = '{target.label}'
+        term = self.lookup_embedded_token(token, dataset)
+        if term is None and token == '{target.name}':
+            term = self.lookup_embedded_token('{target.label}', dataset)
+        if term is not None:
+            if isinstance(term, list) and len(term) > 0:
+                return term[0]
+            return term
+        if term is None:
+            targets = self.lookup_embedded_token('{targets}', dataset)
+            if targets is not None:
+                if isinstance(targets, list) and len(targets) > 0:
+                    target = targets[0]
+                    if isinstance(target, dict):
+                        return target.get('label')
+                    elif isinstance(target, str):
+                        return target.split("/")[2]
+        return "Unknown Target"
+
+    def _biosample_summary(self, token, dataset, a_file):
         # BPNet annotation has very different properties than experiments
         if dataset.get("annotation_type") in ["BPNet-model", "ChromBPNet-model"]:
             if token == "{replicates.library.biosample.summary}":
-                token = "{biosample_term_name}"
-
-        if token in SIMPLE_DATASET_TOKENS:
-            term = dataset.get(token[1:-1])
-            if term is None:
-                if token == "{assay_title}":
-                    term = dataset.get("assay_term_name")
-            if term is None:
-                return "Unknown " + token[1:-1].split('_')[0].capitalize()
-            elif isinstance(term,list) and len(term) > 3:
-                return "Collection of %d %ss" % (len(term),token[1:-1].split('_')[0].capitalize())
+                return self._biosample_term_name("{biosample_term_name}", dataset, a_file)
+        term = self.lookup_embedded_token('{replicates.library.biosample.summary}', dataset)
+        if term is None:
+            term = dataset.get("biosample_term_name")
+        if term is not None:
             return term
-        elif token == "{experiment.accession}":
-            return dataset['accession']
-        elif token in ["{target}", "{target.label}", "{target.name}", "{target.title}", "{target.investigated_as}"]:
-            if token == '{target}':
-                token = '{target.label}'
-            term = self.lookup_embedded_token(token, dataset)
-            if term is None and token == '{target.name}':
-                term = self.lookup_embedded_token('{target.label}', dataset)
-            if term is not None:
-                if isinstance(term, list) and len(term) > 0:
-                    return term[0]
-                return term
-            if term is None:
-                targets = self.lookup_embedded_token('{targets}', dataset)
-                if targets is not None:
-                    if isinstance(targets, list) and len(targets) > 0:
-                        target = targets[0]
-                        if isinstance(target, dict):
-                            return target.get('label')
-                        elif isinstance(target, str):
-                            return target.split("/")[2]
-            return "Unknown Target"
-        elif token in ["{replicates.library.biosample.summary}",
-                    "{replicates.library.biosample.summary|multiple}"]:
-            term = self.lookup_embedded_token('{replicates.library.biosample.summary}', dataset)
-            if term is None:
-                term = dataset.get("biosample_term_name")
-            if term is not None:
-                return term
-            if token.endswith("|multiple}"):
-                return "multiple biosamples"
+        if token.endswith("|multiple}"):
+            return "multiple biosamples"
+        return "Unknown Biosample"
+
+    def _biosample_term_name(self, token, dataset, a_file):
+        biosample_ontology = dataset.get('biosample_ontology')
+        if biosample_ontology is None:
             return "Unknown Biosample"
-        elif token == "{biosample_term_name}":
-            biosample_ontology = dataset.get('biosample_ontology')
-            if biosample_ontology is None:
-                return "Unknown Biosample"
-            if isinstance(biosample_ontology, dict):
-                return biosample_ontology['term_name']
-            if isinstance(biosample_ontology, list) and len(biosample_ontology) > 3:
-                return "Collection of %d Biosamples" % (len(biosample_ontology))
-            # The following got complicated because general Dataset objects
-            # cannot have biosample_ontology embedded properly. As a base class,
-            # some of the children, PublicationData, Project and 8 Series
-            # objects, have biosample_ontology embedded as array of objects,
-            # while experiment and annotation have it embedded as one single
-            # object. This becomes a problem when File object linkTo Dataset in
-            # general rather than one specific type. Current embedding system
-            # don't know how to map a property with type = ["array", "string"]
-            # in elasticsearch. Therefore, it is possible the
-            # "biosample_ontology" we got here is @id which should be embedded
-            # with the following code.
-            if not isinstance(biosample_ontology, list):
-                biosample_ontology = [biosample_ontology]
-            term_names = []
-            for type_obj in biosample_ontology:
-                if isinstance(type_obj, str):
-                    term_names.append(
-                        self._request.embed(type_obj, '@@object')['term_name']
-                    )
-                elif 'term_name' in type_obj:
-                    term_names.append(type_obj['term_name'])
-            if len(term_names) == 1:
-                return term_names[0]
-            else:
-                return term_names
-
-        elif token == "{biosample_term_name|multiple}":
-            biosample_ontology = dataset.get('biosample_ontology')
-            if biosample_ontology is None:
-                return "multiple biosamples"
-            return biosample_ontology.get('term_name')
-        # TODO: rna_species
-        # elif token == "{rna_species}":
-        #     if replicates.library.nucleic_acid = polyadenylated mRNA
-        #        rna_species = "polyA RNA"
-        #     elif replicates.library.nucleic_acid == "RNA":
-        #        if "polyadenylated mRNA" in replicates.library.depleted_in_term_name
-        #                rna_species = "polyA depleted RNA"
-        #        else
-        #                rna_species = "total RNA"
-        elif a_file is not None:
-            if token == "{file.accession}":
-                return a_file['accession']
-            #elif token == "{output_type}":
-            #    return a_file['output_type']
-            elif token == "{output_type_short_label}":
-                output_type = a_file['output_type']
-                return OUTPUT_TYPE_8CHARS.get(output_type, output_type)
-            elif token == "{replicate}":
-                rep_tag = a_file.get("rep_tag")
-                if rep_tag is not None:
-                    while len(rep_tag) > 4:
-                        if rep_tag[3] != '0':
-                            break
-                        rep_tag = rep_tag[0:3] + rep_tag[4:]
-                    return rep_tag
-                rep_tech = a_file.get("rep_tech")
-                if rep_tech is not None:
-                    return rep_tech.split('_')[0]  # Should truncate tech_rep
-                rep_tech = self.rep_for_file(a_file)
-                return rep_tech.split('_')[0]  # Should truncate tech_rep
-            elif token == "{replicate_number}":
-                rep_tag = a_file.get("rep_tag", a_file.get("rep_tech", self.rep_for_file(a_file)))
-                if not rep_tag.startswith("rep"):
-                    return "0"
-                return rep_tag[3:].split('_')[0]
-            elif token == "{biological_replicate_number}":
-                rep_tech = a_file.get("rep_tech", self.rep_for_file(a_file))
-                if not rep_tech.startswith("rep"):
-                    return "0"
-                return rep_tech[3:].split('_')[0]
-            elif token == "{technical_replicate_number}":
-                rep_tech = a_file.get("rep_tech", self.rep_for_file(a_file))
-                if not rep_tech.startswith("rep"):
-                    return "0"
-                return rep_tech.split('_')[1]
-            elif token == "{rep_tech}":
-                return a_file.get("rep_tech", self.rep_for_file(a_file))
-            else:
-                val = self.lookup_embedded_token(token, a_file)
-                if val is not None and isinstance(val, str):
-                    return val
-                return ""
+        if isinstance(biosample_ontology, dict):
+            return biosample_ontology['term_name']
+        if isinstance(biosample_ontology, list) and len(biosample_ontology) > 3:
+            return "Collection of %d Biosamples" % (len(biosample_ontology))
+        # The following got complicated because general Dataset objects
+        # cannot have biosample_ontology embedded properly. As a base class,
+        # some of the children, PublicationData, Project and 8 Series
+        # objects, have biosample_ontology embedded as array of objects,
+        # while experiment and annotation have it embedded as one single
+        # object. This becomes a problem when File object linkTo Dataset in
+        # general rather than one specific type. Current embedding system
+        # don't know how to map a property with type = ["array", "string"]
+        # in elasticsearch. Therefore, it is possible the
+        # "biosample_ontology" we got here is @id which should be embedded
+        # with the following code.
+        if not isinstance(biosample_ontology, list):
+            biosample_ontology = [biosample_ontology]
+        term_names = []
+        for type_obj in biosample_ontology:
+            if isinstance(type_obj, str):
+                term_names.append(
+                    self._request.embed(type_obj, '@@object')['term_name']
+                )
+            elif 'term_name' in type_obj:
+                term_names.append(type_obj['term_name'])
+        if len(term_names) == 1:
+            return term_names[0]
         else:
-            val = self.lookup_embedded_token(token, dataset)
+            return term_names
+
+    def _biosample_term_name_multiple(self, token, dataset, a_file):
+        biosample_ontology = dataset.get('biosample_ontology')
+        if biosample_ontology is None:
+            return "multiple biosamples"
+        return biosample_ontology.get('term_name')
+
+    # TODO: rna_species
+    # elif token == "{rna_species}":
+    #     if replicates.library.nucleic_acid = polyadenylated mRNA
+    #        rna_species = "polyA RNA"
+    #     elif replicates.library.nucleic_acid == "RNA":
+    #        if "polyadenylated mRNA" in replicates.library.depleted_in_term_name
+    #                rna_species = "polyA depleted RNA"
+    #        else
+    #                rna_species = "total RNA"
+
+    def _file_accession(self, token, dataset, a_file):
+        return a_file['accession']
+
+    def _output_type_short_label(self, token, dataset, a_file):
+        output_type = a_file['output_type']
+        return OUTPUT_TYPE_8CHARS.get(output_type, output_type)
+
+    def _replicate(self, token, dataset, a_file):
+        rep_tag = a_file.get("rep_tag")
+        if rep_tag is not None:
+            while len(rep_tag) > 4:
+                if rep_tag[3] != '0':
+                    break
+                rep_tag = rep_tag[0:3] + rep_tag[4:]
+            return rep_tag
+        rep_tech = a_file.get("rep_tech")
+        if rep_tech is not None:
+            return rep_tech.split('_')[0]  # Should truncate tech_rep
+        rep_tech = self.rep_for_file(a_file)
+        return rep_tech.split('_')[0]  # Should truncate tech_rep
+
+    def _replicate_number(self, token, dataset, a_file):
+        rep_tag = a_file.get("rep_tag", a_file.get("rep_tech", self.rep_for_file(a_file)))
+        if not rep_tag.startswith("rep"):
+            return "0"
+        return rep_tag[3:].split('_')[0]
+
+    def _biological_replicate_number(self, token, dataset, a_file):
+        rep_tech = a_file.get("rep_tech", self.rep_for_file(a_file))
+        if not rep_tech.startswith("rep"):
+            return "0"
+        return rep_tech[3:].split('_')[0]
+
+    def _technical_replicate_number(self, token, dataset, a_file):
+        rep_tech = a_file.get("rep_tech", self.rep_for_file(a_file))
+        if not rep_tech.startswith("rep"):
+            return "0"
+        return rep_tech.split('_')[1]
+
+    def _rep_tech(self, token, dataset, a_file):
+        return a_file.get("rep_tech", self.rep_for_file(a_file))
+
+    def _embedded_token(self, token, dataset, a_file):
+        if a_file is not None:
+            val = self.lookup_embedded_token(token, a_file)
             if val is not None and isinstance(val, str):
                 return val
-            log.debug('Untranslated token: "%s"' % token)
-            return "unknown"
+            return ""
+        val = self.lookup_embedded_token(token, dataset)
+        if val is not None and isinstance(val, str):
+            return val
+        log.debug('Untranslated token: "%s"' % token)
+        return "unknown"
 
     def convert_mask(self, mask, dataset=None, a_file=None):
         '''Given a mask with one or more known {term_name}s, replaces with values.'''
-        working_on = mask
         # dataset might not be self.dataset
         if dataset is None:
             dataset = self.dataset
-        chars = len(working_on)
-        while chars > 0:
-            beg_ix = working_on.find('{')
-            if beg_ix == -1:
-                break
-            end_ix = working_on.find('}')
-            if end_ix == -1:
-                break
-            term = self.lookup_token(working_on[beg_ix:end_ix+1], dataset, a_file=a_file)
-            new_mask = []
-            if beg_ix > 0:
-                new_mask = working_on[0:beg_ix]
-            new_mask += "%s%s" % (term, working_on[end_ix+1:])
-            chars = len(working_on[end_ix+1:])
-            working_on = ''.join(new_mask)
-
-        return working_on
+        return compile_mask(mask).render(self, dataset, a_file)
 
     def ucsc_single_composite_trackDb(self, vis_format, title):
         '''Given a single vis_format (vis_dataset or vis_by_type dict, returns single UCSC trackDb composite text'''
@@ -1078,6 +1075,82 @@ class VisDefines(object):
         return blob
 
 
+def _file_token(resolver):
+    # File tokens are looked up in the dataset when there is no file
+    def resolve(vis_defines, token, dataset, a_file):
+        if a_file is None:
+            return vis_defines._embedded_token(token, dataset, a_file)
+        return resolver(vis_defines, token, dataset, a_file)
+    return resolve
+
+
+# Resolvers of the mask tokens which are not simply looked up in the embedded dataset or file
+TOKEN_RESOLVERS = dict(
+    [(token, VisDefines._simple_dataset_token) for token in SIMPLE_DATASET_TOKENS] +
+    [
+        ("{experiment.accession}", VisDefines._experiment_accession),
+        ("{target}", VisDefines._target),
+        ("{target.label}", VisDefines._target),
+        ("{target.name}", VisDefines._target),
+        ("{target.title}", VisDefines._target),
+        ("{target.investigated_as}", VisDefines._target),
+        ("{replicates.library.biosample.summary}", VisDefines._biosample_summary),
+        ("{replicates.library.biosample.summary|multiple}", VisDefines._biosample_summary),
+        ("{biosample_term_name}", VisDefines._biosample_term_name),
+        ("{biosample_term_name|multiple}", VisDefines._biosample_term_name_multiple),
+        ("{file.accession}", _file_token(VisDefines._file_accession)),
+        ("{output_type_short_label}", _file_token(VisDefines._output_type_short_label)),
+        ("{replicate}", _file_token(VisDefines._replicate)),
+        ("{replicate_number}", _file_token(VisDefines._replicate_number)),
+        ("{biological_replicate_number}", _file_token(VisDefines._biological_replicate_number)),
+        ("{technical_replicate_number}", _file_token(VisDefines._technical_replicate_number)),
+        ("{rep_tech}", _file_token(VisDefines._rep_tech)),
+    ]
+)
+
+
+def token_resolver(token):
+    '''Returns the resolver(vis_defines, token, dataset, a_file) of a mask token.'''
+    if token not in SUPPORTED_MASK_TOKENS:
+        return VisDefines._unknown_token
+    return TOKEN_RESOLVERS.get(token, VisDefines._embedded_token)
+
+
+class MaskTemplate(object):
+    # A mask parsed once into its literal segments and (token, resolver) pairs
+
+    def __init__(self, mask):
+        self.mask = mask
+        self.parts = []
+        beg_ix = mask.find('{')
+        end_ix = -1
+        while beg_ix != -1:
+            close_ix = mask.find('}', beg_ix)
+            if close_ix == -1:
+                break
+            if beg_ix > end_ix + 1:
+                self.parts.append(mask[end_ix + 1:beg_ix])
+            token = mask[beg_ix:close_ix + 1]
+            self.parts.append((token, token_resolver(token)))
+            end_ix = close_ix
+            beg_ix = mask.find('{', end_ix + 1)
+        if end_ix + 1 < len(mask):
+            self.parts.append(mask[end_ix + 1:])
+
+    def render(self, vis_defines, dataset, a_file=None):
+        '''Returns the mask with each token replaced by its value.'''
+        return ''.join([
+            part if isinstance(part, str) else str(part[1](vis_defines, part[0], dataset, a_file))
+            for part in self.parts
+        ])
+
+
+@lru_cache(maxsize=MASK_TEMPLATE_CACHE_SIZE)
+def compile_mask(mask):
+    '''Returns the MaskTemplate of mask, parsing each distinct mask only once.'''
+    return MaskTemplate(mask)
+
+
 class IhecDefines(object):
     # Defines and formatting code for IHEC JSON
 
@@ -1606,38 +1679,134 @@ class IhecDefines(object):
         }
 
 
+VIS_CACHE_FLUSH_SIZE = 500
+VIS_CACHE_MGET_CHUNK_SIZE = 1000
+
+# Vis cache indices known to exist, so each process checks only once.
+_vis_cache_indices = set()
+
+
+class VisCacheBuffer(object):
+    # Vis_blobs waiting to be bulk written, shared by every VisCache of a request
+
+    def __init__(self, flush_size=VIS_CACHE_FLUSH_SIZE):
+        self.flush_size = flush_size
+        self.pending = OrderedDict()
+        self.owner = None  # Set by the vis indexer to the uuid whose blobs are being added
+        self.owners = {}  # vis_id: owner of each pending blob
+        self.failed = set()  # Owners of blobs that failed to write, until take_failed()
+        self.flushes = 0
+        self.written = 0
+        self.errors = 0
+        self.seconds = 0.0
+
+    def record_flush(self, written, errors, seconds):
+        self.flushes += 1
+        self.written += written
+        self.errors += errors
+        self.seconds += seconds
+
+    def take_failed(self):
+        failed = self.failed
+        self.failed = set()
+        return failed
+
+    def add_stats(self, stats):
+        # Folds in the stats() of another buffer, e.g. a vis indexer pool process's
+        self.flushes += stats.get('flushes', 0)
+        self.written += stats.get('written', 0)
+        self.errors += stats.get('errors', 0)
+        self.seconds += stats.get('seconds', 0.0)
+
+    def stats(self):
+        return {
+            'flushes': self.flushes,
+            'written': self.written,
+            'errors': self.errors,
+            'pending': len(self.pending),
+            'seconds': round(self.seconds, 3),
+            'written_per_second': round(self.written / self.seconds, 1) if self.seconds else None,
+        }
+
+
 # TODO: move to separate vis_cache module?
 class VisCache(object):
     # Stores and recalls vis_dataset formatted json to/from es vis_cache
+    # When the request has a VisCacheBuffer (as the vis indexer's does) adds are
+    # buffered there and bulk written by flush(), otherwise each is written at once.
 
     def __init__(self, request):
         self.request = request
         self.es = self.request.registry.get(ELASTIC_SEARCH, None)
         self.index = VIS_CACHE_INDEX
+        self.buffer = getattr(request, '_vis_cache_buffer', None)
 
-    def create_cache(self):
+    def create_cache(self, recheck=False):
         if not self.es:
             return None
+        if self.index in _vis_cache_indices and not recheck:
+            return
         if not self.es.indices.exists(self.index):
             one_shard = {'index': {'number_of_shards': 1, 'max_result_window': 99999 }}
             mapping = {'default': {"enabled": False}}
             self.es.indices.create(index=self.index, body=one_shard, wait_for_active_shards=1)
             self.es.indices.put_mapping(index=self.index, doc_type='default', body=mapping)
             log.debug("created %s index" % self.index)
+        _vis_cache_indices.add(self.index)
 
     def add(self, vis_id, vis_dataset):
         '''Adds a vis_dataset (aka vis_blob) json object to elastic-search'''
         if not self.es:
             return
-        if not self.es.indices.exists(self.index):
-            self.create_cache()  # Only bother creating on add
+        if self.buffer is not None:
+            self.buffer.pending[vis_id] = vis_dataset
+            self.buffer.owners[vis_id] = self.buffer.owner
+            if len(self.buffer.pending) >= self.buffer.flush_size:
+                self.flush()
+            return
+        self.create_cache()  # Only bother creating on add
 
         self.es.index(index=self.index, doc_type='default', body=vis_dataset, id=vis_id)
 
+    def flush(self):
+        '''Bulk writes the buffered vis_datasets, returns the vis_ids that failed to write.
+        Their owners are kept in the buffer's failed set.'''
+        if not self.es or self.buffer is None or not self.buffer.pending:
+            return []
+        self.create_cache()
+        pending = self.buffer.pending
+        self.buffer.pending = OrderedDict()
+        actions = (
+            {'_index': self.index, '_type': 'default', '_id': vis_id, '_source': vis_dataset}
+            for vis_id, vis_dataset in pending.items()
+        )
+        start = time.time()
+        written, errors = bulk(
+            self.es,
+            actions,
+            chunk_size=self.buffer.flush_size,
+            raise_on_error=False,
+            raise_on_exception=False,
+        )
+        self.buffer.record_flush(written, len(errors), time.time() - start)
+        failed = []
+        for error in errors:
+            log.error("Error writing vis_blob: %s" % error)
+            # Each error is {op_type: {'_id': ..., ...}}
+            failed.extend(item.get('_id') for item in error.values())
+        owners = {vis_id: self.buffer.owners.pop(vis_id, None) for vis_id in pending}
+        self.buffer.failed.update(
+            owners[vis_id] for vis_id in failed if owners.get(vis_id) is not None
+        )
+        log.debug("flushed %d vis_blobs to %s" % (written, self.index))
+        return failed
+
     def get(self, vis_id=None, accession=None, assembly=None):
         '''Returns the vis_dataset json object from elastic-search, or None if not found.'''
         if vis_id is None and accession is not None and assembly is not None:
             vis_id = accession + '_' + ASSEMBLY_TO_UCSC_ID.get(assembly, assembly)
+        if self.buffer is not None and vis_id in self.buffer.pending:
+            return self.buffer.pending[vis_id]
         if self.es:
             try:
                 result = self.es.get(index=self.index, doc_type='default', id=vis_id)
@@ -1647,21 +1816,29 @@ class VisCache(object):
         return None
 
     def search(self, accessions, assembly):
-        '''Returns a list of composites from elastic-search, or None if not found.'''
+        '''Returns a dict of vis_datasets by vis_id from elastic-search, empty if none found.'''
         if self.es:
             ucsc_assembly = ASSEMBLY_TO_UCSC_ID.get(assembly, assembly)  # Normalized accession
             vis_ids = [accession + "_" + ucsc_assembly for accession in accessions]
+            results = {}
             try:
-                query = {"query": {"ids": {"values": vis_ids}}}
-                res = self.es.search(body=query, index=self.index, doc_type='default', size=99999)  # size=200?
-                hits = res.get("hits", {}).get("hits", [])
-                results = {}
-                for hit in hits:
-                    results[hit["_id"]] = hit["_source"]  # make this a generator? No... len(results)
-                log.debug("ids found: %d" % (len(results)))
-                return results
+                for start in range(0, len(vis_ids), VIS_CACHE_MGET_CHUNK_SIZE):
+                    res = self.es.mget(
+                        index=self.index,
+                        doc_type='default',
+                        body={'ids': vis_ids[start:start + VIS_CACHE_MGET_CHUNK_SIZE]},
+                    )
+                    for doc in res.get('docs', []):
+                        if doc.get('found'):
+                            results[doc["_id"]] = doc["_source"]
             except:
-                pass
+                pass  # Missing index will return what was found
+            if self.buffer is not None:
+                for vis_id in vis_ids:
+                    if vis_id in self.buffer.pending:
+                        results[vis_id] = self.buffer.pending[vis_id]
+            log.debug("ids found: %d" % (len(results)))
+            return results
         return {}
 
 
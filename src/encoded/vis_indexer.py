@@ -8,12 +8,19 @@ from pyramid.view import view_config
 from sqlalchemy.exc import StatementError
 
 from urllib3.exceptions import ReadTimeoutError
+from multiprocessing import get_context
+from multiprocessing.pool import Pool
+from pyramid.decorator import reify
+from pyramid.request import apply_request_extensions
+from pyramid.threadlocal import manager
 from snovault.elasticsearch.interfaces import (
+    APP_FACTORY,
     ELASTIC_SEARCH,
     INDEXER,
 )
 import datetime
 import logging
+import os
 import pytz
 import time
 import copy
@@ -32,15 +39,22 @@ from snovault.elasticsearch.indexer_state import (
     SEARCH_MAX
 )
 
+from .searches.snapshots import refresh_matrix_snapshots_if_stale
 from .vis_defines import (
     VISIBLE_DATASET_TYPES_LC,
-    VIS_CACHE_INDEX
+    VIS_CACHE_INDEX,
+    VisCache,
+    VisCacheBuffer,
+    VIS_CACHE_FLUSH_SIZE,
 )
 from .visualization import vis_cache_add
 
 
 log = logging.getLogger('snovault.elasticsearch.es_index_listener')
 
+# Most uuids sent to a vis indexer pool process at once
+VIS_INDEXER_CHUNK_SIZE = 256
+
 
 def includeme(config):
     config.add_route('index_vis', '/index_vis')
@@ -48,8 +62,15 @@ def includeme(config):
     config.scan(__name__)
     registry = config.registry
     is_vis_indexer = registry.settings.get('visindexer')
-    if is_vis_indexer:
-        registry['vis'+INDEXER] = VisIndexer(registry)
+    if is_vis_indexer and not registry.settings.get('indexer_worker'):
+        try:
+            processes = int(registry.settings.get('visindexer.processes', 1))
+        except ValueError:
+            processes = 1
+        if processes > 1:
+            registry['vis'+INDEXER] = MPVisIndexer(registry, processes=processes)
+        else:
+            registry['vis'+INDEXER] = VisIndexer(registry)
 
 class VisIndexerState(IndexerState):
     # Accepts handoff of uuids from primary indexer. Keeps track of uuids and vis_indexer state by cycle.
@@ -69,6 +90,10 @@ class VisIndexerState(IndexerState):
     def viscached_uuid(self, uuid):
         self.list_extend(self.viscached_set, [uuid])
 
+    def viscached_uuids(self, uuids):
+        if uuids:
+            self.list_extend(self.viscached_set, list(uuids))
+
     def get_one_cycle(self, xmin, request):
         uuids = []
         next_xmin = None
@@ -123,6 +148,10 @@ class VisIndexerState(IndexerState):
         display = super(VisIndexerState, self).display(uuids=uuids)
         display['staged_to_process'] = self.get_count(self.staged_cycles_list)
         display['datasets_vis_cached_current_cycle'] = self.get_count(self.success_set)
+        last_cycle = display.get('state') or {}
+        for key in ('vis_cache_flush', 'vis_indexing'):
+            if key in last_cycle:
+                display[key] = last_cycle[key]
         return display
 
 
@@ -231,12 +260,20 @@ def index_vis(request):
 
         indexing_errors.extend(errors)  # ignore errors?
         result['errors'] = indexing_errors
+        result['vis_cache_flush'] = indexer.flush_stats
+        result['vis_indexing'] = indexer.cycle_stats
 
         result = state.finish_cycle(result, indexing_errors)
 
     if uuid_count == 0:
         result.pop('indexed',None)
 
+    # Runs after every primary indexing cycle, so this is where matrix
+    # landing pages get materialized for the new generation. Bounded by
+    # matrix_snapshots.time_limit; what doesn't fit waits for the next call.
+    if not dry_run:
+        refresh_matrix_snapshots_if_stale(request)
+
     state.send_notices()
     return result
 
@@ -246,12 +283,18 @@ def all_visualizable_uuids(registry):
 
 
 class VisIndexer(Indexer):
+    processes = 1
+
     def __init__(self, registry):
         super(VisIndexer, self).__init__(registry)
         self.es = registry[ELASTIC_SEARCH]
         self.esstorage = registry[STORAGE]
         self.index = registry.settings['snovault.elasticsearch.index']
         self.state = VisIndexerState(self.es, self.index)  # WARNING, race condition is avoided because there is only one worker
+        self.flush_size = int(registry.settings.get('visindexer.flush_size', VIS_CACHE_FLUSH_SIZE))
+        self.flush_stats = {}
+        self.cycle_stats = {}
+        self.viscached = []
 
     def get_from_es(request, comp_id):
         '''Returns composite json blob from elastic-search, or None if not found.'''
@@ -260,15 +303,59 @@ class VisIndexer(Indexer):
     def update_objects(self, request, uuids, xmin):
         # pylint: disable=too-many-arguments, unused-argument
         '''Run indexing process on uuids'''
+        start_time = time.time()
+        errors = self.build_vis_blobs(request, uuids, xmin, create_cache=True)
+        self.record_cycle_stats(len(uuids), time.time() - start_time)
+        return errors
+
+    def build_vis_blobs(self, request, uuids, xmin, create_cache=False):
+        '''Builds and bulk writes the vis_blobs of uuids, returns the errors.'''
         errors = []
-        for i, uuid in enumerate(uuids):
-            error = self.update_object(request, uuid, xmin)
-            if error is not None:
-                errors.append(error)
-            if (i + 1) % 1000 == 0:
-                log.info('Vis Indexing %d', i + 1)
+        # vis_blobs are buffered and bulk written flush_size at a time.
+        request._vis_cache_buffer = VisCacheBuffer(flush_size=self.flush_size)
+        vis_cache = VisCache(request)
+        if create_cache:
+            vis_cache.create_cache(recheck=True)  # The index may have been dropped since the last cycle
+        try:
+            for i, uuid in enumerate(uuids):
+                error = self.update_object(request, uuid, xmin)
+                if error is not None:
+                    errors.append(error)
+                if (i + 1) % 1000 == 0:
+                    errors.extend(self.flush_vis_blobs(vis_cache))
+                    log.info('Vis Indexing %d', i + 1)
+        finally:
+            errors.extend(self.flush_vis_blobs(vis_cache))
+            self.flush_stats = request._vis_cache_buffer.stats()
+            del request._vis_cache_buffer
+        log.info('Vis cache flushes: %s', self.flush_stats)
         return errors
 
+    def flush_vis_blobs(self, vis_cache):
+        '''Flushes the buffered vis_blobs and records the uuids whose blobs were
+        all written as vis_cached, returns errors for those that weren't.'''
+        vis_cache.flush()
+        failed = vis_cache.buffer.take_failed()
+        self.record_viscached([uuid for uuid in self.viscached if uuid not in failed])
+        self.viscached = []
+        timestamp = datetime.datetime.now().isoformat()
+        return [
+            {'error_message': 'Error writing vis_blob', 'timestamp': timestamp, 'uuid': str(uuid)}
+            for uuid in failed
+        ]
+
+    def record_viscached(self, uuids):
+        # Uuid-level accounting is written to the state in batches
+        self.state.viscached_uuids(uuids)
+
+    def record_cycle_stats(self, uuid_count, seconds):
+        self.cycle_stats = {
+            'processes': self.processes,
+            'uuids': uuid_count,
+            'seconds': round(seconds, 3),
+            'uuids_per_second': round(uuid_count / seconds, 1) if seconds else None,
+        }
+
     def update_object(self, request, uuid, xmin, restart=False):
 
         last_exc = None
@@ -287,6 +374,9 @@ class VisIndexer(Indexer):
         ### NOTE: if other work is to be done, this can be renamed "secondary indexer", and work can be added here
 
         if last_exc is None:
+            buffer = getattr(request, '_vis_cache_buffer', None)
+            if buffer is not None:
+                buffer.owner = uuid
             try:
                 result = vis_cache_add(
                     request,
@@ -294,8 +384,7 @@ class VisIndexer(Indexer):
                     is_vis_indexer=True,
                 )
                 if len(result):
-                    # Warning: potentiallly slow uuid-level accounting, but single process so no concurency issue
-                    self.state.viscached_uuid(uuid)
+                    self.viscached.append(uuid)  # Recorded once its vis_blobs are flushed
             except Exception as e:
                 log.error('Error indexing %s', uuid, exc_info=True)
                 #last_exc = repr(e)
@@ -304,3 +393,151 @@ class VisIndexer(Indexer):
         if last_exc is not None:
             timestamp = datetime.datetime.now().isoformat()
             return {'error_message': last_exc, 'timestamp': timestamp, 'uuid': str(uuid)}
+
+
+# Running in subprocess
+
+app = None
+worker_indexer = None
+
+
+def initializer(app_factory, settings):
+    import signal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    global app, worker_indexer
+    app = app_factory(settings, indexer_worker=True, create_tables=False)
+    worker_indexer = VisIndexerWorker(app.registry)
+
+
+def worker_request():
+    registry = app.registry
+    request = app.request_factory.blank('/_vis_indexing_pool')
+    request.registry = registry
+    request.datastore = 'elasticsearch'
+    apply_request_extensions(request)
+    request.invoke_subrequest = app.invoke_subrequest
+    request.root = app.root_factory(request)
+    request._stats = {}
+    return request
+
+
+def update_vis_objects_in_worker(args):
+    uuids, xmin = args
+    start_time = time.time()
+    worker_indexer.flush_stats = {}
+    try:
+        request = worker_request()
+        manager.push({'request': request, 'registry': request.registry})
+        try:
+            errors = worker_indexer.build_vis_blobs(request, uuids, xmin)
+        finally:
+            manager.pop()
+    except Exception as e:
+        # Report the whole chunk as errors rather than losing the cycle.
+        log.error('Error vis indexing %d uuids', len(uuids), exc_info=True)
+        timestamp = datetime.datetime.now().isoformat()
+        errors = [
+            {'error_message': repr(e), 'timestamp': timestamp, 'uuid': str(uuid)}
+            for uuid in uuids
+        ]
+    viscached = worker_indexer.flushed
+    worker_indexer.flushed = []
+    failed = worker_indexer.failed
+    worker_indexer.failed = []
+    return {
+        'pid': os.getpid(),
+        'uuids': len(uuids),
+        'errors': errors,
+        'viscached': viscached,
+        'failed': failed,
+        'flush': worker_indexer.flush_stats,
+        'run_time': time.time() - start_time,
+    }
+
+
+class VisIndexerWorker(VisIndexer):
+    # Builds vis_blobs in a pool process and hands its accounting back to MPVisIndexer
+
+    def __init__(self, registry):
+        super(VisIndexerWorker, self).__init__(registry)
+        self.flushed = []
+        self.failed = []
+
+    def flush_vis_blobs(self, vis_cache):
+        errors = super(VisIndexerWorker, self).flush_vis_blobs(vis_cache)
+        self.failed.extend(error['uuid'] for error in errors)
+        return errors
+
+    def record_viscached(self, uuids):
+        self.flushed.extend(uuids)
+
+
+# Running in main process
+
+class MPVisIndexer(VisIndexer):
+    '''
+    Splits each cycle's uuids into chunks built by a pool of processes,
+    each running its own app (and so its own elasticsearch connection)
+    and bulk writing its vis_blobs. Errors, vis_cached uuids and flush
+    stats are gathered here and recorded in the VisIndexerState.
+    '''
+    maxtasks = 100  # pooled processes will exit and be replaced after this many chunks are completed.
+
+    def __init__(self, registry, processes=None):
+        super(MPVisIndexer, self).__init__(registry)
+        self.processes = processes or os.cpu_count()
+        self.chunk_size = int(registry.settings.get('visindexer.chunk_size', VIS_INDEXER_CHUNK_SIZE))
+        self.initargs = (registry[APP_FACTORY], registry.settings,)
+
+    @reify
+    def pool(self):
+        return Pool(
+            processes=self.processes,
+            initializer=initializer,
+            initargs=self.initargs,
+            maxtasksperchild=self.maxtasks,
+            context=get_context('forkserver'),
+        )
+
+    def update_objects(self, request, uuids, xmin):
+        # pylint: disable=too-many-arguments, unused-argument
+        '''Run multiprocess vis indexing process on uuids'''
+        start_time = time.time()
+        uuids = list(uuids)
+        # Created once here so the workers don't race to create it.
+        VisCache(request).create_cache(recheck=True)
+        chunkiness = min(int((len(uuids) - 1) / self.processes) + 1, self.chunk_size)
+        tasks = [
+            (uuids[start:start + chunkiness], xmin)
+            for start in range(0, len(uuids), chunkiness)
+        ]
+        errors = []
+        flushes = VisCacheBuffer()
+        done = 0
+        try:
+            for update_info in self.pool.imap_unordered(update_vis_objects_in_worker, tasks):
+                errors.extend(update_info['errors'])
+                # Only uuids whose vis_blobs the worker wrote are vis_cached.
+                failed = set(update_info.get('failed', ()))
+                self.state.viscached_uuids(
+                    [uuid for uuid in update_info['viscached'] if str(uuid) not in failed]
+                )
+                flushes.add_stats(update_info['flush'])
+                if (done + update_info['uuids']) // 1000 > done // 1000:
+                    log.info('Vis Indexing %d', done + update_info['uuids'])
+                done += update_info['uuids']
+        except:
+            self.shutdown()
+            raise
+        finally:
+            self.flush_stats = flushes.stats()
+        self.record_cycle_stats(len(uuids), time.time() - start_time)
+        log.info('Vis cache flushes: %s', self.flush_stats)
+        return errors
+
+    def shutdown(self):
+        if 'pool' in self.__dict__:
+            self.pool.terminate()
+            self.pool.join()
+            del self.pool